@@ -0,0 +1,227 @@
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.request import pathname2url
+
+import database
+
+# Cartella dei backup, accanto al database
+BACKUP_DIR_NAME = 'backup'
+# Backup conservati: i più vecchi vengono eliminati
+BACKUP_KEEP = 10
+# Backup automatico all'avvio se l'ultimo è più vecchio di così
+BACKUP_INTERVAL_HOURS = 24
+# Pagine copiate per passo (con pagine da 4 KiB, 4 MB) e pausa tra un passo e l'altro:
+# tra i passi il database è libero, quindi il programma resta utilizzabile
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_STEP_PAUSE = 0.01
+# Se il database viene modificato da un'altra connessione la copia ricomincia da capo:
+# dopo questi riavvii si copia tutto in un solo passo
+BACKUP_MAX_RESTARTS = 3
+
+_BACKUP_NAME = re.compile(r'^preventivi-(\d{8}-\d{6})(?:-\d+)?\.db$')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+class BackupError(Exception):
+    """Backup non valido o ripristino non possibile."""
+
+def backup_dir():
+    """Cartella dei backup del database corrente."""
+    return os.path.join(os.path.dirname(os.path.abspath(database.DATABASE_NAME)), BACKUP_DIR_NAME)
+
+def list_backups(directory=None):
+    """Backup presenti nella cartella, dal più recente: lista di (data, percorso)."""
+    directory = directory or backup_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    backups = []
+    for name in names:
+        match = _BACKUP_NAME.match(name)
+        if match:
+            path = os.path.join(directory, name)
+            backups.append((datetime.strptime(match.group(1), '%Y%m%d-%H%M%S'), os.path.getmtime(path), path))
+    backups.sort(reverse=True)
+    return [(created, path) for created, _, path in backups]
+
+def _copy_database(source, target, progress=None):
+    """Copia source in target con l'API di backup di SQLite, BACKUP_PAGES_PER_STEP pagine alla volta.
+
+    Le pagine passano direttamente da un file all'altro: la memoria usata non dipende
+    dalla dimensione del database. progress(pagine copiate, pagine totali) viene chiamata
+    dopo ogni passo, nel thread della copia.
+    """
+    restarts = 0
+    last_remaining = None
+
+    class TooManyRestarts(Exception):
+        pass
+
+    def on_step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise TooManyRestarts()
+        last_remaining = remaining
+        if progress is not None:
+            progress(total - remaining, total)
+        if remaining:
+            time.sleep(BACKUP_STEP_PAUSE)
+
+    try:
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=on_step)
+    except TooManyRestarts:
+        # Il database cambia più in fretta della copia: un solo passo, cioè un'unica lettura coerente
+        source.backup(target, pages=-1)
+
+def create_backup(directory=None, keep=BACKUP_KEEP, progress=None):
+    """Salva una copia del database nella cartella dei backup e restituisce il percorso.
+
+    Il programma resta utilizzabile durante la copia (vedi _copy_database). Il file
+    compare con il nome definitivo solo a copia completata; poi vengono eliminati i
+    backup oltre i `keep` più recenti (nessuno con keep=None).
+    """
+    directory = directory or backup_dir()
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(directory, f'preventivi-{stamp}.db')
+    counter = 1
+    while os.path.exists(path):
+        counter += 1
+        path = os.path.join(directory, f'preventivi-{stamp}-{counter}.db')
+    temp_path = path + '.tmp'
+
+    source = sqlite3.connect(database.DATABASE_NAME, timeout=5.0)
+    try:
+        target = sqlite3.connect(temp_path)
+        try:
+            _copy_database(source, target, progress)
+            # Copia autonoma in un solo file, anche se il database è in modalità WAL
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        source.close()
+
+    for _, old_path in (list_backups(directory)[keep:] if keep is not None else []):
+        try:
+            os.remove(old_path)
+        except OSError as e:
+            print(f"Impossibile eliminare il vecchio backup {old_path}: {e}")
+    return path
+
+def backup_if_due(interval_hours=BACKUP_INTERVAL_HOURS, directory=None, keep=BACKUP_KEEP):
+    """Esegue create_backup se l'ultimo backup è più vecchio di interval_hours; altrimenti None."""
+    backups = list_backups(directory)
+    if backups and datetime.now() - backups[0][0] < timedelta(hours=interval_hours):
+        return None
+    return create_backup(directory, keep)
+
+def check_backup(path):
+    """Controlla che path sia un database utilizzabile: None se va bene, altrimenti il motivo."""
+    try:
+        conn = sqlite3.connect(f'file:{pathname2url(os.path.abspath(path))}?mode=ro', uri=True)
+    except sqlite3.Error as e:
+        return f"impossibile aprire il file: {e}"
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'materials'").fetchone() is None:
+            return "il file non contiene un database dei preventivi"
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version > database.SCHEMA_VERSION:
+            return f"il backup è di una versione più recente del programma (schema {version})"
+        result = conn.execute('PRAGMA quick_check').fetchone()[0]
+        if result != 'ok':
+            return f"il file è danneggiato ({result})"
+    except sqlite3.Error as e:
+        return f"il file non è un database valido: {e}"
+    finally:
+        conn.close()
+    return None
+
+def prepare_restore(path, progress=None):
+    """Prima parte del ripristino, eseguibile in background mentre il programma è in uso.
+
+    Verifica il backup, lo copia accanto al database e salva un backup dello stato
+    attuale (per poter tornare indietro). Restituisce il file da passare a finish_restore.
+    """
+    problem = check_backup(path)
+    if problem:
+        raise BackupError(f"Backup non utilizzabile: {problem}")
+    temp_path = os.path.abspath(database.DATABASE_NAME) + '.restore'
+    # Copia a blocchi, nella stessa cartella: la sostituzione finale è una rinomina atomica
+    shutil.copyfile(path, temp_path)
+    try:
+        # Senza rotazione: non deve sparire il backup scelto, se è il più vecchio
+        create_backup(keep=None, progress=progress)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def finish_restore(temp_path):
+    """Sostituisce il database con il file preparato da prepare_restore.
+
+    Va chiamata quando nessun altro thread sta usando il database e con le altre
+    postazioni chiuse. La sostituzione è una rinomina atomica: se qualcosa va storto
+    resta il database precedente. Le connessioni vengono riaperte (PRAGMA data_version
+    riparte) e il catalogo in memoria scartato; chi tiene una posizione del registro
+    delle modifiche (database.get_catalog_seq) deve ricaricare i dati da capo.
+    """
+    live_path = os.path.abspath(database.DATABASE_NAME)
+    database.close_all_connections()
+    # Un lock esclusivo riesce solo se nessun'altra istanza sta usando il file; alla
+    # chiusura dell'ultima connessione SQLite scrive e rimuove il file -wal
+    conn = sqlite3.connect(live_path, timeout=0)
+    try:
+        conn.execute('BEGIN EXCLUSIVE')
+        conn.execute('ROLLBACK')
+        in_use = False
+    except sqlite3.OperationalError:
+        in_use = True
+    finally:
+        conn.close()
+    # In modalità WAL il lock esclusivo non esclude i lettori: il -wal rimasto indica un'altra istanza
+    if in_use or os.path.exists(live_path + '-wal'):
+        os.remove(temp_path)
+        raise BackupError("Il database è in uso da un'altra postazione: chiuderla e riprovare.")
+    os.replace(temp_path, live_path)
+    database.invalidate_price_catalog()
+    # Un backup di una versione precedente viene aggiornato allo schema corrente
+    database.create_tables()
+
+def restore_backup(path, progress=None):
+    """Ripristina il backup `path` (prepare_restore seguita da finish_restore)."""
+    finish_restore(prepare_restore(path, progress))
+
+# --- Esecuzione in background ---
+
+def _submit(func, *args, **kwargs):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Un thread a parte: una copia lunga non rallenta le letture di db_worker
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='Backup')
+        return _executor.submit(func, *args, **kwargs)
+
+def create_backup_async(progress=None):
+    return _submit(create_backup, progress=progress)
+
+def backup_if_due_async():
+    return _submit(backup_if_due)
+
+def prepare_restore_async(path, progress=None):
+    return _submit(prepare_restore, path, progress)
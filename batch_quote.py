@@ -0,0 +1,252 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import database
+import file_formats
+import money
+import quote_kernel
+from database import QUOTE_EDGE_SIDES
+from quote_engine import QuoteEngine
+
+# Preventivi da riga di comando, senza interfaccia: ogni distinta di taglio (CSV, XLSX o
+# JSON, vedi file_formats.read_cut_list) viene calcolata con i prezzi di preventivi.db e
+# salvata come preventivo JSON (apribile con "Apri Preventivo") e PDF. Le distinte di
+# una cartella sono calcolate in parallelo, un processo per CPU.
+#
+#   python -m batch_quote distinte/ --out preventivi_calcolati
+#   python -m batch_quote lavoro1.csv lavoro2.xlsx --db //server/condivisa/preventivi.db --no-pdf
+#
+# Alla fine scrive il riepilogo di tutte le distinte in riepilogo.csv. Le distinte con
+# righe non valide (materiale o bordo non trovato nel listino) non producono file.
+
+DEFAULT_OUT_DIR = 'preventivi_calcolati'
+SUMMARY_FILENAME = 'riepilogo.csv'
+SUMMARY_COLUMNS = ('file', 'righe', 'mq', 'lastre_eur', 'bordi_eur', 'totale_eur', 'errori')
+
+
+def _init_worker(db_path):
+    """Inizializzazione di ogni processo: il listino viene letto una volta in memoria."""
+    database.DATABASE_NAME = db_path
+    database.load_price_catalog()
+
+def _material_index():
+    """Materiali del listino per nome (senza distinzione di maiuscole)."""
+    index = {}
+    for material in database.get_all_materials():
+        index.setdefault(material['name'].casefold(), []).append(material)
+    return index
+
+def _resolve_material(index, line):
+    """Materiale del listino per una riga della distinta; solleva CutListError se manca o è ambiguo."""
+    candidates = index.get(line['material_name'].casefold(), [])
+    if line['thickness'] is not None:
+        thickness_mm = database.thickness_to_mm(line['thickness'])
+        candidates = [material for material in candidates if material['thickness_mm'] == thickness_mm]
+    if line['supplier'] is not None:
+        supplier = line['supplier'].casefold()
+        candidates = [material for material in candidates if (material['supplier'] or '').casefold() == supplier]
+    description = line['material_name']
+    if line['thickness'] is not None:
+        description += f" {line['thickness']:g} cm"
+    if line['supplier'] is not None:
+        description += f" ({line['supplier']})"
+    if not candidates:
+        raise file_formats.CutListError(f"materiale non trovato nel listino: {description}")
+    if len(candidates) > 1:
+        raise file_formats.CutListError(
+            f"materiale ambiguo: {description} ha {len(candidates)} prezzi, indicare spessore e fornitore")
+    return candidates[0]
+
+def price_cut_list_lines(lines):
+    """Calcola le righe di una distinta letta con file_formats.read_cut_list.
+
+    Restituisce (QuoteEngine con le righe calcolate, errori, secondi di calcolo). Gli
+    errori sono messaggi per riga; se ce ne sono il preventivo non è completo.
+    """
+    index = _material_index()
+    errors = []
+    materials = []
+    for row_number, line in enumerate(lines, start=2):
+        try:
+            materials.append(_resolve_material(index, line))
+        except file_formats.CutListError as e:
+            errors.append(f"Riga {row_number}: {e}")
+            materials.append(None)
+
+    edge_keys = [(material['name'], material['thickness'], edge_type)
+                 for line, material in zip(lines, materials) if material is not None
+                 for edge_type in line['edges'].values()]
+    edge_prices = database.get_edge_prices(edge_keys)
+
+    started = time.perf_counter()
+    priced = []  # (riga, materiale, {lato: prezzo al metro})
+    material_positions = {}
+    counts, lengths_cm, widths_cm, price_indices, edge_masks, edge_prices_lm = [], [], [], [], [], []
+    for row_number, (line, material) in enumerate(zip(lines, materials), start=2):
+        if material is None:
+            continue
+        side_prices = {}
+        for side, edge_type in line['edges'].items():
+            price_lm = edge_prices.get((material['name'], material['thickness'], edge_type))
+            if price_lm is None:
+                errors.append(f"Riga {row_number}: bordo '{edge_type}' senza prezzo per {material['name']}")
+            else:
+                side_prices[side] = price_lm
+        priced.append((line, material, side_prices))
+        counts.append(line['quantity'])
+        lengths_cm.append(line['length_cm'])
+        widths_cm.append(line['width_cm'])
+        price_indices.append(material_positions.setdefault(material['id'], len(material_positions)))
+        edge_masks.append([side in side_prices for side in QUOTE_EDGE_SIDES])
+        edge_prices_lm.append([side_prices.get(side, 0.0) for side in QUOTE_EDGE_SIDES])
+    prices_per_sqm = [0.0] * len(material_positions)
+    for line, material, side_prices in priced:
+        prices_per_sqm[material_positions[material['id']]] = material['price_per_sqm']
+    prices = quote_kernel.price_cut_list(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm,
+                                         edge_masks, edge_prices_lm)
+    elapsed = time.perf_counter() - started
+
+    engine = QuoteEngine()
+    # Un solo passo di annulla per tutta la distinta: nessuna versione intermedia conservata
+    with engine.group():
+        for i, (line, material, side_prices) in enumerate(priced):
+            engine.add_priced_slab(
+                line['quantity'], money.tenths_mm(line['length_cm']), money.tenths_mm(line['width_cm']),
+                material['name'], material['thickness'], money.price_units(material['price_per_sqm']),
+                int(prices.mq_units[i]), int(prices.slab_cents[i]),
+                {side: (line['edges'][side], money.price_units(price_lm)) for side, price_lm in side_prices.items()})
+    return engine, errors, elapsed
+
+def quote_file(filename, out_dir, write_json=True, write_pdf=True):
+    """Calcola una distinta e ne salva il preventivo in out_dir. Eseguita nei processi di lavoro.
+
+    Restituisce un dict con file, righe, totali, errori, secondi di calcolo e file scritti.
+    """
+    result = {'file': filename, 'lines': 0, 'totals': None, 'errors': [], 'pricing_seconds': 0.0, 'outputs': []}
+    try:
+        lines = file_formats.read_cut_list(filename)
+        engine, errors, result['pricing_seconds'] = price_cut_list_lines(lines)
+        result['lines'] = len(lines)
+        result['totals'] = engine.totals()
+        result['errors'] = errors
+        if errors:
+            return result
+        quote_items = [list(file_formats.line_row_values(line)) for line in engine]
+        totals = file_formats.quote_totals_strings(result['totals'])
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        if write_json:
+            path = os.path.join(out_dir, stem + '.json')
+            file_formats.write_quote_json(quote_items, totals, path)
+            result['outputs'].append(path)
+        if write_pdf:
+            path = os.path.join(out_dir, stem + '.pdf')
+            file_formats.write_quote_pdf(quote_items, totals, path)
+            result['outputs'].append(path)
+    except Exception as e:
+        # Una distinta illeggibile non deve fermare le altre
+        result['errors'].append(str(e) or type(e).__name__)
+    return result
+
+def collect_cut_lists(paths, out_dir):
+    """File delle distinte: quelli indicati e quelli con estensione supportata nelle cartelle indicate."""
+    out_dir = os.path.abspath(out_dir)
+    filenames = []
+    for path in paths:
+        if not os.path.isdir(path):
+            filenames.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            filename = os.path.join(path, name)
+            # La cartella di uscita può essere dentro quella delle distinte: i preventivi non sono distinte
+            if (os.path.isfile(filename) and name.lower().endswith(file_formats.CUT_LIST_EXTENSIONS)
+                    and os.path.dirname(os.path.abspath(filename)) != out_dir):
+                filenames.append(filename)
+    return filenames
+
+def write_summary(results, filename):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_COLUMNS)
+        for result in results:
+            # Distinte con errori: totali vuoti, il preventivo non è completo
+            totals = None if result['errors'] else result['totals']
+            writer.writerow([
+                result['file'],
+                result['lines'],
+                money.format_mq(totals.mq_units) if totals else '',
+                money.format_cents(totals.slabs_cents) if totals else '',
+                money.format_cents(totals.edges_cents) if totals else '',
+                money.format_cents(totals.total_cents) if totals else '',
+                ' | '.join(result['errors']),
+            ])
+
+def run(filenames, db_path, out_dir, workers, write_json=True, write_pdf=True):
+    """Calcola tutte le distinte e restituisce i risultati nell'ordine di filenames."""
+    # Migrazioni di schema una volta sola, prima di avviare i processi
+    database.DATABASE_NAME = db_path
+    database.create_tables()
+    database.close_db_connection()
+
+    if workers <= 1:
+        _init_worker(db_path)
+        return [quote_file(filename, out_dir, write_json, write_pdf) for filename in filenames]
+    results = {}
+    # spawn su tutti i sistemi: come su Windows, ogni processo apre la propria connessione
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(db_path,)) as executor:
+        futures = {executor.submit(quote_file, filename, out_dir, write_json, write_pdf): position
+                   for position, filename in enumerate(filenames)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return [results[position] for position in range(len(filenames))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Calcola i preventivi di una o più distinte di taglio senza interfaccia.')
+    parser.add_argument('inputs', nargs='+', help=f"distinte ({', '.join(file_formats.CUT_LIST_EXTENSIONS)}) o cartelle che le contengono")
+    parser.add_argument('--db', default=database.DATABASE_NAME, help='database dei prezzi')
+    parser.add_argument('--out', default=DEFAULT_OUT_DIR, help='cartella dei preventivi e del riepilogo')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processi in parallelo (1 = nessun processo separato)')
+    parser.add_argument('--no-json', action='store_true', help='non salvare i preventivi JSON')
+    parser.add_argument('--no-pdf', action='store_true', help='non salvare i preventivi PDF')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.db):
+        parser.error(f'database non trovato: {args.db}')
+    filenames = collect_cut_lists(args.inputs, args.out)
+    if not filenames:
+        parser.error('nessuna distinta di taglio trovata')
+    os.makedirs(args.out, exist_ok=True)
+
+    workers = max(1, min(args.workers, len(filenames)))
+    print(f'{len(filenames)} distinte, {workers} processi')
+    started = time.perf_counter()
+    results = run(filenames, os.path.abspath(args.db), args.out, workers,
+                  write_json=not args.no_json, write_pdf=not args.no_pdf)
+    elapsed = time.perf_counter() - started
+
+    failed = 0
+    for result in results:
+        totals = result['totals']
+        if result['errors']:
+            failed += 1
+            print(f"  {result['file']:40} ERRORE: {result['errors'][0]}"
+                  + (f" (e altri {len(result['errors']) - 1})" if len(result['errors']) > 1 else ''))
+        else:
+            print(f"  {result['file']:40} {result['lines']:6} righe  {totals.mq:12.4f} m²  {totals.total_eur:14,.2f} €")
+    summary = os.path.join(args.out, SUMMARY_FILENAME)
+    write_summary(results, summary)
+
+    lines = sum(result['lines'] for result in results)
+    pricing = sum(result['pricing_seconds'] for result in results)
+    print(f'{lines} righe in {elapsed:.2f} s ({lines / elapsed:,.0f} righe/s); '
+          f'calcolo prezzi {pricing * 1000:.1f} ms' + (f' ({lines / pricing:,.0f} righe/s)' if pricing else ''))
+    print(f'Riepilogo in {summary}' + (f'; {failed} distinte con errori' if failed else ''))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
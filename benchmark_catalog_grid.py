@@ -0,0 +1,151 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import database
+from catalog_grid import CatalogGridModel
+
+# Tempi delle tabelle di gestione del catalogo (catalog_grid) con un catalogo grande, su un
+# database temporaneo: prima pagina, pagine successive, ordinamenti, filtri e modifiche
+# applicate riga per riga, confrontati con la lettura completa usata prima. Verifica che
+# scorrendo tutte le pagine si legga ogni riga una volta sola, nell'ordine, e che dopo
+# le modifiche le righe mostrate coincidano con una lettura da capo.
+#
+#   python benchmark_catalog_grid.py --rows 50000
+
+def fill_catalog(rows, seed):
+    rng = random.Random(seed)
+    suppliers = [f'Fornitore {n}' for n in range(40)] + [None]
+    database.add_materials_bulk({
+        'name': f'Materiale {n // 4}', 'thickness': (2, 3, None, 1.5)[n % 4], 'price_per_sqm': rng.randint(3000, 60000) / 100,
+        'description': rng.choice(('', 'lucido', 'levigato', 'fiammato')), 'supplier': rng.choice(suppliers),
+    } for n in range(rows))
+    database.upsert_edges_bulk({
+        'edge_type': f'Bordo {n % 50}', 'material_name': f'Materiale {n // 100}' if n % 7 else None,
+        'thickness': (2, 3, None)[n % 3], 'price_per_lm': rng.randint(100, 6000) / 100,
+    } for n in range(rows))
+    database.upsert_linear_elements_bulk({
+        'element_type': f'Elemento {n % 30}', 'material_name': f'Materiale {n // 30}' if n % 5 else None,
+        'thickness': (2, 3, None)[n % 3], 'price_per_lm': rng.randint(100, 9000) / 100, 'description': '',
+    } for n in range(rows))
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def walk_pages(table, sort, descending, filters=None):
+    """Legge tutte le pagine; restituisce (id in ordine, tempo della pagina più lenta, errori)."""
+    ids, keys, slowest, after = [], [], 0.0, None
+    while True:
+        page, elapsed = _timed(database.get_catalog_rows, table, sort, descending, filters, after=after)
+        slowest = max(slowest, elapsed)
+        ids.extend(row['id'] for _, row in page)
+        keys.extend(key for key, _ in page)
+        if len(page) < database.CATALOG_PAGE_SIZE:
+            break
+        after = page[-1][0]
+    ordered = all((a > b) if descending else (a < b) for a, b in zip(keys, keys[1:]))
+    errors = [] if ordered and len(set(ids)) == len(ids) else [f'{table} per {sort}: pagine fuori ordine o righe ripetute']
+    return ids, slowest, errors
+
+def load_pages(model, pages):
+    """Come CatalogGrid: prima pagina con il punto del registro, poi pagine successive."""
+    model.reset()
+    model.catalog_seq, page = database.with_catalog_seq(database.get_catalog_rows, model.table, *model.query())
+    model.add_page(page, database.CATALOG_PAGE_SIZE)
+    for _ in range(pages - 1):
+        if model.complete:
+            break
+        model.add_page(database.get_catalog_rows(model.table, *model.query(), after=model.after), database.CATALOG_PAGE_SIZE)
+
+def check_changes(rows, seed):
+    """Modifiche sparse (comprese righe oltre le pagine lette) applicate riga per riga, come dopo un salvataggio."""
+    rng = random.Random(seed)
+    model = CatalogGridModel('materials')
+    model.sort_column, model.sort_descending = 'price_per_sqm', True
+    model.filters = {'description': 'l'}
+    load_pages(model, 3)
+    loaded = list(model.ids)
+    for material_id in rng.sample(range(1, rows + 1), 20) + loaded[:5]:
+        material = database.get_material_by_id(material_id)
+        if material is not None:
+            database.update_material(material_id, material['name'], rng.randint(3000, 60000) / 100, material['thickness'],
+                                     rng.choice(('', 'lucido', 'levigato')), material['supplier'])
+    for material_id in loaded[5:10]:
+        database.delete_material(material_id)
+    database.add_material('Materiale nuovo', 999.0, 2.0, 'lucido')
+    (seq, changes), elapsed = _timed(database.get_catalog_row_changes, 'materials', model.catalog_seq, *model.query())
+    model.catalog_seq = seq
+    started = time.perf_counter()
+    for row_id, entry in changes.items():
+        model.apply_change(row_id, entry)
+    elapsed += time.perf_counter() - started
+
+    # Riferimento: rilettura da capo delle stesse pagine, fino alla stessa chiave
+    after = model.after
+    reference = CatalogGridModel('materials')
+    reference.sort_column, reference.sort_descending, reference.filters = model.sort_column, True, dict(model.filters)
+    load_pages(reference, 5)
+    expected = [row_id for row_id in reference.display_ids() if reference.key_by_id[row_id] >= after]
+    ok = model.display_ids() == expected
+    print(f'  {len(changes)} righe cambiate applicate in {elapsed * 1000:6.2f} ms '
+          f"({'uguali' if ok else 'DIVERSE'} da una rilettura da capo)")
+    return ok
+
+def run(rows, seed):
+    print(f'catalogo di {rows} materiali, {rows} bordi, {rows} elementi lineari')
+    errors = []
+    for table in database.CATALOG_DEFAULT_SORT:
+        _, full_elapsed = _timed(lambda: database.get_db_connection().execute(
+            f'SELECT * FROM {table} ORDER BY id').fetchall())
+        (seq, first), first_elapsed = _timed(database.with_catalog_seq, database.get_catalog_rows, table)
+        total, count_elapsed = _timed(database.count_catalog_rows, table)
+        print(f'  {table}: prima pagina {first_elapsed * 1000:6.2f} ms, conteggio {count_elapsed * 1000:6.2f} ms '
+              f'(lettura completa {full_elapsed * 1000:7.1f} ms)')
+        for sort in database.catalog_sort_columns(table):
+            for descending in (False, True):
+                ids, slowest, walk_errors = walk_pages(table, sort, descending)
+                errors += walk_errors
+                if len(ids) != total:
+                    errors.append(f'{table} per {sort}: lette {len(ids)} righe su {total}')
+            print(f'    per {sort:14} pagina più lenta {slowest * 1000:6.2f} ms')
+
+    filters = {'supplier': 'fornitore 1', 'price_per_sqm': '> 300', 'thickness': '<= 2'}
+    page, elapsed = _timed(database.get_catalog_rows, 'materials', 'name', False, filters)
+    matched = database.count_catalog_rows('materials', filters)
+    wrong = [row['id'] for _, row in page if not ('fornitore 1' in (row['supplier'] or '').lower()
+                                                   and row['price_per_sqm'] > 300 and row['thickness_mm'] <= 20)]
+    if wrong:
+        errors.append(f'filtri: righe che non li rispettano {wrong[:5]}')
+    print(f'  filtri {filters}: prima pagina {elapsed * 1000:6.2f} ms, {matched} righe')
+
+    if not check_changes(rows, seed):
+        errors.append('modifiche applicate riga per riga diverse da una rilettura')
+    for message in errors:
+        print(f'  ERRORE {message}')
+    return not errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempi delle tabelle di gestione del catalogo con molte righe.')
+    parser.add_argument('--rows', type=int, default=50000, help='righe per tabella')
+    parser.add_argument('--seed', type=int, default=1, help='seme dei dati casuali')
+    parser.add_argument('--dir', default=None, help='cartella in cui creare il database temporaneo')
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix='preventivi_catalogo_', dir=args.dir)
+    try:
+        database.DATABASE_NAME = os.path.join(workdir, 'preventivi.db')
+        database.create_tables()
+        fill_catalog(args.rows, args.seed)
+        ok = run(args.rows, args.seed)
+        database.close_all_connections()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
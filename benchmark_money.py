@@ -0,0 +1,88 @@
+import argparse
+import random
+import sys
+import time
+
+import money
+from quote_engine import QuoteEngine
+
+# Confronto dei tempi tra i calcoli con i float (come prima di money) e quelli in unità
+# intere: calcolo delle righe, ricalcolo dei totali a ogni modifica e formattazione.
+#
+#   python benchmark_money.py --lines 2000 --updates 200
+
+def make_lines(count, seed):
+    """Righe casuali: quantità, lunghezza e larghezza in cm, prezzo al m² e prezzo del bordo."""
+    rng = random.Random(seed)
+    return [(rng.randint(1, 50), rng.randint(100, 4000) / 10, rng.randint(50, 900) / 10,
+             rng.randint(1000, 60000) / 100, rng.randint(100, 5000) / 100) for _ in range(count)]
+
+def rows_with_floats(lines):
+    """Come prima: float arrotondati con round() e valori della tabella come stringhe."""
+    rows = []
+    for quantity, length_cm, width_cm, price, edge_price in lines:
+        mq = quantity * (length_cm / 100) * (width_cm / 100)
+        slab_cost = round(mq * price, 2)
+        edges_cost = round(length_cm / 100 * edge_price * quantity, 2)
+        rows.append((f"{round(mq, 4):.4f}", f"{slab_cost:.2f}", f"{edges_cost:.2f}", f"{round(slab_cost + edges_cost, 2):.2f}"))
+    return rows
+
+def rows_with_units(lines):
+    """Con money: unità intere, formattate solo alla fine."""
+    rows = []
+    for quantity, length_cm, width_cm, price, edge_price in lines:
+        length_tmm, width_tmm = money.tenths_mm(length_cm), money.tenths_mm(width_cm)
+        slab_cents = money.slab_cost_cents(quantity, length_tmm, width_tmm, money.price_units(price))
+        edges_cents = money.length_cost_cents(length_tmm, money.price_units(edge_price), quantity)
+        rows.append((money.format_mq(money.slab_mq_units(quantity, length_tmm, width_tmm)),
+                     money.format_cents(slab_cents), money.format_cents(edges_cents),
+                     money.format_cents(slab_cents + edges_cents)))
+    return rows
+
+def totals_from_strings(rows):
+    """Come il vecchio update_summary: rilettura di tutte le stringhe della tabella."""
+    total_mq = total_eur = 0.0
+    for row in rows:
+        total_mq += float(row[0])
+        total_eur += float(row[3])
+    return total_mq, total_eur
+
+def _timed(func, *args, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, (time.perf_counter() - started) / repeat
+
+def run(lines, updates, seed):
+    cut_list = make_lines(lines, seed)
+    print(f'{lines} righe casuali')
+
+    float_rows, float_elapsed = _timed(rows_with_floats, cut_list)
+    unit_rows, unit_elapsed = _timed(rows_with_units, cut_list)
+    print(f'  calcolo e formattazione delle righe: float {float_elapsed * 1e6 / lines:6.2f} µs/riga, '
+          f'interi {unit_elapsed * 1e6 / lines:6.2f} µs/riga')
+
+    engine = QuoteEngine()
+    for quantity, length_cm, width_cm, price, edge_price in cut_list:
+        line = engine.add_slab(quantity, length_cm, width_cm, 'Materiale', 2.0, price)
+        engine.set_edges(line.line_id, {'front': ('Bordo', edge_price)})
+    (_, string_total), string_elapsed = _timed(totals_from_strings, float_rows, repeat=updates)
+    totals, engine_elapsed = _timed(engine.totals, repeat=updates)
+    print(f'  totali a ogni modifica: rilettura delle stringhe {string_elapsed * 1000:8.3f} ms, '
+          f'QuoteEngine {engine_elapsed * 1000:8.4f} ms')
+
+    differences = sum(1 for old, new in zip(float_rows, unit_rows) if old != new)
+    print(f'  righe con valori diversi: {differences} (arrotondamenti a metà e errori dei float)')
+    print(f'  totale: somma delle stringhe {string_total:,.6f} €, interi {money.format_cents(totals.total_cents)} €')
+
+def main():
+    parser = argparse.ArgumentParser(description='Confronto dei tempi dei calcoli con i float e in unità intere.')
+    parser.add_argument('--lines', type=int, default=2000, help='righe del preventivo')
+    parser.add_argument('--updates', type=int, default=200, help='ricalcoli dei totali da misurare')
+    parser.add_argument('--seed', type=int, default=1, help='seme dei dati casuali')
+    args = parser.parse_args()
+    run(args.lines, args.updates, args.seed)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
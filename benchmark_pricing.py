@@ -0,0 +1,80 @@
+import argparse
+import random
+import sys
+import time
+
+import quote_kernel
+from database import QUOTE_EDGE_SIDES
+from quote_engine import QuoteEngine
+
+# Confronto dei tempi di calcolo di una distinta di taglio sintetica: riga per riga con
+# QuoteEngine (come quando si aggiungono righe e bordi dall'interfaccia) e con il kernel
+# di quote_kernel, in puro Python e con NumPy se installato. Verifica anche che i totali
+# coincidano.
+#
+#   python benchmark_pricing.py --lines 100000
+
+def make_cut_list(lines, materials, seed):
+    """Distinta casuale ma riproducibile: liste di quantità, misure, materiali e bordi."""
+    rng = random.Random(seed)
+    prices_per_sqm = [round(rng.uniform(30, 400), 2) for _ in range(materials)]
+    counts = [rng.randint(1, 20) for _ in range(lines)]
+    lengths_cm = [round(rng.uniform(20, 300), 1) for _ in range(lines)]
+    widths_cm = [round(rng.uniform(10, 60), 1) for _ in range(lines)]
+    price_indices = [rng.randrange(materials) for _ in range(lines)]
+    edge_masks = [[rng.random() < 0.4 for _ in QUOTE_EDGE_SIDES] for _ in range(lines)]
+    edge_prices_lm = [[round(rng.uniform(3, 30), 2) for _ in QUOTE_EDGE_SIDES] for _ in range(lines)]
+    return counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm
+
+def price_per_row(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm):
+    """Il percorso attuale: una add_slab e una set_edges per riga."""
+    engine = QuoteEngine()
+    for i in range(len(counts)):
+        line = engine.add_slab(counts[i], lengths_cm[i], widths_cm[i], 'Materiale', 2.0, prices_per_sqm[price_indices[i]])
+        edges = {side: ('Bordo', edge_prices_lm[i][k]) for k, side in enumerate(QUOTE_EDGE_SIDES) if edge_masks[i][k]}
+        if edges:
+            engine.set_edges(line.line_id, edges)
+    return engine.totals()
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def run(lines, materials, seed):
+    cut_list = make_cut_list(lines, materials, seed)
+    print(f'Distinta sintetica: {lines} righe, {materials} materiali')
+    results = []
+    totals, elapsed = _timed(price_per_row, *cut_list)
+    results.append(('riga per riga (QuoteEngine)', totals, elapsed))
+    prices, elapsed = _timed(lambda *args: quote_kernel.price_cut_list(*args, use_numpy=False), *cut_list)
+    results.append(('kernel, puro Python', prices.totals, elapsed))
+    if quote_kernel.has_numpy():
+        # Conversione in array esclusa dal tempo: chi usa il kernel tiene già i dati in array
+        arrays = tuple(quote_kernel.np.asarray(values) for values in cut_list)
+        prices, elapsed = _timed(lambda *args: quote_kernel.price_cut_list(*args, use_numpy=True), *arrays)
+        results.append(('kernel, NumPy', prices.totals, elapsed))
+    else:
+        print('  NumPy non installato: confronto solo con il kernel in puro Python')
+
+    reference = results[0][1]
+    ok = True
+    for name, totals, elapsed in results:
+        same = totals == reference
+        ok = ok and same
+        print(f'  {name:30} {elapsed * 1000:9.1f} ms  {lines / elapsed:12,.0f} righe/s  '
+              f'totale {totals.total_eur:,.2f} €' + ('' if same else '  (DIVERSO)'))
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Confronto dei tempi di calcolo di una distinta di taglio.')
+    parser.add_argument('--lines', type=int, default=100000, help='righe della distinta')
+    parser.add_argument('--materials', type=int, default=500, help='materiali diversi')
+    parser.add_argument('--seed', type=int, default=1, help='seme dei dati casuali')
+    args = parser.parse_args()
+    ok = run(args.lines, args.materials, args.seed)
+    print('Totali coincidenti.' if ok else 'Totali NON coincidenti.')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
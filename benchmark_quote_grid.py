@@ -0,0 +1,125 @@
+import argparse
+import random
+import sys
+import time
+
+import file_formats
+from quote_engine import QuoteEngine
+from quote_grid import QuoteGridModel
+
+# Tempi di apertura di un preventivo grande con la tabella virtualizzata (quote_grid):
+# lettura delle righe salvate in un file JSON, prima schermata, ordinamento, svuotamento.
+# Se c'è uno schermo confronta anche, in una finestra Tk, il primo disegno di QuoteGrid
+# con un Treeview che contiene tutte le righe (come la vecchia tabella).
+#
+#   python benchmark_quote_grid.py --lines 10000
+
+FIRST_SCREEN_LINES = 100  # come in main.py
+
+def make_rows(count, seed):
+    """Tabella di un preventivo salvato (come save_quote_to_json): valori di line_row_values."""
+    rng = random.Random(seed)
+    engine = QuoteEngine()
+    for _ in range(count):
+        line = engine.add_slab(rng.randint(1, 50), rng.randint(100, 4000) / 10, rng.randint(50, 900) / 10,
+                               f'Materiale {rng.randint(1, 200)}', 2.0, rng.randint(1000, 60000) / 100)
+        if rng.random() < 0.5:
+            engine.set_edges(line.line_id, {'front': ('Bordo', rng.randint(100, 5000) / 100)})
+    return [list(file_formats.line_row_values(line)) for line in engine]
+
+def load_rows(engine, rows, first_screen=None):
+    """Come open_quote_from_json: un solo passo di annulla, first_screen() dopo le prime righe."""
+    with engine.group():
+        for position, values in enumerate(rows):
+            engine.add_line_data(file_formats.line_data_from_row_values(values))
+            if position == FIRST_SCREEN_LINES and first_screen is not None:
+                first_screen()
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def run_headless(rows, screen_rows):
+    engine = QuoteEngine()
+    model = QuoteGridModel(engine)
+    engine.subscribe(model.line_changed)
+
+    first_screen = lambda: [file_formats.line_row_values(engine.get(line_id)) for line_id in model.window(0, screen_rows)]
+    shown = []
+    started = time.perf_counter()
+    load_rows(engine, rows, lambda: shown.append((first_screen(), time.perf_counter() - started)))
+    load_elapsed = time.perf_counter() - started
+    print(f'  apertura di {len(rows)} righe: prima schermata ({screen_rows} righe) dopo {shown[0][1] * 1000:6.2f} ms, '
+          f'preventivo completo {load_elapsed * 1000:8.1f} ms')
+
+    model.sort_by('materiale')
+    _, sort_elapsed = _timed(first_screen)
+    model.sort_by('importo_riga')
+    model.sort_by('importo_riga')
+    _, sort_desc_elapsed = _timed(first_screen)
+    print(f'  ordinamento per materiale {sort_elapsed * 1000:8.1f} ms, per importo decrescente {sort_desc_elapsed * 1000:8.1f} ms')
+
+    middle = len(rows) // 2
+    _, scroll_elapsed = _timed(lambda: [file_formats.line_row_values(engine.get(line_id))
+                                        for line_id in model.window(middle, screen_rows)])
+    model.select(0)
+    model.select(len(rows) - 1, extend=True)
+    selected = len(model.selection())
+    _, clear_elapsed = _timed(engine.clear)
+    _, undo_elapsed = _timed(engine.undo)
+    print(f'  scorrimento a metà {scroll_elapsed * 1000:6.2f} ms; {selected} righe selezionate con Maiusc; '
+          f'nuovo preventivo {clear_elapsed * 1000:6.2f} ms, annulla {undo_elapsed * 1000:8.1f} ms')
+    return len(engine) == len(rows)
+
+def run_tk(rows):
+    import tkinter as tk
+    from tkinter import ttk
+    from quote_grid import COLUMNS, QuoteGrid
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print('  (nessuno schermo: confronto con il Treeview saltato)')
+        return
+    root.geometry('1000x600')
+
+    engine = QuoteEngine()
+    grid = QuoteGrid(root, engine)
+    grid.pack(fill='both', expand=True)
+    root.update()
+    shown = []
+    started = time.perf_counter()
+    load_rows(engine, rows, lambda: (root.update_idletasks(), shown.append(time.perf_counter() - started)))
+    root.update()
+    grid_elapsed = time.perf_counter() - started
+    grid.destroy()
+
+    tree = ttk.Treeview(root, columns=COLUMNS, show='headings')
+    tree.pack(fill='both', expand=True)
+    engine = QuoteEngine()
+    engine.subscribe(lambda old, new: tree.insert('', 'end', iid=str(new.line_id), values=file_formats.line_row_values(new)))
+    root.update()
+    started = time.perf_counter()
+    load_rows(engine, rows)
+    root.update()
+    tree_elapsed = time.perf_counter() - started
+    root.destroy()
+    print(f'  a video: QuoteGrid prima schermata {shown[0] * 1000:6.1f} ms, completo {grid_elapsed * 1000:8.1f} ms; '
+          f'Treeview con tutte le righe {tree_elapsed * 1000:8.1f} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempi della tabella virtualizzata del preventivo.')
+    parser.add_argument('--lines', type=int, default=10000, help='righe del preventivo')
+    parser.add_argument('--screen-rows', type=int, default=40, help='righe visibili in una schermata')
+    parser.add_argument('--seed', type=int, default=1, help='seme dei dati casuali')
+    parser.add_argument('--no-tk', action='store_true', help='non aprire la finestra Tk')
+    args = parser.parse_args()
+    rows = make_rows(args.lines, args.seed)
+    print(f'preventivo di {args.lines} righe')
+    ok = run_headless(rows, args.screen_rows)
+    if not args.no_tk:
+        run_tk(rows)
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from quote_engine import QuoteEngine
+
+# Costo di annulla/ripeti su un preventivo grande: memoria conservata per ogni passo e
+# tempo di undo() e redo(), confrontati con una copia completa delle righe per passo.
+# Alla fine verifica che annullando tutto si ritorni al preventivo di partenza.
+#
+#   python benchmark_undo.py --lines 2000 --steps 500
+
+def make_quote(lines, seed):
+    rng = random.Random(seed)
+    engine = QuoteEngine()
+    for _ in range(lines):
+        line = engine.add_slab(rng.randint(1, 50), rng.randint(100, 4000) / 10, rng.randint(50, 900) / 10,
+                               'Materiale', 2.0, rng.randint(1000, 60000) / 100)
+        if rng.random() < 0.5:
+            engine.set_edges(line.line_id, {'front': ('Bordo', rng.randint(100, 5000) / 100)})
+    engine.reset_history()
+    return engine
+
+def edit(engine, rng):
+    """Una modifica a caso, come quelle dell'interfaccia: bordi, eliminazione, più righe eliminate."""
+    lines = engine.lines()
+    choice = rng.random()
+    if choice < 0.6:
+        line = rng.choice(lines)
+        engine.set_edges(line.line_id, {'front': ('Bordo', rng.randint(100, 5000) / 100),
+                                        'left': ('Bordo', rng.randint(100, 5000) / 100)})
+    elif choice < 0.9:
+        engine.remove(rng.choice(lines).line_id)
+    else:
+        with engine.group():
+            for line in rng.sample(lines, min(10, len(lines))):
+                engine.remove(line.line_id)
+
+def run(lines, steps, seed):
+    engine = make_quote(lines, seed)
+    original, original_totals = engine.lines(), engine.totals()
+    print(f'preventivo di {lines} righe, {steps} modifiche')
+
+    rng = random.Random(seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(steps):
+        edit(engine, rng)
+    history = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # Riferimento: una copia di tutte le righe per ogni passo
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = [dict((line.line_id, line) for line in engine) for _ in range(min(steps, 50))]
+    per_copy = (tracemalloc.get_traced_memory()[0] - before) / len(copies)
+    tracemalloc.stop()
+    del copies
+    print(f'  memoria per passo: cronologia {history / steps / 1024:8.2f} KiB, '
+          f'copia completa {per_copy / 1024:8.2f} KiB')
+
+    notified = []
+    engine.subscribe(lambda old, new: notified.append(1))
+    started = time.perf_counter()
+    while engine.undo():
+        pass
+    undo_elapsed = time.perf_counter() - started
+    undo_notified = len(notified)
+    started = time.perf_counter()
+    while engine.redo():
+        pass
+    redo_elapsed = time.perf_counter() - started
+    print(f'  undo {undo_elapsed * 1e6 / steps:8.1f} µs/passo, redo {redo_elapsed * 1e6 / steps:8.1f} µs/passo; '
+          f'{undo_notified / steps:.1f} righe notificate per passo')
+
+    while engine.undo():
+        pass
+    ok = engine.lines() == original and engine.totals() == original_totals
+    print('  annullando tutto si torna al preventivo di partenza' if ok else '  ERRORE: preventivo diverso dopo gli annullamenti')
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Costo di annulla/ripeti su un preventivo grande.')
+    parser.add_argument('--lines', type=int, default=2000, help='righe del preventivo')
+    parser.add_argument('--steps', type=int, default=500, help='modifiche da annullare')
+    parser.add_argument('--seed', type=int, default=1, help='seme dei dati casuali')
+    args = parser.parse_args()
+    return 0 if run(args.lines, args.steps, args.seed) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
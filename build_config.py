@@ -5,12 +5,24 @@
 include_files = [
     'preventivi.db',
     'database.py',
+    'price_catalog.py',
     'utils.py',
     'materials_manager.py',
     'edges_manager.py',
     'linear_elements_manager.py',
     'edge_editor_dialog.py',
+    'edge_profile_dialog.py',
     'linear_quote_dialog.py',
+    'quote_archive.py',
+    'db_worker.py',
+    'backup.py',
+    'catalog_ndjson.py',
+    'quote_engine.py',
+    'quote_grid.py',
+    'catalog_grid.py',
+    'quote_kernel.py',
+    'file_formats.py',
+    'money.py',
 ]
 
 # Moduli nascosti da includere
@@ -0,0 +1,348 @@
+import bisect
+import tkinter as tk
+from tkinter import ttk
+import database
+import db_worker
+
+FILTER_DELAY_MS = 200  # Pausa nella digitazione dopo cui un filtro viene applicato
+LOAD_AHEAD = 0.8       # Si legge la pagina successiva quando è visibile questa frazione delle righe caricate
+
+
+class CatalogGridModel:
+    """Righe di una tabella del catalogo lette a pagine (database.get_catalog_rows), senza widget.
+
+    `keys` e `ids` sono le chiavi di ordinamento e gli id delle righe lette, sempre in
+    ordine crescente: con l'ordinamento decrescente la tabella le mostra al contrario
+    (display_index). La pagina successiva parte da `after`, la chiave dell'ultima riga
+    letta. Le modifiche (database.get_catalog_row_changes) vengono applicate riga per
+    riga, e solo se cadono entro le righe già lette: le altre arriveranno con le pagine
+    successive, nella posizione giusta.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.sort_column = None
+        self.sort_descending = False
+        self.filters = {}
+        self.search = None
+        self.total = None    # righe che passano i filtri (database.count_catalog_rows), anche non lette
+        self.reset()
+
+    def reset(self):
+        self.keys = []
+        self.ids = []
+        self.rows = {}
+        self.key_by_id = {}
+        self.after = None
+        self.complete = False
+        self.catalog_seq = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self):
+        """(sort, descending, filters, search) per le funzioni di database, dopo la tabella."""
+        return self.sort_column, self.sort_descending, dict(self.filters), self.search
+
+    def sort_by(self, column):
+        """Click sull'intestazione: crescente, decrescente, poi di nuovo l'ordine predefinito."""
+        if column not in database.catalog_sort_columns(self.table):
+            return False
+        if self.sort_column != column:
+            self.sort_column, self.sort_descending = column, False
+        elif not self.sort_descending:
+            self.sort_descending = True
+        else:
+            self.sort_column, self.sort_descending = None, False
+        return True
+
+    def display_index(self, index):
+        """Posizione nella tabella della riga in posizione index di `ids`."""
+        return len(self.ids) - 1 - index if self.sort_descending else index
+
+    def display_ids(self):
+        return self.ids[::-1] if self.sort_descending else list(self.ids)
+
+    def _covers(self, key):
+        # La riga è entro le pagine già lette?
+        if self.complete:
+            return True
+        if self.after is None:
+            return False
+        return key >= self.after if self.sort_descending else key <= self.after
+
+    def _remove(self, row_id):
+        """Toglie la riga; restituisce la posizione che aveva nella tabella, o None."""
+        key = self.key_by_id.pop(row_id, None)
+        if key is None:
+            return None
+        index = bisect.bisect_left(self.keys, key)
+        position = self.display_index(index)
+        del self.keys[index]
+        del self.ids[index]
+        del self.rows[row_id]
+        return position
+
+    def _insert(self, key, row):
+        """Inserisce la riga al suo posto; restituisce la posizione nella tabella."""
+        index = bisect.bisect(self.keys, key)
+        self.keys.insert(index, key)
+        self.ids.insert(index, row['id'])
+        self.rows[row['id']] = row
+        self.key_by_id[row['id']] = key
+        return self.display_index(index)
+
+    def add_page(self, page, limit):
+        """Aggiunge una pagina letta da `after` in poi; restituisce gli id nuovi, nell'ordine mostrato."""
+        added = []
+        for key, row in page:
+            # Già presente se una modifica l'ha inserita prima dell'arrivo della pagina
+            self._remove(row['id'])
+            self._insert(key, row)
+            added.append(row['id'])
+        if page:
+            self.after = page[-1][0]
+        self.complete = len(page) < limit
+        return added
+
+    def apply_change(self, row_id, entry):
+        """Applica una modifica di get_catalog_row_changes ((chiave, riga) o None).
+
+        Restituisce (posizione precedente, nuova posizione) nella tabella, None dove
+        la riga non c'era o non c'è più.
+        """
+        old_position = self._remove(row_id)
+        new_position = None
+        if entry is not None and self._covers(entry[0]):
+            new_position = self._insert(*entry)
+        return old_position, new_position
+
+
+class CatalogGrid(ttk.Frame):
+    """Tabella di gestione di materials, edges o linear_elements, letta a pagine dal database.
+
+    `columns` è una lista di (colonna, intestazione, larghezza, allineamento), con le
+    colonne di database.get_catalog_rows; `row_values(riga)` restituisce i valori
+    mostrati. Sopra ogni colonna c'è un campo filtro, l'intestazione ordina (se la
+    colonna ha un indice) e la pagina successiva viene letta nel thread del database
+    quando si scorre verso il fondo, quindi anche un catalogo di decine di migliaia di
+    righe si apre subito. Dopo una modifica refresh_catalog_changes() applica solo le
+    righe cambiate, senza ricaricare. `on_select()` e `on_activate(riga)` (doppio click
+    o Invio) sono facoltative.
+    """
+
+    def __init__(self, parent, table, columns, row_values, on_select=None, on_activate=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.model = CatalogGridModel(table)
+        self.columns = columns
+        self.row_values = row_values
+        self.on_select = on_select
+        self.on_activate = on_activate
+        self._loading = False
+        self._filter_job = None
+        self._generation = 0  # Cresce a ogni ricaricamento: le modifiche chieste prima vengono scartate
+
+        # Campi filtro allineati alle colonne (riposizionati se le colonne cambiano larghezza)
+        self.filter_frame = ttk.Frame(self)
+        self.filter_frame.grid(row=0, column=0, sticky="ew")
+        self.filter_vars = {}
+        self.filter_entries = []
+        for column, *_ in columns:
+            var = tk.StringVar()
+            entry = ttk.Entry(self.filter_frame, textvariable=var)
+            entry.bind("<KeyRelease>", self._on_filter_changed)
+            self.filter_vars[column] = var
+            self.filter_entries.append(entry)
+        self.filter_frame.configure(height=self.filter_entries[0].winfo_reqheight())
+
+        self.tree = ttk.Treeview(self, columns=[column for column, *_ in columns], show="headings")
+        for column, heading, width, anchor in columns:
+            self.tree.heading(column, text=heading, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, anchor=anchor)
+        self.tree.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        self.tree.configure(yscrollcommand=self._on_tree_scrolled)
+
+        self.status_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.status_var).grid(row=2, column=0, columnspan=2, sticky="w", pady=(2, 0))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.tree.bind("<Configure>", lambda event: self._place_filters())
+        self.tree.bind("<ButtonRelease-1>", lambda event: self._place_filters(), add="+")
+        self.tree.bind("<<TreeviewSelect>>", lambda event: self.on_select and self.on_select())
+        self.tree.bind("<Double-1>", self._on_activate)
+        self.tree.bind("<Return>", self._on_activate)
+
+        self._update_headings()
+        self.reload()
+
+    # --- Stato per chi usa la tabella ---
+
+    def selected_rows(self):
+        """Righe selezionate (sqlite3.Row), nell'ordine mostrato."""
+        return [self.model.rows[int(iid)] for iid in self.tree.selection()]
+
+    def selected_row(self):
+        rows = self.selected_rows()
+        return rows[0] if rows else None
+
+    def set_search(self, text):
+        """Ricerca per parole (solo materiali, vedi database.get_catalog_rows); ricarica la tabella."""
+        self.model.search = text
+        self.reload()
+
+    def sort_by(self, column):
+        if self.model.sort_by(column):
+            self._update_headings()
+            self.reload()
+
+    def _update_headings(self):
+        sortable = database.catalog_sort_columns(self.model.table)
+        current = self.model.sort_column or database.CATALOG_DEFAULT_SORT[self.model.table]
+        for column, heading, *_ in self.columns:
+            arrow = ""
+            if column == current:
+                arrow = " ▼" if self.model.sort_descending else " ▲"
+            self.tree.heading(column, text=heading + arrow if column in sortable else heading)
+
+    # --- Caricamento a pagine ---
+
+    @database.query_scope("Tabella catalogo: prima pagina")
+    def reload(self):
+        """Rilegge dalla prima pagina, con l'ordinamento e i filtri attuali."""
+        self._loading = True
+        self._generation += 1
+        self.model.total = None
+        # Fino alla prima pagina nessun aggiornamento riga per riga: la pagina letta li comprende già
+        self.model.catalog_seq = None
+        table = self.model.table
+        db_worker.when_done(self, database.with_catalog_seq_async(database.get_catalog_rows, table, *self.model.query()),
+                            self._on_first_page, self._on_load_error, key="page")
+        self._count_rows()
+
+    def _count_rows(self):
+        sort, descending, filters, search = self.model.query()
+        db_worker.when_done(self, database.count_catalog_rows_async(self.model.table, filters, search),
+                            self._on_count, self._on_load_error, key="count")
+
+    def _on_first_page(self, result):
+        seq, page = result
+        self.model.reset()
+        self.model.catalog_seq = seq
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._loading = False
+        self._add_page(page)
+        self.tree.yview_moveto(0)
+
+    @database.query_scope("Tabella catalogo: pagina successiva")
+    def load_more(self):
+        if self._loading or self.model.complete or self.model.catalog_seq is None:
+            return
+        self._loading = True
+        db_worker.when_done(self, database.get_catalog_rows_async(self.model.table, *self.model.query(), after=self.model.after),
+                            self._on_next_page, self._on_load_error, key="page")
+
+    def _on_next_page(self, page):
+        self._loading = False
+        self._add_page(page)
+
+    def _add_page(self, page):
+        for row_id in self.model.add_page(page, database.CATALOG_PAGE_SIZE):
+            iid = str(row_id)
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            self.tree.insert("", "end", iid=iid, values=self.row_values(self.model.rows[row_id]))
+        self._update_status()
+
+    def _on_count(self, total):
+        self.model.total = total
+        self._update_status()
+
+    def _update_status(self):
+        loaded = len(self.model)
+        if self.model.total is None:
+            self.status_var.set(f"{loaded} righe")
+        else:
+            self.status_var.set(f"{loaded} di {max(self.model.total, loaded)} righe")
+
+    def _on_tree_scrolled(self, first, last):
+        self.scrollbar.set(first, last)
+        # Verso il fondo delle righe lette (o tabella non ancora piena): pagina successiva
+        if float(last) >= LOAD_AHEAD:
+            self.load_more()
+
+    def _on_load_error(self, error):
+        self._loading = False
+        if isinstance(error, ValueError):
+            self.status_var.set(str(error))  # Filtro scritto male: nessun messaggio modale durante la digitazione
+        else:
+            self.status_var.set(f"Errore nel caricamento: {error}")
+
+    # --- Modifiche ---
+
+    def refresh_catalog_changes(self):
+        """Aggiorna la tabella con le sole righe cambiate (dopo una modifica, anche da un'altra postazione)."""
+        if self.model.catalog_seq is None:
+            return # Caricamento ancora in corso
+        generation = self._generation
+        db_worker.when_done(self, database.get_catalog_row_changes_async(self.model.table, self.model.catalog_seq, *self.model.query()),
+                            lambda result: self._apply_changes(generation, result), self._on_load_error, key="changes")
+
+    def _apply_changes(self, generation, result):
+        seq, changes = result
+        if generation != self._generation:
+            return # Ricaricata nel frattempo: la prima pagina è già aggiornata
+        if changes is None:
+            self.reload() # Troppe modifiche: si ricarica tutto
+            return
+        self.model.catalog_seq = max(self.model.catalog_seq, seq)
+        if not changes:
+            return
+        for row_id, entry in changes.items():
+            iid = str(row_id)
+            old_position, new_position = self.model.apply_change(row_id, entry)
+            if new_position is None:
+                if old_position is not None:
+                    self.tree.delete(iid)
+            elif old_position is None:
+                self.tree.insert("", new_position, iid=iid, values=self.row_values(entry[1]))
+            else:
+                self.tree.item(iid, values=self.row_values(entry[1]))
+                self.tree.move(iid, "", new_position)
+        # Righe aggiunte o tolte anche oltre le pagine lette: il totale si rilegge
+        self._count_rows()
+        self._update_status()
+
+    # --- Filtri ---
+
+    def _on_filter_changed(self, event=None):
+        # Si rilegge solo dopo una breve pausa nella digitazione
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DELAY_MS, self._apply_filters)
+
+    def _apply_filters(self):
+        self._filter_job = None
+        filters = {column: var.get().strip() for column, var in self.filter_vars.items() if var.get().strip()}
+        if filters != self.model.filters:
+            self.model.filters = filters
+            self.reload()
+
+    def _place_filters(self):
+        x = 0
+        for (column, *_), entry in zip(self.columns, self.filter_entries):
+            width = int(self.tree.column(column, "width"))
+            entry.place(x=x, y=0, width=width)
+            x += width
+
+    def _on_activate(self, event):
+        if event.type == tk.EventType.ButtonPress and not self.tree.identify_row(event.y):
+            return None
+        row = self.selected_row()
+        if row is not None and self.on_activate is not None:
+            self.on_activate(row)
+        return "break"
@@ -0,0 +1,243 @@
+import gzip
+import itertools
+import json
+import os
+from datetime import datetime
+
+import database
+
+# Formato di esportazione del catalogo a righe (NDJSON): una riga di intestazione e poi
+# un oggetto JSON per riga, uno per materiale, bordo o elemento lineare:
+#
+#   {"format": "preventivi-catalog", "version": 1, "export_date": "2026-10-18T10:00:00"}
+#   {"type": "material", "name": "Marmo", "thickness_mm": 20, "price_per_sqm": 120.0, ...}
+#   {"type": "edge", "material_name": null, "thickness_mm": null, "edge_type": "Toro", ...}
+#
+# Le righe vengono scritte e lette una alla volta, quindi la memoria usata non dipende
+# dalla dimensione del catalogo. I file che finiscono con .gz sono compressi con gzip.
+CATALOG_FORMAT = 'preventivi-catalog'
+CATALOG_FORMAT_VERSION = 1
+# Compressione gzip: 6 è molto più veloce di 9 con file quasi uguali
+GZIP_LEVEL = 6
+
+# Ogni quante righe lette o scritte viene chiamato progress(fatte, totale)
+PROGRESS_EVERY = 1000
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# tipo di record -> (tabella, campi esportati)
+_RECORD_TYPES = {
+    'material': ('materials', ('name', 'thickness_mm', 'price_per_sqm', 'description', 'supplier')),
+    'edge': ('edges', ('material_name', 'thickness_mm', 'edge_type', 'price_per_lm')),
+    'linear_element': ('linear_elements', ('element_type', 'material_name', 'thickness_mm', 'price_per_lm', 'description')),
+}
+
+class CatalogFormatError(ValueError):
+    """File di catalogo non valido."""
+
+def open_catalog(filename):
+    """Apre un file di catalogo in lettura come testo, decomprimendolo se è in formato gzip."""
+    with open(filename, 'rb') as f:
+        compressed = f.read(2) == _GZIP_MAGIC
+    if compressed:
+        return gzip.open(filename, 'rt', encoding='utf-8')
+    return open(filename, 'r', encoding='utf-8')
+
+def _parse_header(line):
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or header.get('format') != CATALOG_FORMAT:
+        return None
+    return header
+
+def read_header(filename):
+    """Intestazione del file se è un catalogo NDJSON, altrimenti None (es. vecchio formato JSON)."""
+    with open_catalog(filename) as f:
+        return _parse_header(f.readline())
+
+def _file_position(f):
+    """Byte del file su disco già letti da f (per i file compressi, byte compressi)."""
+    buffer = f.buffer
+    return getattr(buffer, 'fileobj', buffer).tell()
+
+def export_catalog(filename, progress=None):
+    """Scrive materiali, bordi ed elementi lineari in filename, compresso se finisce con .gz.
+
+    Le righe passano direttamente dal cursore al file; progress(righe scritte, righe totali),
+    se indicata, viene chiamata ogni PROGRESS_EVERY righe. Restituisce i conteggi
+    {'materials': n, 'edges': n, 'linear_elements': n}.
+    """
+    total = sum(database.count_catalog_rows(table) for table, _ in _RECORD_TYPES.values()) if progress else 0
+    written = 0
+    if filename.endswith('.gz'):
+        f = gzip.open(filename, 'wt', encoding='utf-8', compresslevel=GZIP_LEVEL)
+    else:
+        f = open(filename, 'w', encoding='utf-8')
+    counts = {}
+    with f:
+        header = {'format': CATALOG_FORMAT, 'version': CATALOG_FORMAT_VERSION,
+                  'export_date': datetime.now().isoformat(timespec='seconds')}
+        f.write(json.dumps(header) + '\n')
+        for record_type, (table, fields) in _RECORD_TYPES.items():
+            count = 0
+            for row in database.iter_catalog_rows(table):
+                record = {'type': record_type}
+                for field in fields:
+                    record[field] = row[field]
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+                written += 1
+                if progress and written % PROGRESS_EVERY == 0:
+                    progress(written, total)
+            counts[table] = count
+    if progress:
+        progress(written, total)
+    return counts
+
+def _read_records(f, progress=None):
+    size = os.fstat(f.fileno()).st_size if progress else 0
+    for line_number, line in enumerate(f, start=2):
+        if progress and line_number % PROGRESS_EVERY == 0:
+            progress(_file_position(f), size)
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise CatalogFormatError(f"Riga {line_number} non valida: {e}") from None
+        if not isinstance(record, dict):
+            raise CatalogFormatError(f"Riga {line_number} non valida: atteso un oggetto JSON")
+        yield record
+
+def import_catalog(filename, overwrite_existing=False, progress=None):
+    """Importa un catalogo NDJSON in un'unica transazione: o si importa tutto o niente.
+
+    I record vengono letti uno alla volta e passati, per gruppi consecutivi dello stesso
+    tipo, agli inserimenti massivi di database (add_materials_bulk, upsert_edges_bulk,
+    upsert_linear_elements_bulk): la memoria usata non dipende dalla dimensione del file.
+    I record di tipo sconosciuto vengono ignorati. progress(byte letti, byte del file), se
+    indicata, viene chiamata ogni PROGRESS_EVERY righe. Restituisce i conteggi di ogni tabella
+    {'materials': {'inserted': n, 'updated': n, 'skipped': n}, 'edges': ..., 'linear_elements': ...}.
+    """
+    outcomes = {table: {'inserted': 0, 'updated': 0, 'skipped': 0} for table, _ in _RECORD_TYPES.values()}
+    writers = {
+        'material': database.add_materials_bulk,
+        'edge': database.upsert_edges_bulk,
+        'linear_element': database.upsert_linear_elements_bulk,
+    }
+    # Bordi "LINEAR_<tipo>" dei backup precedenti: pochi, importati alla fine come elementi lineari
+    legacy_linear = []
+
+    def edges_only(records):
+        for record in records:
+            edge_type = str(record.get('edge_type') or '')
+            if edge_type.startswith(database.LEGACY_LINEAR_PREFIX):
+                legacy_linear.append(dict(record, element_type=edge_type[len(database.LEGACY_LINEAR_PREFIX):]))
+            else:
+                yield record
+
+    def add_outcome(table, outcome):
+        for key, value in outcome.items():
+            outcomes[table][key] += value
+
+    with open_catalog(filename) as f:
+        header = _parse_header(f.readline())
+        if header is None:
+            raise CatalogFormatError("Il file non è un catalogo esportato dal programma")
+        if header.get('version', 0) > CATALOG_FORMAT_VERSION:
+            raise CatalogFormatError(
+                f"Il catalogo è di una versione più recente del programma (formato {header['version']})")
+        with database.transaction():
+            for record_type, records in itertools.groupby(_read_records(f, progress),
+                                                          key=lambda record: record.get('type')):
+                if record_type not in writers:
+                    continue
+                if record_type == 'edge':
+                    records = edges_only(records)
+                add_outcome(_RECORD_TYPES[record_type][0],
+                            writers[record_type](records, overwrite_existing=overwrite_existing))
+            if legacy_linear:
+                add_outcome('linear_elements', database.upsert_linear_elements_bulk(
+                    legacy_linear, overwrite_existing=overwrite_existing))
+    return outcomes
+
+# --- Vecchio formato: un unico file JSON ---
+
+def export_catalog_json(filename):
+    """Esporta il catalogo nel vecchio formato JSON unico, leggibile dalle versioni precedenti.
+
+    Restituisce i conteggi come export_catalog.
+    """
+    materials_data = [{
+        'name': material['name'],
+        'thickness': material['thickness'],
+        'price_per_sqm': material['price_per_sqm'],
+        'description': material['description'],
+        'supplier': material['supplier']
+    } for material in database.get_all_materials()]
+    edges_data = [{
+        'material_name': edge['material_name'],
+        'thickness': edge['thickness'],
+        'edge_type': edge['edge_type'],
+        'price_per_lm': edge['price_per_lm']
+    } for edge in database.get_all_edge_types()]
+    linear_data = [{
+        'material_name': element['material_name'],
+        'thickness': element['thickness'],
+        'element_type': element['element_type'],
+        'price_per_lm': element['price_per_lm'],
+        'description': element['description']
+    } for element in database.get_all_linear_elements()]
+
+    export_data = {
+        'export_date': json.dumps(datetime.now().isoformat()),
+        'materials': materials_data,
+        'edges': edges_data,
+        'linear_elements': linear_data
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(export_data, f, indent=4, ensure_ascii=False)
+    return {'materials': len(materials_data), 'edges': len(edges_data), 'linear_elements': len(linear_data)}
+
+def import_catalog_json(filename, overwrite_existing=False):
+    """Importa un catalogo nel vecchio formato JSON unico (anche compresso), in un'unica transazione.
+
+    Restituisce i conteggi come import_catalog.
+    """
+    with open_catalog(filename) as f:
+        import_data = json.load(f)
+    if not isinstance(import_data, dict) or not any(
+            section in import_data for section in ('materials', 'edges', 'linear_elements')):
+        raise CatalogFormatError("mancano le sezioni 'materials', 'edges' o 'linear_elements'")
+
+    outcomes = {table: {'inserted': 0, 'updated': 0, 'skipped': 0} for table, _ in _RECORD_TYPES.values()}
+    # I backup precedenti salvavano gli elementi lineari come bordi "LINEAR_<tipo>"
+    edges_data = []
+    linear_data = list(import_data.get('linear_elements', []))
+    for edge in import_data.get('edges', []):
+        edge_type = str(edge.get('edge_type') or '')
+        if edge_type.startswith(database.LEGACY_LINEAR_PREFIX):
+            linear_data.append(dict(edge, element_type=edge_type[len(database.LEGACY_LINEAR_PREFIX):]))
+        else:
+            edges_data.append(edge)
+
+    # Tutto il file in un'unica transazione: o si importa tutto o niente
+    with database.transaction():
+        if 'materials' in import_data:
+            outcomes['materials'] = database.add_materials_bulk(import_data['materials'], overwrite_existing=overwrite_existing)
+        if edges_data:
+            outcomes['edges'] = database.upsert_edges_bulk(edges_data, overwrite_existing=overwrite_existing)
+        if linear_data:
+            outcomes['linear_elements'] = database.upsert_linear_elements_bulk(linear_data, overwrite_existing=overwrite_existing)
+    return outcomes
+
+def import_catalog_file(filename, overwrite_existing=False, progress=None):
+    """Importa un catalogo riconoscendo da sé il formato: NDJSON (import_catalog) o vecchio JSON (import_catalog_json).
+
+    progress vale solo per il formato NDJSON: il vecchio file JSON viene letto tutto in una volta.
+    """
+    if read_header(filename) is not None:
+        return import_catalog(filename, overwrite_existing=overwrite_existing, progress=progress)
+    return import_catalog_json(filename, overwrite_existing=overwrite_existing)
@@ -1,18 +1,780 @@
+import contextvars
+import itertools
+import math
+import os
+import random
 import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import money
+from price_catalog import PriceCatalog
 
 DATABASE_NAME = 'preventivi.db'
 
-def get_db_connection():
-    """Crea e restituisce una connessione al database."""
-    conn = sqlite3.connect(DATABASE_NAME)
+# Prefisso con cui le vecchie versioni salvavano gli elementi lineari nella tabella edges
+LEGACY_LINEAR_PREFIX = 'LINEAR_'
+
+# Colonne restituite dalle letture: lo spessore è salvato in millimetri interi (thickness_mm)
+# ma l'API continua a esporlo in cm nella colonna thickness
+_MATERIAL_COLUMNS = 'id, name, thickness_mm / 10.0 AS thickness, thickness_mm, price_per_sqm, description, supplier'
+_EDGE_COLUMNS = 'id, material_name, thickness_mm / 10.0 AS thickness, thickness_mm, edge_type, price_per_lm'
+_LINEAR_ELEMENT_COLUMNS = 'id, element_type, material_name, thickness_mm / 10.0 AS thickness, thickness_mm, price_per_lm, description'
+
+# Chiavi univoche con i NULL resi confrontabili. In SQLite due NULL sono sempre distinti,
+# quindi UNIQUE (material_name, thickness_mm, edge_type) non impedisce i bordi generici
+# doppi: gli indici univoci (e gli ON CONFLICT degli upsert) usano queste espressioni.
+_UNIQUE_KEYS = {
+    'materials': "name, IFNULL(thickness_mm, -1), IFNULL(supplier, '')",
+    'edges': "IFNULL(material_name, ''), IFNULL(thickness_mm, -1), edge_type",
+    'linear_elements': "element_type, IFNULL(material_name, ''), IFNULL(thickness_mm, -1)",
+}
+
+# Pragma applicati una sola volta, all'apertura della connessione di ogni thread
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),     # ~16 MB di page cache (valore negativo = KiB)
+    ('mmap_size', 268435456),   # 256 MB di I/O memory-mapped
+    ('busy_timeout', 5000),     # ms di attesa se un altro processo tiene il lock
+    ('temp_store', 'MEMORY'),
+)
+
+# Database condiviso da più postazioni (cartella di rete): il WAL richiede memoria condivisa
+# tra i processi e non è affidabile su SMB/NFS, quindi si torna al journal classico.
+# Questi pragma sostituiscono i corrispondenti di CONNECTION_PRAGMAS.
+SHARED_ACCESS_PRAGMAS = (
+    ('journal_mode', 'DELETE'),
+    ('synchronous', 'FULL'),
+    ('mmap_size', 0),           # Niente memory-mapped I/O su file remoti
+)
+
+# Tentativi dopo un "database is locked" rimasto tale anche dopo busy_timeout,
+# con attesa crescente (secondi, raddoppiata a ogni tentativo e resa casuale)
+BUSY_RETRIES = 6
+BUSY_RETRY_DELAY = 0.05
+BUSY_RETRY_MAX_DELAY = 1.0
+# Tentativi per prendere il lock di scrittura (BEGIN IMMEDIATE, cambio di journal_mode
+# all'apertura): nulla è ancora stato eseguito, quindi si può aspettare più a lungo, fino
+# a coprire le scritture in coda delle altre postazioni (lotti di SHARED_WRITE_BATCH righe)
+WRITE_LOCK_RETRIES = 10
+
+# In modalità condivisa le scritture massive sono spezzate in transazioni di al massimo
+# queste righe, così le altre postazioni non restano bloccate per tutta l'importazione
+SHARED_WRITE_BATCH = 500
+
+_local = threading.local()
+_connections_lock = threading.Lock()
+_open_connections = weakref.WeakSet()  # Connessioni dei thread ancora vivi
+# Incrementato da close_all_connections: gli altri thread riaprono la loro connessione
+_connections_generation = 0
+
+class _Connection(sqlite3.Connection):
+    """Connessione con supporto ai weakref, per il registro delle connessioni aperte.
+
+    Se la strumentazione è attiva (enable_query_stats, query_scope) le istruzioni
+    passano da un _InstrumentedCursor; altrimenti vanno dirette a sqlite3.
+    In modalità condivisa le istruzioni fuori da una transazione vengono ripetute
+    se il database resta bloccato da un'altra postazione (vedi _retry_when_busy).
+    """
+    shared_access = False
+    data_version = None  # Ultimo PRAGMA data_version visto da check_catalog_changes
+
+    def execute(self, sql, parameters=()):
+        if self.in_transaction or not self.shared_access:
+            return self._execute(sql, parameters)
+        return _retry_when_busy(self._execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        # Non ripetuta: i parametri possono essere un generatore già in parte consumato
+        if not _query_stats_enabled and _current_scope.get() is None:
+            return super().executemany(sql, parameters)
+        return self.cursor(_InstrumentedCursor).executemany(sql, parameters)
+
+    def _execute(self, sql, parameters=()):
+        if not _query_stats_enabled and _current_scope.get() is None:
+            return super().execute(sql, parameters)
+        return self.cursor(_InstrumentedCursor).execute(sql, parameters)
+
+def _open_connection(path):
+    """Apre una nuova connessione e applica i pragma di CONNECTION_PRAGMAS.
+
+    Se il database è condiviso (impostazione salvata nel file, oppure file su una
+    cartella di rete) valgono anche quelli di SHARED_ACCESS_PRAGMAS.
+    """
+    # isolation_level=None: le transazioni sono gestite esplicitamente da transaction().
+    # timeout imposta busy_timeout prima di qualsiasi lettura: aprendo il file mentre
+    # un'altra postazione scrive si aspetta invece di ricevere subito "database is locked"
+    pragmas = dict(CONNECTION_PRAGMAS)
+    conn = sqlite3.connect(path, timeout=pragmas.pop('busy_timeout') / 1000, isolation_level=None,
+                           check_same_thread=False, factory=_Connection)
     conn.row_factory = sqlite3.Row  # Per accedere alle colonne per nome
+    setting = _retry_when_busy(_shared_access_setting, conn)
+    conn.shared_access = setting if setting is not None else _is_network_path(path)
+    if conn.shared_access:
+        pragmas.update(SHARED_ACCESS_PRAGMAS)
+    for pragma, value in pragmas.items():
+        if pragma == 'journal_mode':
+            result = _set_journal_mode(conn, value)
+        else:
+            result = conn.execute(f'PRAGMA {pragma} = {value}').fetchone()
+        if pragma == 'journal_mode' and conn.shared_access and result[0].lower() == 'wal':
+            # Il WAL si disattiva solo se nessun altro ha il file aperto
+            print("Attenzione: il database è in uso da un'altra istanza in modalità WAL; "
+                  "la modalità condivisa sarà completa quando tutte le postazioni lo avranno riaperto.")
+    return conn
+
+def _set_journal_mode(conn, mode):
+    """Imposta journal_mode e restituisce la riga con la modalità in uso.
+
+    Il cambio richiede il lock del file: se un'altra postazione sta scrivendo si riprova
+    (WRITE_LOCK_RETRIES tentativi). Dal WAL invece non si esce finché un'altra istanza ha
+    il file aperto, e SQLite risponde subito "database is locked": si resta allora nella
+    modalità attuale.
+    """
+    try:
+        return _retry_when_busy(conn._execute, f'PRAGMA journal_mode = {mode}', retries=WRITE_LOCK_RETRIES,
+                                handled=True).fetchone()
+    except sqlite3.OperationalError as e:
+        if not _is_busy_error(e):
+            raise
+        return _retry_when_busy(conn._execute, 'PRAGMA journal_mode').fetchone()
+
+def get_db_connection():
+    """Restituisce la connessione del thread corrente, aprendola alla prima richiesta.
+
+    La connessione resta aperta per tutta la vita del thread: non va chiusa dal chiamante.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == DATABASE_NAME and _local.generation == _connections_generation:
+        return conn
+    if conn is not None:
+        # DATABASE_NAME è cambiato, o la connessione è stata chiusa da close_all_connections: riapri
+        close_db_connection()
+    conn = _open_connection(DATABASE_NAME)
+    _local.conn = conn
+    _local.path = DATABASE_NAME
+    _local.generation = _connections_generation
+    _local.savepoint_depth = 0
+    _local.after_commit = []
+    with _connections_lock:
+        _open_connections.add(conn)
     return conn
 
+def close_db_connection():
+    """Chiude la connessione del thread corrente, se aperta."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _connections_lock:
+        _open_connections.discard(conn)
+    conn.close()
+
+def close_all_connections():
+    """Chiude le connessioni di tutti i thread (es. alla chiusura dell'applicazione).
+
+    Va chiamata quando gli altri thread non stanno usando il database: alla richiesta
+    successiva ognuno apre una nuova connessione.
+    """
+    global _connections_generation
+    with _connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _connections_generation += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+    _local.conn = None
+
+@contextmanager
+def transaction():
+    """Esegue il blocco in un'unica transazione: commit all'uscita, rollback in caso di errore.
+
+    Le chiamate annidate usano dei SAVEPOINT, quindi una funzione CRUD chiamata
+    dentro una transazione più ampia non ne forza il commit.
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        _local.savepoint_depth += 1
+        savepoint = f'sp_{_local.savepoint_depth}'
+        callbacks_mark = len(_local.after_commit)
+        conn.execute(f'SAVEPOINT {savepoint}')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f'ROLLBACK TO {savepoint}')
+            conn.execute(f'RELEASE {savepoint}')
+            del _local.after_commit[callbacks_mark:]
+            raise
+        else:
+            conn.execute(f'RELEASE {savepoint}')
+        finally:
+            _local.savepoint_depth -= 1
+        return
+
+    _local.after_commit = []
+    # BEGIN IMMEDIATE prende subito il lock di scrittura: il tempo speso qui è l'attesa
+    # dovuta alle altre scritture in corso (vedi get_lock_stats)
+    started = time.perf_counter()
+    _retry_when_busy(conn._execute, 'BEGIN IMMEDIATE', retries=WRITE_LOCK_RETRIES)
+    _record_lock_wait(time.perf_counter() - started)
+    try:
+        yield conn
+        # Se un lettore impedisce il commit la transazione resta aperta e si può riprovare
+        _retry_when_busy(conn.execute, 'COMMIT')
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        _local.after_commit = []
+        raise
+    callbacks, _local.after_commit = _local.after_commit, []
+    for callback in callbacks:
+        callback()
+
+def _after_commit(callback):
+    """Esegue callback subito, oppure al commit della transazione in corso (mai se annullata)."""
+    if get_db_connection().in_transaction:
+        _local.after_commit.append(callback)
+    else:
+        callback()
+
+# --- Accesso condiviso da più postazioni ---
+
+# File system di rete riconosciuti su Linux (tipo indicato in /proc/mounts)
+_NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'afs', '9p', 'fuse.sshfs'}
+
+_lock_stats_lock = threading.Lock()
+_lock_stats = {'write_transactions': 0, 'lock_wait': 0.0, 'max_lock_wait': 0.0, 'busy_retries': 0, 'busy_failures': 0}
+
+def _is_network_path(path):
+    """Vero se il file si trova su una cartella di rete (percorso UNC, unità di rete, mount NFS/SMB)."""
+    path = os.path.realpath(os.path.abspath(path))
+    if os.name == 'nt':
+        if path.startswith('\\\\'):
+            return True
+        try:
+            import ctypes
+            DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + '\\') == DRIVE_REMOTE
+        except (AttributeError, OSError):
+            return False
+    try:
+        with open('/proc/mounts', encoding='utf-8') as mounts:
+            entries = [line.split()[1:3] for line in mounts]
+    except OSError:
+        return False
+    best_mount, best_type = '', None
+    for mount_point, fs_type in entries:
+        mount_point = mount_point.replace('\\040', ' ')
+        inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+        if inside and len(mount_point) > len(best_mount):
+            best_mount, best_type = mount_point, fs_type
+    return best_type in _NETWORK_FILESYSTEMS
+
+def _shared_access_setting(conn):
+    """Impostazione salvata nel database: True/False, None se mai scelta (o schema precedente)."""
+    try:
+        row = conn.execute("SELECT value FROM settings WHERE key = 'shared_access'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return None if row is None else row[0] == '1'
+
+def set_shared_access(enabled):
+    """Attiva o disattiva la modalità condivisa (più postazioni sullo stesso file).
+
+    La scelta è salvata nel database, quindi vale per tutte le istanze che lo aprono,
+    anche quella che lo vede come disco locale. Si applica alle connessioni aperte
+    da qui in poi: le istanze già avviate la usano dal prossimo avvio.
+    """
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO settings (key, value) VALUES ('shared_access', ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        ''', ('1' if enabled else '0',))
+
+def is_shared_access():
+    """Vero se la connessione corrente usa la modalità condivisa."""
+    return get_db_connection().shared_access
+
+def _is_busy_error(error):
+    code = getattr(error, 'sqlite_errorcode', None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF in (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED (anche codici estesi)
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def _retry_when_busy(func, *args, retries=BUSY_RETRIES, handled=False):
+    """Chiama func(*args), ripetendola se il database resta bloccato anche dopo busy_timeout.
+
+    Al massimo retries tentativi in più, con attese esponenziali e casuali
+    (due postazioni bloccate insieme non riprovano nello stesso istante).
+    Con handled=True il chiamante gestisce da sé l'ultimo errore, che quindi
+    non viene contato tra i busy_failures.
+    """
+    delay = BUSY_RETRY_DELAY
+    for attempt in itertools.count():
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if not _is_busy_error(e):
+                raise
+            with _lock_stats_lock:
+                _lock_stats['busy_failures' if attempt >= retries and not handled else 'busy_retries'] += 1
+            if attempt >= retries:
+                raise
+        time.sleep(delay * random.uniform(0.5, 1.0))
+        delay = min(delay * 2, BUSY_RETRY_MAX_DELAY)
+
+def _record_lock_wait(elapsed):
+    with _lock_stats_lock:
+        _lock_stats['write_transactions'] += 1
+        _lock_stats['lock_wait'] += elapsed
+        _lock_stats['max_lock_wait'] = max(_lock_stats['max_lock_wait'], elapsed)
+
+def get_lock_stats():
+    """Contesa sul lock di scrittura in questo processo.
+
+    Restituisce write_transactions, lock_wait_ms (attesa totale per iniziare una
+    transazione), avg_lock_wait_ms, max_lock_wait_ms, busy_retries (tentativi ripetuti
+    per "database is locked") e busy_failures (errori restituiti dopo l'ultimo tentativo).
+    """
+    with _lock_stats_lock:
+        stats = dict(_lock_stats)
+    transactions = stats['write_transactions']
+    return {
+        'write_transactions': transactions,
+        'lock_wait_ms': stats['lock_wait'] * 1000,
+        'avg_lock_wait_ms': stats['lock_wait'] * 1000 / transactions if transactions else 0.0,
+        'max_lock_wait_ms': stats['max_lock_wait'] * 1000,
+        'busy_retries': stats['busy_retries'],
+        'busy_failures': stats['busy_failures'],
+    }
+
+def reset_lock_stats():
+    with _lock_stats_lock:
+        _lock_stats.update(write_transactions=0, lock_wait=0.0, max_lock_wait=0.0, busy_retries=0, busy_failures=0)
+
+def format_lock_stats():
+    """Riepilogo testuale di get_lock_stats()."""
+    stats = get_lock_stats()
+    return (f"Lock di scrittura: {stats['write_transactions']} transazioni, attesa "
+            f"{stats['lock_wait_ms']:.1f} ms (media {stats['avg_lock_wait_ms']:.2f}, max {stats['max_lock_wait_ms']:.1f}), "
+            f"{stats['busy_retries']} tentativi ripetuti, {stats['busy_failures']} falliti")
+
+def _write_in_batches(rows, write):
+    """Esegue write(conn, righe) in un'unica transazione e restituisce [risultato].
+
+    In modalità condivisa, se non si è già dentro una transazione, le righe vengono
+    scritte a blocchi di SHARED_WRITE_BATCH, ognuno nella propria transazione, e si
+    ottiene un risultato per blocco. Un errore annulla solo il blocco in corso.
+    """
+    conn = get_db_connection()
+    if not conn.shared_access or conn.in_transaction:
+        with transaction() as conn:
+            return [write(conn, rows)]
+    results = []
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, SHARED_WRITE_BATCH))
+        if not batch:
+            return results
+        with transaction() as conn:
+            results.append(write(conn, batch))
+
+# --- Strumentazione delle query (opzionale) ---
+
+_query_stats_enabled = False
+_query_stats_lock = threading.Lock()
+_query_stats = {}  # azione (nome dello scope, None = nessuno) -> {sql: QueryStat}
+# Scope corrente; db_worker.submit lo propaga al thread del database
+_current_scope = contextvars.ContextVar('query_scope', default=None)
+
+class QueryStat:
+    """Contatori di una istruzione SQL: esecuzioni, tempo totale e massimo (secondi), righe lette."""
+    __slots__ = ('count', 'total_time', 'max_time', 'rows')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {'count': self.count, 'total_ms': self.total_time * 1000, 'max_ms': self.max_time * 1000, 'rows': self.rows}
+
+class QueryScope:
+    """Le istruzioni eseguite dentro un query_scope(): `statements` è {sql: QueryStat}."""
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.statements = {}
+
+    @property
+    def query_count(self):
+        with _query_stats_lock:
+            return sum(stat.count for stat in self.statements.values())
+
+def _record_query(scope, sql, elapsed, rows, executed):
+    # Il tempo totale comprende esecuzione e lettura delle righe; il massimo solo l'esecuzione
+    with _query_stats_lock:
+        targets = []
+        if _query_stats_enabled:
+            targets.append(_query_stats.setdefault(scope.name if scope is not None else None, {}))
+        while scope is not None:
+            targets.append(scope.statements)
+            scope = scope.parent
+        for statements in targets:
+            stat = statements.get(sql)
+            if stat is None:
+                stat = statements[sql] = QueryStat()
+            stat.count += executed
+            stat.total_time += elapsed
+            stat.rows += rows
+            if executed:
+                stat.max_time = max(stat.max_time, elapsed)
+
+class _InstrumentedCursor(sqlite3.Cursor):
+    """Cursore che registra tempi e righe di ogni istruzione nello scope in cui è stata eseguita."""
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed = time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._sql = ' '.join(sql.split())
+        self._scope = _current_scope.get()
+        try:
+            return self._timed(super().execute, sql, parameters)
+        finally:
+            _record_query(self._scope, self._sql, self._elapsed, 0, 1)
+
+    def executemany(self, sql, parameters):
+        self._sql = ' '.join(sql.split())
+        self._scope = _current_scope.get()
+        try:
+            return self._timed(super().executemany, sql, parameters)
+        finally:
+            _record_query(self._scope, self._sql, self._elapsed, 0, 1)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        _record_query(self._scope, self._sql, self._elapsed, row is not None, 0)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        _record_query(self._scope, self._sql, self._elapsed, len(rows), 0)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        _record_query(self._scope, self._sql, self._elapsed, len(rows), 0)
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            _record_query(self._scope, self._sql, self._elapsed, 0, 0)
+            raise
+        _record_query(self._scope, self._sql, self._elapsed, 1, 0)
+        return row
+
+def enable_query_stats(enabled=True):
+    """Attiva (o disattiva) la raccolta delle statistiche di tutte le query, raggruppate per azione."""
+    global _query_stats_enabled
+    _query_stats_enabled = enabled
+
+def reset_query_stats():
+    with _query_stats_lock:
+        _query_stats.clear()
+
+def get_query_stats():
+    """Statistiche raccolte: {azione: [dict con sql, count, total_ms, max_ms, rows]}, dalle istruzioni più lente."""
+    with _query_stats_lock:
+        result = {}
+        for action, statements in _query_stats.items():
+            rows = [dict(sql=sql, **stat.as_dict()) for sql, stat in statements.items()]
+            result[action] = sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+    return result
+
+def format_query_stats():
+    """Riepilogo testuale di get_query_stats(), un blocco per azione."""
+    lines = []
+    for action, statements in get_query_stats().items():
+        lines.append(f"{action or '(nessuna azione)'}: {sum(row['count'] for row in statements)} query, "
+                     f"{sum(row['total_ms'] for row in statements):.1f} ms")
+        for row in statements:
+            lines.append(f"  {row['count']:>5}x {row['total_ms']:9.2f} ms (max {row['max_ms']:.2f}) "
+                         f"{row['rows']:>7} righe  {row['sql'][:120]}")
+    return '\n'.join(lines)
+
+@contextmanager
+def query_scope(name):
+    """Raggruppa sotto `name` (es. un'azione dell'interfaccia) le query eseguite nel blocco.
+
+    Vale anche per le richieste inviate al thread del database dal blocco. Si può usare
+    come decoratore. Gli scope si possono annidare: ogni query conta in tutti quelli aperti.
+    Restituisce il QueryScope con le istruzioni eseguite.
+    """
+    scope = QueryScope(name, _current_scope.get())
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+@contextmanager
+def assert_query_budget(max_queries, max_repeats=None, name='budget'):
+    """Per i test: AssertionError se il blocco esegue più di max_queries istruzioni.
+
+    Con max_repeats fallisce anche se una stessa istruzione viene eseguita più di
+    max_repeats volte, il segno tipico di una query per riga dentro un ciclo (N+1).
+    Le richieste inviate al thread del database contano solo se completate nel blocco.
+    """
+    with query_scope(name) as scope:
+        yield scope
+    with _query_stats_lock:
+        statements = {sql: stat.count for sql, stat in scope.statements.items() if stat.count}
+    problems = []
+    total = sum(statements.values())
+    if total > max_queries:
+        problems.append(f"{total} query eseguite, massimo {max_queries}")
+    if max_repeats is not None:
+        problems.extend(f"{count} esecuzioni (massimo {max_repeats}) di: {sql}"
+                        for sql, count in statements.items() if count > max_repeats)
+    if problems:
+        details = '\n'.join(f"  {count}x {sql}" for sql, count in statements.items())
+        raise AssertionError(f"{name}: " + '; '.join(problems) + f"\n{details}")
+
+def thickness_to_mm(thickness):
+    """Converte uno spessore in cm (numero o stringa, anche con la virgola) in millimetri interi."""
+    if thickness is None:
+        return None
+    if isinstance(thickness, str):
+        thickness = thickness.strip().replace(',', '.')
+        if not thickness:
+            return None
+    # Arrotonda come round() di SQLite (metà lontano da zero), usato dalla migrazione
+    return int(math.floor(float(thickness) * 10 + 0.5))
+
+def thickness_from_mm(thickness_mm):
+    """Converte uno spessore in millimetri interi nel valore in cm usato dall'interfaccia."""
+    return None if thickness_mm is None else thickness_mm / 10.0
+
+# --- Catalogo prezzi in memoria ---
+
+def _load_catalog_rows():
+    """Legge le tabelle materials ed edges per il caricamento del catalogo in memoria."""
+    conn = get_db_connection()
+    # Letto per primo: le righe sono almeno aggiornate a questa modifica del registro
+    seq = _last_catalog_change(conn)
+    materials = conn.execute(f'SELECT {_MATERIAL_COLUMNS} FROM materials').fetchall()
+    edges = conn.execute(f'SELECT {_EDGE_COLUMNS} FROM edges').fetchall()
+    return materials, edges, seq
+
+_price_catalog = PriceCatalog(_load_catalog_rows)
+_price_catalog_enabled = False
+_price_catalog_source = None
+
+def load_price_catalog(background=False):
+    """Attiva il catalogo prezzi in memoria e lo carica, subito o in un thread separato.
+
+    Finché il catalogo non è attivo (o mentre si sta caricando) le letture vanno su SQLite.
+    """
+    global _price_catalog_enabled, _price_catalog_source
+    _price_catalog_enabled = True
+    _price_catalog_source = DATABASE_NAME
+    if background:
+        _price_catalog.warm_in_background()
+    else:
+        _price_catalog.load()
+    return _price_catalog
+
+def _active_catalog():
+    """Restituisce il catalogo se può servire la lettura corrente, altrimenti None."""
+    global _price_catalog_source
+    if not _price_catalog_enabled or _price_catalog.is_warming():
+        return None
+    if _price_catalog_source != DATABASE_NAME:
+        _price_catalog.invalidate()
+        _price_catalog_source = DATABASE_NAME
+    if get_db_connection().in_transaction:
+        # Le modifiche non ancora confermate sono visibili solo da questa connessione
+        return None
+    if not _price_catalog.is_loaded() and not _price_catalog.load():
+        return None
+    return _price_catalog
+
+def _refresh_catalog_material(material_id):
+    """Allinea il catalogo in memoria dopo una scrittura sul materiale indicato."""
+    if _price_catalog_enabled:
+        _after_commit(lambda: _patch_catalog_material(material_id))
+
+def _patch_catalog_material(material_id):
+    if not _price_catalog.is_loaded():
+        _price_catalog.invalidate()  # un caricamento in corso potrebbe non vedere la modifica
+        return
+    row = get_db_connection().execute(f'SELECT {_MATERIAL_COLUMNS} FROM materials WHERE id = ?', (material_id,)).fetchone()
+    if row is None:
+        _price_catalog.remove_material(int(material_id))
+    else:
+        _price_catalog.put_material(row)
+
+def _refresh_catalog_edge(edge_id):
+    """Allinea il catalogo in memoria dopo una scrittura sul bordo indicato."""
+    if _price_catalog_enabled:
+        _after_commit(lambda: _patch_catalog_edge(edge_id))
+
+def _patch_catalog_edge(edge_id):
+    if not _price_catalog.is_loaded():
+        _price_catalog.invalidate()
+        return
+    row = get_db_connection().execute(f'SELECT {_EDGE_COLUMNS} FROM edges WHERE id = ?', (edge_id,)).fetchone()
+    if row is None:
+        _price_catalog.remove_edge(int(edge_id))
+    else:
+        _price_catalog.put_edge(row)
+
+def invalidate_price_catalog():
+    """Scarta subito il catalogo in memoria (es. dopo aver sostituito il file del database)."""
+    _price_catalog.invalidate()
+
+def _invalidate_catalog():
+    """Scarta il catalogo in memoria dopo una scrittura massiva (al commit)."""
+    if _price_catalog_enabled:
+        _after_commit(_price_catalog.invalidate)
+
+# --- Registro delle modifiche al catalogo ---
+
+# Colonne delle righe restituite da get_catalog_changes, per tabella
+_CATALOG_CHANGE_COLUMNS = {'materials': _MATERIAL_COLUMNS, 'edges': _EDGE_COLUMNS, 'linear_elements': _LINEAR_ELEMENT_COLUMNS}
+
+def _last_catalog_change(conn):
+    return conn.execute('SELECT IFNULL(MAX(seq), 0) FROM catalog_changes').fetchone()[0]
+
+def get_catalog_seq():
+    """Ultima modifica del registro già visibile nelle letture di materiali e bordi.
+
+    Va letta prima dei dati da tenere aggiornati e poi passata a get_catalog_changes.
+    Se le letture passano dal catalogo in memoria vale il punto raggiunto dal catalogo.
+    """
+    catalog = _active_catalog()
+    seq = catalog.seq() if catalog is not None else None
+    return seq if seq is not None else _last_catalog_change(get_db_connection())
+
+def with_catalog_seq(func, *args):
+    """Esegue la lettura func(*args) e restituisce (seq, risultato) (vedi get_catalog_seq)."""
+    return get_catalog_seq(), func(*args)
+
+# Id delle righe di una tabella cambiate tra due modifiche del registro (seq escluso, seq incluso, tabella)
+_CHANGED_IDS_SQL = 'SELECT row_id FROM catalog_changes WHERE seq > ? AND seq <= ? AND table_name = ?'
+
+def _catalog_changes_lost(conn, since_seq, seq):
+    """Vero se il registro non risale più fino a since_seq (troppe modifiche, o database sostituito)."""
+    oldest = conn.execute('SELECT MIN(seq) FROM catalog_changes').fetchone()[0]
+    return since_seq > seq or oldest is None or oldest > since_seq + 1
+
+def get_catalog_changes(since_seq, tables=('materials', 'edges')):
+    """Righe di materiali, bordi o elementi lineari cambiate dopo la modifica since_seq, anche da altre istanze.
+
+    Restituisce (seq, modifiche): modifiche è {tabella: {id: riga attuale, None se eliminata}}
+    e seq va passato alla chiamata successiva. Se il registro non risale più fino a
+    since_seq (troppe modifiche, o database sostituito) modifiche è None: i dati vanno
+    ricaricati per intero.
+    """
+    conn = get_db_connection()
+    seq = _last_catalog_change(conn)
+    if since_seq == seq:
+        return seq, {table: {} for table in tables}
+    if _catalog_changes_lost(conn, since_seq, seq):
+        return seq, None
+    changes = {}
+    changed_ids = _CHANGED_IDS_SQL
+    for table in tables:
+        params = (since_seq, seq, table)
+        rows = conn.execute(f'SELECT {_CATALOG_CHANGE_COLUMNS[table]} FROM {table} WHERE id IN ({changed_ids})', params)
+        current = {row['id']: row for row in rows}
+        changes[table] = {row_id: current.get(row_id) for (row_id,) in conn.execute(changed_ids, params)}
+    return seq, changes
+
+def check_catalog_changes():
+    """Vero se altre connessioni (anche di altre istanze) hanno scritto sul database dall'ultima chiamata.
+
+    Da chiamare periodicamente, sempre dallo stesso thread: PRAGMA data_version non legge
+    nessuna tabella, quindi il controllo costa pochissimo. Se qualcosa è cambiato il
+    catalogo in memoria viene allineato con le sole righe modificate.
+    """
+    conn = get_db_connection()
+    version = conn.execute('PRAGMA data_version').fetchone()[0]
+    if version == conn.data_version:
+        return False
+    conn.data_version = version
+    if _price_catalog_enabled and _price_catalog_source == DATABASE_NAME:
+        since = _price_catalog.seq()
+        if since is not None:
+            seq, changes = get_catalog_changes(since)
+            if changes is None:
+                _price_catalog.invalidate()
+            else:
+                _price_catalog.apply_changes(seq, changes['materials'], changes['edges'])
+    return True
+
 def create_tables():
-    """Crea la tabella dei materiali se non esiste."""
+    """Crea le tabelle se non esistono e applica le migrazioni di schema mancanti."""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    # Percorso normale all'avvio: database già aggiornato, basta leggere l'intestazione
+    if _schema_version(conn) != SCHEMA_VERSION:
+        migrate()
+    # File su una cartella di rete: la modalità condivisa viene salvata nel database,
+    # così la usa anche la postazione che apre lo stesso file come disco locale
+    if conn.shared_access and _shared_access_setting(conn) is None:
+        set_shared_access(True)
+
+def _schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate():
+    """Applica in ordine le migrazioni mancanti, ognuna nella propria transazione.
+
+    La versione raggiunta è salvata in PRAGMA user_version insieme alle modifiche della
+    migrazione, quindi un errore lascia il database alla versione precedente.
+    Restituisce la versione finale dello schema.
+    """
+    conn = get_db_connection()
+    version = _schema_version(conn)
+    if version > SCHEMA_VERSION:
+        print(f"Attenzione: il database è alla versione {version}, più recente di quella supportata ({SCHEMA_VERSION}).")
+        return version
+    for target, description, migration in _MIGRATIONS:
+        if target <= version:
+            continue
+        with transaction():
+            # Riletta dentro la transazione: un'altra istanza potrebbe averla già applicata
+            version = _schema_version(conn)
+            if target <= version:
+                continue
+            if version == 0:
+                _create_legacy_schema(conn)
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {target}')
+            version = target
+        print(f"Database aggiornato alla versione {target} ({description}).")
+    return version
+
+def _create_legacy_schema(conn):
+    """Schema precedente alle migrazioni (versione 0), punto di partenza della migrazione 1."""
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS materials (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -23,7 +785,7 @@ def create_tables():
             UNIQUE (name, thickness, supplier) -- Composite unique key updated
         )
     ''')
-    cursor.execute('''
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS edges (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             material_name TEXT, -- Can be NULL if price is general
@@ -33,235 +795,1665 @@ def create_tables():
             UNIQUE (material_name, thickness, edge_type)
         )
     ''')
-    conn.commit()
-    conn.close()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS linear_elements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            element_type TEXT NOT NULL, -- Battiscopa, cornice, profilo...
+            material_name TEXT, -- NULL se il prezzo è generico
+            thickness REAL,     -- NULL se il prezzo è generico
+            price_per_lm REAL NOT NULL, -- Prezzo €/metro lineare
+            description TEXT,
+            UNIQUE (element_type, material_name, thickness)
+        )
+    ''')
+    _move_linear_elements_out_of_edges(conn)
+
+def _move_linear_elements_out_of_edges(conn):
+    """Sposta in linear_elements le righe di edges salvate con la vecchia convenzione "LINEAR_<tipo>"."""
+    # Intervallo sull'indice di edge_type invece di un LIKE: costa una sola ricerca
+    linear_range = "edge_type >= 'LINEAR_' AND edge_type < 'LINEAR`'"
+    conn.execute(f'''
+        INSERT OR IGNORE INTO linear_elements (element_type, material_name, thickness, price_per_lm, description)
+        SELECT substr(edge_type, {len(LEGACY_LINEAR_PREFIX) + 1}), material_name, thickness, price_per_lm, ''
+        FROM edges WHERE {linear_range}
+    ''')
+    if conn.execute(f'DELETE FROM edges WHERE {linear_range}').rowcount:
+        _invalidate_catalog()
+
+def _rebuild_table(conn, table, create_sql, columns, select_expressions):
+    """Ricrea `table` con lo schema `create_sql` copiando le righe esistenti.
+
+    SQLite non permette di cambiare il tipo di una colonna: si crea la nuova tabella,
+    si copiano i dati e si sostituisce la vecchia. Gli id e il contatore AUTOINCREMENT
+    vengono conservati. Restituisce il numero di righe scartate perché duplicate.
+    """
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    conn.execute(create_sql.format(table=f'{table}_new'))
+    copied = conn.execute(f'''
+        INSERT OR IGNORE INTO {table}_new ({columns})
+        SELECT {select_expressions} FROM {table} ORDER BY id
+    ''').rowcount
+    discarded = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] - copied
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    if sequence is not None:
+        if not conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence['seq'], table)).rowcount:
+            conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, sequence['seq']))
+    return discarded
+
+def _migrate_thickness_to_mm(conn):
+    """Migrazione 1: thickness REAL (cm) diventa thickness_mm INTEGER (millimetri).
+
+    Gli interi si confrontano con "=" senza sorprese di arrotondamento e danno chiavi
+    stabili nei dizionari. Le righe che dopo l'arrotondamento risultano duplicate
+    vengono scartate, tenendo la più vecchia.
+    """
+    # I valori non numerici (mai validi come spessore) diventano NULL
+    thickness_mm = "CASE WHEN typeof(thickness) IN ('integer', 'real') THEN CAST(round(thickness * 10) AS INTEGER) END"
+    discarded = _rebuild_table(conn, 'materials', '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            thickness_mm INTEGER, -- Spessore in millimetri, può essere NULL
+            price_per_sqm REAL NOT NULL, -- Prezzo €/m²
+            description TEXT,
+            supplier TEXT,
+            UNIQUE (name, thickness_mm, supplier)
+        )
+    ''', 'id, name, thickness_mm, price_per_sqm, description, supplier',
+        f'id, name, {thickness_mm}, price_per_sqm, description, supplier')
+    discarded += _rebuild_table(conn, 'edges', '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            material_name TEXT, -- NULL se il prezzo è generico
+            thickness_mm INTEGER, -- NULL se il prezzo è generico
+            edge_type TEXT NOT NULL,
+            price_per_lm REAL NOT NULL, -- Prezzo €/metro lineare
+            UNIQUE (material_name, thickness_mm, edge_type)
+        )
+    ''', 'id, material_name, thickness_mm, edge_type, price_per_lm',
+        f'id, material_name, {thickness_mm}, edge_type, price_per_lm')
+    discarded += _rebuild_table(conn, 'linear_elements', '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            element_type TEXT NOT NULL, -- Battiscopa, cornice, profilo...
+            material_name TEXT, -- NULL se il prezzo è generico
+            thickness_mm INTEGER, -- NULL se il prezzo è generico
+            price_per_lm REAL NOT NULL, -- Prezzo €/metro lineare
+            description TEXT,
+            UNIQUE (element_type, material_name, thickness_mm)
+        )
+    ''', 'id, element_type, material_name, thickness_mm, price_per_lm, description',
+        f'id, element_type, material_name, {thickness_mm}, price_per_lm, description')
+    if discarded:
+        print(f"Migrazione spessori: {discarded} righe duplicate dopo la conversione in mm sono state scartate.")
+    create_indexes(conn)
+    _invalidate_catalog()
+
+def _migrate_null_safe_uniqueness(conn):
+    """Migrazione 2: elimina i duplicati con chiavi NULL e crea gli indici univoci di _UNIQUE_KEYS."""
+    for table, rows in compact_duplicates().items():
+        for row in rows:
+            print(f"Compattazione {table}: eliminato il duplicato {row}")
+    for table, key in _UNIQUE_KEYS.items():
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_key ON {table} ({key})')
+
+def _migrate_quote_archive(conn):
+    """Migrazione 3: tabelle dell'archivio preventivi (testata, righe, bordi delle righe)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quotes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quote_number TEXT NOT NULL UNIQUE, -- "AAAA-NNNN", progressivo per anno
+            client TEXT COLLATE NOCASE,
+            notes TEXT,
+            created_at TEXT NOT NULL, -- "AAAA-MM-GG HH:MM:SS", ora locale
+            updated_at TEXT NOT NULL,
+            line_count INTEGER NOT NULL,
+            total_mq REAL NOT NULL,
+            total_slabs_eur REAL NOT NULL,
+            total_edges_eur REAL NOT NULL,
+            total_eur REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quote_lines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quote_id INTEGER NOT NULL, -- quotes.id
+            position INTEGER NOT NULL, -- Ordine della riga nel preventivo
+            is_linear INTEGER NOT NULL DEFAULT 0, -- 1 = elemento lineare (prezzo €/ml)
+            quantity INTEGER NOT NULL,
+            length_cm REAL NOT NULL, -- Per gli elementi lineari: lunghezza in metri lineari
+            width_cm REAL, -- NULL per gli elementi lineari
+            material_name TEXT NOT NULL, -- Materiale o tipo di elemento lineare
+            thickness_mm INTEGER,
+            mq REAL NOT NULL, -- Per gli elementi lineari: metri lineari totali
+            price REAL NOT NULL, -- €/m² oppure €/ml
+            slab_cost REAL NOT NULL,
+            edges_cost REAL NOT NULL,
+            total REAL NOT NULL,
+            notes TEXT,
+            UNIQUE (quote_id, position)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quote_line_edges (
+            line_id INTEGER NOT NULL, -- quote_lines.id
+            side TEXT NOT NULL, -- front, back, left, right
+            edge_type TEXT NOT NULL,
+            length_cm REAL NOT NULL,
+            price_lm REAL NOT NULL,
+            cost REAL NOT NULL,
+            PRIMARY KEY (line_id, side)
+        ) WITHOUT ROWID
+    ''')
+    # Archivio ordinato per data e ricerca per cliente (il numero ha già l'indice UNIQUE)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quotes_created ON quotes (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quotes_client ON quotes (client, created_at)')
+
+_MATERIALS_FTS_INSERT_TRIGGER = '''
+    CREATE TRIGGER materials_fts_insert AFTER INSERT ON materials BEGIN
+        INSERT INTO materials_fts (rowid, name, description, supplier)
+        VALUES (new.id, new.name, new.description, new.supplier);
+    END
+'''
+
+def _migrate_materials_search(conn):
+    """Migrazione 4: indice full-text FTS5 su nome, descrizione e fornitore dei materiali.
+
+    Se SQLite è compilato senza FTS5 la migrazione non crea nulla e search_materials
+    ripiega su LIKE.
+    """
+    try:
+        # Tabella "external content": il testo resta in materials, l'indice lo segue tramite trigger
+        conn.execute('''
+            CREATE VIRTUAL TABLE materials_fts USING fts5(
+                name, description, supplier,
+                content='materials', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"Ricerca materiali: FTS5 non disponibile ({e}), verrà usata la ricerca semplice.")
+        return
+    conn.execute(_MATERIALS_FTS_INSERT_TRIGGER)
+    conn.execute('''
+        CREATE TRIGGER materials_fts_delete AFTER DELETE ON materials BEGIN
+            INSERT INTO materials_fts (materials_fts, rowid, name, description, supplier)
+            VALUES ('delete', old.id, old.name, old.description, old.supplier);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER materials_fts_update AFTER UPDATE OF name, description, supplier ON materials BEGIN
+            INSERT INTO materials_fts (materials_fts, rowid, name, description, supplier)
+            VALUES ('delete', old.id, old.name, old.description, old.supplier);
+            INSERT INTO materials_fts (rowid, name, description, supplier)
+            VALUES (new.id, new.name, new.description, new.supplier);
+        END
+    ''')
+    conn.execute("INSERT INTO materials_fts (materials_fts) VALUES ('rebuild')")
+    # Ordinamento per pertinenza: il nome pesa più del fornitore, che pesa più della descrizione
+    conn.execute("INSERT INTO materials_fts (materials_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 4.0)')")
+
+# Storico prezzi: tabella -> (tabella dello storico, colonne della chiave, colonna del prezzo).
+# Le chiavi sono quelle di _UNIQUE_KEYS, così lo storico sopravvive a eliminazioni e reimportazioni.
+_PRICE_HISTORY = {
+    'materials': ('material_price_history', ('name', 'thickness_mm', 'supplier'), 'price_per_sqm'),
+    'edges': ('edge_price_history', ('material_name', 'thickness_mm', 'edge_type'), 'price_per_lm'),
+    'linear_elements': ('linear_element_price_history', ('element_type', 'material_name', 'thickness_mm'), 'price_per_lm'),
+}
+
+# Confronto tra chiavi con i NULL resi uguali, come nelle espressioni di _UNIQUE_KEYS
+_NULL_SAFE_KEY = {'material_name': "IFNULL({}, '')", 'supplier': "IFNULL({}, '')", 'thickness_mm': 'IFNULL({}, -1)'}
+
+def _migrate_price_history(conn):
+    """Migrazione 5: storico dei prezzi di materiali, bordi ed elementi lineari.
+
+    Ogni riga dello storico dice da quando (valid_from, ora locale "AAAA-MM-GG HH:MM:SS")
+    vale un prezzo; prezzo NULL = voce eliminata. Le righe vengono scritte da trigger,
+    quindi anche importazioni e upsert lasciano traccia. Lo storico parte dai prezzi
+    presenti al momento della migrazione: per le date precedenti il prezzo non è noto.
+    """
+    now = "datetime('now', 'localtime')"
+    for table, (history, key_columns, price_column) in _PRICE_HISTORY.items():
+        columns = ', '.join(key_columns)
+        column_types = ', '.join(f"{column} {'INTEGER' if column == 'thickness_mm' else 'TEXT'}" for column in key_columns)
+        old_key = ', '.join(f'old.{column}' for column in key_columns)
+        new_key = ', '.join(f'new.{column}' for column in key_columns)
+        key_changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in key_columns)
+        insert = f'INSERT INTO {history} ({columns}, {price_column}, valid_from)'
+        # Più modifiche nello stesso secondo: vale l'ultima. Non INSERT OR REPLACE, perché dentro
+        # un trigger prevarrebbe la politica di conflitto dell'istruzione esterna (es. un upsert)
+        upsert = f'ON CONFLICT ({_UNIQUE_KEYS[table]}, valid_from) DO UPDATE SET {price_column} = excluded.{price_column}'
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {history} (
+                id INTEGER PRIMARY KEY,
+                {column_types},
+                {price_column} REAL, -- NULL = eliminato da valid_from in poi
+                valid_from TEXT NOT NULL
+            )
+        ''')
+        # Una versione per chiave e istante: serve sia "prezzo di X alla data D" sia "tutti i prezzi alla data D"
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS ux_{history}_key ON {history} ({_UNIQUE_KEYS[table]}, valid_from)')
+        conn.execute(f'''
+            CREATE TRIGGER {history}_insert AFTER INSERT ON {table} BEGIN
+                {insert} VALUES ({new_key}, new.{price_column}, {now}) {upsert};
+            END
+        ''')
+        # Cambio di chiave (es. materiale rinominato): la vecchia chiave risulta eliminata
+        conn.execute(f'''
+            CREATE TRIGGER {history}_update AFTER UPDATE OF {columns}, {price_column} ON {table}
+            WHEN {key_changed} OR old.{price_column} IS NOT new.{price_column}
+            BEGIN
+                {insert} SELECT {old_key}, NULL, {now} WHERE {key_changed} {upsert};
+                {insert} VALUES ({new_key}, new.{price_column}, {now}) {upsert};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER {history}_delete AFTER DELETE ON {table} BEGIN
+                {insert} VALUES ({old_key}, NULL, {now}) {upsert};
+            END
+        ''')
+        conn.execute(f'{insert} SELECT {columns}, {price_column}, {now} FROM {table}')
+
+def _migrate_materials_search_update_trigger(conn):
+    """Migrazione 6: l'indice di ricerca si aggiorna solo se il testo cambia davvero.
+
+    L'upsert di add_materials_bulk riscrive sempre la descrizione, e il trigger della
+    migrazione 4 reindicizzava ogni riga: un ricaricamento di listino con soli prezzi
+    cambiati era molte volte più lento del necessario.
+    """
+    if not _has_materials_search_index(conn):
+        return
+    conn.execute('DROP TRIGGER IF EXISTS materials_fts_update')
+    conn.execute('''
+        CREATE TRIGGER materials_fts_update AFTER UPDATE OF name, description, supplier ON materials
+        WHEN old.name IS NOT new.name OR old.description IS NOT new.description OR old.supplier IS NOT new.supplier
+        BEGIN
+            INSERT INTO materials_fts (materials_fts, rowid, name, description, supplier)
+            VALUES ('delete', old.id, old.name, old.description, old.supplier);
+            INSERT INTO materials_fts (rowid, name, description, supplier)
+            VALUES (new.id, new.name, new.description, new.supplier);
+        END
+    ''')
+
+def _migrate_settings(conn):
+    """Migrazione 7: impostazioni salvate nel database (es. modalità condivisa)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+def _migrate_catalog_changes(conn):
+    """Migrazione 8: registro delle modifiche a materiali e bordi, scritto da trigger.
+
+    Ogni inserimento, modifica o eliminazione aggiunge una riga (seq, tabella, id): chi
+    tiene una copia dei dati (catalogo in memoria, finestre aperte, altre istanze sullo
+    stesso file) chiede a get_catalog_changes solo le righe cambiate dopo l'ultimo seq
+    visto. Si conservano le ultime 20000 modifiche; chi è più indietro ricarica tutto.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL
+        )
+    ''')
+    for table in ('materials', 'edges'):
+        _create_catalog_change_triggers(conn, table)
+    # Pulizia ogni 1000 modifiche, non a ogni riga
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS catalog_changes_prune AFTER INSERT ON catalog_changes
+        WHEN new.seq % 1000 = 0
+        BEGIN
+            DELETE FROM catalog_changes WHERE seq <= new.seq - 20000;
+        END
+    ''')
+
+def _create_catalog_change_triggers(conn, table):
+    for event, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO catalog_changes (table_name, row_id) VALUES ('{table}', {row}.id);
+            END
+        ''')
+
+def _migrate_edge_profiles(conn):
+    """Migrazione 9: profili dei bordi con nome (tipo di bordo per lato), da applicare a più righe."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS edge_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            front_edge TEXT,
+            back_edge TEXT,
+            left_edge TEXT,
+            right_edge TEXT
+        )
+    ''')
+
+def _migrate_catalog_grids(conn):
+    """Migrazione 10: finestre di gestione del catalogo paginate (vedi get_catalog_rows).
+
+    Un indice per ogni ordinamento delle colonne che non ha già quello univoco di
+    _UNIQUE_KEYS, con le stesse espressioni senza NULL delle chiavi di paginazione, e
+    il registro delle modifiche esteso agli elementi lineari.
+    """
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_materials_grid_thickness ON materials (IFNULL(thickness_mm, -1), name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_materials_grid_price ON materials (price_per_sqm)')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_materials_grid_supplier ON materials (IFNULL(supplier, ''), name, IFNULL(thickness_mm, -1))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_edges_grid_type ON edges (edge_type, IFNULL(material_name, ''), IFNULL(thickness_mm, -1))")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_edges_grid_thickness ON edges (IFNULL(thickness_mm, -1), edge_type)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_edges_grid_price ON edges (price_per_lm)')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linear_elements_grid_material ON linear_elements (IFNULL(material_name, ''), IFNULL(thickness_mm, -1), element_type)")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_linear_elements_grid_thickness ON linear_elements (IFNULL(thickness_mm, -1), element_type)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_linear_elements_grid_price ON linear_elements (price_per_lm)')
+    _create_catalog_change_triggers(conn, 'linear_elements')
+
+# Chiave di settings che, finché presente, sospende il trigger materials_fts_insert
+_MATERIALS_FTS_DEFERRED = 'materials_fts_deferred'
+
+def _migrate_materials_search_deferred_insert(conn):
+    """Migrazione 11: indicizzazione dei materiali nuovi sospendibile senza eliminare il trigger.
+
+    add_materials_bulk eliminava e ricreava materials_fts_insert a ogni blocco: ogni volta
+    cambiava lo schema, che tutte le connessioni (anche delle altre postazioni) devono
+    rileggere, e la correttezza dell'indice dipendeva dal ricreare il trigger. Ora il
+    trigger resta e non scatta finché in settings c'è _MATERIALS_FTS_DEFERRED, scritto e
+    tolto dentro la stessa transazione dell'importazione.
+    """
+    if not _has_materials_search_index(conn):
+        return
+    conn.execute('DROP TRIGGER IF EXISTS materials_fts_insert')
+    conn.execute(f'''
+        CREATE TRIGGER materials_fts_insert AFTER INSERT ON materials
+        WHEN NOT EXISTS (SELECT 1 FROM settings WHERE key = '{_MATERIALS_FTS_DEFERRED}')
+        BEGIN
+            INSERT INTO materials_fts (rowid, name, description, supplier)
+            VALUES (new.id, new.name, new.description, new.supplier);
+        END
+    ''')
+
+def compact_duplicates():
+    """Elimina i record con la stessa chiave (NULL compresi), tenendo il più vecchio.
+
+    Le letture usavano già il record con l'id più basso, quindi i prezzi restituiti non
+    cambiano. Restituisce {tabella: [righe eliminate, come dict]}.
+    """
+    removed = {}
+    with transaction() as conn:
+        for table, key in _UNIQUE_KEYS.items():
+            duplicates = f'id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {key})'
+            removed[table] = [dict(row) for row in conn.execute(f'SELECT * FROM {table} WHERE {duplicates} ORDER BY id')]
+            if removed[table]:
+                conn.execute(f'DELETE FROM {table} WHERE {duplicates}')
+    if any(removed.values()):
+        _invalidate_catalog()
+    return removed
+
+def create_indexes(conn):
+    """Crea gli indici usati dalle query di questo modulo (vedi check_query_plans)."""
+    # Elenco materiali ordinato per nome/fornitore/spessore senza ordinamento temporaneo
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_materials_name_supplier ON materials (name, supplier, thickness_mm)')
+    # Materiali di un fornitore (listini importati da Excel, un foglio per fornitore)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_materials_supplier_name ON materials (supplier, name, thickness_mm)')
+    # Ricerca del prezzo di un bordo: coprente, la tabella non viene mai letta
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_edges_type_scope ON edges (edge_type, material_name, thickness_mm, price_per_lm)')
+    # Elenco bordi e bordi per materiale/spessore: coprente e già nell'ordine richiesto
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_edges_scope_type ON edges (material_name, thickness_mm, edge_type, price_per_lm)')
+    # Elementi lineari di un materiale (l'elenco e la ricerca per tipo usano l'indice UNIQUE)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_linear_elements_material ON linear_elements (material_name, thickness_mm, element_type)')
 
 def add_material(name, price_per_sqm, thickness=None, description='', supplier=None):
     """Aggiunge un nuovo materiale al database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            INSERT INTO materials (name, thickness, price_per_sqm, description, supplier)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (name, thickness, price_per_sqm, description, supplier))
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO materials (name, thickness_mm, price_per_sqm, description, supplier)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, thickness_to_mm(thickness), price_per_sqm, description, supplier))
     except sqlite3.IntegrityError:
         # Updated error message
         print(f"Errore: Il materiale '{name}' con spessore '{thickness}' e fornitore '{supplier}' esiste già.")
         return None
-    finally:
-        conn.close()
+    _refresh_catalog_material(cursor.lastrowid)
     return cursor.lastrowid
 
 def get_all_materials():
     """Recupera tutti i materiali dal database."""
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.all_materials()
     conn = get_db_connection()
-    cursor = conn.cursor()
     # Added supplier to SELECT statement
-    cursor.execute('SELECT id, name, thickness, price_per_sqm, description, supplier FROM materials ORDER BY name, supplier, thickness')
-    materials = cursor.fetchall()
-    conn.close()
-    return materials
+    return conn.execute(f'SELECT {_MATERIAL_COLUMNS} FROM materials ORDER BY name, supplier, thickness_mm').fetchall()
 
 def get_material_by_id(material_id):
     """Recupera un materiale specifico per ID."""
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.material_by_id(material_id)
     conn = get_db_connection()
-    cursor = conn.cursor()
     # Added supplier to SELECT statement
-    cursor.execute('SELECT id, name, thickness, price_per_sqm, description, supplier FROM materials WHERE id = ?', (material_id,))
-    material = cursor.fetchone()
-    conn.close()
-    return material
+    return conn.execute(f'SELECT {_MATERIAL_COLUMNS} FROM materials WHERE id = ?', (material_id,)).fetchone()
+
+def get_materials_by_supplier(supplier):
+    """Recupera i materiali di un fornitore (None = materiali senza fornitore)."""
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.materials_by_supplier(supplier)
+    conn = get_db_connection()
+    return conn.execute(f'SELECT {_MATERIAL_COLUMNS} FROM materials WHERE supplier IS ? ORDER BY name, supplier, thickness_mm', (supplier,)).fetchall()
 
 def update_material(material_id, name, price_per_sqm, thickness=None, description='', supplier=None):
     """Aggiorna un materiale esistente."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            UPDATE materials
-            SET name = ?, thickness = ?, price_per_sqm = ?, description = ?, supplier = ?
-            WHERE id = ?
-        ''', (name, thickness, price_per_sqm, description, supplier, material_id))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE materials
+                SET name = ?, thickness_mm = ?, price_per_sqm = ?, description = ?, supplier = ?
+                WHERE id = ?
+            ''', (name, thickness_to_mm(thickness), price_per_sqm, description, supplier, material_id))
     except sqlite3.IntegrityError:
         # Updated error message
         print(f"Errore: Il nome materiale '{name}' con spessore '{thickness}' e fornitore '{supplier}' potrebbe essere già in uso da un altro record.")
         return False
-    finally:
-        conn.close()
+    _refresh_catalog_material(material_id)
     return True
 
 def delete_material(material_id):
     """Elimina un materiale dal database."""
+    with transaction() as conn:
+        cursor = conn.execute('DELETE FROM materials WHERE id = ?', (material_id,))
+    _refresh_catalog_material(material_id)
+    return cursor.rowcount > 0
+
+def _row_thickness_mm(row):
+    """Spessore in mm di un dict importato: thickness_mm se presente, altrimenti thickness in cm."""
+    if row.get('thickness_mm') is not None:
+        return int(row['thickness_mm'])
+    return thickness_to_mm(row.get('thickness'))
+
+def add_materials_bulk(materials, overwrite_existing=False):
+    """Inserisce molti materiali con un solo executemany, in un'unica transazione.
+
+    `materials` è un iterabile di dict con le chiavi name e price_per_sqm e, opzionali,
+    thickness (in cm, oppure thickness_mm già in millimetri), description e supplier.
+    I materiali già presenti vengono aggiornati se overwrite_existing è True, altrimenti
+    saltati. Le righe senza nome o con prezzo non
+    valido vengono saltate. In modalità condivisa la scrittura è divisa in transazioni
+    brevi (vedi _write_in_batches), salvo se già dentro una transazione.
+    Restituisce i conteggi {'inserted': n, 'updated': n, 'skipped': n}.
+    """
+    conflict_action = '''
+        DO UPDATE SET price_per_sqm = excluded.price_per_sqm, description = excluded.description
+        WHERE price_per_sqm IS NOT excluded.price_per_sqm OR description IS NOT excluded.description
+    ''' if overwrite_existing else 'DO NOTHING'
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    valid_count = 0
+
+    def valid_rows():
+        nonlocal valid_count
+        for material in materials:
+            name = str(material.get('name') or '').strip()
+            try:
+                price_per_sqm = float(material['price_per_sqm'])
+                thickness_mm = _row_thickness_mm(material)
+            except (KeyError, TypeError, ValueError):
+                price_per_sqm = None
+            if not name or price_per_sqm is None:
+                counts['skipped'] += 1
+                continue
+            valid_count += 1
+            yield (name, thickness_mm, price_per_sqm,
+                   material.get('description') or '', material.get('supplier'))
+
+    def write_batch(conn, rows):
+        search_index = _has_materials_search_index(conn)
+        if search_index:
+            # Il trigger riga per riga rende l'inserimento massivo molto più lento: viene sospeso
+            # (migrazione 11) e le righe nuove vengono indicizzate dopo, con un'unica istruzione.
+            # Il segnale esiste solo dentro questa transazione: le altre connessioni non lo vedono
+            conn.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, 1)', (_MATERIALS_FTS_DEFERRED,))
+        last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM materials').fetchone()[0]
+        rows_before = conn.execute('SELECT COUNT(*) FROM materials').fetchone()[0]
+        cursor = conn.executemany(f'''
+            INSERT INTO materials (name, thickness_mm, price_per_sqm, description, supplier)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT ({_UNIQUE_KEYS['materials']}) {conflict_action}
+        ''', rows)
+        changed = max(cursor.rowcount, 0)
+        inserted = conn.execute('SELECT COUNT(*) FROM materials').fetchone()[0] - rows_before
+        if search_index:
+            conn.execute('''
+                INSERT INTO materials_fts (rowid, name, description, supplier)
+                SELECT id, name, description, supplier FROM materials WHERE id > ?
+            ''', (last_id,))
+            conn.execute('DELETE FROM settings WHERE key = ?', (_MATERIALS_FTS_DEFERRED,))
+        return changed, inserted
+
+    try:
+        results = _write_in_batches(valid_rows(), write_batch)
+    finally:
+        _invalidate_catalog()
+    changed = sum(batch_changed for batch_changed, _ in results)
+    counts['inserted'] = sum(inserted for _, inserted in results)
+    counts['updated'] = changed - counts['inserted']
+    counts['skipped'] += valid_count - changed
+    return counts
+
+# Numero massimo di risultati ordinati per pertinenza in una ricerca con limite
+_SEARCH_RANK_CANDIDATES = 500
+
+def _has_materials_search_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'materials_fts'").fetchone() is not None
+
+def _fts_prefix_query(text):
+    """Trasforma il testo digitato in una query FTS5: ogni parola è un prefisso, tutte obbligatorie."""
+    return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in text.split())
+
+def search_materials(text, limit=None):
+    """Cerca i materiali per nome, descrizione o fornitore, dal più pertinente.
+
+    Ogni parola di `text` vale come inizio di parola ("carr bianc" trova "Carrara Bianco")
+    e devono esserci tutte. Con testo vuoto restituisce tutti i materiali.
+    """
+    if not text or not text.split():
+        materials = get_all_materials()
+        return materials[:limit] if limit is not None else materials
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM materials WHERE id = ?', (material_id,))
-    conn.commit()
-    conn.close()
-    # The 'return edge_types' was likely a copy-paste error and has been removed.
+    limit_clause = 'LIMIT ?' if limit is not None else ''
+    if _has_materials_search_index(conn):
+        # Calcolare bm25 costa per ogni riga trovata: con un limite, e ricerche molto generiche
+        # ("c", "marmo"), si ordinano per pertinenza solo i primi _SEARCH_RANK_CANDIDATES risultati
+        params = [_fts_prefix_query(text)] + ([_SEARCH_RANK_CANDIDATES, limit] if limit is not None else [])
+        return conn.execute(f'''
+            SELECT {_MATERIAL_COLUMNS}
+            FROM (SELECT rowid AS hit_id, rank FROM materials_fts WHERE materials_fts MATCH ? {limit_clause})
+            JOIN materials ON materials.id = hit_id
+            ORDER BY rank, name, supplier, thickness_mm {limit_clause}
+        ''', params).fetchall()
+
+    # Ripiego senza FTS5: ogni parola deve comparire in uno dei campi
+    conditions = []
+    params = []
+    for token in text.split():
+        pattern = '%' + token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append("(name LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\' OR supplier LIKE ? ESCAPE '\\')")
+        params.extend((pattern, pattern, pattern))
+    params += [limit] if limit is not None else []
+    return conn.execute(f'''
+        SELECT {_MATERIAL_COLUMNS} FROM materials
+        WHERE {' AND '.join(conditions)}
+        ORDER BY name, supplier, thickness_mm {limit_clause}
+    ''', params).fetchall()
+
 # --- CRUD Functions for Edge Types ---
 
 def add_edge_type(edge_type, price_per_lm, material_name=None, thickness=None):
     """Adds a new edge type to the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            INSERT INTO edges (material_name, thickness, edge_type, price_per_lm)
-            VALUES (?, ?, ?, ?)
-        ''', (material_name, thickness, edge_type, price_per_lm))
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO edges (material_name, thickness_mm, edge_type, price_per_lm)
+                VALUES (?, ?, ?, ?)
+            ''', (material_name, thickness_to_mm(thickness), edge_type, price_per_lm))
     except sqlite3.IntegrityError:
         print(f"Error: Edge type '{edge_type}' for material '{material_name}' and thickness '{thickness}' already exists.")
         return None
-    finally:
-        conn.close()
+    _refresh_catalog_edge(cursor.lastrowid)
     return cursor.lastrowid
 
 def get_all_edge_types():
     """Retrieves all edge types from the database."""
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.all_edge_types()
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, material_name, thickness, edge_type, price_per_lm FROM edges ORDER BY material_name, thickness, edge_type')
-    edge_types = cursor.fetchall()
-    conn.close()
-    return edge_types
+    return conn.execute(f'SELECT {_EDGE_COLUMNS} FROM edges ORDER BY material_name, thickness_mm, edge_type').fetchall()
 
 def get_edge_by_id(edge_id):
     """Retrieves a specific edge type by ID."""
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.edge_by_id(edge_id)
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, material_name, thickness, edge_type, price_per_lm FROM edges WHERE id = ?', (edge_id,))
-    edge = cursor.fetchone()
-    conn.close()
-    return edge
+    return conn.execute(f'SELECT {_EDGE_COLUMNS} FROM edges WHERE id = ?', (edge_id,)).fetchone()
 
 def update_edge_type(edge_id, edge_type, price_per_lm, material_name=None, thickness=None):
     """Updates an existing edge type."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            UPDATE edges
-            SET material_name = ?, thickness = ?, edge_type = ?, price_per_lm = ?
-            WHERE id = ?
-        ''', (material_name, thickness, edge_type, price_per_lm, edge_id))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE edges
+                SET material_name = ?, thickness_mm = ?, edge_type = ?, price_per_lm = ?
+                WHERE id = ?
+            ''', (material_name, thickness_to_mm(thickness), edge_type, price_per_lm, edge_id))
     except sqlite3.IntegrityError:
         print(f"Error: Edge type '{edge_type}' for material '{material_name}' and thickness '{thickness}' might already be in use.")
         return False
-    finally:
-        conn.close()
+    _refresh_catalog_edge(edge_id)
     return True
 
 def delete_edge_type(edge_id):
     """Deletes an edge type from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM edges WHERE id = ?', (edge_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.execute('DELETE FROM edges WHERE id = ?', (edge_id,))
+    _refresh_catalog_edge(edge_id)
     return cursor.rowcount > 0
 
+def upsert_edges_bulk(edges, overwrite_existing=True):
+    """Inserts or updates many edge types with a single executemany, in one transaction.
+
+    `edges` is an iterable of dicts with edge_type and price_per_lm and, optionally,
+    material_name and thickness (in cm, or thickness_mm in millimetres). Existing edges
+    get the new price when overwrite_existing is True and are skipped otherwise.
+    In shared mode the rows are written in short transactions (see _write_in_batches).
+    Returns the counts {'inserted': n, 'updated': n, 'skipped': n}.
+    """
+    conflict_action = '''
+        DO UPDATE SET price_per_lm = excluded.price_per_lm
+        WHERE price_per_lm IS NOT excluded.price_per_lm
+    ''' if overwrite_existing else 'DO NOTHING'
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    valid_count = 0
+
+    def valid_rows():
+        nonlocal valid_count
+        for edge in edges:
+            edge_type = str(edge.get('edge_type') or '').strip()
+            try:
+                price_per_lm = float(edge['price_per_lm'])
+                thickness_mm = _row_thickness_mm(edge)
+            except (KeyError, TypeError, ValueError):
+                price_per_lm = None
+            if not edge_type or price_per_lm is None:
+                counts['skipped'] += 1
+                continue
+            valid_count += 1
+            yield (edge.get('material_name'), thickness_mm, edge_type, price_per_lm)
+
+    def write_batch(conn, rows):
+        rows_before = conn.execute('SELECT COUNT(*) FROM edges').fetchone()[0]
+        cursor = conn.executemany(f'''
+            INSERT INTO edges (material_name, thickness_mm, edge_type, price_per_lm)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT ({_UNIQUE_KEYS['edges']}) {conflict_action}
+        ''', rows)
+        return max(cursor.rowcount, 0), conn.execute('SELECT COUNT(*) FROM edges').fetchone()[0] - rows_before
+
+    try:
+        results = _write_in_batches(valid_rows(), write_batch)
+    finally:
+        _invalidate_catalog()
+    changed = sum(batch_changed for batch_changed, _ in results)
+    counts['inserted'] = sum(inserted for _, inserted in results)
+    counts['updated'] = changed - counts['inserted']
+    counts['skipped'] += valid_count - changed
+    return counts
+
 def get_edge_types_by_material_thickness(material_name, thickness):
     """Retrieves edge types filtered by material and thickness, plus generic ones.
     Prioritizes more specific matches.
     """
+    thickness_mm = thickness_to_mm(thickness)
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.edge_types_for(material_name, thickness_mm)
     conn = get_db_connection()
-    cursor = conn.cursor()
-    query = '''
-        SELECT id, material_name, thickness, edge_type, price_per_lm 
-        FROM edges 
-        WHERE 
-            (material_name = ? AND thickness = ?) OR 
-            (material_name = ? AND thickness IS NULL AND ? IS NOT NULL) OR
-            (material_name IS NULL AND thickness = ? AND ? IS NOT NULL) OR
-            (material_name IS NULL AND thickness IS NULL)
-        ORDER BY 
-            CASE
-                WHEN material_name = ? AND thickness = ? THEN 1
-                WHEN material_name = ? AND thickness IS NULL THEN 2
-                WHEN material_name IS NULL AND thickness = ? THEN 3
-                WHEN material_name IS NULL AND thickness IS NULL THEN 4
-                ELSE 5
-            END,
-            edge_type
+    # Un ramo per livello di specificità: ognuno è una ricerca sull'indice (material_name, thickness, ...),
+    # mentre la vecchia WHERE con quattro OR costringeva a scandire tutta la tabella.
+    # Con material_name o thickness a NULL i rami con "= ?" non restituiscono nulla.
+    query = f'''
+        SELECT {_EDGE_COLUMNS}
+        FROM (
+            SELECT 1 AS priority, id, material_name, thickness_mm, edge_type, price_per_lm
+            FROM edges WHERE material_name = ? AND thickness_mm = ?
+            UNION ALL
+            SELECT 2, id, material_name, thickness_mm, edge_type, price_per_lm
+            FROM edges WHERE material_name = ? AND thickness_mm IS NULL
+            UNION ALL
+            SELECT 3, id, material_name, thickness_mm, edge_type, price_per_lm
+            FROM edges WHERE material_name IS NULL AND thickness_mm = ?
+            UNION ALL
+            SELECT 4, id, material_name, thickness_mm, edge_type, price_per_lm
+            FROM edges WHERE material_name IS NULL AND thickness_mm IS NULL
+        )
+        ORDER BY priority, edge_type, id
     '''
-    params = [
-        material_name, thickness,
-        material_name, material_name,
-        thickness, thickness,
-        material_name, thickness,
-        material_name,
-        thickness
-    ]
-    
-    cursor.execute(query, params)
-    edge_types = cursor.fetchall()
-    conn.close()
-    return edge_types
+    params = [material_name, thickness_mm, material_name, thickness_mm]
+    return conn.execute(query, params).fetchall()
 
 def get_distinct_edge_types():
     """Retrieves complete records of distinct edge types, prioritizing generic ones."""
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.distinct_edge_types()
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, material_name, thickness, edge_type, price_per_lm
+    cursor = conn.execute(f'''
+        SELECT {_EDGE_COLUMNS}
         FROM (
             SELECT 
-                id, material_name, thickness, edge_type, price_per_lm,
+                id, material_name, thickness_mm, edge_type, price_per_lm,
                 ROW_NUMBER() OVER (PARTITION BY edge_type ORDER BY 
                     CASE WHEN material_name IS NULL THEN 0 ELSE 1 END, 
-                    CASE WHEN thickness IS NULL THEN 0 ELSE 1 END
+                    CASE WHEN thickness_mm IS NULL THEN 0 ELSE 1 END
                 ) as rn
             FROM edges
         )
         WHERE rn = 1
         ORDER BY edge_type
     ''')
-    edge_types_data = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return edge_types_data
+    return [dict(row) for row in cursor.fetchall()]
+
+# Ranked edge price lookup: one branch per level of specificity (material+thickness,
+# material only, thickness only, generic), each one an index search. The first row wins.
+_RANKED_EDGE_PRICE_SQL = '''
+    SELECT price_per_lm FROM (
+        SELECT 1 AS priority, id, price_per_lm FROM edges
+        WHERE edge_type = {edge_type} AND material_name = {material_name} AND thickness_mm = {thickness_mm}
+        UNION ALL
+        SELECT 2, id, price_per_lm FROM edges
+        WHERE edge_type = {edge_type} AND material_name = {material_name} AND thickness_mm IS NULL
+        UNION ALL
+        SELECT 3, id, price_per_lm FROM edges
+        WHERE edge_type = {edge_type} AND material_name IS NULL AND thickness_mm = {thickness_mm}
+        UNION ALL
+        SELECT 4, id, price_per_lm FROM edges
+        WHERE edge_type = {edge_type} AND material_name IS NULL AND thickness_mm IS NULL
+    )
+    ORDER BY priority, id
+    LIMIT 1
+'''
 
 def get_edge_price(material_name, thickness, edge_type):
     """Retrieves the price of a specific edge type, looking for the most precise match."""
+    thickness_mm = thickness_to_mm(thickness)
+    catalog = _active_catalog()
+    if catalog is not None:
+        return catalog.edge_price(material_name, thickness_mm, edge_type)
     conn = get_db_connection()
-    cursor = conn.cursor()
-    query = 'SELECT price_per_lm FROM edges WHERE edge_type = ?'
-    params = [edge_type]
-
-    # Try matches in order of specificity
-    for condition, extra_params in [
-        ("AND material_name = ? AND thickness = ?", [material_name, thickness]),
-        ("AND material_name = ? AND thickness IS NULL", [material_name]),
-        ("AND material_name IS NULL AND thickness = ?", [thickness]),
-        ("AND material_name IS NULL AND thickness IS NULL", [])
-    ]:
-        cursor.execute(f"{query} {condition}", params + extra_params)
-        result = cursor.fetchone()
-        if result:
-            conn.close()
-            return result['price_per_lm']
-    
-    conn.close()
-    return None
+    query = _RANKED_EDGE_PRICE_SQL.format(edge_type=':edge_type', material_name=':material_name', thickness_mm=':thickness_mm')
+    result = conn.execute(query, {'edge_type': edge_type, 'material_name': material_name, 'thickness_mm': thickness_mm}).fetchone()
+    return result['price_per_lm'] if result else None
+
+def _max_query_variables(conn):
+    """Numero massimo di parametri per istruzione (999 sulle versioni di SQLite più vecchie)."""
+    getlimit = getattr(conn, 'getlimit', None)  # Python 3.11+
+    return getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) if getlimit else 999
+
+def get_edge_prices(keys):
+    """Resolves the prices of many (material_name, thickness, edge_type) tuples at once.
+
+    Duplicate tuples are resolved once, with a single query (split only if the keys
+    exceed SQLite's parameter limit). Returns a dict {tuple: price_per_lm or None}.
+    """
+    unique_keys = list(dict.fromkeys(tuple(key) for key in keys))
+    catalog = _active_catalog()
+    if catalog is not None:
+        return {key: catalog.edge_price(key[0], thickness_to_mm(key[1]), key[2]) for key in unique_keys}
+
+    prices = {}
+    conn = get_db_connection()
+    chunk_size = max(1, _max_query_variables(conn) // 4)
+    ranked_price = _RANKED_EDGE_PRICE_SQL.format(edge_type='r.edge_type', material_name='r.material_name', thickness_mm='r.thickness_mm')
+    for start in range(0, len(unique_keys), chunk_size):
+        chunk = unique_keys[start:start + chunk_size]
+        params = []
+        for position, (material_name, thickness, edge_type) in enumerate(chunk):
+            params.extend((position, material_name, thickness_to_mm(thickness), edge_type))
+        query = f'''
+            WITH requested (position, material_name, thickness_mm, edge_type) AS (
+                VALUES {', '.join(['(?, ?, ?, ?)'] * len(chunk))}
+            )
+            SELECT r.position, ({ranked_price}) AS price_per_lm
+            FROM requested r
+        '''
+        for row in conn.execute(query, params):
+            prices[chunk[row['position']]] = row['price_per_lm']
+    return prices
+
+# --- CRUD Functions for Linear Elements ---
+
+def add_linear_element(element_type, price_per_lm, material_name=None, thickness=None, description=''):
+    """Aggiunge un elemento lineare (battiscopa, cornice...)."""
+    try:
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO linear_elements (element_type, material_name, thickness_mm, price_per_lm, description)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (element_type, material_name, thickness_to_mm(thickness), price_per_lm, description))
+    except sqlite3.IntegrityError:
+        print(f"Errore: L'elemento lineare '{element_type}' per materiale '{material_name}' e spessore '{thickness}' esiste già.")
+        return None
+    return cursor.lastrowid
+
+def get_all_linear_elements():
+    """Recupera tutti gli elementi lineari."""
+    conn = get_db_connection()
+    return conn.execute(f'''
+        SELECT {_LINEAR_ELEMENT_COLUMNS}
+        FROM linear_elements ORDER BY element_type, material_name, thickness_mm
+    ''').fetchall()
+
+_CATALOG_EXPORT_COLUMNS = {
+    'materials': _MATERIAL_COLUMNS,
+    'edges': _EDGE_COLUMNS,
+    'linear_elements': _LINEAR_ELEMENT_COLUMNS,
+}
+
+def iter_catalog_rows(table):
+    """Cursore su tutte le righe di materials, edges o linear_elements, in ordine di id.
+
+    Le righe vengono lette una alla volta durante l'iterazione, senza caricare la tabella
+    in memoria (per le esportazioni di cataloghi grandi).
+    """
+    return get_db_connection().execute(f'SELECT {_CATALOG_EXPORT_COLUMNS[table]} FROM {table} ORDER BY id')
+
+def get_linear_element_by_id(element_id):
+    """Recupera un elemento lineare per ID."""
+    conn = get_db_connection()
+    return conn.execute(f'''
+        SELECT {_LINEAR_ELEMENT_COLUMNS}
+        FROM linear_elements WHERE id = ?
+    ''', (element_id,)).fetchone()
+
+def get_linear_elements_by_material_thickness(material_name, thickness):
+    """Elementi lineari validi per materiale/spessore, dal più specifico al generico."""
+    thickness_mm = thickness_to_mm(thickness)
+    conn = get_db_connection()
+    return conn.execute(f'''
+        SELECT {_LINEAR_ELEMENT_COLUMNS}
+        FROM (
+            SELECT 1 AS priority, * FROM linear_elements WHERE material_name = ? AND thickness_mm = ?
+            UNION ALL
+            SELECT 2, * FROM linear_elements WHERE material_name = ? AND thickness_mm IS NULL
+            UNION ALL
+            SELECT 3, * FROM linear_elements WHERE material_name IS NULL AND thickness_mm = ?
+            UNION ALL
+            SELECT 4, * FROM linear_elements WHERE material_name IS NULL AND thickness_mm IS NULL
+        )
+        ORDER BY priority, element_type, id
+    ''', (material_name, thickness_mm, material_name, thickness_mm)).fetchall()
+
+def get_linear_element_price(element_type, material_name=None, thickness=None):
+    """Prezzo €/ml di un elemento lineare, cercando la corrispondenza più precisa."""
+    conn = get_db_connection()
+    result = conn.execute('''
+        SELECT price_per_lm FROM (
+            SELECT 1 AS priority, id, price_per_lm FROM linear_elements
+            WHERE element_type = :element_type AND material_name = :material_name AND thickness_mm = :thickness_mm
+            UNION ALL
+            SELECT 2, id, price_per_lm FROM linear_elements
+            WHERE element_type = :element_type AND material_name = :material_name AND thickness_mm IS NULL
+            UNION ALL
+            SELECT 3, id, price_per_lm FROM linear_elements
+            WHERE element_type = :element_type AND material_name IS NULL AND thickness_mm = :thickness_mm
+            UNION ALL
+            SELECT 4, id, price_per_lm FROM linear_elements
+            WHERE element_type = :element_type AND material_name IS NULL AND thickness_mm IS NULL
+        )
+        ORDER BY priority, id
+        LIMIT 1
+    ''', {'element_type': element_type, 'material_name': material_name, 'thickness_mm': thickness_to_mm(thickness)}).fetchone()
+    return result['price_per_lm'] if result else None
+
+def update_linear_element(element_id, element_type, price_per_lm, material_name=None, thickness=None, description=''):
+    """Aggiorna un elemento lineare esistente."""
+    try:
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE linear_elements
+                SET element_type = ?, material_name = ?, thickness_mm = ?, price_per_lm = ?, description = ?
+                WHERE id = ?
+            ''', (element_type, material_name, thickness_to_mm(thickness), price_per_lm, description, element_id))
+    except sqlite3.IntegrityError:
+        print(f"Errore: L'elemento lineare '{element_type}' per materiale '{material_name}' e spessore '{thickness}' potrebbe essere già in uso.")
+        return False
+    return True
+
+def delete_linear_element(element_id):
+    """Elimina un elemento lineare."""
+    with transaction() as conn:
+        cursor = conn.execute('DELETE FROM linear_elements WHERE id = ?', (element_id,))
+    return cursor.rowcount > 0
+
+def upsert_linear_elements_bulk(elements, overwrite_existing=True):
+    """Inserisce o aggiorna molti elementi lineari in un'unica transazione.
+
+    `elements` è un iterabile di dict con element_type e price_per_lm e, opzionali,
+    material_name, thickness (cm) o thickness_mm e description. Restituisce i conteggi come add_materials_bulk,
+    che descrive anche la scrittura a blocchi in modalità condivisa.
+    """
+    conflict_action = '''
+        DO UPDATE SET price_per_lm = excluded.price_per_lm, description = excluded.description
+        WHERE price_per_lm IS NOT excluded.price_per_lm OR description IS NOT excluded.description
+    ''' if overwrite_existing else 'DO NOTHING'
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    valid_count = 0
+
+    def valid_rows():
+        nonlocal valid_count
+        for element in elements:
+            element_type = str(element.get('element_type') or '').strip()
+            try:
+                price_per_lm = float(element['price_per_lm'])
+                thickness_mm = _row_thickness_mm(element)
+            except (KeyError, TypeError, ValueError):
+                price_per_lm = None
+            if not element_type or price_per_lm is None:
+                counts['skipped'] += 1
+                continue
+            valid_count += 1
+            yield (element_type, element.get('material_name'), thickness_mm,
+                   price_per_lm, element.get('description') or '')
+
+    def write_batch(conn, rows):
+        rows_before = conn.execute('SELECT COUNT(*) FROM linear_elements').fetchone()[0]
+        cursor = conn.executemany(f'''
+            INSERT INTO linear_elements (element_type, material_name, thickness_mm, price_per_lm, description)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT ({_UNIQUE_KEYS['linear_elements']}) {conflict_action}
+        ''', rows)
+        return max(cursor.rowcount, 0), conn.execute('SELECT COUNT(*) FROM linear_elements').fetchone()[0] - rows_before
+
+    results = _write_in_batches(valid_rows(), write_batch)
+    changed = sum(batch_changed for batch_changed, _ in results)
+    counts['inserted'] = sum(inserted for _, inserted in results)
+    counts['updated'] = changed - counts['inserted']
+    counts['skipped'] += valid_count - changed
+    return counts
+
+# --- Tabelle delle finestre di gestione del catalogo ---
+
+# Righe lette per ogni pagina delle finestre di gestione
+CATALOG_PAGE_SIZE = 200
+
+# Colonne delle finestre di gestione, per tabella: nome -> (colonna da filtrare, tipo di
+# filtro, espressioni della chiave di ordinamento o None se la colonna non si ordina).
+# Le chiavi non contengono NULL (IFNULL come in _UNIQUE_KEYS), quindi si confrontano come
+# valori di riga, e l'id in fondo le rende univoche; ognuna ha il suo indice (migrazione
+# 10 o indice univoco), così una pagina è sempre una ricerca sull'indice.
+_CATALOG_GRID_COLUMNS = {
+    'materials': {
+        'id': ('id', 'number', ()),
+        'name': ('name', 'text', ('name', 'IFNULL(thickness_mm, -1)', "IFNULL(supplier, '')")),
+        'thickness': ('thickness_mm', 'thickness', ('IFNULL(thickness_mm, -1)', 'name')),
+        'price_per_sqm': ('price_per_sqm', 'number', ('price_per_sqm',)),
+        'description': ('description', 'text', None),
+        'supplier': ('supplier', 'text', ("IFNULL(supplier, '')", 'name', 'IFNULL(thickness_mm, -1)')),
+    },
+    'edges': {
+        'id': ('id', 'number', ()),
+        'edge_type': ('edge_type', 'text', ('edge_type', "IFNULL(material_name, '')", 'IFNULL(thickness_mm, -1)')),
+        'material_name': ('material_name', 'text', ("IFNULL(material_name, '')", 'IFNULL(thickness_mm, -1)', 'edge_type')),
+        'thickness': ('thickness_mm', 'thickness', ('IFNULL(thickness_mm, -1)', 'edge_type')),
+        'price_per_lm': ('price_per_lm', 'number', ('price_per_lm',)),
+    },
+    'linear_elements': {
+        'id': ('id', 'number', ()),
+        'element_type': ('element_type', 'text', ('element_type', "IFNULL(material_name, '')", 'IFNULL(thickness_mm, -1)')),
+        'material_name': ('material_name', 'text', ("IFNULL(material_name, '')", 'IFNULL(thickness_mm, -1)', 'element_type')),
+        'thickness': ('thickness_mm', 'thickness', ('IFNULL(thickness_mm, -1)', 'element_type')),
+        'price_per_lm': ('price_per_lm', 'number', ('price_per_lm',)),
+        'description': ('description', 'text', None),
+    },
+}
+# Ordine senza una colonna scelta: lo stesso degli elenchi completi (get_all_*)
+CATALOG_DEFAULT_SORT = {'materials': 'name', 'edges': 'material_name', 'linear_elements': 'element_type'}
+
+_FILTER_OPERATORS = ('>=', '<=', '<>', '!=', '>', '<', '=')
+
+def catalog_sort_columns(table):
+    """Colonne di table per cui le finestre di gestione possono ordinare."""
+    return [column for column, (_, _, key) in _CATALOG_GRID_COLUMNS[table].items() if key is not None]
+
+def _like_pattern(text):
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def _catalog_filter(column, kind, text):
+    """Condizione SQL e parametro per il filtro `text` su una colonna.
+
+    Le colonne di testo devono contenere il testo (senza distinguere maiuscole e
+    minuscole); quelle numeriche accettano un operatore davanti al numero ("> 100",
+    "<=2,5"; senza operatore vale "="). Gli spessori si scrivono in cm.
+    """
+    if kind == 'text':
+        return f"{column} LIKE ? ESCAPE '\\'", _like_pattern(text)
+    operator = next((op for op in _FILTER_OPERATORS if text.startswith(op)), None)
+    number = text[len(operator):].strip() if operator else text
+    try:
+        value = thickness_to_mm(number) if kind == 'thickness' else float(number.replace(',', '.'))
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValueError(f"Filtro non valido: {text!r} (es. 120, > 100, <= 2,5)")
+    operator = {None: '=', '!=': '<>'}.get(operator, operator)
+    return f'{column} {operator} ?', value
+
+def _catalog_rows_query(table, sort, filters, search):
+    """Espressioni della chiave di ordinamento, condizioni e parametri di una lettura paginata."""
+    columns = _CATALOG_GRID_COLUMNS[table]
+    key = columns[sort or CATALOG_DEFAULT_SORT[table]][2]
+    if key is None:
+        raise ValueError(f"La colonna {sort!r} di {table} non si può ordinare")
+    conditions = []
+    params = []
+    for column, text in (filters or {}).items():
+        text = (text or '').strip()
+        if text:
+            filter_column, kind, _ = columns[column]
+            condition, value = _catalog_filter(filter_column, kind, text)
+            conditions.append(condition)
+            params.append(value)
+    if table == 'materials' and search and search.split():
+        # Stessa ricerca di search_materials, qui come filtro: l'ordine resta quello della colonna
+        if _has_materials_search_index(get_db_connection()):
+            conditions.append('id IN (SELECT rowid FROM materials_fts WHERE materials_fts MATCH ?)')
+            params.append(_fts_prefix_query(search))
+        else:
+            for token in search.split():
+                conditions.append("(name LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\' OR supplier LIKE ? ESCAPE '\\')")
+                params.extend([_like_pattern(token)] * 3)
+    return key + ('id',), conditions, params
+
+def _catalog_select(table, key):
+    # Le espressioni della chiave vengono lette in fondo alla riga, per chiedere la pagina successiva
+    sort_keys = ', '.join(f'{expr} AS sort_key_{i}' for i, expr in enumerate(key))
+    return f'SELECT {_CATALOG_CHANGE_COLUMNS[table]}, {sort_keys} FROM {table}'
+
+def _keyed_rows(rows, key):
+    return [(tuple(row[-len(key):]), row) for row in rows]
+
+def get_catalog_rows(table, sort=None, descending=False, filters=None, search=None, after=None, limit=CATALOG_PAGE_SIZE):
+    """Una pagina di materials, edges o linear_elements per le finestre di gestione.
+
+    sort è una delle colonne di catalog_sort_columns (None = ordine degli elenchi
+    completi), filters è {colonna: testo} (vedi _catalog_filter) e search, solo per i
+    materiali, è la ricerca per parole di search_materials. Paginazione per chiave come
+    list_quotes: restituisce una lista di (chiave, riga) e la chiave dell'ultima riga va
+    passata come `after` per la pagina successiva, che costa una ricerca sull'indice
+    anche con decine di migliaia di righe.
+    """
+    key, conditions, params = _catalog_rows_query(table, sort, filters, search)
+    if after is not None:
+        # Il limite sulla prima espressione, ridondante, serve a SQLite per cercare sull'indice:
+        # da solo il confronto fra valori di riga non lo usa quando la chiave inizia con IFNULL
+        operator = '<' if descending else '>'
+        conditions.append(f"{key[0]} {operator}= ? AND ({', '.join(key)}) {operator} ({', '.join('?' * len(key))})")
+        params.extend((after[0],) + tuple(after))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    direction = ' DESC' if descending else ''
+    rows = get_db_connection().execute(f'''
+        {_catalog_select(table, key)} {where}
+        ORDER BY {', '.join(expr + direction for expr in key)}
+        LIMIT ?
+    ''', params + [limit]).fetchall()
+    return _keyed_rows(rows, key)
+
+def count_catalog_rows(table, filters=None, search=None):
+    """Numero di righe di table che passano i filtri di get_catalog_rows."""
+    _, conditions, params = _catalog_rows_query(table, None, filters, search)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return get_db_connection().execute(f'SELECT COUNT(*) FROM {table} {where}', params).fetchone()[0]
+
+def get_catalog_row_changes(table, since_seq, sort=None, descending=False, filters=None, search=None):
+    """Righe di table cambiate dopo la modifica since_seq, per aggiornare le pagine di get_catalog_rows.
+
+    Come get_catalog_changes, ma con la chiave di ordinamento e i filtri delle pagine:
+    restituisce (seq, {id: (chiave, riga), o None se la riga è stata eliminata o non
+    passa più i filtri}), con None al posto del dict se i dati vanno ricaricati.
+    """
+    conn = get_db_connection()
+    seq = _last_catalog_change(conn)
+    if since_seq == seq:
+        return seq, {}
+    if _catalog_changes_lost(conn, since_seq, seq):
+        return seq, None
+    key, conditions, params = _catalog_rows_query(table, sort, filters, search)
+    changed = (since_seq, seq, table)
+    conditions.append(f'id IN ({_CHANGED_IDS_SQL})')
+    rows = conn.execute(f"{_catalog_select(table, key)} WHERE {' AND '.join(conditions)}", params + list(changed)).fetchall()
+    current = {row['id']: (key_values, row) for key_values, row in _keyed_rows(rows, key)}
+    return seq, {row_id: current.get(row_id) for (row_id,) in conn.execute(_CHANGED_IDS_SQL, changed)}
+
+# --- Archivio preventivi ---
+
+QUOTE_EDGE_SIDES = ('front', 'back', 'left', 'right')
+
+def _prefix_bounds(prefix):
+    """Estremi (incluso, escluso) delle stringhe che iniziano con prefix, per una ricerca per intervallo sull'indice."""
+    return prefix, prefix + '\U0010ffff'
+
+def _next_quote_number(conn, year):
+    # MAX numerico e non ultimo in ordine alfabetico: "2026-10000" viene prima di "2026-9999"
+    last = conn.execute(f'''
+        SELECT MAX(CAST(substr(quote_number, {len(str(year)) + 2}) AS INTEGER)) FROM quotes
+        WHERE quote_number >= ? AND quote_number < ?
+    ''', _prefix_bounds(f'{year}-')).fetchone()[0]
+    return f'{year}-{(last or 0) + 1:04d}'
+
+def save_quote(lines, client=None, notes='', quote_id=None):
+    """Salva un preventivo nell'archivio e ne restituisce l'id.
+
+    `lines` è una lista di dict con quantity, length_cm, width_cm, material_name,
+    thickness (cm), mq, price, slab_cost, edges_cost, total e, opzionali, is_linear,
+    notes ed edges ({lato: dict con edge_type, length_cm, price_lm, cost}, solo i lati
+    con un bordo). Con quote_id il preventivo esistente viene sostituito, mantenendo
+    numero e data di creazione; altrimenti riceve il numero successivo dell'anno.
+    """
+    now = datetime.now()
+    timestamp = now.isoformat(sep=' ', timespec='seconds')
+    # Totali sommati in unità intere: nessun errore di arrotondamento con molte righe
+    header = (
+        client or None, notes or '', timestamp, len(lines),
+        money.to_float(sum(money.mq_units(line['mq']) for line in lines), money.MQ_UNITS),
+        money.to_float(sum(money.cents(line['slab_cost']) for line in lines), money.CENTS),
+        money.to_float(sum(money.cents(line['edges_cost']) for line in lines), money.CENTS),
+        money.to_float(sum(money.cents(line['total']) for line in lines), money.CENTS),
+    )
+    with transaction() as conn:
+        if quote_id is None:
+            cursor = conn.execute('''
+                INSERT INTO quotes (quote_number, client, notes, updated_at, line_count,
+                                    total_mq, total_slabs_eur, total_edges_eur, total_eur, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (_next_quote_number(conn, now.year),) + header + (timestamp,))
+            quote_id = cursor.lastrowid
+        else:
+            conn.execute('''
+                UPDATE quotes
+                SET client = ?, notes = ?, updated_at = ?, line_count = ?,
+                    total_mq = ?, total_slabs_eur = ?, total_edges_eur = ?, total_eur = ?
+                WHERE id = ?
+            ''', header + (quote_id,))
+            _delete_quote_lines(conn, quote_id)
+
+        edge_rows = []
+        for position, line in enumerate(lines):
+            cursor = conn.execute('''
+                INSERT INTO quote_lines (quote_id, position, is_linear, quantity, length_cm, width_cm,
+                                         material_name, thickness_mm, mq, price, slab_cost, edges_cost, total, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (quote_id, position, int(bool(line.get('is_linear'))), line['quantity'], line['length_cm'],
+                  line.get('width_cm'), line['material_name'], thickness_to_mm(line.get('thickness')),
+                  line['mq'], line['price'], line['slab_cost'], line['edges_cost'], line['total'],
+                  line.get('notes') or ''))
+            for side, edge in (line.get('edges') or {}).items():
+                edge_rows.append((cursor.lastrowid, side, edge['edge_type'], edge['length_cm'], edge['price_lm'], edge['cost']))
+        conn.executemany('''
+            INSERT INTO quote_line_edges (line_id, side, edge_type, length_cm, price_lm, cost)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', edge_rows)
+    return quote_id
+
+def _delete_quote_lines(conn, quote_id):
+    conn.execute('DELETE FROM quote_line_edges WHERE line_id IN (SELECT id FROM quote_lines WHERE quote_id = ?)', (quote_id,))
+    conn.execute('DELETE FROM quote_lines WHERE quote_id = ?', (quote_id,))
+
+def list_quotes(limit=100, after=None, client=None, number=None, date_from=None, date_to=None):
+    """Una pagina dell'archivio preventivi, dal più recente, senza le righe.
+
+    Paginazione per chiave: `after` è la coppia (created_at, id) dell'ultimo preventivo
+    della pagina precedente, quindi ogni pagina costa una ricerca sull'indice anche con
+    migliaia di preventivi. client e number filtrano per prefisso (il cliente senza
+    distinguere maiuscole e minuscole); date_from e date_to sono date comprese.
+    """
+    conditions = []
+    params = []
+    if client:
+        conditions.append('client >= ? AND client < ?')
+        params.extend(_prefix_bounds(client))
+    if number:
+        conditions.append('quote_number >= ? AND quote_number < ?')
+        params.extend(_prefix_bounds(number))
+    if date_from:
+        conditions.append('created_at >= ?')
+        params.append(date_from.isoformat())
+    if date_to:
+        conditions.append('created_at < ?')
+        params.append((date_to + timedelta(days=1)).isoformat())
+    if after is not None:
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    conn = get_db_connection()
+    return conn.execute(f'''
+        SELECT id, quote_number, client, created_at, updated_at, line_count, total_mq, total_eur
+        FROM quotes {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', params + [limit]).fetchall()
+
+def get_quote(quote_id, include_lines=True):
+    """Carica un preventivo (testata e, se richiesto, righe e bordi) come dict, o None se non esiste."""
+    conn = get_db_connection()
+    header = conn.execute('SELECT * FROM quotes WHERE id = ?', (quote_id,)).fetchone()
+    if header is None or not include_lines:
+        return dict(header) if header is not None else None
+    lines = {}
+    for row in conn.execute('''
+        SELECT id, is_linear, quantity, length_cm, width_cm, material_name,
+               thickness_mm / 10.0 AS thickness, mq, price, slab_cost, edges_cost, total, notes
+        FROM quote_lines WHERE quote_id = ? ORDER BY position
+    ''', (quote_id,)):
+        line = dict(row)
+        line['is_linear'] = bool(line['is_linear'])
+        line['edges'] = {}
+        lines[line.pop('id')] = line
+    for row in conn.execute('''
+        SELECT e.line_id, e.side, e.edge_type, e.length_cm, e.price_lm, e.cost
+        FROM quote_lines l JOIN quote_line_edges e ON e.line_id = l.id
+        WHERE l.quote_id = ?
+    ''', (quote_id,)):
+        edge = dict(row)
+        lines[edge.pop('line_id')]['edges'][edge.pop('side')] = edge
+    quote = dict(header)
+    quote['lines'] = list(lines.values())
+    return quote
+
+def delete_quote(quote_id):
+    """Elimina un preventivo dall'archivio, con righe e bordi."""
+    with transaction() as conn:
+        _delete_quote_lines(conn, quote_id)
+        cursor = conn.execute('DELETE FROM quotes WHERE id = ?', (quote_id,))
+    return cursor.rowcount > 0
+
+# --- Profili dei bordi ---
+
+_EDGE_PROFILE_COLUMNS = ', '.join(f'{side}_edge' for side in QUOTE_EDGE_SIDES)
+
+def get_edge_profiles():
+    """Profili dei bordi salvati, per nome: dict con id, name ed edges ({lato: tipo di bordo}, solo i lati con un bordo)."""
+    conn = get_db_connection()
+    rows = conn.execute(f'SELECT id, name, {_EDGE_PROFILE_COLUMNS} FROM edge_profiles ORDER BY name').fetchall()
+    return [
+        {'id': row['id'], 'name': row['name'],
+         'edges': {side: row[f'{side}_edge'] for side in QUOTE_EDGE_SIDES if row[f'{side}_edge']}}
+        for row in rows
+    ]
+
+def save_edge_profile(name, edges):
+    """Salva un profilo dei bordi ({lato: tipo di bordo}); se il nome esiste già lo sostituisce. Restituisce l'id."""
+    values = [edges.get(side) or None for side in QUOTE_EDGE_SIDES]
+    with transaction() as conn:
+        conn.execute(f'''
+            INSERT INTO edge_profiles (name, {_EDGE_PROFILE_COLUMNS}) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                {', '.join(f'{side}_edge = excluded.{side}_edge' for side in QUOTE_EDGE_SIDES)}
+        ''', [name] + values)
+        profile_id = conn.execute('SELECT id FROM edge_profiles WHERE name = ?', (name,)).fetchone()['id']
+    return profile_id
+
+def delete_edge_profile(profile_id):
+    with transaction() as conn:
+        cursor = conn.execute('DELETE FROM edge_profiles WHERE id = ?', (profile_id,))
+    return cursor.rowcount > 0
+
+# --- Storico prezzi ---
+
+def _as_of_timestamp(as_of):
+    """Istante di riferimento per lo storico: datetime, date (fine della giornata),
+    testo "AAAA-MM-GG[ HH:MM:SS]" (es. created_at di un preventivo) oppure None = adesso."""
+    if as_of is None:
+        as_of = datetime.now()
+    if isinstance(as_of, datetime):
+        return as_of.isoformat(sep=' ', timespec='seconds')
+    if isinstance(as_of, date):
+        return f'{as_of.isoformat()} 23:59:59'
+    return f'{as_of} 23:59:59' if len(as_of) == 10 else as_of
+
+def _price_as_of_sql(table, **generic):
+    """Sottoquery col prezzo in vigore a :as_of per la chiave passata come parametri :colonna.
+
+    Le colonne indicate in `generic` vengono confrontate con NULL (livelli generici dei bordi).
+    Una sola ricerca sull'indice (chiave, valid_from) dello storico.
+    """
+    history, key_columns, price_column = _PRICE_HISTORY[table]
+    conditions = []
+    for column in key_columns:
+        expression = _NULL_SAFE_KEY.get(column, '{}')
+        value = 'NULL' if column in generic else f':{column}'
+        conditions.append(f'{expression.format(column)} = {expression.format(value)}')
+    return f'''(
+        SELECT {price_column} FROM {history}
+        WHERE {' AND '.join(conditions)} AND valid_from <= :as_of
+        ORDER BY valid_from DESC LIMIT 1
+    )'''
+
+def _ranked_price_as_of_sql(table):
+    # Stessa precedenza di get_edge_price: una voce eliminata (prezzo NULL) lascia il posto alla successiva
+    return 'COALESCE({}, {}, {}, {})'.format(
+        _price_as_of_sql(table),
+        _price_as_of_sql(table, thickness_mm=None),
+        _price_as_of_sql(table, material_name=None),
+        _price_as_of_sql(table, material_name=None, thickness_mm=None),
+    )
+
+def get_material_price_as_of(name, thickness=None, supplier=None, as_of=None):
+    """Prezzo €/m² di un materiale in vigore alla data `as_of`, o None se il materiale allora non esisteva."""
+    conn = get_db_connection()
+    return conn.execute(f"SELECT {_price_as_of_sql('materials')}", {
+        'name': name, 'thickness_mm': thickness_to_mm(thickness), 'supplier': supplier, 'as_of': _as_of_timestamp(as_of),
+    }).fetchone()[0]
+
+def get_edge_price_as_of(material_name, thickness, edge_type, as_of=None):
+    """Like get_edge_price, but with the prices in force at `as_of`."""
+    conn = get_db_connection()
+    return conn.execute(f"SELECT {_ranked_price_as_of_sql('edges')}", {
+        'material_name': material_name, 'thickness_mm': thickness_to_mm(thickness), 'edge_type': edge_type,
+        'as_of': _as_of_timestamp(as_of),
+    }).fetchone()[0]
+
+def get_linear_element_price_as_of(element_type, material_name=None, thickness=None, as_of=None):
+    """Come get_linear_element_price, con i prezzi in vigore alla data `as_of`."""
+    conn = get_db_connection()
+    return conn.execute(f"SELECT {_ranked_price_as_of_sql('linear_elements')}", {
+        'element_type': element_type, 'material_name': material_name, 'thickness_mm': thickness_to_mm(thickness),
+        'as_of': _as_of_timestamp(as_of),
+    }).fetchone()[0]
+
+def _prices_as_of(table, as_of):
+    """Tutte le voci di `table` esistenti alla data `as_of`, con il prezzo di allora e da quando valeva.
+
+    Una sola lettura dell'indice (chiave, valid_from) dello storico, nell'ordine delle chiavi:
+    per ogni chiave la versione più recente non successiva ad as_of (MAX con colonne "bare"
+    di SQLite, che restituisce le altre colonne della stessa riga).
+    """
+    history, key_columns, price_column = _PRICE_HISTORY[table]
+    columns = ', '.join('thickness_mm / 10.0 AS thickness, thickness_mm' if column == 'thickness_mm' else column
+                        for column in key_columns)
+    conn = get_db_connection()
+    return conn.execute(f'''
+        SELECT * FROM (
+            SELECT {columns}, {price_column}, MAX(valid_from) AS valid_from
+            FROM {history}
+            WHERE valid_from <= ?
+            GROUP BY {_UNIQUE_KEYS[table]}
+        )
+        WHERE {price_column} IS NOT NULL
+    ''', (_as_of_timestamp(as_of),)).fetchall()
+
+def get_materials_as_of(as_of):
+    """Listino materiali (name, thickness, thickness_mm, supplier, price_per_sqm, valid_from) alla data `as_of`."""
+    return _prices_as_of('materials', as_of)
+
+def get_edge_types_as_of(as_of):
+    """Edge price list (material_name, thickness, thickness_mm, edge_type, price_per_lm, valid_from) as of `as_of`."""
+    return _prices_as_of('edges', as_of)
+
+def get_linear_elements_as_of(as_of):
+    """Listino elementi lineari (element_type, material_name, thickness, thickness_mm, price_per_lm, valid_from) alla data `as_of`."""
+    return _prices_as_of('linear_elements', as_of)
+
+# --- Varianti asincrone (per l'interfaccia) ---
+# Eseguono la funzione corrispondente nel thread del database e restituiscono un
+# concurrent.futures.Future. Dal thread di Tk il risultato va ritirato con
+# db_worker.when_done, mai con future.result(), che bloccherebbe la finestra.
+
+def _submit(func, *args, **kwargs):
+    import db_worker  # Solo l'interfaccia usa il thread del database
+    return db_worker.submit(func, *args, **kwargs)
+
+def create_tables_async():
+    return _submit(create_tables)
+
+def is_shared_access_async():
+    return _submit(is_shared_access)
+
+def set_shared_access_async(enabled):
+    return _submit(set_shared_access, enabled)
+
+def get_all_materials_async():
+    return _submit(get_all_materials)
+
+def get_material_by_id_async(material_id):
+    return _submit(get_material_by_id, material_id)
+
+def add_material_async(name, price_per_sqm, thickness=None, description='', supplier=None):
+    return _submit(add_material, name, price_per_sqm, thickness, description, supplier)
+
+def update_material_async(material_id, name, price_per_sqm, thickness=None, description='', supplier=None):
+    return _submit(update_material, material_id, name, price_per_sqm, thickness, description, supplier)
+
+def delete_material_async(material_id):
+    return _submit(delete_material, material_id)
+
+def get_edge_by_id_async(edge_id):
+    return _submit(get_edge_by_id, edge_id)
+
+def add_edge_type_async(edge_type, price_per_lm, material_name=None, thickness=None):
+    return _submit(add_edge_type, edge_type, price_per_lm, material_name, thickness)
+
+def update_edge_type_async(edge_id, edge_type, price_per_lm, material_name=None, thickness=None):
+    return _submit(update_edge_type, edge_id, edge_type, price_per_lm, material_name, thickness)
+
+def delete_edge_type_async(edge_id):
+    return _submit(delete_edge_type, edge_id)
+
+def get_all_linear_elements_async():
+    return _submit(get_all_linear_elements)
+
+def add_linear_element_async(element_type, price_per_lm, material_name=None, thickness=None, description=''):
+    return _submit(add_linear_element, element_type, price_per_lm, material_name, thickness, description)
+
+def update_linear_element_async(element_id, element_type, price_per_lm, material_name=None, thickness=None, description=''):
+    return _submit(update_linear_element, element_id, element_type, price_per_lm, material_name, thickness, description)
+
+def delete_linear_element_async(element_id):
+    return _submit(delete_linear_element, element_id)
+
+def save_quote_async(lines, client=None, notes='', quote_id=None):
+    return _submit(save_quote, lines, client, notes, quote_id)
+
+def get_quote_async(quote_id, include_lines=True):
+    return _submit(get_quote, quote_id, include_lines)
+
+def delete_quote_async(quote_id):
+    return _submit(delete_quote, quote_id)
+
+def search_materials_async(text, limit=None):
+    return _submit(search_materials, text, limit)
+
+def with_catalog_seq_async(func, *args):
+    return _submit(with_catalog_seq, func, *args)
+
+def get_catalog_changes_async(since_seq, tables=('materials', 'edges')):
+    return _submit(get_catalog_changes, since_seq, tables)
+
+def check_catalog_changes_async():
+    return _submit(check_catalog_changes)
+
+def list_quotes_async(limit=100, after=None, client=None, number=None, date_from=None, date_to=None):
+    return _submit(list_quotes, limit, after, client, number, date_from, date_to)
+
+def get_catalog_rows_async(table, sort=None, descending=False, filters=None, search=None, after=None, limit=CATALOG_PAGE_SIZE):
+    return _submit(get_catalog_rows, table, sort, descending, filters, search, after, limit)
+
+def count_catalog_rows_async(table, filters=None, search=None):
+    return _submit(count_catalog_rows, table, filters, search)
+
+def get_catalog_row_changes_async(table, since_seq, sort=None, descending=False, filters=None, search=None):
+    return _submit(get_catalog_row_changes, table, since_seq, sort, descending, filters, search)
+
+def get_edge_profiles_async():
+    return _submit(get_edge_profiles)
+
+def save_edge_profile_async(name, edges):
+    return _submit(save_edge_profile, name, edges)
+
+def delete_edge_profile_async(profile_id):
+    return _submit(delete_edge_profile, profile_id)
+
+def get_edge_prices_async(keys):
+    return _submit(get_edge_prices, keys)
+
+# --- Migrazioni di schema ---
+
+# (versione, descrizione, funzione): in ordine crescente, mai modificate una volta rilasciate.
+# Una nuova modifica di schema si aggiunge in fondo con la versione successiva.
+_MIGRATIONS = (
+    (1, 'spessori in millimetri interi', _migrate_thickness_to_mm),
+    (2, 'chiavi univoche con NULL e compattazione dei duplicati', _migrate_null_safe_uniqueness),
+    (3, 'archivio preventivi', _migrate_quote_archive),
+    (4, 'ricerca full-text dei materiali', _migrate_materials_search),
+    (5, 'storico dei prezzi', _migrate_price_history),
+    (6, 'indice di ricerca aggiornato solo se cambia il testo', _migrate_materials_search_update_trigger),
+    (7, 'impostazioni del database', _migrate_settings),
+    (8, 'registro delle modifiche a materiali e bordi', _migrate_catalog_changes),
+    (9, 'profili dei bordi', _migrate_edge_profiles),
+    (10, 'indici delle tabelle di gestione e modifiche agli elementi lineari', _migrate_catalog_grids),
+    (11, 'indice di ricerca sospeso durante le importazioni senza eliminare il trigger', _migrate_materials_search_deferred_insert),
+)
+SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+# --- Verifica dei piani di esecuzione ---
+
+_PLAN_CHECK_QUOTE_LINES = [{
+    'quantity': 1, 'length_cm': 100.0, 'width_cm': 30.0, 'material_name': '-', 'thickness': 2.0, 'mq': 0.3,
+    'price': 1.0, 'slab_cost': 0.3, 'edges_cost': 0.0, 'total': 0.3,
+    'edges': {'front': {'edge_type': '-', 'length_cm': 100.0, 'price_lm': 0.0, 'cost': 0.0}},
+}]
+
+def _plan_check_catalog_changes():
+    since = _last_catalog_change(get_db_connection())
+    add_edge_type('-', 0.0)
+    return get_catalog_changes(since)
+
+def _plan_check_catalog_rows(table, sort, descending=False, **kwargs):
+    # Pagina successiva alla prima: la chiave ha un valore per espressione più l'id
+    after = (0,) * (len(_CATALOG_GRID_COLUMNS[table][sort][2]) + 1)
+    return get_catalog_rows(table, sort, descending, after=after, **kwargs)
+
+def _plan_check_catalog_row_changes():
+    since = _last_catalog_change(get_db_connection())
+    add_linear_element('-', 0.0)
+    return get_catalog_row_changes('linear_elements', since, 'price_per_lm', filters={'element_type': '-'})
+
+# (nome, chiamata, scansione completa ammessa, ordinamento in B-tree temporaneo ammesso)
+_QUERY_PLAN_CHECKS = (
+    ('get_all_materials', lambda: get_all_materials(), True, False),
+    ('get_material_by_id', lambda: get_material_by_id(-1), False, False),
+    ('get_materials_by_supplier', lambda: get_materials_by_supplier('-'), False, False),
+    ('update_material', lambda: update_material(-1, '-', 0.0, 1.0, '', '-'), False, False),
+    ('delete_material', lambda: delete_material(-1), False, False),
+    ('add_materials_bulk', lambda: add_materials_bulk([]), True, False),
+    ('get_all_edge_types', lambda: get_all_edge_types(), True, False),
+    ('get_edge_by_id', lambda: get_edge_by_id(-1), False, False),
+    ('update_edge_type', lambda: update_edge_type(-1, '-', 0.0, '-', 1.0), False, False),
+    ('delete_edge_type', lambda: delete_edge_type(-1), False, False),
+    ('upsert_edges_bulk', lambda: upsert_edges_bulk([]), True, False),
+    # L'unione dei quattro livelli di specificità va riordinata, ma sono poche righe
+    ('get_edge_types_by_material_thickness', lambda: get_edge_types_by_material_thickness('-', 1.0), False, True),
+    ('get_distinct_edge_types', lambda: get_distinct_edge_types(), True, True),
+    # I rami della ricerca a priorità vanno ordinati, ma restituiscono al massimo poche righe
+    ('get_edge_price', lambda: get_edge_price('-', 1.0, '-'), False, True),
+    ('get_edge_prices', lambda: get_edge_prices([('-', 1.0, '-'), (None, None, '-')]), False, True),
+    ('load_price_catalog', lambda: _load_catalog_rows(), True, True),
+    ('get_all_linear_elements', lambda: get_all_linear_elements(), True, False),
+    ('get_linear_element_by_id', lambda: get_linear_element_by_id(-1), False, False),
+    ('get_linear_elements_by_material_thickness', lambda: get_linear_elements_by_material_thickness('-', 1.0), False, True),
+    ('get_linear_element_price', lambda: get_linear_element_price('-', '-', 1.0), False, True),
+    ('update_linear_element', lambda: update_linear_element(-1, '-', 0.0, '-', 1.0), False, False),
+    ('delete_linear_element', lambda: delete_linear_element(-1), False, False),
+    ('upsert_linear_elements_bulk', lambda: upsert_linear_elements_bulk([]), True, False),
+    ('compact_duplicates', lambda: compact_duplicates(), True, False),
+    ('save_quote', lambda: save_quote(_PLAN_CHECK_QUOTE_LINES), False, False),
+    ('save_quote (sostituzione)', lambda: save_quote(_PLAN_CHECK_QUOTE_LINES, quote_id=-1), False, False),
+    ('list_quotes', lambda: list_quotes(after=('9999', -1)), False, False),
+    ('list_quotes (cliente)', lambda: list_quotes(client='-', after=('9999', -1)), False, True),
+    ('list_quotes (numero)', lambda: list_quotes(number='2000-', after=('9999', -1)), False, True),
+    ('list_quotes (date)', lambda: list_quotes(date_from=date(2000, 1, 1), date_to=date(2000, 1, 31)), False, False),
+    ('get_quote', lambda: get_quote(-1), False, False),
+    # Il risultato della ricerca va ordinato per pertinenza, ma è limitato
+    ('search_materials', lambda: search_materials('carr bianc', limit=50), False, True),
+    ('update_material (indice di ricerca)', lambda: update_material(-1, 'x', 0.0), False, False),
+    ('delete_quote', lambda: delete_quote(-1), False, False),
+    # L'indice univoco del nome dà già l'ordine
+    ('get_edge_profiles', lambda: get_edge_profiles(), True, False),
+    ('save_edge_profile', lambda: save_edge_profile('-', {'front': '-'}), False, False),
+    ('delete_edge_profile', lambda: delete_edge_profile(-1), False, False),
+    ('get_material_price_as_of', lambda: get_material_price_as_of('-', 1.0, '-', date(2000, 1, 1)), False, False),
+    ('get_edge_price_as_of', lambda: get_edge_price_as_of('-', 1.0, '-', date(2000, 1, 1)), False, False),
+    ('get_catalog_changes', _plan_check_catalog_changes, False, False),
+    ('get_linear_element_price_as_of', lambda: get_linear_element_price_as_of('-', '-', 1.0, date(2000, 1, 1)), False, False),
+    # I listini a una data leggono tutto l'indice dello storico, già nell'ordine del GROUP BY
+    ('get_materials_as_of', lambda: get_materials_as_of(date(2000, 1, 1)), True, False),
+    ('get_edge_types_as_of', lambda: get_edge_types_as_of(date(2000, 1, 1)), True, False),
+    ('get_linear_elements_as_of', lambda: get_linear_elements_as_of(date(2000, 1, 1)), True, False),
+    ('create_tables', lambda: create_tables(), False, False),
+    ('get_catalog_rows (filtri)', lambda: _plan_check_catalog_rows('materials', 'price_per_sqm', filters={'supplier': '-', 'thickness': '> 2'}), False, False),
+    # I materiali trovati dalla ricerca vanno riordinati per colonna, ma la pagina è limitata
+    ('get_catalog_rows (ricerca)', lambda: _plan_check_catalog_rows('materials', 'supplier', search='carr bianc'), False, True),
+    ('count_catalog_rows', lambda: count_catalog_rows('edges', filters={'edge_type': '-'}), True, False),
+    ('get_catalog_row_changes', _plan_check_catalog_row_changes, False, False),
+)
+# Ogni ordinamento delle finestre di gestione, nei due versi
+_QUERY_PLAN_CHECKS += tuple(
+    (f"get_catalog_rows ({table}, {sort}{', decrescente' if descending else ''})",
+     lambda table=table, sort=sort, descending=descending: _plan_check_catalog_rows(table, sort, descending), False, False)
+    for table in _CATALOG_GRID_COLUMNS for sort in catalog_sort_columns(table) for descending in (False, True)
+)
+
+class _PlanCheckRollback(Exception):
+    pass
+
+def check_query_plans():
+    """Controlla con EXPLAIN QUERY PLAN le query inviate dalle funzioni di questo modulo.
+
+    Ogni funzione viene eseguita (in una transazione poi annullata, con il catalogo in
+    memoria escluso) registrando le istruzioni SQL realmente inviate. Restituisce
+    l'elenco dei problemi: scansioni complete di una tabella dove serve una ricerca
+    per indice, oppure ordinamenti in B-tree temporanei. Lista vuota = tutto a posto.
+    """
+    global _price_catalog_enabled
+    conn = get_db_connection()
+    tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    problems = []
+    catalog_was_enabled = _price_catalog_enabled
+    _price_catalog_enabled = False
+    try:
+        for name, call, full_scan_allowed, temp_sort_allowed in _QUERY_PLAN_CHECKS:
+            statements = []
+            conn.set_trace_callback(statements.append)
+            try:
+                with transaction():
+                    call()
+                    raise _PlanCheckRollback()
+            except _PlanCheckRollback:
+                pass
+            finally:
+                conn.set_trace_callback(None)
+
+            for statement in statements:
+                if statement.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'WITH', 'UPDATE', 'DELETE'):
+                    continue
+                for plan_row in conn.execute(f'EXPLAIN QUERY PLAN {statement}'):
+                    detail = plan_row['detail']
+                    words = detail.split()
+                    # Le tabelle virtuali (FTS5) indicano nel dettaglio l'indice usato
+                    if not full_scan_allowed and words[0] == 'SCAN' and words[1] in tables and 'VIRTUAL TABLE' not in detail:
+                        problems.append(f"{name}: scansione completa ({detail}) in: {' '.join(statement.split())}")
+                    if not temp_sort_allowed and 'TEMP B-TREE' in detail:
+                        problems.append(f"{name}: ordinamento temporaneo ({detail}) in: {' '.join(statement.split())}")
+    finally:
+        _price_catalog_enabled = catalog_was_enabled
+    return problems
 
 if __name__ == '__main__':
     create_tables()
     print("Database and tables initialized.")
 
-    # Add generic edge types
-    add_edge_type("normal edge", 3.00)
-    add_edge_type("polished normal edge", 7.00)
-    add_edge_type("half bull nose 3cm", 25.00)
-    print("Generic edge types added.")
-
-    print("Content of 'edges' table after insertion:")
+    print("Content of 'edges' table:")
     all_edges = get_all_edge_types()
     if all_edges:
         for edge in all_edges:
             print(dict(edge))
     else:
         print("No data found in 'edges' table.")
+
+    plan_problems = check_query_plans()
+    print("Query plan check:", "OK" if not plan_problems else "")
+    for problem in plan_problems:
+        print(f"  - {problem}")
@@ -0,0 +1,90 @@
+import contextvars
+import sys
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+# Ogni quanti ms il thread di Tk controlla se ci sono risultati pronti
+POLL_INTERVAL_MS = 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Richieste in attesa di consegna: (widget, future, on_success, on_error, key).
+# Usate solo dal thread di Tk, quindi senza lock.
+_pending = []
+_poll_scheduled = False
+
+def submit(func, *args, **kwargs):
+    """Esegue func(*args, **kwargs) nel thread del database e restituisce un concurrent.futures.Future."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Un solo thread: le richieste vengono servite in ordine, con la sua connessione SQLite
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='DatabaseWorker')
+        # Il contesto del chiamante (es. database.query_scope) vale anche nel thread del database
+        return _executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+def shutdown(wait=True):
+    """Ferma il thread del database. Con wait=True attende le richieste già accodate."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+def when_done(widget, future, on_success, on_error=None, key=None):
+    """Consegna il risultato di `future` a on_success(risultato) nel thread di Tk.
+
+    Va chiamata dal thread di Tk; il completamento viene controllato con after(),
+    quindi le callback possono usare liberamente i widget. In caso di errore viene
+    chiamata on_error(eccezione), se indicata, altrimenti l'errore viene stampato.
+    Con `key`, una richiesta precedente dello stesso widget con la stessa chiave
+    viene scartata: arriva solo il risultato più recente (es. ricerca durante la
+    digitazione). I risultati per widget già chiusi vengono ignorati.
+    """
+    global _pending, _poll_scheduled
+    if key is not None:
+        superseded = [entry for entry in _pending if entry[0] is widget and entry[4] == key]
+        for entry in superseded:
+            entry[1].cancel()  # Se non è ancora partita non verrà eseguita
+        _pending = [entry for entry in _pending if entry not in superseded]
+    _pending.append((widget, future, on_success, on_error, key))
+    if not _poll_scheduled:
+        _poll_scheduled = True
+        root = widget._root()
+        root.after(POLL_INTERVAL_MS, _poll, root)
+
+def _poll(root):
+    global _pending, _poll_scheduled
+    ready = []
+    waiting = []
+    for entry in _pending:
+        (ready if entry[1].done() else waiting).append(entry)
+    _pending = waiting
+    for widget, future, on_success, on_error, key in ready:
+        try:
+            _deliver(widget, future, on_success, on_error)
+        except Exception:
+            # Come per le altre callback di Tk: l'errore viene segnalato ma il polling continua
+            root.report_callback_exception(*sys.exc_info())
+    if _pending:
+        root.after(POLL_INTERVAL_MS, _poll, root)
+    else:
+        _poll_scheduled = False
+
+def _deliver(widget, future, on_success, on_error):
+    if future.cancelled():
+        return
+    try:
+        if not widget.winfo_exists():
+            return
+    except tk.TclError:
+        return
+    error = future.exception()
+    if error is None:
+        on_success(future.result())
+    elif on_error is not None:
+        on_error(error)
+    else:
+        print(f"Errore nel thread del database: {error!r}")
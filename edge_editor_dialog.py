@@ -1,17 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import database
+import db_worker
+import money
 
 class EdgeEditorDialog(tk.Toplevel):
-    def __init__(self, parent, row_id, material_name, thickness, length1_cm, length2_cm, current_edge_details, num_soglie=1):
+    def __init__(self, parent, row_id, material_name, thickness, length1_cm, length2_cm, current_edges, num_soglie=1):
         super().__init__(parent)
         self.parent = parent
-        self.row_id = row_id
+        self.row_id = row_id # Id della riga in parent.quote_engine
         self.material_name = material_name
         self.thickness = thickness
         self.length1_cm = float(length1_cm) # Fronte/Retro
         self.length2_cm = float(length2_cm) # Sinistra/Destra
-        self.current_edge_details = current_edge_details
+        self.current_edges = current_edges # {lato: QuoteEdge}, solo i lati con un bordo
         self.num_soglie = int(num_soglie)  # Numero di soglie per moltiplicare il costo
 
         self.title(f"Editor Bordi - {material_name} ({thickness}cm) - {self.num_soglie} soglie")
@@ -29,124 +31,59 @@ class EdgeEditorDialog(tk.Toplevel):
         }
         self.total_edge_cost_var = tk.StringVar(value="0.00")
 
-        # Load edge types first. If it fails or no types are found, handle appropriately.
-        if not self._load_edge_types():
-            # If _load_edge_types returns False (e.g., user was warned and no types exist),
-            # we might want to close the dialog or prevent further initialization.
-            # For now, we'll let it proceed, but create_widgets will handle empty edge_options.
-            # Consider self.destroy() here if a completely empty dialog is not desired.
-            # For instance, if messagebox was shown and no types, it might be best to close.
-            # However, the current logic in _load_edge_types shows a warning and proceeds.
-            pass # Proceed to create widgets, which will show 'Nessun bordo disponibile'
+        self.edge_comboboxes = {}
 
+        # I tipi di bordo vengono letti nel thread del database: il dialogo compare subito
+        # e le liste (e i costi) si completano all'arrivo dei dati
         self._create_widgets()
         self._load_current_details()
         self._update_all_costs()
+        self._load_edge_types()
 
+    @database.query_scope("Editor bordi: caricamento tipi")
     def _load_edge_types(self):
         print(f"[DEBUG] _load_edge_types: Inizio caricamento per Materiale: {self.material_name}, Spessore: {self.thickness}")
-        try:
-            # Prima prova a ottenere i bordi specifici per materiale e spessore
-            specific_edge_types = database.get_edge_types_by_material_thickness(self.material_name, self.thickness)
-            print(f"[DEBUG] _load_edge_types: Tipi di bordo specifici trovati: {specific_edge_types}")
-            self.edge_types_data = list(specific_edge_types) # Converti in lista per estendere
-
-            # Se non ci sono bordi specifici o per assicurarsi di avere anche i generici come fallback
-            # (la logica originale li prendeva solo se gli specifici erano assenti, modifichiamo per prenderli sempre e poi filtrare)
-            generic_edge_types = database.get_edge_types_by_material_thickness(None, None)
-            print(f"[DEBUG] _load_edge_types: Tipi di bordo generici trovati: {generic_edge_types}")
-            
-            # Unisci e rimuovi duplicati, dando priorità agli specifici con prezzi validi
-            # Converti le tuple in dizionari per una più facile manipolazione
-            specific_dicts = {row['edge_type']: dict(row) for row in specific_edge_types}
-            generic_dicts = {row['edge_type']: dict(row) for row in generic_edge_types}
-
-            print(f"[DEBUG] _load_edge_types: specific_dicts: {specific_dicts}")
-            print(f"[DEBUG] _load_edge_types: generic_dicts: {generic_dicts}")
-
-            merged_data_final = {}
-
-            # Inizia con i dati generici
-            for edge_name, gen_data in generic_dicts.items():
-                merged_data_final[edge_name] = gen_data
-
-            # Sovrascrivi o aggiungi dati specifici, con logica per i prezzi None
-            for edge_name, spec_data in specific_dicts.items():
-                if edge_name in merged_data_final:
-                    # Esiste sia specifico che generico
-                    # Se il prezzo specifico NON è None, usa i dati specifici
-                    if spec_data.get('price_per_lm') is not None:
-                        merged_data_final[edge_name] = spec_data
-                    # Altrimenti (prezzo specifico è None), i dati generici sono già lì (con il loro prezzo),
-                    # quindi non fare nulla per mantenere il prezzo generico.
-                else:
-                    # Esiste solo specifico, aggiungilo indipendentemente dal prezzo
-                    merged_data_final[edge_name] = spec_data
-            
-            print(f"[DEBUG] _load_edge_types: merged_data_final (before sqlite3.Row conversion): {merged_data_final}")
-            # Assicurati che self.db_conn sia disponibile se necessario per sqlite3.Row
-            # Se db_conn non è un attributo di istanza, dovrai passarlo o gestirlo diversamente.
-            # Per ora, presumo che self.db_conn sia accessibile o che sqlite3.Row non ne abbia bisogno qui.
-            # Se database.py restituisce già oggetti simili a dizionari o Row, potresti non aver bisogno di questa conversione.
-            # Modifica: database.get_edge_types_by_material_thickness dovrebbe restituire oggetti che possono essere usati direttamente
-            # o convertiti in un formato consistente. Se sono già dizionari, la conversione a Row potrebbe non essere necessaria
-            # o potrebbe necessitare di un cursore fittizio se non si esegue una query.
-            # Per semplicità, se database.py restituisce dict, usiamo quelli.
-            # Se restituisce Row objects, la logica di conversione a dict e poi di nuovo a Row deve essere coerente.
-            # Assumendo che database.py fornisca dict o Row-like objects:
-            self.edge_types_data = list(merged_data_final.values()) # Se merged_data_final contiene già i dati nel formato corretto (es. dict)
-            # Se è necessaria la conversione esplicita a sqlite3.Row e hai un self.db_conn:
-            # self.edge_types_data = [sqlite3.Row(self.db_conn.cursor(), data) for data in merged_data_final.values()] 
-            # Scegli la riga sopra se database.py non restituisce oggetti Row e ne hai bisogno.
-            # Se database.py restituisce già oggetti Row, allora la conversione a dict e poi di nuovo a Row è ridondante.
-            # Semplifichiamo assumendo che i dizionari siano sufficienti o che le Row siano gestite correttamente.
-            # La riga seguente è più robusta se i dati sono già Row o dict.
-            # self.edge_types_data = list(merged_data_final.values()) 
-            # Tuttavia, per mantenere la coerenza con il codice originale che usa sqlite3.Row, proviamo a ricostruirli
-            # se `database.py` non li fornisce già in quel formato.
-            # Se `database.get_edge_types_by_material_thickness` restituisce già `sqlite3.Row` objects, 
-            # allora la conversione a `dict` e poi di nuovo a `sqlite3.Row` è inefficiente.
-            # Per ora, manteniamo la conversione a `list` di `dict` come formato intermedio.
-            # La conversione finale a `sqlite3.Row` dipende da come il resto del codice utilizza `self.edge_types_data`.
-            # Se il codice si aspetta oggetti `sqlite3.Row`, la conversione è necessaria.
-            # Se il codice accede ai campi tramite `['key']`, allora i `dict` vanno bene.
-            # Dato il codice in `_calculate_side_cost` e `_save_changes` che usa `et_data['edge_type']`, i dizionari sono sufficienti.
-            # Quindi, la riga seguente è probabilmente la più corretta e semplice:
-            self.edge_types_data = list(merged_data_final.values())
-            print(f"[DEBUG] _load_edge_types: Dati finali self.edge_types_data dopo unione e deduplicazione: {self.edge_types_data}")
-
-            if not self.edge_types_data:
-                # Se non ci sono bordi specifici, prendi tutti i tipi di bordo generici (senza material_name e thickness specifici)
-                # Questi dovrebbero avere i loro prezzi corretti nel database.
-                generic_edge_types = database.get_edge_types_by_material_thickness(None, None) # Passa None per ottenere quelli generici
-                self.edge_types_data.extend(generic_edge_types) # Aggiungili a quelli specifici (se ce ne sono)
-                # Rimuovi duplicati basati su edge_type, dando priorità a quelli specifici se presenti
-                seen_edge_types = set()
-                unique_edge_types_data = []
-                for et_data in self.edge_types_data:
-                    if et_data['edge_type'] not in seen_edge_types:
-                        unique_edge_types_data.append(et_data)
-                        seen_edge_types.add(et_data['edge_type'])
-                self.edge_types_data = unique_edge_types_data
-
-                if not self.edge_types_data:
-                     messagebox.showwarning("Nessun Tipo di Bordo", f"Nessun tipo di bordo definito nel database per {self.material_name} ({self.thickness}cm) o tipi generici.", parent=self)
-                     # It's important that create_widgets can handle an empty edge_types_data
-                     return False # Indicate that no types were loaded
-            return True # Indicate success
-        except Exception as e:
-            messagebox.showerror("Errore Database", f"Errore nel caricamento dei tipi di bordo: {e}", parent=self)
-            self.edge_types_data = []
-            return False # Indicate failure
+        db_worker.when_done(self, db_worker.submit(self._fetch_edge_types), self._on_edge_types_loaded, self._on_edge_types_error)
+
+    def _fetch_edge_types(self):
+        """Tipi di bordo validi per materiale e spessore. Eseguita nel thread del database: niente widget qui."""
+        # Una sola query: comprende già i bordi generici, dal più specifico al generico
+        edge_types = database.get_edge_types_by_material_thickness(self.material_name, self.thickness)
+        print(f"[DEBUG] _load_edge_types: Tipi di bordo trovati: {edge_types}")
+
+        # Per ogni tipo vale il record più specifico con un prezzo valido (come in get_edge_price);
+        # se nessuno ha un prezzo si tiene il più specifico
+        merged_data_final = {}
+        for row in edge_types:
+            current = merged_data_final.get(row['edge_type'])
+            if current is None or (current['price_per_lm'] is None and row['price_per_lm'] is not None):
+                merged_data_final[row['edge_type']] = dict(row)
+        edge_types_data = list(merged_data_final.values())
+        print(f"[DEBUG] _load_edge_types: Dati finali edge_types_data dopo unione e deduplicazione: {edge_types_data}")
+        return edge_types_data
+
+    def _on_edge_types_loaded(self, edge_types_data):
+        self._apply_edge_types(edge_types_data)
+        if not edge_types_data:
+            messagebox.showwarning("Nessun Tipo di Bordo", f"Nessun tipo di bordo definito nel database per {self.material_name} ({self.thickness}cm) o tipi generici.", parent=self)
+
+    def _on_edge_types_error(self, error):
+        messagebox.showerror("Errore Database", f"Errore nel caricamento dei tipi di bordo: {error}", parent=self)
+        self._apply_edge_types([])
+
+    def _apply_edge_types(self, edge_types_data):
+        self.edge_types_data = edge_types_data
+        # La combobox resta readonly e contiene "Nessun bordo disponibile" se non ci sono tipi
+        edge_options = [et['edge_type'] for et in edge_types_data] or ["Nessun bordo disponibile"]
+        for combo_type in self.edge_comboboxes.values():
+            combo_type.configure(values=edge_options)
+        self.save_button.configure(state="normal")
+        self._update_all_costs()
 
     def _create_widgets(self):
         main_frame = ttk.Frame(self, padding="10")
         main_frame.pack(fill="both", expand=True)
 
-        edge_options = [et['edge_type'] for et in self.edge_types_data]
-        if not edge_options:
-            edge_options = ["Nessun bordo disponibile"]
-
         sides = {
             'front': {'label': 'Fronte', 'length': self.length1_cm},
             'back':  {'label': 'Retro',  'length': self.length1_cm},
@@ -163,7 +100,9 @@ class EdgeEditorDialog(tk.Toplevel):
             cb_active = ttk.Checkbutton(frame, text="Attivo", variable=self.selected_edges[side_key]['active'], command=lambda sk=side_key: self._on_active_toggle(sk))
             cb_active.grid(row=0, column=0, padx=5, pady=2, sticky="w")
 
-            combo_type = ttk.Combobox(frame, textvariable=self.selected_edges[side_key]['type'], values=edge_options, state="readonly", width=20)
+            # Le opzioni arrivano con i tipi di bordo, in _apply_edge_types
+            combo_type = ttk.Combobox(frame, textvariable=self.selected_edges[side_key]['type'], values=[], state="readonly", width=20)
+            self.edge_comboboxes[side_key] = combo_type
             # Rimosso: if not self.edge_types_data: combo_type.config(state="disabled")
             # Il Combobox sarà readonly e conterrà "Nessun bordo disponibile" se edge_options è tale.
             # L'utente potrà comunque attivare il bordo, e il costo sarà 0 se nessun tipo valido è selezionato.
@@ -187,19 +126,20 @@ class EdgeEditorDialog(tk.Toplevel):
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=row_idx, column=0, columnspan=3, pady=10, sticky="e")
 
-        save_button = ttk.Button(button_frame, text="Salva Modifiche", command=self._save_changes)
-        save_button.pack(side="left", padx=5)
+        # Disabilitato finché non sono noti i prezzi dei bordi
+        self.save_button = ttk.Button(button_frame, text="Salva Modifiche", command=self._save_changes, state="disabled")
+        self.save_button.pack(side="left", padx=5)
 
         cancel_button = ttk.Button(button_frame, text="Annulla", command=self.destroy)
         cancel_button.pack(side="left", padx=5)
 
     def _load_current_details(self):
-        if not self.current_edge_details: return
+        if not self.current_edges: return
         for side_key, details_vars in self.selected_edges.items():
-            if side_key in self.current_edge_details:
-                side_data = self.current_edge_details[side_key]
-                details_vars['active'].set(side_data.get('active', False))
-                details_vars['type'].set(side_data.get('type', ''))
+            edge = self.current_edges.get(side_key)
+            if edge is not None:
+                details_vars['active'].set(True)
+                details_vars['type'].set(edge.edge_type)
 
     def _on_active_toggle(self, side_key):
         # Se il bordo viene disattivato, il tipo selezionato non è più rilevante
@@ -217,7 +157,7 @@ class EdgeEditorDialog(tk.Toplevel):
     def _calculate_side_cost(self, side_key):
         if not self.selected_edges[side_key]['active'].get():
             self.selected_edges[side_key]['cost_var'].set("0.00")
-            return 0.0
+            return 0
 
         edge_type_name = self.selected_edges[side_key]['type'].get()
 
@@ -225,7 +165,7 @@ class EdgeEditorDialog(tk.Toplevel):
         if not edge_type_name or not self.edge_types_data or edge_type_name == "Nessun bordo disponibile":
             print(f"[DEBUG] _calculate_side_cost: Nessun tipo di bordo valido selezionato o self.edge_types_data è vuoto. Costo impostato a 0.")
             self.selected_edges[side_key]['cost_var'].set("0.00")
-            return 0.0
+            return 0
 
         price_lm = 0.0
         et_data_found = None
@@ -250,99 +190,53 @@ class EdgeEditorDialog(tk.Toplevel):
             print(f"[DEBUG] _calculate_side_cost: Dati trovati per '{edge_type_name}', ma 'price_per_lm' mancante o None: {et_data_found}. Prezzo impostato a 0.")
             price_lm = 0.0 # Assicura che sia 0 se il prezzo non è valido o mancante
             
-        length_m = 0.0
+        # Stesso calcolo di quote_engine, in decimi di mm e centesimi
         if side_key in ['front', 'back']:
-            length_m = self.length1_cm / 100.0
-        elif side_key in ['left', 'right']:
-            length_m = self.length2_cm / 100.0
+            length_tmm = money.tenths_mm(self.length1_cm)
+        else:
+            length_tmm = money.tenths_mm(self.length2_cm)
         
         # Moltiplica il costo per il numero di soglie
-        cost = length_m * price_lm * self.num_soglie
-        print(f"[DEBUG] _calculate_side_cost: Costo calcolato per {side_key}: lunghezza={length_m:.3f}m, prezzo={price_lm:.2f}€/m, soglie={self.num_soglie}, costo_totale={cost:.2f}€")
-        self.selected_edges[side_key]['cost_var'].set(f"{cost:.2f}")
-        return cost
+        cost_cents = money.length_cost_cents(length_tmm, money.price_units(price_lm), self.num_soglie)
+        print(f"[DEBUG] _calculate_side_cost: Costo calcolato per {side_key}: lunghezza={money.format_units(length_tmm, money.TENTHS_MM_PER_M, 3)}m, prezzo={price_lm:.2f}€/m, soglie={self.num_soglie}, costo_totale={money.format_cents(cost_cents)}€")
+        self.selected_edges[side_key]['cost_var'].set(money.format_cents(cost_cents))
+        return cost_cents
 
     def _update_all_costs(self):
-        total_cost = 0.0
+        total_cents = 0
         for side_key in self.selected_edges.keys():
-            total_cost += self._calculate_side_cost(side_key)
-        self.total_edge_cost_var.set(f"{total_cost:.2f}")
+            total_cents += self._calculate_side_cost(side_key)
+        self.total_edge_cost_var.set(money.format_cents(total_cents))
 
     def _save_changes(self):
-        updated_details = {}
-        total_calculated_edge_cost = 0.0
-
+        # Solo tipo e prezzo dei lati con un bordo: lunghezze, costi e totali li calcola quote_engine
+        edges = {}
         for side_key, details_vars in self.selected_edges.items():
-            is_active = details_vars['active'].get()
-            edge_type = details_vars['type'].get() if is_active else ''
-            cost = float(details_vars['cost_var'].get()) if is_active else 0.0
-            length_cm = self.length1_cm if side_key in ['front', 'back'] else self.length2_cm
-            price_lm = 0.0
-            if is_active and edge_type:
-                 for et_data in self.edge_types_data:
-                    if et_data['edge_type'] == edge_type:
-                        price_lm = float(et_data['price_per_lm']) if et_data and 'price_per_lm' in et_data else 0.0
-                        break
-            
-            updated_details[side_key] = {
-                'active': is_active,
-                'type': edge_type,
-                'length_cm': length_cm,
-                'price_lm': price_lm,
-                'cost': cost
-            }
-            if is_active:
-                total_calculated_edge_cost += cost
-        
-        updated_details['total_edge_cost'] = total_calculated_edge_cost
-
-        self.parent.edge_details_map[self.row_id] = updated_details
-
-        current_values = list(self.parent.quote_tree.item(self.row_id, 'values'))
-        
-        costo_lastra = float(current_values[7])
-        current_values[8] = f"{total_calculated_edge_cost:.2f}"
-        current_values[9] = f"{(costo_lastra + total_calculated_edge_cost):.2f}"
-        
-        self.parent.quote_tree.item(self.row_id, values=tuple(current_values))
-        self.parent.update_summary()
+            edge_type = details_vars['type'].get()
+            if not details_vars['active'].get() or not edge_type:
+                continue
+            for et_data in self.edge_types_data:
+                if et_data['edge_type'] == edge_type:
+                    edges[side_key] = (edge_type, float(et_data['price_per_lm'] or 0.0))
+                    break
+
+        self.parent.quote_engine.set_edges(self.row_id, edges)
         self.destroy()
 
 if __name__ == '__main__':
+    from quote_engine import QuoteEngine
+
     class MockApp:
         def __init__(self):
-            self.edge_details_map = {}
-            self.quote_tree = None
-            self.total_mq_var = tk.StringVar()
-            self.total_slabs_eur_var = tk.StringVar()
-            self.total_edges_eur_var = tk.StringVar()
-            self.total_eur_var = tk.StringVar()
-
-        def update_summary(self):
-            print("MockApp: update_summary called")
+            self.quote_engine = QuoteEngine()
+            self.quote_engine.subscribe(lambda old, new: print(f"MockApp: riga aggiornata {new}"))
 
     root = tk.Tk()
     root.withdraw()
     
     mock_parent = MockApp()
-    mock_row_id = "test_row_1"
-    mock_material = "Marmo Test"
-    mock_thickness = 2.0
-    mock_len1 = 120.0
-    mock_len2 = 30.0
-    mock_current_edges = {
-        'front': {'active': True, 'type': 'Filo Lucido', 'length_cm': 120.0, 'price_lm': 10, 'cost': 12.0},
-        'total_edge_cost': 12.0
-    }
-    mock_parent.edge_details_map[mock_row_id] = mock_current_edges
-
-    class MockTree:
-        def item(self, row_id, values=None):
-            if values:
-                print(f"MockTree: item {row_id} updated with values: {values}")
-                return
-            return ('1', '120.0', '30.0', 'Marmo Test', '2.0', '0.3600', '100.00', '36.00', '0.00', '36.00', row_id)
-    mock_parent.quote_tree = MockTree()
+    mock_line = mock_parent.quote_engine.add_slab(13, 120.0, 30.0, "Marmo Test", 2.0, 100.0)
+    mock_line = mock_parent.quote_engine.set_edges(mock_line.line_id, {'front': ('Filo Lucido', 10.0)})
 
     def mock_get_edges(mat_name, thick):
         print(f"mock_get_edges called for {mat_name}, {thick}")
@@ -354,8 +248,9 @@ if __name__ == '__main__':
     database.get_edge_types_by_material_thickness = mock_get_edges
     database.get_distinct_edge_types = lambda: [('Filo Lucido',), ('Costa Retta',), ('Toro',)]
 
-    dialog = EdgeEditorDialog(mock_parent, mock_row_id, mock_material, mock_thickness, mock_len1, mock_len2, mock_current_edges, 13)
+    dialog = EdgeEditorDialog(mock_parent, mock_line.line_id, mock_line.material_name, mock_line.thickness,
+                              mock_line.length_cm, mock_line.width_cm, mock_line.edges, mock_line.quantity)
     root.wait_window(dialog)
     print("Dialog closed.")
-    print("Updated edge details in MockApp:", mock_parent.edge_details_map.get(mock_row_id))
+    print("Updated line in MockApp:", mock_parent.quote_engine.get(mock_line.line_id))
     root.mainloop()
\ No newline at end of file
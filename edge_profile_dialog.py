@@ -0,0 +1,175 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+import database
+import db_worker
+from database import QUOTE_EDGE_SIDES
+from quote_engine import edge_profile
+
+NO_EDGE = "(nessun bordo)"
+SIDE_LABELS = {'front': 'Fronte', 'back': 'Retro', 'left': 'Sinistra', 'right': 'Destra'}
+
+class EdgeProfileDialog(tk.Toplevel):
+    """Profili dei bordi con nome: si scelgono o si compongono e si applicano a tutte le righe selezionate.
+
+    I prezzi vengono letti una volta sola per ogni materiale e spessore delle righe
+    (database.get_edge_prices) e il profilo applicato con QuoteEngine.apply_edge_profile,
+    in un solo passo di Annulla.
+    """
+
+    def __init__(self, parent, line_ids):
+        super().__init__(parent)
+        self.parent = parent
+        self.line_ids = list(line_ids)
+        self.profiles = []
+        self.applying = False
+
+        self.title(f"Profili Bordi - {len(self.line_ids)} righe selezionate")
+        self.geometry("560x380")
+        self.transient(parent)
+        self.grab_set()
+
+        self.create_widgets()
+        self.load_profiles()
+        db_worker.when_done(self, db_worker.submit(database.get_distinct_edge_types), self._on_edge_types_loaded,
+                            self._on_load_error)
+
+    def create_widgets(self):
+        main_frame = ttk.Frame(self, padding="10")
+        main_frame.pack(fill="both", expand=True)
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.rowconfigure(0, weight=1)
+
+        list_frame = ttk.LabelFrame(main_frame, text="Profili Salvati", padding="5")
+        list_frame.grid(row=0, column=0, sticky="ns", padx=(0, 10))
+        self.profile_list = tk.Listbox(list_frame, width=24, exportselection=False)
+        self.profile_list.pack(fill="both", expand=True)
+        self.profile_list.bind("<<ListboxSelect>>", self.on_profile_selected)
+        self.delete_button = ttk.Button(list_frame, text="Elimina Profilo", command=self.delete_profile)
+        self.delete_button.pack(fill="x", pady=(5, 0))
+
+        edit_frame = ttk.LabelFrame(main_frame, text="Profilo", padding="5")
+        edit_frame.grid(row=0, column=1, sticky="nsew")
+        edit_frame.columnconfigure(1, weight=1)
+
+        ttk.Label(edit_frame, text="Nome:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.name_var = tk.StringVar()
+        ttk.Entry(edit_frame, textvariable=self.name_var).grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+
+        self.side_vars = {}
+        self.side_comboboxes = {}
+        for row, side in enumerate(QUOTE_EDGE_SIDES, start=1):
+            ttk.Label(edit_frame, text=f"{SIDE_LABELS[side]}:").grid(row=row, column=0, padx=5, pady=5, sticky="w")
+            self.side_vars[side] = tk.StringVar(value=NO_EDGE)
+            # Le opzioni arrivano con i tipi di bordo, in _on_edge_types_loaded
+            combo = ttk.Combobox(edit_frame, textvariable=self.side_vars[side], values=[NO_EDGE], state="readonly")
+            combo.grid(row=row, column=1, padx=5, pady=5, sticky="ew")
+            self.side_comboboxes[side] = combo
+
+        self.save_button = ttk.Button(edit_frame, text="Salva Profilo", command=self.save_profile)
+        self.save_button.grid(row=len(QUOTE_EDGE_SIDES) + 1, column=1, padx=5, pady=10, sticky="e")
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=1, column=0, columnspan=2, pady=(10, 0), sticky="e")
+        self.apply_button = ttk.Button(button_frame, text=f"Applica a {len(self.line_ids)} Righe",
+                                       command=self.apply_profile, style="Accent.TButton")
+        self.apply_button.pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Chiudi", command=self.destroy).pack(side="left", padx=5)
+
+    def load_profiles(self):
+        db_worker.when_done(self, database.get_edge_profiles_async(), self._on_profiles_loaded, self._on_load_error)
+
+    def _on_profiles_loaded(self, profiles):
+        self.profiles = profiles
+        self.profile_list.delete(0, "end")
+        for profile in profiles:
+            self.profile_list.insert("end", profile['name'])
+
+    def _on_edge_types_loaded(self, edge_types):
+        options = [NO_EDGE] + [row['edge_type'] for row in edge_types]
+        for combo in self.side_comboboxes.values():
+            combo.configure(values=options)
+
+    def _on_load_error(self, error):
+        messagebox.showerror("Errore Database", f"Errore nel caricamento dei profili dei bordi: {error}", parent=self)
+
+    def on_profile_selected(self, event=None):
+        selection = self.profile_list.curselection()
+        if not selection:
+            return
+        profile = self.profiles[selection[0]]
+        self.name_var.set(profile['name'])
+        for side, var in self.side_vars.items():
+            var.set(profile['edges'].get(side, NO_EDGE))
+
+    def current_edges(self):
+        """{lato: tipo di bordo} dei lati con un bordo scelto."""
+        return {side: var.get() for side, var in self.side_vars.items() if var.get() and var.get() != NO_EDGE}
+
+    def save_profile(self):
+        name = self.name_var.get().strip()
+        if not name:
+            messagebox.showwarning("Profili Bordi", "Inserire un nome per il profilo.", parent=self)
+            return
+        # Salvato nel thread del database; fino alla risposta il pulsante resta disattivato
+        self.save_button.configure(state="disabled")
+        db_worker.when_done(self, database.save_edge_profile_async(name, self.current_edges()),
+                            self._on_profile_saved, self._on_save_error)
+
+    def _on_profile_saved(self, profile_id):
+        self.save_button.configure(state="normal")
+        self.load_profiles()
+
+    def _on_save_error(self, error):
+        self.save_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Impossibile salvare il profilo: {error}", parent=self)
+
+    def delete_profile(self):
+        selection = self.profile_list.curselection()
+        if not selection:
+            messagebox.showwarning("Nessuna Selezione", "Selezionare un profilo da eliminare.", parent=self)
+            return
+        profile = self.profiles[selection[0]]
+        if not messagebox.askyesno("Conferma Eliminazione", f"Eliminare il profilo '{profile['name']}'?", parent=self):
+            return
+        self.delete_button.configure(state="disabled")
+        db_worker.when_done(self, database.delete_edge_profile_async(profile['id']),
+                            self._on_profile_deleted, self._on_delete_error)
+
+    def _on_profile_deleted(self, deleted):
+        self.delete_button.configure(state="normal")
+        self.load_profiles()
+
+    def _on_delete_error(self, error):
+        self.delete_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Impossibile eliminare il profilo: {error}", parent=self)
+
+    @database.query_scope("Profili bordi: applicazione")
+    def apply_profile(self):
+        if self.applying:
+            return
+        profile = edge_profile(self.current_edges())
+        keys = self.parent.quote_engine.edge_price_keys(self.line_ids, profile)
+        self.applying = True
+        self.apply_button.configure(state="disabled")
+        # Una sola lettura per tutti i materiali e spessori delle righe selezionate
+        db_worker.when_done(self, database.get_edge_prices_async(keys),
+                            lambda prices: self._on_prices_loaded(profile, prices), self._on_prices_error)
+
+    def _on_prices_loaded(self, profile, prices):
+        self.applying = False
+        self.apply_button.configure(state="normal")
+        missing = [key for key, price in prices.items() if price is None]
+        if missing:
+            details = "\n".join(f"- {edge_type} per {material_name} ({thickness} cm)"
+                                for material_name, thickness, edge_type in missing[:10])
+            more = f"\n... e altri {len(missing) - 10}" if len(missing) > 10 else ""
+            messagebox.showerror("Prezzi Bordi Mancanti",
+                                 f"Nessun prezzo nel listino per:\n{details}{more}\n\nNessuna riga è stata modificata.", parent=self)
+            return
+        self.parent.quote_engine.apply_edge_profile(self.line_ids, profile, prices)
+        self.destroy()
+
+    def _on_prices_error(self, error):
+        self.applying = False
+        self.apply_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Errore nella lettura dei prezzi dei bordi: {error}", parent=self)
@@ -1,6 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import database
+import db_worker
+from catalog_grid import CatalogGrid
+
+# (colonna di database.get_catalog_rows, intestazione, larghezza, allineamento)
+EDGE_COLUMNS = [
+    ("id", "ID", 40, "center"),
+    ("edge_type", "Nome Tipo Bordo", 150, "w"),
+    ("material_name", "Materiale Specifico", 150, "w"),
+    ("thickness", "Spessore Specifico (cm)", 150, "e"),
+    ("price_per_lm", "Prezzo (€/ml)", 100, "e"),
+]
 
 class EdgesManager(tk.Toplevel):
     def __init__(self, parent):
@@ -9,30 +20,10 @@ class EdgesManager(tk.Toplevel):
         self.geometry("800x500") # Adjusted size for more columns
         self.parent = parent
 
-        # Frame for Treeview
-        tree_frame = ttk.Frame(self)
-        tree_frame.pack(pady=10, padx=10, fill="both", expand=True)
-
-        # Treeview to display edge types
-        self.tree = ttk.Treeview(tree_frame, columns=("ID", "Nome Tipo Bordo", "Materiale Specifico", "Spessore Specifico (cm)", "Prezzo (€/ml)"), show="headings")
-        self.tree.heading("ID", text="ID")
-        self.tree.heading("Nome Tipo Bordo", text="Nome Tipo Bordo")
-        self.tree.heading("Materiale Specifico", text="Materiale Specifico")
-        self.tree.heading("Spessore Specifico (cm)", text="Spessore Specifico (cm)")
-        self.tree.heading("Prezzo (€/ml)", text="Prezzo (€/ml)")
-
-        self.tree.column("ID", width=40, anchor="center")
-        self.tree.column("Nome Tipo Bordo", width=150)
-        self.tree.column("Materiale Specifico", width=150)
-        self.tree.column("Spessore Specifico (cm)", width=150, anchor="e")
-        self.tree.column("Prezzo (€/ml)", width=100, anchor="e")
-
-        self.tree.pack(side="left", fill="both", expand=True)
-
-        # Scrollbar for Treeview
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
+        # Tabella letta a pagine, con un filtro per colonna: le modifiche aggiornano solo le righe cambiate
+        self.grid_view = CatalogGrid(self, "edges", EDGE_COLUMNS, self._edge_values,
+                                     on_activate=lambda row: self.open_edit_edge_dialog())
+        self.grid_view.pack(pady=10, padx=10, fill="both", expand=True)
 
         # Frame for buttons
         button_frame = ttk.Frame(self)
@@ -44,56 +35,61 @@ class EdgesManager(tk.Toplevel):
         edit_button = ttk.Button(button_frame, text="Modifica Selezionato", command=self.open_edit_edge_dialog)
         edit_button.pack(side="left", padx=5)
 
-        delete_button = ttk.Button(button_frame, text="Elimina Selezionato", command=self.delete_selected_edge)
-        delete_button.pack(side="left", padx=5)
-
-        self.load_edge_types()
+        self.delete_button = ttk.Button(button_frame, text="Elimina Selezionato", command=self.delete_selected_edge)
+        self.delete_button.pack(side="left", padx=5)
 
         self.transient(parent) # Keep this window on top of the main window
         self.grab_set() # Modal behavior
 
-    def load_edge_types(self):
-        """Carica i tipi di bordo dal database e li visualizza nella Treeview."""
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        edge_types = database.get_all_edge_types()
-        for et in edge_types:
-            material_name = et['material_name'] if et['material_name'] else "Generico"
-            thickness = et['thickness'] if et['thickness'] is not None else "Generico"
-            self.tree.insert("", "end", values=(et['id'], et['edge_type'], material_name, thickness, f"{et['price_per_lm']:.2f}"))
+    def _edge_values(self, et):
+        material_name = et['material_name'] if et['material_name'] else "Generico"
+        thickness = et['thickness'] if et['thickness'] is not None else "Generico"
+        return (et['id'], et['edge_type'], material_name, thickness, f"{et['price_per_lm']:.2f}")
+
+    def refresh_catalog_changes(self):
+        """Aggiorna l'elenco con le sole righe cambiate (dopo una modifica, anche da un'altra postazione)."""
+        self.grid_view.refresh_catalog_changes()
+
+    def reload_catalog(self):
+        """Ricarica l'elenco da capo (es. dopo il ripristino di un backup)."""
+        self.grid_view.reload()
 
     def open_add_edge_dialog(self):
         """Apre la finestra di dialogo per aggiungere un nuovo tipo di bordo."""
-        EdgeDialog(self, "Aggiungi Nuovo Tipo Bordo", self.load_edge_types)
+        EdgeDialog(self, "Aggiungi Nuovo Tipo Bordo", self.refresh_catalog_changes)
 
     def open_edit_edge_dialog(self):
         """Apre la finestra di dialogo per modificare il tipo di bordo selezionato."""
-        selected_item = self.tree.selection()
-        if not selected_item:
+        edge = self.grid_view.selected_row()
+        if edge is None:
             messagebox.showwarning("Nessuna Selezione", "Seleziona un tipo di bordo da modificare.", parent=self)
             return
-        
-        item_values = self.tree.item(selected_item[0], 'values')
-        edge_id = item_values[0]
-        EdgeDialog(self, "Modifica Tipo Bordo", self.load_edge_types, edge_id=edge_id)
+        EdgeDialog(self, "Modifica Tipo Bordo", self.refresh_catalog_changes, edge_id=edge['id'])
 
     def delete_selected_edge(self):
         """Elimina il tipo di bordo selezionato dal database."""
-        selected_item = self.tree.selection()
-        if not selected_item:
+        edge = self.grid_view.selected_row()
+        if edge is None:
             messagebox.showwarning("Nessuna Selezione", "Seleziona un tipo di bordo da eliminare.", parent=self)
             return
 
-        item_values = self.tree.item(selected_item[0], 'values')
-        edge_id = item_values[0]
-        edge_name = item_values[1]
+        if messagebox.askyesno("Conferma Eliminazione", f"Sei sicuro di voler eliminare il tipo di bordo '{edge['edge_type']}'?", parent=self):
+            # Eliminato nel thread del database; fino alla risposta non si può eliminare di nuovo
+            self.delete_button.configure(state="disabled")
+            db_worker.when_done(self, database.delete_edge_type_async(edge['id']), self._on_edge_deleted,
+                                self._on_delete_error)
+
+    def _on_edge_deleted(self, deleted):
+        self.delete_button.configure(state="normal")
+        if deleted:
+            messagebox.showinfo("Successo", "Tipo di bordo eliminato con successo.", parent=self)
+            self.refresh_catalog_changes()
+        else:
+            messagebox.showerror("Errore", "Impossibile eliminare il tipo di bordo.", parent=self)
 
-        if messagebox.askyesno("Conferma Eliminazione", f"Sei sicuro di voler eliminare il tipo di bordo '{edge_name}'?", parent=self):
-            if database.delete_edge_type(edge_id):
-                messagebox.showinfo("Successo", "Tipo di bordo eliminato con successo.", parent=self)
-                self.load_edge_types()
-            else:
-                messagebox.showerror("Errore", "Impossibile eliminare il tipo di bordo.", parent=self)
+    def _on_delete_error(self, error):
+        self.delete_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Impossibile eliminare il tipo di bordo: {error}", parent=self)
 
 class EdgeDialog(tk.Toplevel):
     def __init__(self, parent, title, callback_on_save, edge_id=None):
@@ -124,32 +120,40 @@ class EdgeDialog(tk.Toplevel):
         self.price_entry = ttk.Entry(self, textvariable=self.price_var, width=10)
         self.price_entry.grid(row=3, column=1, padx=5, pady=5, sticky="w")
 
-        # Load data if editing
-        if self.edge_id:
-            self.load_edge_data()
-
         # Buttons
         button_frame = ttk.Frame(self)
         button_frame.grid(row=4, column=0, columnspan=2, pady=10)
 
-        save_button = ttk.Button(button_frame, text="Salva", command=self.save_edge)
-        save_button.pack(side="left", padx=5)
+        self.save_button = ttk.Button(button_frame, text="Salva", command=self.save_edge)
+        self.save_button.pack(side="left", padx=5)
         cancel_button = ttk.Button(button_frame, text="Annulla", command=self.destroy)
         cancel_button.pack(side="left", padx=5)
 
+        # Load data if editing
+        if self.edge_id:
+            self.load_edge_data()
+
         self.grid_columnconfigure(1, weight=1)
         self.transient(parent)
         self.grab_set()
         self.edge_type_entry.focus_set()
 
     def load_edge_data(self):
-        edge = database.get_edge_by_id(self.edge_id)
+        # Letto nel thread del database; fino all'arrivo dei dati non si può salvare
+        self.save_button.configure(state="disabled")
+        db_worker.when_done(self, database.get_edge_by_id_async(self.edge_id), self._on_edge_loaded, self._on_load_error)
+
+    def _on_edge_loaded(self, edge):
+        self.save_button.configure(state="normal")
         if edge:
             self.edge_type_var.set(edge['edge_type'])
             self.material_name_var.set(edge['material_name'] or "")
             self.thickness_var.set(str(edge['thickness']) if edge['thickness'] is not None else "")
             self.price_var.set(f"{edge['price_per_lm']:.2f}")
 
+    def _on_load_error(self, error):
+        messagebox.showerror("Errore Database", f"Impossibile caricare il tipo di bordo: {error}", parent=self)
+
     def save_edge(self):
         edge_type = self.edge_type_var.get().strip()
         material_name = self.material_name_var.get().strip() or None
@@ -178,14 +182,23 @@ class EdgeDialog(tk.Toplevel):
                 messagebox.showerror("Errore Validazione", "Lo spessore deve essere un numero valido (es. 2.0) o lasciato vuoto.", parent=self)
                 return
 
+        # Salvato nel thread del database; fino alla risposta il pulsante Salva resta disattivato
+        self.save_button.configure(state="disabled")
         if self.edge_id:
-            success = database.update_edge_type(self.edge_id, edge_type, price, material_name, thickness)
-            action = "aggiornato"
+            future = database.update_edge_type_async(self.edge_id, edge_type, price, material_name, thickness)
+            db_worker.when_done(self, future, lambda success: self._on_edge_saved(success, "aggiornato"),
+                                self._on_save_error)
         else:
-            new_id = database.add_edge_type(edge_type, price, material_name, thickness)
-            success = new_id is not None
-            action = "aggiunto"
+            future = database.add_edge_type_async(edge_type, price, material_name, thickness)
+            db_worker.when_done(self, future, lambda new_id: self._on_edge_saved(new_id is not None, "aggiunto"),
+                                self._on_save_error)
+
+    def _on_save_error(self, error):
+        self.save_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Impossibile salvare il tipo di bordo: {error}", parent=self)
 
+    def _on_edge_saved(self, success, action):
+        self.save_button.configure(state="normal")
         if success:
             messagebox.showinfo("Successo", f"Tipo di bordo {action} con successo.", parent=self.parent)
             self.callback_on_save()
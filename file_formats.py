@@ -0,0 +1,398 @@
+import csv
+import json
+import os
+
+import openpyxl
+import xlrd
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib import colors
+from reportlab.lib.units import cm
+
+import database
+import money
+
+# Lettura e scrittura dei file senza interfaccia: preventivi (JSON e PDF), distinte di
+# taglio e listini Excel. Le funzioni sollevano eccezioni invece di mostrare messaggi:
+# i messaggi per l'utente sono in utils, la riga di comando è batch_quote.
+
+QUOTE_TABLE_HEADINGS = ["N.", "L (cm)", "W (cm)", "Materiale", "Spess. (cm)", "m²", "€/m²", "Lastra (€)", "Bordi (€)", "Tot. Riga (€)"]
+
+class CutListError(ValueError):
+    """Distinta di taglio non leggibile."""
+
+# --- Preventivi ---
+
+def line_row_values(line):
+    """Valori di una riga del preventivo (quote_engine.QuoteLine) come nella tabella, più l'id della riga."""
+    if line.is_linear:
+        length, width = money.format_units(line.length_tmm, money.TENTHS_MM_PER_M, 2), "LINEAR"
+    else:
+        length = money.format_units(line.length_tmm, money.TENTHS_MM_PER_CM, 1)
+        width = money.format_units(line.width_tmm, money.TENTHS_MM_PER_CM, 1)
+    return (
+        line.quantity,
+        length,
+        width,
+        line.material_name,
+        str(line.thickness) if line.thickness is not None else "N/A",
+        money.format_mq(line.mq_units),
+        money.format_price(line.price_units),
+        money.format_cents(line.slab_cents),
+        money.format_cents(line.edges_cents),
+        money.format_cents(line.total_cents),
+        line.line_id
+    )
+
+def line_data_from_row_values(values):
+    """Riga nel formato di database.save_quote dai valori della tabella salvati in un file JSON (senza i singoli bordi).
+
+    Misure e importi restano stringhe: QuoteEngine.add_line_data li converte in unità
+    intere senza passare dai float.
+    """
+    is_linear = values[2] == "LINEAR"
+    return {
+        'is_linear': is_linear,
+        'quantity': int(values[0]),
+        'length_cm': str(values[1]),
+        'width_cm': None if is_linear else str(values[2]),
+        'material_name': values[3],
+        'thickness': None if values[4] in ("", "N/A") else float(values[4]),
+        'mq': str(values[5]),
+        'price': str(values[6]),
+        'slab_cost': str(values[7]),
+        'edges_cost': str(values[8]),
+        'total': str(values[9]),
+    }
+
+def quote_totals_strings(totals):
+    """Totali di quote_engine.QuoteTotals nel formato salvato nei file del preventivo."""
+    return {"mq": money.format_mq(totals.mq_units), "eur": money.format_cents(totals.total_cents)}
+
+def write_quote_pdf(quote_items, totals, filename):
+    """Scrive il preventivo (righe come line_row_values, totali come quote_totals_strings) in un PDF."""
+    doc = SimpleDocTemplate(filename, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = []
+
+    story.append(Paragraph("Preventivo Soglie", styles['h1']))
+    story.append(Spacer(1, 12))
+
+    # Dati tabella con intestazioni corrette (escludendo l'ID)
+    data = [list(QUOTE_TABLE_HEADINGS)]
+
+    for item in quote_items:
+        # Prendi solo i primi 10 valori (escludendo l'ID che è l'ultimo)
+        row_data = list(item[:10])
+        data.append(row_data)
+
+    # Creazione tabella con larghezze colonne ottimizzate
+    table = Table(data, colWidths=[0.8*cm, 1.8*cm, 1.8*cm, 3.5*cm, 1.5*cm, 1.5*cm, 1.5*cm, 1.8*cm, 1.8*cm, 2*cm])
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0,0), (-1,-1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Numeri centrati
+        ('ALIGN', (1, 1), (2, -1), 'RIGHT'),   # Dimensioni allineate a destra
+        ('ALIGN', (5, 1), (-1, -1), 'RIGHT'),  # Valori numerici allineati a destra
+    ])
+    table.setStyle(style)
+    story.append(table)
+    story.append(Spacer(1, 24))
+
+    # Riepilogo
+    story.append(Paragraph(f"<b>Totale m²:</b> {totals['mq']}", styles['Normal']))
+    story.append(Paragraph(f"<b>Totale Importo (€):</b> {totals['eur']}", styles['Normal']))
+
+    doc.build(story)
+
+def write_quote_json(quote_items, totals, filename):
+    """Salva il preventivo nel file JSON che si apre con "Apri Preventivo"."""
+    data_to_save = {
+        "items": quote_items,
+        "totals": totals
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(data_to_save, f, indent=4, ensure_ascii=False)
+
+def read_quote_json(filename):
+    """Legge un preventivo salvato con write_quote_json: (righe, totali)."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get("items", []), data.get("totals", {})
+
+# --- Distinte di taglio ---
+
+# Colonne di una distinta di taglio: nome usato nei dict -> intestazioni accettate
+CUT_LIST_COLUMNS = {
+    'quantity': ('quantity', 'quantita', 'quantità', 'n', 'n.', 'n. soglie'),
+    'length_cm': ('length_cm', 'lunghezza', 'lunghezza (cm)', 'l (cm)'),
+    'width_cm': ('width_cm', 'larghezza', 'larghezza (cm)', 'w (cm)'),
+    'material_name': ('material_name', 'material', 'materiale'),
+    'thickness': ('thickness', 'spessore', 'spessore (cm)', 'spess. (cm)'),
+    'supplier': ('supplier', 'fornitore'),
+    'front': ('edge_front', 'bordo fronte', 'fronte'),
+    'back': ('edge_back', 'bordo retro', 'retro'),
+    'left': ('edge_left', 'bordo sinistra', 'sinistra'),
+    'right': ('edge_right', 'bordo destra', 'destra'),
+}
+CUT_LIST_EXTENSIONS = ('.csv', '.xlsx', '.json')
+
+_CUT_LIST_ALIASES = {alias: key for key, aliases in CUT_LIST_COLUMNS.items() for alias in aliases}
+
+def _cut_list_number(value, cast, row_number, column):
+    if isinstance(value, str):
+        value = value.strip().replace(',', '.')
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise CutListError(f"Riga {row_number}: valore non valido in '{column}': {value!r}") from None
+    if number <= 0:
+        raise CutListError(f"Riga {row_number}: '{column}' deve essere positivo")
+    return number
+
+def _cut_list_row(raw, row_number):
+    """Riga della distinta da un dict con le intestazioni del file (vedi CUT_LIST_COLUMNS)."""
+    row = {}
+    edges = raw.get('edges') or {}
+    for header, value in raw.items():
+        key = _CUT_LIST_ALIASES.get(str(header).strip().lower())
+        if key is not None and value not in (None, ''):
+            row[key] = value.strip() if isinstance(value, str) else value
+    material_name = str(row.get('material_name') or '').strip()
+    if not material_name:
+        raise CutListError(f"Riga {row_number}: materiale mancante")
+    thickness = row.get('thickness')
+    line = {
+        'quantity': _cut_list_number(row.get('quantity', 1), int, row_number, 'quantity'),
+        'length_cm': _cut_list_number(row.get('length_cm'), float, row_number, 'length_cm'),
+        'width_cm': _cut_list_number(row.get('width_cm'), float, row_number, 'width_cm'),
+        'material_name': material_name,
+        'thickness': None if thickness is None else _cut_list_number(thickness, float, row_number, 'thickness'),
+        'supplier': str(row['supplier']) if row.get('supplier') is not None else None,
+        'edges': {},
+    }
+    for side in database.QUOTE_EDGE_SIDES:
+        # Nei file JSON anche come "edges": {lato: tipo} o {lato: {"edge_type": tipo}}
+        edge = row.get(side, edges.get(side))
+        if isinstance(edge, dict):
+            edge = edge.get('edge_type')
+        if edge:
+            line['edges'][side] = str(edge).strip()
+    return line
+
+def _read_csv_rows(filename):
+    with open(filename, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            # I CSV salvati da Excel in italiano usano il punto e virgola
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.DictReader(f, dialect=dialect)
+
+def _read_xlsx_rows(filename):
+    workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        for values in rows:
+            if any(value not in (None, '') for value in values):
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+def _read_json_rows(filename):
+    with open(filename, encoding='utf-8') as f:
+        data = json.load(f)
+    rows = data.get('lines') if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        raise CutListError("Il file JSON deve contenere una lista di righe (o un oggetto con 'lines')")
+    yield from rows
+
+def read_cut_list(filename):
+    """Legge una distinta di taglio CSV, XLSX (primo foglio) o JSON.
+
+    La prima riga (o le chiavi degli oggetti JSON) indica le colonne: quantità, lunghezza
+    e larghezza in cm, materiale e, facoltativi, spessore in cm, fornitore e tipo di bordo
+    di ogni lato (vedi CUT_LIST_COLUMNS). Restituisce una lista di dict con quantity,
+    length_cm, width_cm, material_name, thickness, supplier ed edges ({lato: tipo}).
+    Solleva CutListError se una riga non è valida.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    readers = {'.csv': _read_csv_rows, '.xlsx': _read_xlsx_rows, '.json': _read_json_rows}
+    if extension not in readers:
+        raise CutListError(f"Formato non supportato: {extension or filename} (usare {', '.join(CUT_LIST_EXTENSIONS)})")
+    lines = []
+    # Le righe sono numerate come nel file: la 1 è l'intestazione
+    for row_number, raw in enumerate(readers[extension](filename), start=2):
+        if not isinstance(raw, dict):
+            raise CutListError(f"Riga {row_number}: attesa una riga con le colonne della distinta")
+        lines.append(_cut_list_row(raw, row_number))
+    return lines
+
+# --- Listini Excel ---
+
+def import_materials_from_excel(filepath, progress_callback=None, overwrite_existing=False):
+    """Importa materiali da un file Excel multi-sheet nel database SQLite.
+
+    Ogni foglio è un fornitore; le colonne "CMx" sono i prezzi per spessore. Con
+    overwrite_existing=True i prezzi dei materiali già presenti vengono aggiornati.
+    Restituisce (materiali importati, voci saltate, fogli elaborati); solleva ValueError
+    se il formato non è supportato o il file non ha fogli.
+    """
+    imported_count = 0
+    skipped_count = 0
+    processed_sheets = 0
+
+    if filepath.endswith('.xls'):
+        workbook = xlrd.open_workbook(filepath)
+        sheet_names = workbook.sheet_names()
+    elif filepath.endswith('.xlsx'):
+        workbook = openpyxl.load_workbook(filepath, data_only=True) # data_only=True to get values not formulas
+        sheet_names = workbook.sheetnames
+    else:
+        raise ValueError("Formato file non supportato. Utilizzare .xls o .xlsx")
+
+    total_sheets = len(sheet_names)
+    if total_sheets == 0:
+        raise ValueError("Il file Excel non contiene fogli.")
+
+    for sheet_index, supplier_name in enumerate(sheet_names):
+        if progress_callback:
+            # Update progress based on sheets processed, and then rows within a sheet
+            progress_callback((sheet_index / total_sheets) * 100) # Initial progress for starting a new sheet
+
+        if filepath.endswith('.xls'):
+            sheet = workbook.sheet_by_name(supplier_name)
+            # Find the header row (e.g., containing 'nome' or 'Nome Materiale')
+            header_row_idx = -1
+            for r_idx in range(sheet.nrows):
+                row_values = [str(sheet.cell_value(r_idx, c_idx)).strip().lower() for c_idx in range(sheet.ncols)]
+                if "nome" in row_values or "nome materiale" in row_values:
+                    header_row_idx = r_idx
+                    break
+            if header_row_idx == -1:
+                print(f"Foglio '{supplier_name}': Intestazione non trovata. Salto.")
+                skipped_count += sheet.nrows # Approximate skipped rows
+                continue
+
+            header = [str(sheet.cell_value(header_row_idx, col)).strip() for col in range(sheet.ncols)]
+            data_rows = (sheet.row_values(row_idx) for row_idx in range(header_row_idx + 1, sheet.nrows))
+            current_sheet_total_rows = sheet.nrows - (header_row_idx + 1)
+
+        elif filepath.endswith('.xlsx'):
+            sheet = workbook[supplier_name]
+            header_row_idx = -1
+            for r_idx, row in enumerate(sheet.iter_rows(values_only=True)):
+                row_values = [str(cell).strip().lower() if cell is not None else "" for cell in row]
+                if "nome" in row_values or "nome materiale" in row_values:
+                    header_row_idx = r_idx
+                    break
+            if header_row_idx == -1:
+                print(f"Foglio '{supplier_name}': Intestazione non trovata. Salto.")
+                skipped_count += sheet.max_row # Approximate skipped rows
+                continue
+
+            # Get header row values more robustly
+            header_values_generator = sheet.iter_rows(min_row=header_row_idx + 1, max_row=header_row_idx + 1, values_only=True)
+            header = []
+            for row_tuple in header_values_generator: # Should be only one row_tuple
+                header = [str(cell).strip() if cell is not None else "" for cell in row_tuple]
+                break # exit after processing the header row
+
+            data_rows = sheet.iter_rows(min_row=header_row_idx + 2, values_only=True)
+            current_sheet_total_rows = sheet.max_row - (header_row_idx + 1)
+
+        if not header or not any(h.lower() == "nome materiale" or h.lower() == "nome" for h in header):
+            print(f"Foglio '{supplier_name}': Colonna 'Nome Materiale' non trovata nell'intestazione. Salto.")
+            skipped_count += current_sheet_total_rows
+            continue
+
+        try:
+            name_col_idx = next(i for i, h in enumerate(header) if h.lower() == "nome materiale" or h.lower() == "nome")
+        except StopIteration:
+            print(f"Foglio '{supplier_name}': Indice colonna 'Nome Materiale' non trovato. Salto.")
+            skipped_count += current_sheet_total_rows
+            continue
+
+        # Identify thickness columns (e.g., CM2, CM3, CM40)
+        # Chiave in millimetri interi: "CM2" e "CM2,0" sono lo stesso spessore
+        thickness_price_cols = {}
+        for col_idx, col_name in enumerate(header):
+            if col_name.upper().startswith("CM") and col_idx != name_col_idx:
+                try:
+                    # Extract numeric part of thickness from CM<number>
+                    thickness_mm = database.thickness_to_mm(col_name[2:])
+                    if thickness_mm is None:
+                        raise ValueError(col_name)
+                    thickness_price_cols[thickness_mm] = col_idx
+                except ValueError:
+                    print(f"Foglio '{supplier_name}': Formato spessore non valido in colonna '{col_name}'. Salto colonna.")
+
+        if not thickness_price_cols:
+            print(f"Foglio '{supplier_name}': Nessuna colonna spessore (CMx) trovata o valida. Salto foglio.")
+            skipped_count += current_sheet_total_rows
+            continue
+
+        sheet_skipped_count = 0
+        sheet_materials = []
+        for i, row_data in enumerate(data_rows):
+            if progress_callback:
+                # Update progress for rows within the current sheet
+                sheet_progress = ((i + 1) / current_sheet_total_rows) * (100 / total_sheets) # Progress within this sheet's share
+                base_progress = (sheet_index / total_sheets) * 100
+                progress_callback(base_progress + sheet_progress)
+
+            material_name = str(row_data[name_col_idx]).strip() if row_data[name_col_idx] else None
+
+            if not material_name:
+                sheet_skipped_count += len(thickness_price_cols) # Skipping all potential entries for this row
+                continue
+
+            for thickness_mm, price_col_idx in thickness_price_cols.items():
+                if price_col_idx >= len(row_data) or row_data[price_col_idx] is None or str(row_data[price_col_idx]).strip() == "":
+                    # No price for this thickness, skip this specific material-thickness combination
+                    sheet_skipped_count += 1
+                    continue
+
+                price_str = str(row_data[price_col_idx]).replace(',', '.').replace('€', '').strip()
+
+                try:
+                    price = float(price_str)
+                except ValueError:
+                    print(f"Foglio '{supplier_name}', Materiale '{material_name}', Spessore '{database.thickness_from_mm(thickness_mm)}': Prezzo non valido '{price_str}'. Salto.")
+                    sheet_skipped_count += 1
+                    continue
+
+                # Description is not part of this specific Excel structure, so pass empty or None
+                sheet_materials.append({
+                    'name': material_name,
+                    'price_per_sqm': price,
+                    'thickness_mm': thickness_mm,
+                    'description': "",
+                    'supplier': supplier_name
+                })
+
+        # Tutto il foglio in un'unica transazione
+        outcome = database.add_materials_bulk(sheet_materials, overwrite_existing=overwrite_existing)
+        sheet_imported_count = outcome['inserted'] + outcome['updated']
+        sheet_skipped_count += outcome['skipped']
+
+        imported_count += sheet_imported_count
+        skipped_count += sheet_skipped_count
+        processed_sheets += 1
+        print(f"Foglio '{supplier_name}': Importati {sheet_imported_count}, Saltati {sheet_skipped_count}")
+
+    if progress_callback:
+        progress_callback(100) # Ensure progress reaches 100%
+
+    return imported_count, skipped_count, processed_sheets
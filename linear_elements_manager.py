@@ -1,6 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import database
+import db_worker
+from catalog_grid import CatalogGrid
+
+# (colonna di database.get_catalog_rows, intestazione, larghezza, allineamento)
+LINEAR_ELEMENT_COLUMNS = [
+    ("element_type", "Tipo Elemento", 200, "w"),
+    ("material_name", "Materiale", 200, "w"),
+    ("price_per_lm", "Prezzo €/ml", 100, "e"),
+    ("description", "Descrizione", 250, "w"),
+]
 
 class LinearElementsManager(tk.Toplevel):
     def __init__(self, parent):
@@ -15,7 +25,6 @@ class LinearElementsManager(tk.Toplevel):
         self.grab_set()
         
         self.create_widgets()
-        self.load_linear_elements()
         
         # Centra la finestra
         self.center_window()
@@ -83,33 +92,10 @@ class LinearElementsManager(tk.Toplevel):
         list_frame = ttk.LabelFrame(main_frame, text="Elementi Lineari", padding="10")
         list_frame.pack(fill="both", expand=True)
         
-        # Treeview per mostrare gli elementi
-        columns = ("tipo", "materiale", "prezzo", "descrizione")
-        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
-        
-        # Definisci le intestazioni
-        self.tree.heading("tipo", text="Tipo Elemento")
-        self.tree.heading("materiale", text="Materiale")
-        self.tree.heading("prezzo", text="Prezzo €/ml")
-        self.tree.heading("descrizione", text="Descrizione")
-        
-        # Definisci le larghezze delle colonne
-        self.tree.column("tipo", width=200)
-        self.tree.column("materiale", width=200)
-        self.tree.column("prezzo", width=100, anchor="e")
-        self.tree.column("descrizione", width=250)
-        
-        # Scrollbar per la treeview
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack della treeview e scrollbar
-        self.tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
-        # Bind eventi
-        self.tree.bind("<<TreeviewSelect>>", self.on_select)
-        self.tree.bind("<Double-1>", self.on_double_click)
+        # Tabella letta a pagine, con un filtro per colonna: le modifiche aggiornano solo le righe cambiate
+        self.grid_view = CatalogGrid(list_frame, "linear_elements", LINEAR_ELEMENT_COLUMNS, self._element_values,
+                                     on_select=self.on_select, on_activate=self.on_double_click)
+        self.grid_view.pack(fill="both", expand=True)
         
         # Frame per i pulsanti di chiusura
         close_frame = ttk.Frame(main_frame)
@@ -121,125 +107,141 @@ class LinearElementsManager(tk.Toplevel):
         self.load_materials()
         
     def load_materials(self):
-        """Carica i materiali nel combobox."""
-        materials = database.get_all_materials()
+        """Carica i materiali nel combobox (letti nel thread del database)."""
+        db_worker.when_done(self, database.get_all_materials_async(), self._on_materials_loaded, self._on_materials_error,
+                            key="materials")
+
+    def _on_materials_loaded(self, materials):
         material_names = [f"{mat['name']} ({mat['thickness'] if mat['thickness'] else 'N/A'} cm)" for mat in materials]
         self.material_combobox['values'] = sorted(material_names)
-        
-    def load_linear_elements(self):
-        """Carica gli elementi lineari dalla tabella edges con filtro per tipo."""
-        # Pulisci la treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        # Carica gli elementi lineari (usiamo la tabella edges con una convenzione)
-        # Gli elementi lineari avranno edge_type che inizia con "LINEAR_"
-        edges = database.get_all_edge_types()
-        for edge in edges:
-            if edge['edge_type'].startswith('LINEAR_'):
-                # Rimuovi il prefisso LINEAR_ per la visualizzazione
-                element_type = edge['edge_type'][7:]  # Rimuovi "LINEAR_"
-                material_display = f"{edge['material_name'] or 'Generico'}"
-                if edge['thickness']:
-                    material_display += f" ({edge['thickness']} cm)"
-                
-                self.tree.insert("", "end", values=(
-                    element_type,
-                    material_display,
-                    f"{edge['price_per_lm']:.2f}",
-                    ""  # Descrizione vuota per ora
-                ), tags=(edge['id'],))
+
+    def _on_materials_error(self, error):
+        messagebox.showerror("Errore Database", f"Impossibile caricare i materiali: {error}", parent=self)
+        
+    def _material_display(self, element):
+        material_display = f"{element['material_name'] or 'Generico'}"
+        if element['thickness']:
+            material_display += f" ({element['thickness']} cm)"
+        return material_display
+
+    def _element_values(self, element):
+        return (element['element_type'], self._material_display(element),
+                f"{element['price_per_lm']:.2f}", element['description'] or "")
+
+    def refresh_catalog_changes(self):
+        """Aggiorna l'elenco con le sole righe cambiate (dopo una modifica, anche da un'altra postazione)."""
+        self.grid_view.refresh_catalog_changes()
+
+    def reload_catalog(self):
+        """Ricarica l'elenco da capo (es. dopo il ripristino di un backup)."""
+        self.grid_view.reload()
+        self.load_materials()
                 
     def add_linear_element(self):
         """Aggiunge un nuovo elemento lineare."""
         if not self.validate_input():
             return
             
-        element_type = f"LINEAR_{self.element_type_var.get().strip()}"
+        element_type = self.element_type_var.get().strip()
         material_name = self.extract_material_name()
         thickness = self.extract_material_thickness()
         price = float(self.price_var.get().replace(',', '.'))
-        
-        try:
-            result = database.add_edge_type(
-                edge_type=element_type,
-                price_per_lm=price,
-                material_name=material_name,
-                thickness=thickness
-            )
-            
-            if result:
-                messagebox.showinfo("Successo", "Elemento lineare aggiunto con successo!")
-                self.clear_fields()
-                self.load_linear_elements()
-            else:
-                messagebox.showerror("Errore", "Elemento lineare già esistente!")
-                
-        except Exception as e:
-            messagebox.showerror("Errore", f"Errore durante l'aggiunta: {e}")
-            
+        description = self.description_var.get().strip()
+        
+        self._start_write(database.add_linear_element_async(
+            element_type=element_type,
+            price_per_lm=price,
+            material_name=material_name,
+            thickness=thickness,
+            description=description
+        ), self._on_element_added, "Errore durante l'aggiunta")
+
+    def _on_element_added(self, result):
+        if result:
+            messagebox.showinfo("Successo", "Elemento lineare aggiunto con successo!")
+            self.clear_fields()
+            self.refresh_catalog_changes()
+        else:
+            messagebox.showerror("Errore", "Elemento lineare già esistente!")
+
     def update_linear_element(self):
         """Modifica l'elemento lineare selezionato."""
-        selected = self.tree.selection()
-        if not selected:
+        selected = self.grid_view.selected_row()
+        if selected is None:
             return
             
         if not self.validate_input():
             return
             
-        item = selected[0]
-        edge_id = self.tree.item(item, "tags")[0]
+        element_id = selected['id']
         
-        element_type = f"LINEAR_{self.element_type_var.get().strip()}"
+        element_type = self.element_type_var.get().strip()
         material_name = self.extract_material_name()
         thickness = self.extract_material_thickness()
         price = float(self.price_var.get().replace(',', '.'))
-        
-        try:
-            success = database.update_edge_type(
-                edge_id=edge_id,
-                edge_type=element_type,
-                price_per_lm=price,
-                material_name=material_name,
-                thickness=thickness
-            )
-            
-            if success:
-                messagebox.showinfo("Successo", "Elemento lineare modificato con successo!")
-                self.clear_fields()
-                self.load_linear_elements()
-                self.update_button.config(state="disabled")
-                self.delete_button.config(state="disabled")
-            else:
-                messagebox.showerror("Errore", "Errore durante la modifica!")
-                
-        except Exception as e:
-            messagebox.showerror("Errore", f"Errore durante la modifica: {e}")
-            
+        description = self.description_var.get().strip()
+        
+        self._start_write(database.update_linear_element_async(
+            element_id=element_id,
+            element_type=element_type,
+            price_per_lm=price,
+            material_name=material_name,
+            thickness=thickness,
+            description=description
+        ), self._on_element_updated, "Errore durante la modifica")
+
+    def _on_element_updated(self, success):
+        if success:
+            messagebox.showinfo("Successo", "Elemento lineare modificato con successo!")
+            self.clear_fields()
+            self.refresh_catalog_changes()
+            self.update_button.config(state="disabled")
+            self.delete_button.config(state="disabled")
+        else:
+            messagebox.showerror("Errore", "Errore durante la modifica!")
+
     def delete_linear_element(self):
         """Elimina l'elemento lineare selezionato."""
-        selected = self.tree.selection()
-        if not selected:
+        selected = self.grid_view.selected_row()
+        if selected is None:
             return
             
         if messagebox.askyesno("Conferma", "Sei sicuro di voler eliminare questo elemento lineare?"):
-            item = selected[0]
-            edge_id = self.tree.item(item, "tags")[0]
-            
-            try:
-                success = database.delete_edge_type(edge_id)
-                if success:
-                    messagebox.showinfo("Successo", "Elemento lineare eliminato con successo!")
-                    self.clear_fields()
-                    self.load_linear_elements()
-                    self.update_button.config(state="disabled")
-                    self.delete_button.config(state="disabled")
-                else:
-                    messagebox.showerror("Errore", "Errore durante l'eliminazione!")
-                    
-            except Exception as e:
-                messagebox.showerror("Errore", f"Errore durante l'eliminazione: {e}")
-                
+            self._start_write(database.delete_linear_element_async(selected['id']), self._on_element_deleted,
+                              "Errore durante l'eliminazione")
+
+    def _on_element_deleted(self, success):
+        if success:
+            messagebox.showinfo("Successo", "Elemento lineare eliminato con successo!")
+            self.clear_fields()
+            self.refresh_catalog_changes()
+            self.update_button.config(state="disabled")
+            self.delete_button.config(state="disabled")
+        else:
+            messagebox.showerror("Errore", "Errore durante l'eliminazione!")
+
+    def _start_write(self, future, on_success, error_message):
+        """Consegna a on_success il risultato di una scrittura nel thread del database.
+
+        Fino alla risposta i pulsanti Aggiungi, Modifica ed Elimina restano disattivati.
+        """
+        for button in (self.add_button, self.update_button, self.delete_button):
+            button.config(state="disabled")
+
+        def on_done(result):
+            self._end_write()
+            on_success(result)
+
+        def on_error(error):
+            self._end_write()
+            messagebox.showerror("Errore", f"{error_message}: {error}")
+
+        db_worker.when_done(self, future, on_done, on_error)
+
+    def _end_write(self):
+        self.add_button.config(state="normal")
+        self.on_select()
+
     def validate_input(self):
         """Valida l'input dell'utente."""
         if not self.element_type_var.get().strip():
@@ -259,7 +261,7 @@ class LinearElementsManager(tk.Toplevel):
     def extract_material_name(self):
         """Estrae il nome del materiale dal combobox."""
         material_text = self.material_var.get()
-        if not material_text:
+        if not material_text or material_text == "Generico":
             return None
         # Estrai il nome prima della parentesi
         return material_text.split(' (')[0] if ' (' in material_text else material_text
@@ -285,25 +287,19 @@ class LinearElementsManager(tk.Toplevel):
         self.price_var.set("")
         self.description_var.set("")
         
-    def on_select(self, event):
-        """Gestisce la selezione di un elemento nella treeview."""
-        selected = self.tree.selection()
-        if selected:
+    def on_select(self):
+        """Gestisce la selezione di un elemento nella tabella."""
+        if self.grid_view.selected_row() is not None:
             self.update_button.config(state="normal")
             self.delete_button.config(state="normal")
         else:
             self.update_button.config(state="disabled")
             self.delete_button.config(state="disabled")
             
-    def on_double_click(self, event):
+    def on_double_click(self, element):
         """Gestisce il doppio click su un elemento per modificarlo."""
-        selected = self.tree.selection()
-        if selected:
-            item = selected[0]
-            values = self.tree.item(item, "values")
-            
-            # Popola i campi con i valori selezionati
-            self.element_type_var.set(values[0])
-            self.material_var.set(values[1])
-            self.price_var.set(values[2])
-            self.description_var.set(values[3])
\ No newline at end of file
+        # Popola i campi con i valori selezionati
+        self.element_type_var.set(element['element_type'])
+        self.material_var.set(self._material_display(element))
+        self.price_var.set(f"{element['price_per_lm']:.2f}")
+        self.description_var.set(element['description'] or "")
\ No newline at end of file
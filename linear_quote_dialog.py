@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import database
+import db_worker
+import money
 
 class LinearQuoteDialog(tk.Toplevel):
     def __init__(self, parent):
@@ -88,18 +90,20 @@ class LinearQuoteDialog(tk.Toplevel):
         list_frame.pack(fill="both", expand=True, pady=(0, 10))
         
         # Treeview per mostrare gli elementi disponibili
-        columns = ("tipo", "materiale", "prezzo")
+        columns = ("tipo", "materiale", "prezzo", "descrizione")
         self.tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=6)
         
         # Definisci le intestazioni
         self.tree.heading("tipo", text="Tipo Elemento")
         self.tree.heading("materiale", text="Materiale")
         self.tree.heading("prezzo", text="Prezzo €/ml")
+        self.tree.heading("descrizione", text="Descrizione")
         
         # Definisci le larghezze delle colonne
-        self.tree.column("tipo", width=200)
-        self.tree.column("materiale", width=200)
-        self.tree.column("prezzo", width=100, anchor="e")
+        self.tree.column("tipo", width=160)
+        self.tree.column("materiale", width=160)
+        self.tree.column("prezzo", width=90, anchor="e")
+        self.tree.column("descrizione", width=200)
         
         # Scrollbar per la treeview
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
@@ -143,34 +147,39 @@ class LinearQuoteDialog(tk.Toplevel):
         help_label.pack(anchor="w")
         
     def load_linear_elements(self):
-        """Carica gli elementi lineari disponibili."""
+        """Carica gli elementi lineari disponibili (letti nel thread del database)."""
+        db_worker.when_done(self, database.get_all_linear_elements_async(), self._on_linear_elements_loaded,
+                            self._on_linear_elements_error, key="linear_elements")
+
+    def _on_linear_elements_loaded(self, elements):
         # Pulisci la treeview
         for item in self.tree.get_children():
             self.tree.delete(item)
             
-        # Carica gli elementi lineari
-        edges = database.get_all_edge_types()
+        # Carica gli elementi lineari dalla tabella dedicata
         element_options = []
         
-        for edge in edges:
-            if edge['edge_type'].startswith('LINEAR_'):
-                # Rimuovi il prefisso LINEAR_ per la visualizzazione
-                element_type = edge['edge_type'][7:]
-                material_display = f"{edge['material_name'] or 'Generico'}"
-                if edge['thickness']:
-                    material_display += f" ({edge['thickness']} cm)"
-                
-                display_name = f"{element_type} - {material_display}"
-                element_options.append(display_name)
-                
-                self.tree.insert("", "end", values=(
-                    element_type,
-                    material_display,
-                    f"{edge['price_per_lm']:.2f}"
-                ), tags=(edge['id'], edge['price_per_lm']))
+        for element in elements:
+            element_type = element['element_type']
+            material_display = f"{element['material_name'] or 'Generico'}"
+            if element['thickness']:
+                material_display += f" ({element['thickness']} cm)"
+            
+            display_name = f"{element_type} - {material_display}"
+            element_options.append(display_name)
+            
+            self.tree.insert("", "end", values=(
+                element_type,
+                material_display,
+                f"{element['price_per_lm']:.2f}",
+                element['description'] or ""
+            ), tags=(element['id'], element['price_per_lm']))
                 
         # Aggiorna il combobox
         self.element_combobox['values'] = sorted(element_options)
+
+    def _on_linear_elements_error(self, error):
+        messagebox.showerror("Errore Database", f"Impossibile caricare gli elementi lineari: {error}", parent=self)
         
     def on_element_selected(self, event):
         """Gestisce la selezione di un elemento dal combobox."""
@@ -221,15 +230,16 @@ class LinearQuoteDialog(tk.Toplevel):
     def calculate_total(self, *args):
         """Calcola il costo totale."""
         try:
-            quantity = float(self.quantity_var.get() or "0")
-            length = float(self.length_var.get().replace(',', '.') or "0")
-            price = float(self.price_var.get() or "0")
+            quantity = int(self.quantity_var.get() or "0")
+            length_tmm = money.tenths_mm_from_m(self.length_var.get() or "0")
+            price_units = money.price_units(self.price_var.get() or "0")
             
-            total = quantity * length * price
-            self.total_cost_var.set(f"{total:.2f}")
+            # Stesso calcolo di quote_engine.add_linear
+            total_cents = money.length_cost_cents(length_tmm, price_units, quantity)
+            self.total_cost_var.set(money.format_cents(total_cents))
             
             # Cambia il colore del totale se è valido
-            if total > 0:
+            if total_cents > 0:
                 self.total_cost_label.configure(foreground="green")
             else:
                 self.total_cost_label.configure(foreground="black")
@@ -247,42 +257,11 @@ class LinearQuoteDialog(tk.Toplevel):
             quantity = int(self.quantity_var.get())
             length = float(self.length_var.get().replace(',', '.'))
             price = float(self.price_var.get())
-            total_cost = float(self.total_cost_var.get())
             element_type = self.element_var.get()
             notes = self.notes_var.get().strip()
             
-            # Genera un ID univoco per la riga lineare
-            row_id = f"linear_{len(self.parent.quote_tree.get_children())}_{element_type.replace(' ','_').replace('-','_')}"
-            
-            # Aggiungi alla Treeview del preventivo principale
-            # Formato: (Quantità, Lunghezza, Larghezza, Materiale, Spessore, MQ, Prezzo/MQ, Costo Lastra, Costo Bordi, Totale, ID)
-            # Per elementi lineari: Quantità=quantità, Lunghezza=lunghezza ml, Larghezza="LINEAR", Materiale=tipo elemento
-            self.parent.quote_tree.insert("", "end", iid=row_id, values=(
-                quantity,
-                f"{length:.2f}",
-                "LINEAR",  # Indica che è un elemento lineare
-                element_type,
-                "N/A",  # Spessore non applicabile
-                f"{quantity * length:.4f}",  # Usiamo questo campo per i metri lineari totali
-                f"{price:.2f}",  # Prezzo per metro lineare
-                "0.00",  # Costo lastra non applicabile
-                "0.00",  # Costo bordi non applicabile
-                f"{total_cost:.2f}",  # Costo totale
-                row_id
-            ))
-            
-            # Inizializza i dettagli dei bordi (vuoti per elementi lineari)
-            if not hasattr(self.parent, 'edge_details_map'):
-                self.parent.edge_details_map = {}
-            self.parent.edge_details_map[row_id] = {
-                'front': {'active': False, 'type': '', 'length_cm': 0, 'price_lm': 0, 'cost': 0},
-                'back': {'active': False, 'type': '', 'length_cm': 0, 'price_lm': 0, 'cost': 0},
-                'left': {'active': False, 'type': '', 'length_cm': 0, 'price_lm': 0, 'cost': 0},
-                'right': {'active': False, 'type': '', 'length_cm': 0, 'price_lm': 0, 'cost': 0},
-                'total_edge_cost': 0.0,
-                'is_linear': True,  # Flag per identificare elementi lineari
-                'notes': notes
-            }
+            # Aggiungi al preventivo principale: quote_engine calcola il costo e aggiorna la tabella
+            self.parent.quote_engine.add_linear(quantity, length, element_type, price, notes)
             
             # Segna che l'elemento è stato aggiunto
             self.element_added = True
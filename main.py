@@ -1,12 +1,26 @@
+import os
 import tkinter as tk
-from tkinter import ttk, Menu, messagebox
+from tkinter import ttk, Menu, messagebox, simpledialog
 import database
+import db_worker # Thread del database: letture e scritture non bloccano l'interfaccia
+import backup # Backup del database con l'API di backup di SQLite
 from materials_manager import MaterialsManager
 from edges_manager import EdgesManager # Importa EdgesManager
 import utils # Import the utils module
+import file_formats # Righe del preventivo nei file JSON e PDF
+import catalog_ndjson # Esportazione e importazione del catalogo (NDJSON o vecchio JSON)
+import money # Importi e misure in unità intere
 from edge_editor_dialog import EdgeEditorDialog # Importa la nuova finestra di dialogo
+from edge_profile_dialog import EdgeProfileDialog # Profili dei bordi applicati a più righe
 from linear_elements_manager import LinearElementsManager # Importa il gestore elementi lineari
 from linear_quote_dialog import LinearQuoteDialog # Importa la finestra per elementi lineari nei preventivi
+from quote_archive import QuoteArchive # Archivio dei preventivi salvati nel database
+from quote_engine import QuoteEngine # Righe e totali del preventivo, indipendenti dall'interfaccia
+from quote_grid import QuoteGrid # Tabella del preventivo che mostra solo le righe visibili
+
+MATERIAL_SEARCH_LIMIT = 200 # Risultati mostrati nel menu materiali durante una ricerca
+CATALOG_POLL_MS = 2000 # Ogni quanto si controlla se materiali o bordi sono cambiati (anche da altre postazioni)
+FIRST_SCREEN_LINES = 100 # Righe di un preventivo aperto da file mostrate prima di leggere le altre
 
 class App(tk.Tk):
     def __init__(self):
@@ -16,14 +30,35 @@ class App(tk.Tk):
         self.title("Preventivo Soglie Marmista")
         self.geometry("1000x700") # Increased size
 
-        # Initialize database and tables
-        database.create_tables()
+        # Preventivo dell'archivio attualmente aperto (None = nuovo, non ancora archiviato)
+        self.current_quote_id = None
+        self.current_quote_client = None
+        # Il preventivo è in quote_engine; la tabella quote_grid ne è solo la vista
+        self.quote_engine = QuoteEngine()
+        self._summary_job = None
+        self.material_map = {} # Riempita in background da _load_materials_to_combobox
+        self.catalog_seq = None # Ultima modifica al catalogo già presente in material_map
 
         self._create_menu()
         self._create_ui()
-        self._load_materials_to_combobox()
+        self.quote_engine.subscribe(self._on_quote_changed)
+        # Tabelle e migrazioni nel thread del database: la finestra compare subito, le
+        # letture dell'avvio partono in _on_database_ready
+        db_worker.when_done(self, database.create_tables_async(), self._on_database_ready, self._on_database_error)
         print("App.__init__: Fine")
 
+    def _on_database_ready(self, result=None):
+        # Catalogo prezzi in memoria: caricato in background, nel frattempo si legge da SQLite
+        database.load_price_catalog(background=True)
+        db_worker.when_done(self, database.is_shared_access_async(), self.shared_access_var.set)
+        self._load_materials_to_combobox()
+        self.after(CATALOG_POLL_MS, self._poll_catalog_changes)
+        # Backup automatico (al massimo uno al giorno), in background
+        db_worker.when_done(self, backup.backup_if_due_async(), self._on_auto_backup_done, key="auto_backup")
+
+    def _on_database_error(self, error):
+        messagebox.showerror("Errore Database", f"Impossibile aprire il database: {error}", parent=self)
+
     def _create_menu(self):
         menubar = Menu(self)
         self.config(menu=menubar)
@@ -34,11 +69,23 @@ class App(tk.Tk):
         file_menu.add_command(label="Apri Preventivo...", command=self.open_quote_from_json)
         file_menu.add_command(label="Salva Preventivo...", command=self.save_quote_to_json)
         file_menu.add_separator()
+        file_menu.add_command(label="Salva nell'Archivio...", command=self.save_quote_to_archive)
+        file_menu.add_command(label="Archivio Preventivi...", command=self.open_quote_archive)
+        file_menu.add_separator()
         file_menu.add_command(label="Esporta PDF...", command=self.export_quote_to_pdf)
         file_menu.add_separator()
         file_menu.add_command(label="Esci", command=self.quit)
 
-        gestione_menu = Menu(menubar, tearoff=0)
+        self.edit_menu = Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Modifica", menu=self.edit_menu)
+        self.edit_menu.add_command(label="Annulla", accelerator="Ctrl+Z", command=self.undo_quote_change, state="disabled")
+        self.edit_menu.add_command(label="Ripeti", accelerator="Ctrl+Y", command=self.redo_quote_change, state="disabled")
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label="Profilo Bordi Righe Selezionate...", command=self.open_edge_profiles)
+        self.bind("<Control-z>", lambda event: self.undo_quote_change())
+        self.bind("<Control-y>", lambda event: self.redo_quote_change())
+
+        gestione_menu = self.gestione_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Gestione", menu=gestione_menu)
         gestione_menu.add_command(label="Materiali...", command=self.open_materials_manager)
         gestione_menu.add_command(label="Tipi di Bordo...", command=self.open_edges_manager) # Aggiungi menu per bordi
@@ -48,6 +95,16 @@ class App(tk.Tk):
         gestione_menu.add_separator()
         gestione_menu.add_command(label="Esporta Dati (Materiali e Bordi)...", command=self.export_materials_and_edges)
         gestione_menu.add_command(label="Importa Dati (Materiali e Bordi)...", command=self.import_materials_and_edges)
+        gestione_menu.add_separator()
+        gestione_menu.add_command(label="Backup Database Ora", command=self.backup_database)
+        gestione_menu.add_command(label="Ripristina da Backup...", command=self.restore_database)
+        gestione_menu.add_separator()
+        # Modalità condivisa: più postazioni che usano lo stesso preventivi.db su una cartella di rete
+        # Il valore salvato nel database arriva in _on_database_ready
+        self.shared_access_var = tk.BooleanVar(value=False)
+        gestione_menu.add_checkbutton(label="Database Condiviso in Rete", variable=self.shared_access_var,
+                                      command=self.toggle_shared_access)
+        self.shared_access_index = gestione_menu.index("end")
         print("App._create_menu: Fine")
 
     def _create_ui(self):
@@ -92,45 +149,22 @@ class App(tk.Tk):
         add_row_button = ttk.Button(input_frame, text="Aggiungi Riga", command=self.add_quote_row)
         add_row_button.grid(row=1, column=6, padx=10, pady=5, sticky="e")
 
+        ttk.Label(input_frame, text="Cerca materiale:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.material_search_var = tk.StringVar()
+        self._material_search_job = None
+        material_search_entry = ttk.Entry(input_frame, textvariable=self.material_search_var, width=30)
+        material_search_entry.grid(row=2, column=1, columnspan=3, padx=5, pady=5, sticky="ew")
+        material_search_entry.bind("<KeyRelease>", self.on_material_search_changed)
+
         # --- Quote Table Frame ---
         quote_table_frame = ttk.LabelFrame(main_frame, text="Dettaglio Preventivo", padding="10")
         quote_table_frame.pack(fill="both", expand=True, pady=10)
 
-        self.quote_tree = ttk.Treeview(quote_table_frame, columns=(
-            "num", "lun", "lar", "materiale", "spessore", "mq", "prezzo_mq", "costo_lastra", "costo_bordi", "importo_riga", "id_riga"
-        ), show="headings")
-        
-        self.quote_tree.heading("num", text="N.")
-        self.quote_tree.heading("lun", text="L (cm)")
-        self.quote_tree.heading("lar", text="W (cm)")
-        self.quote_tree.heading("materiale", text="Materiale")
-        self.quote_tree.heading("spessore", text="Spess. (cm)")
-        self.quote_tree.heading("mq", text="m²")
-        self.quote_tree.heading("prezzo_mq", text="€/m²")
-        self.quote_tree.heading("costo_lastra", text="Lastra (€)")
-        self.quote_tree.heading("costo_bordi", text="Bordi (€)")
-        self.quote_tree.heading("importo_riga", text="Tot. Riga (€)")
-        self.quote_tree.column("id_riga", width=0, stretch=tk.NO) # Hidden column for row ID
-
-        self.quote_tree.column("num", width=40, anchor="center")
-        self.quote_tree.column("lun", width=70, anchor="e")
-        self.quote_tree.column("lar", width=70, anchor="e")
-        self.quote_tree.column("materiale", width=150)
-        self.quote_tree.column("spessore", width=80, anchor="e")
-        self.quote_tree.column("mq", width=70, anchor="e")
-        self.quote_tree.column("prezzo_mq", width=70, anchor="e")
-        self.quote_tree.column("costo_lastra", width=80, anchor="e")
-        self.quote_tree.column("costo_bordi", width=80, anchor="e")
-        self.quote_tree.column("importo_riga", width=90, anchor="e")
-
-        self.quote_tree.pack(side="left", fill="both", expand=True)
-        # Aggiungi scrollbar
-        scrollbar = ttk.Scrollbar(quote_table_frame, orient="vertical", command=self.quote_tree.yview)
-        self.quote_tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
-
-        # Aggiungi un listener per il doppio click sulla riga per aprire l'editor dei bordi
-        self.quote_tree.bind("<Double-1>", self.open_edge_editor)
+        # Tabella virtualizzata: mostra solo le righe visibili di quote_engine.
+        # Doppio click (o Invio) su una riga apre l'editor dei bordi
+        self.quote_grid = QuoteGrid(quote_table_frame, self.quote_engine,
+                                    on_activate=lambda line_id: self.open_edge_editor(row_id_to_edit=line_id))
+        self.quote_grid.pack(fill="both", expand=True)
 
         # Frame per i pulsanti sotto la tabella del preventivo
         quote_buttons_frame = ttk.Frame(main_frame)
@@ -148,6 +182,9 @@ class App(tk.Tk):
         self.edit_edges_button = ttk.Button(quote_buttons_frame, text="✂️ Gestisci Bordi Riga Selezionata", command=self.open_edge_editor)
         self.edit_edges_button.pack(side="left", padx=5)
 
+        self.edge_profile_button = ttk.Button(quote_buttons_frame, text="🧩 Profilo Bordi Righe Selezionate", command=self.open_edge_profiles)
+        self.edge_profile_button.pack(side="left", padx=5)
+
         # Riepilogo
         summary_frame = ttk.LabelFrame(main_frame, text="Riepilogo", padding="10")
         summary_frame.pack(fill="x", pady=10)
@@ -170,30 +207,124 @@ class App(tk.Tk):
         summary_frame.columnconfigure(1, weight=1)
         print("App._create_ui: Fine")
 
+    def _material_display_name(self, mat):
+        # Display name: "Name (Thickness cm, Supplier)" - Supplier can be None
+        supplier_str = f", {mat['supplier']}" if mat['supplier'] else ""
+        thickness_str = f"{mat['thickness'] if mat['thickness'] is not None else 'N/A'} cm"
+        return f"{mat['name']} ({thickness_str}{supplier_str})"
+
+    @database.query_scope("Caricamento materiali")
     def _load_materials_to_combobox(self):
         print("App._load_materials_to_combobox: Inizio")
-        materials = database.get_all_materials()
+        # La lettura avviene nel thread del database: la finestra resta reattiva anche con un disco lento
+        db_worker.when_done(self, database.with_catalog_seq_async(database.get_all_materials), self._on_materials_loaded,
+                            self._on_materials_load_error, key="materials")
+
+    def _on_materials_loaded(self, result):
+        self.catalog_seq, materials = result
         # Create a unique display name and map it to the material ID for direct lookup
         self.material_map = {}
         display_names = []
         for mat in materials:
-            # Display name: "Name (Thickness cm, Supplier)" - Supplier can be None
-            supplier_str = f", {mat['supplier']}" if mat['supplier'] else ""
-            thickness_str = f"{mat['thickness'] if mat['thickness'] is not None else 'N/A'} cm"
-            display_name = f"{mat['name']} ({thickness_str}{supplier_str})"
+            display_name = self._material_display_name(mat)
             display_names.append(display_name)
             # Use the unique display name as key, store the full material record
             self.material_map[display_name] = mat 
 
-        self.material_combobox['values'] = sorted(display_names)
+        if self.material_search_var.get().strip():
+            self._run_material_search()
+        else:
+            self._show_material_choices(sorted(display_names), select_first=True)
+        print("App._load_materials_to_combobox: Fine")
+
+    def _on_materials_load_error(self, error):
+        messagebox.showerror("Errore Database", f"Impossibile caricare i materiali: {error}", parent=self)
+
+    def _poll_catalog_changes(self):
+        """Controlla nel thread del database se materiali o bordi sono cambiati e aggiorna le finestre aperte."""
+        db_worker.when_done(self, database.check_catalog_changes_async(), self._on_catalog_checked,
+                            self._on_catalog_check_error, key="catalog_poll")
+
+    def _on_catalog_checked(self, changed):
+        if changed:
+            self.refresh_catalog_changes()
+            # Le finestre di gestione aperte applicano solo le righe cambiate
+            for window in self.winfo_children():
+                if isinstance(window, tk.Toplevel) and hasattr(window, "refresh_catalog_changes"):
+                    window.refresh_catalog_changes()
+        self.after(CATALOG_POLL_MS, self._poll_catalog_changes)
+
+    def _on_catalog_check_error(self, error):
+        print(f"Controllo delle modifiche al catalogo non riuscito: {error}")
+        self.after(CATALOG_POLL_MS, self._poll_catalog_changes)
+
+    def refresh_catalog_changes(self):
+        """Aggiorna l'elenco dei materiali con le sole righe cambiate dall'ultimo caricamento."""
+        if self.catalog_seq is None:
+            return # Caricamento iniziale ancora in corso
+        db_worker.when_done(self, database.get_catalog_changes_async(self.catalog_seq, ("materials",)),
+                            self._apply_material_changes, key="material_changes")
+
+    def _apply_material_changes(self, result):
+        seq, changes = result
+        if self.catalog_seq is None:
+            return # Ricaricamento da capo in corso (es. dopo un ripristino)
+        if changes is None:
+            # Troppe modifiche (es. importazione di un listino): si ricarica tutto
+            self._load_materials_to_combobox()
+            return
+        self.catalog_seq = max(self.catalog_seq, seq)
+        if not changes["materials"]:
+            return
+        names_by_id = {mat['id']: name for name, mat in self.material_map.items()}
+        for material_id, mat in changes["materials"].items():
+            old_name = names_by_id.get(material_id)
+            if old_name is not None:
+                del self.material_map[old_name]
+            if mat is not None:
+                self.material_map[self._material_display_name(mat)] = mat
+        if self.material_search_var.get().strip():
+            self._run_material_search()
+        else:
+            self._show_material_choices(sorted(self.material_map))
+        self.on_material_selected(None) # Il materiale selezionato potrebbe essere cambiato
+
+    def _show_material_choices(self, display_names, select_first=False):
+        self.material_combobox['values'] = display_names
         if display_names:
-            self.material_combobox.current(0)
-            self.on_material_selected(None) # Trigger update for the first material
+            if select_first or self.material_var.get() not in display_names:
+                self.material_combobox.current(0)
+                self.on_material_selected(None) # Trigger update for the first material
         else:
             self.material_var.set("")
             self.spessore_var.set("N/A")
             # self.prezzo_mq_var.set("N/A") # Add a var for price display if needed
-        print("App._load_materials_to_combobox: Fine")
+
+    def on_material_search_changed(self, event=None):
+        # Attende una pausa nella digitazione prima di interrogare il database
+        if self._material_search_job is not None:
+            self.after_cancel(self._material_search_job)
+        self._material_search_job = self.after(200, self._run_material_search)
+
+    @database.query_scope("Ricerca materiali")
+    def _run_material_search(self):
+        """Limita l'elenco dei materiali a quelli che corrispondono al testo cercato (ordinati per pertinenza)."""
+        self._material_search_job = None
+        text = self.material_search_var.get().strip()
+        if not text:
+            self._show_material_choices(sorted(self.material_map))
+            return
+        # Con la stessa chiave, i risultati di una ricerca superata non arrivano mai
+        db_worker.when_done(self, database.search_materials_async(text, limit=MATERIAL_SEARCH_LIMIT),
+                            self._on_material_search_results, self._on_materials_load_error, key="material_search")
+
+    def _on_material_search_results(self, materials):
+        display_names = []
+        for mat in materials:
+            display_name = self._material_display_name(mat)
+            self.material_map[display_name] = mat
+            display_names.append(display_name)
+        self._show_material_choices(display_names)
 
     def on_material_selected(self, event):
         selected_display_name = self.material_var.get()
@@ -224,6 +355,30 @@ class App(tk.Tk):
         """Apre la finestra di gestione degli elementi lineari."""
         LinearElementsManager(self)
 
+    def toggle_shared_access(self):
+        """Salva nel database la modalità condivisa scelta dal menu."""
+        enabled = self.shared_access_var.get()
+        # Salvata nel thread del database; fino alla risposta la voce del menu resta disattivata
+        self.gestione_menu.entryconfigure(self.shared_access_index, state="disabled")
+        db_worker.when_done(self, database.set_shared_access_async(enabled),
+                            lambda result: self._on_shared_access_saved(enabled),
+                            lambda error: self._on_shared_access_error(enabled, error))
+
+    def _on_shared_access_error(self, enabled, error):
+        self.gestione_menu.entryconfigure(self.shared_access_index, state="normal")
+        self.shared_access_var.set(not enabled)
+        messagebox.showerror("Errore Database", f"Impossibile salvare l'impostazione:\n{error}", parent=self)
+
+    def _on_shared_access_saved(self, enabled):
+        self.gestione_menu.entryconfigure(self.shared_access_index, state="normal")
+        if enabled:
+            message = ("Modalità condivisa attivata: il database potrà essere usato da più postazioni in rete.\n"
+                       "Riavviare il programma su tutte le postazioni per applicarla.")
+        else:
+            message = "Modalità condivisa disattivata. Verrà applicata al prossimo avvio."
+        messagebox.showinfo("Database Condiviso", message, parent=self)
+
+    @database.query_scope("Aggiunta riga preventivo")
     def add_quote_row(self):
         # Validation
         try:
@@ -254,55 +409,13 @@ class App(tk.Tk):
             return
         
         material_data = self.material_map[selected_material_display_name]
-        material_name = material_data['name']
-        thickness = material_data['thickness']
-        price_per_sqm = material_data['price_per_sqm']
-
-        # Calcoli
-        num_soglie_val = int(self.num_soglie_var.get())
-        lunghezza_m = lunghezza_cm / 100
-        larghezza_m = larghezza_cm / 100
-        mq_singola = lunghezza_m * larghezza_m
-        mq_totali_riga = num_soglie_val * mq_singola
-        costo_lastra_riga = mq_totali_riga * price_per_sqm
-        costo_bordi_riga = 0.0 # Placeholder, sarà calcolato da EdgeEditorDialog
-        importo_totale_riga = costo_lastra_riga + costo_bordi_riga
-
-        # Genera un ID univoco per la riga per poterla modificare/eliminare e associare i bordi
-        row_id = f"row_{len(self.quote_tree.get_children())}_{material_name.replace(' ','_')}"
-
-        # Aggiungi alla Treeview
-        self.quote_tree.insert("", "end", iid=row_id, values=(
-            num_soglie_val, 
-            f"{lunghezza_cm:.1f}", 
-            f"{larghezza_cm:.1f}", 
-            material_name, 
-            str(thickness) if thickness is not None else "N/A", 
-            f"{mq_totali_riga:.4f}", 
-            f"{price_per_sqm:.2f}",
-            f"{costo_lastra_riga:.2f}",
-            f"{costo_bordi_riga:.2f}",
-            f"{importo_totale_riga:.2f}",
-            row_id # Store row_id itself for easy access
-        ))
-
-        # Store edge data associated with this row_id (inizialmente vuoto)
-        if not hasattr(self, 'edge_details_map'):
-            self.edge_details_map = {}
-        self.edge_details_map[row_id] = {
-            'front': {'active': False, 'type': '', 'length_cm': lunghezza_cm, 'price_lm': 0, 'cost': 0},
-            'back': {'active': False, 'type': '', 'length_cm': lunghezza_cm, 'price_lm': 0, 'cost': 0},
-            'left': {'active': False, 'type': '', 'length_cm': larghezza_cm, 'price_lm': 0, 'cost': 0},
-            'right': {'active': False, 'type': '', 'length_cm': larghezza_cm, 'price_lm': 0, 'cost': 0},
-            'total_edge_cost': 0.0
-        }
-
-        self.update_summary()
+        line = self.quote_engine.add_slab(num_soglie, lunghezza_cm, larghezza_cm, material_data['name'],
+                                          material_data['thickness'], material_data['price_per_sqm'])
+        self.quote_grid.see(line.line_id)
 
         # Dopo aver aggiunto la riga, chiedi se l'utente vuole definire i bordi
         if messagebox.askyesno("Gestione Bordi", "Vuoi definire i bordi per la riga appena aggiunta?", parent=self):
-            # Passiamo l'ID della riga appena creata a open_edge_editor
-            self.open_edge_editor(from_add_row=True, row_id_to_edit=row_id)
+            self.open_edge_editor(row_id_to_edit=line.line_id)
         
         self.clear_input_fields()
 
@@ -312,56 +425,127 @@ class App(tk.Tk):
         self.larghezza_var.set("")
         # Non resettare il materiale selezionato, potrebbe essere utile per righe successive
 
+    def _on_quote_changed(self, old, new):
+        """Riepilogo aggiornato una volta sola dopo una serie di modifiche di quote_engine (la tabella si aggiorna da sé)."""
+        if self._summary_job is None:
+            self._summary_job = self.after_idle(self.update_summary)
+
     def delete_quote_row(self):
-        selected_items = self.quote_tree.selection()
-        if not selected_items:
+        selected_ids = self.quote_grid.selection()
+        if not selected_ids:
             messagebox.showwarning("Nessuna Selezione", "Selezionare una riga da eliminare.", parent=self)
             return
         
-        for item_iid in selected_items:
-            if hasattr(self, 'edge_details_map') and item_iid in self.edge_details_map:
-                del self.edge_details_map[item_iid]
-            self.quote_tree.delete(item_iid)
-        self.update_summary()
+        # Tutte le righe selezionate in un solo passo di Annulla
+        with self.quote_engine.group():
+            for line_id in selected_ids:
+                self.quote_engine.remove(line_id)
+
+    def undo_quote_change(self):
+        self.quote_engine.undo()
+        self._update_edit_menu()
+
+    def redo_quote_change(self):
+        self.quote_engine.redo()
+        self._update_edit_menu()
+
+    def _update_edit_menu(self):
+        self.edit_menu.entryconfigure(0, state="normal" if self.quote_engine.can_undo() else "disabled")
+        self.edit_menu.entryconfigure(1, state="normal" if self.quote_engine.can_redo() else "disabled")
 
     def update_summary(self):
-        total_mq = 0.0
-        total_slabs_eur = 0.0
-        total_edges_eur = 0.0
-        total_eur = 0.0
-
-        for row_iid in self.quote_tree.get_children():
-            values = self.quote_tree.item(row_iid, 'values')
-            try:
-                total_mq += float(values[5])
-                total_slabs_eur += float(values[7])
-                total_edges_eur += float(values[8]) # Costo bordi dalla colonna
-                total_eur += float(values[9])     # Importo totale riga dalla colonna
-            except (IndexError, ValueError) as e:
-                print(f"Errore nel calcolo del sommario per la riga {row_iid}: {values} - {e}")
-                continue
-        
-        self.total_mq_var.set(f"{total_mq:.4f}")
-        self.total_slabs_eur_var.set(f"{total_slabs_eur:.2f}")
-        self.total_edges_eur_var.set(f"{total_edges_eur:.2f}")
-        self.total_eur_var.set(f"{total_eur:.2f}")
+        self._summary_job = None
+        # I totali sono tenuti aggiornati da quote_engine riga per riga: nessun ricalcolo qui
+        totals = self.quote_engine.totals()
+        self.total_mq_var.set(money.format_mq(totals.mq_units))
+        self.total_slabs_eur_var.set(money.format_cents(totals.slabs_cents))
+        self.total_edges_eur_var.set(money.format_cents(totals.edges_cents))
+        self.total_eur_var.set(money.format_cents(totals.total_cents))
+        self._update_edit_menu()
 
     def new_quote(self):
         if messagebox.askyesno("Nuovo Preventivo", "Sei sicuro di voler creare un nuovo preventivo? Eventuali modifiche non salvate andranno perse.", parent=self):
-            for i in self.quote_tree.get_children():
-                self.quote_tree.delete(i)
-            self.update_summary()
-            self.num_soglie_var.set("")
-            self.lunghezza_var.set("")
-            self.larghezza_var.set("")
-            if self.material_combobox['values']:
-                 self.material_combobox.current(0)
-                 self.on_material_selected(None)
+            self._clear_quote()
+
+    def _clear_quote(self):
+        self.quote_engine.clear()
+        self._reset_quote_form()
+
+    def _reset_quote_form(self):
+        """Preventivo non più associato all'archivio e campi di inserimento ai valori iniziali."""
+        self.current_quote_id = None
+        self.current_quote_client = None
+        self.title("Preventivo Soglie Marmista")
+        self.num_soglie_var.set("")
+        self.lunghezza_var.set("")
+        self.larghezza_var.set("")
+        if self.material_combobox['values']:
+             self.material_combobox.current(0)
+             self.on_material_selected(None)
+
+    @database.query_scope("Salvataggio nell'archivio")
+    def save_quote_to_archive(self):
+        """Salva il preventivo nell'archivio (lo aggiorna se è stato aperto dall'archivio)."""
+        if not len(self.quote_engine):
+            messagebox.showinfo("Salva nell'Archivio", "Nessun dato da salvare.", parent=self)
+            return
+        client = simpledialog.askstring("Salva nell'Archivio", "Cliente:", initialvalue=self.current_quote_client or "", parent=self)
+        if client is None:
+            return
+        # Salvataggio e lettura del numero nel thread del database; le righe sono quelle di adesso
+        db_worker.when_done(self, database.save_quote_async(self.quote_engine.lines_data(), client=client.strip(),
+                                                            quote_id=self.current_quote_id),
+                            self._on_quote_archived, self._on_archive_error)
+
+    def _on_quote_archived(self, quote_id):
+        self.current_quote_id = quote_id
+        db_worker.when_done(self, database.get_quote_async(quote_id, include_lines=False), self._on_archived_quote_read,
+                            self._on_archive_error)
+
+    def _on_archived_quote_read(self, quote):
+        self.current_quote_client = quote['client']
+        self.title(f"Preventivo Soglie Marmista - {quote['quote_number']}")
+        messagebox.showinfo("Salva nell'Archivio", f"Preventivo {quote['quote_number']} salvato nell'archivio.", parent=self)
+
+    def _on_archive_error(self, error):
+        messagebox.showerror("Archivio Preventivi", f"Errore nell'archivio dei preventivi: {error}", parent=self)
+
+    def open_quote_archive(self):
+        """Apre l'archivio dei preventivi salvati."""
+        QuoteArchive(self)
+
+    @database.query_scope("Apertura dall'archivio")
+    def load_quote_from_archive(self, quote_id):
+        """Sostituisce il preventivo corrente con quello dell'archivio indicato.
+
+        Il preventivo viene letto nel thread del database e caricato all'arrivo;
+        restituisce False se l'utente rinuncia a sostituire quello corrente.
+        """
+        if len(self.quote_engine) and not messagebox.askyesno(
+                "Apri Preventivo", "Il preventivo corrente verrà sostituito. Continuare?", parent=self):
+            return False
+        db_worker.when_done(self, database.get_quote_async(quote_id), self._on_archived_quote_loaded,
+                            self._on_archive_error, key="archive_quote")
+        return True
+
+    def _on_archived_quote_loaded(self, quote):
+        if quote is None:
+            messagebox.showerror("Archivio Preventivi", "Preventivo non trovato.", parent=self)
+            return
+        # Con una riga non valida load_lines_data non cambia nulla: resta il preventivo corrente
+        try:
+            self.quote_engine.load_lines_data(quote['lines'])
+        except ValueError as e:
+            messagebox.showerror("Archivio Preventivi", f"Dati del preventivo non validi: {e}", parent=self)
+            return
+        self._reset_quote_form()
+        self._update_edit_menu()
+        self.current_quote_id = quote['id']
+        self.current_quote_client = quote['client']
+        self.title(f"Preventivo Soglie Marmista - {quote['quote_number']}")
 
     def save_quote_to_json(self):
-        quote_items = []
-        for row_id in self.quote_tree.get_children():
-            quote_items.append(list(self.quote_tree.item(row_id, 'values')))
+        quote_items = [list(file_formats.line_row_values(line)) for line in self.quote_engine]
         
         if not quote_items:
             messagebox.showinfo("Salvataggio JSON", "Nessun dato da salvare.", parent=self)
@@ -389,19 +573,32 @@ class App(tk.Tk):
         if filepath:
             items, totals = utils.load_quote_from_json(filepath)
             if items is not None:
-                self.new_quote() # Clear current quote first (or ask user)
-                for item_values in items:
-                    self.quote_tree.insert("", "end", values=item_values)
-                if totals:
-                    self.total_mq_var.set(totals.get("mq", "0,0000"))
-                    self.total_eur_var.set(totals.get("eur", "0,00"))
-                else: # Recalculate if totals not in JSON (older format?)
-                    self.update_summary()
+                if len(self.quote_engine) and not messagebox.askyesno(
+                        "Apri Preventivo", "Il preventivo corrente verrà sostituito. Continuare?", parent=self):
+                    return
+                # Svuotamento e righe lette sono un solo passo di annulla. I totali vengono ricalcolati
+                # dalle righe; con una riga non valida group() annulla tutto: resta il preventivo
+                # precedente e la cronologia non cambia
+                position = 0
+                try:
+                    with self.quote_engine.group():
+                        self.quote_engine.clear()
+                        for position, item_values in enumerate(items):
+                            self.quote_engine.add_line_data(file_formats.line_data_from_row_values(item_values))
+                            if position == FIRST_SCREEN_LINES:
+                                # La prima schermata compare subito, poi si leggono le altre righe
+                                self.update_idletasks()
+                except (IndexError, KeyError, TypeError, ValueError) as e:
+                    # Un file modificato a mano può avere righe corte, celle null o non numeriche
+                    messagebox.showerror("Errore Apertura", f"Dati della riga {position + 1} non validi: {e!r}",
+                                         parent=self)
+                    return
+                self.current_quote_id = None
+                self.current_quote_client = None
+                self.title("Preventivo Soglie Marmista")
 
     def export_quote_to_pdf(self):
-        quote_items = []
-        for row_id in self.quote_tree.get_children():
-            quote_items.append(list(self.quote_tree.item(row_id, 'values')))
+        quote_items = [list(file_formats.line_row_values(line)) for line in self.quote_engine]
         
         if not quote_items:
             messagebox.showinfo("Esporta PDF", "Nessun dato da esportare.", parent=self)
@@ -426,154 +623,206 @@ class App(tk.Tk):
         if filepath:
             utils.export_to_pdf(quote_items, totals, filepath)
 
-    def open_edge_editor(self, event=None, from_add_row=False, row_id_to_edit=None):
-        item_to_edit_iid = None
+    def open_edge_editor(self, event=None, row_id_to_edit=None):
+        line_id = None
         if row_id_to_edit: # Prioritize row_id_to_edit if provided (from add_quote_row)
-            item_to_edit_iid = row_id_to_edit
+            line_id = row_id_to_edit
         elif event: # Called by double-click
-            item_to_edit_iid = self.quote_tree.focus() # or self.quote_tree.identify_row(event.y)
+            line_id = self.quote_grid.focus_line()
         else: # Called by button "Gestisci Bordi Riga Selezionata"
-            selected_items = self.quote_tree.selection()
-            if selected_items:
-                item_to_edit_iid = selected_items[0]
+            selected_ids = self.quote_grid.selection()
+            if selected_ids:
+                line_id = selected_ids[0]
 
-        if not item_to_edit_iid:
+        line = self.quote_engine.get(line_id)
+        if line is None:
             messagebox.showwarning("Nessuna Selezione", "Selezionare una riga per gestire i bordi.", parent=self)
             return
-        
-        item_values = self.quote_tree.item(item_to_edit_iid, 'values')
-
-        try:
-            material_name_full = item_values[3]
-            # Estrai il nome del materiale prima della parentesi, se presente
-            material_name = material_name_full.split(' (')[0] if ' (' in material_name_full else material_name_full
-            thickness_str = item_values[4]
-            length_cm = float(item_values[1])
-            width_cm = float(item_values[2])
-            num_soglie = int(item_values[0])  # Numero di soglie dalla prima colonna
-            # L'ID della riga è l'IID stesso dell'elemento nel Treeview, che abbiamo in item_to_edit_iid
-            # row_id_from_values = item_values[10] # Questo è ridondante se usiamo item_to_edit_iid
-
-            thickness = None
-            if thickness_str and thickness_str.lower() != 'n/a':
-                try:
-                    thickness = float(thickness_str)
-                except ValueError:
-                    messagebox.showerror("Errore Dati Riga", f"Spessore non valido: {thickness_str}", parent=self)
-                    return
-            
-            # Usa item_to_edit_iid come chiave per edge_details_map
-            current_edge_details = self.edge_details_map.get(item_to_edit_iid)
-            if not current_edge_details and from_add_row:
-                # Se chiamato da add_row e non ci sono dettagli (dovrebbe esserci la struttura base)
-                # assicuriamoci che esista una entry base in edge_details_map
-                if item_to_edit_iid not in self.edge_details_map:
-                     self.edge_details_map[item_to_edit_iid] = {
-                        'front': {'active': False, 'type': '', 'length_cm': length_cm, 'price_lm': 0, 'cost': 0},
-                        'back': {'active': False, 'type': '', 'length_cm': length_cm, 'price_lm': 0, 'cost': 0},
-                        'left': {'active': False, 'type': '', 'length_cm': width_cm, 'price_lm': 0, 'cost': 0},
-                        'right': {'active': False, 'type': '', 'length_cm': width_cm, 'price_lm': 0, 'cost': 0},
-                        'total_edge_cost': 0.0
-                    }
-                current_edge_details = self.edge_details_map[item_to_edit_iid]
-            elif not current_edge_details: # Caso generale se non trovato (non dovrebbe succedere se add_quote_row lo inizializza)
-                 messagebox.showerror("Errore Interno", f"Dettagli bordi non trovati per la riga {item_to_edit_iid}.", parent=self)
-                 return
- 
-        except (IndexError, ValueError) as e:
-            messagebox.showerror("Errore Dati Riga", f"Impossibile leggere i dati dalla riga: {e}", parent=self)
+        if line.is_linear:
+            messagebox.showinfo("Gestione Bordi", "Gli elementi lineari non hanno bordi.", parent=self)
             return
 
-        dialog = EdgeEditorDialog(self, item_to_edit_iid, material_name, thickness, length_cm, width_cm, current_edge_details, num_soglie)
+        dialog = EdgeEditorDialog(self, line.line_id, line.material_name, line.thickness, line.length_cm, line.width_cm, line.edges, line.quantity)
+        self.wait_window(dialog)
+        # Al salvataggio EdgeEditorDialog aggiorna quote_engine, che aggiorna tabella e sommario
+
+    def open_edge_profiles(self):
+        """Applica un profilo dei bordi a tutte le righe di soglie selezionate."""
+        line_ids = [line_id for line_id in self.quote_grid.selection() if not self.quote_engine.get(line_id).is_linear]
+        if not line_ids:
+            messagebox.showwarning("Nessuna Selezione", "Selezionare una o più righe di soglie a cui applicare il profilo.", parent=self)
+            return
+        dialog = EdgeProfileDialog(self, line_ids)
         self.wait_window(dialog)
-        # L'aggiornamento della tabella e del sommario viene fatto da EdgeEditorDialog al salvataggio
 
     def add_linear_element(self):
         """Apre la finestra per aggiungere un elemento lineare al preventivo."""
         dialog = LinearQuoteDialog(self)
         self.wait_window(dialog)
-        # Se l'elemento è stato aggiunto, aggiorna il sommario
-        if hasattr(dialog, 'element_added') and dialog.element_added:
-            self.update_summary()
 
+    @database.query_scope("Importazione da Excel")
     def import_materials_from_excel_dialog(self):
-        try:
-            from tkinter import filedialog # Ensure filedialog is available
-        except ImportError:
-            pass # Should already be available if tkinter is used
-
+        """Importa i materiali da un listino Excel nel thread del database, con la barra di avanzamento."""
+        from tkinter import filedialog
         filepath = filedialog.askopenfilename(
             title="Importa Materiali da Excel",
-            filetypes=(("Excel files", "*.xlsx"), ("All files", "*.*"))
-            # parent=self # parent can be omitted or set to self
+            filetypes=(("Excel files", "*.xlsx *.xls"), ("All files", "*.*")),
+            parent=self
         )
-        if filepath:
-            try:
-                # Placeholder for actual import logic
-                # For example: utils.import_materials_from_excel(filepath, database.add_material)
-                messagebox.showinfo("Importazione Excel", 
-                                    "Funzionalità di importazione da Excel non ancora implementata.\n" 
-                                    f"File selezionato: {filepath}", 
-                                    parent=self)
-                self._load_materials_to_combobox() # Refresh materials after import
-            except Exception as e:
-                messagebox.showerror("Errore Importazione", f"Errore durante l'importazione: {e}", parent=self)
-
-        
-        # Define a callback for the import function to update the progress bar
-        def progress_update_callback(percentage):
-            progress_win.update_progress(percentage)
-            self.update_idletasks() # Keep UI responsive
-
-        try:
-            success = utils.import_materials_from_excel(filepath, progress_callback=progress_update_callback)
-            if success:
-                self._load_materials_to_combobox() # Refresh combobox after import
-                messagebox.showinfo("Importazione Completata", "Importazione dei materiali completata.", parent=self)
-            # Error messages are handled within import_materials_from_excel now
-        except Exception as e:
-            # This is a fallback, most errors should be caught in utils
-            messagebox.showerror("Errore Importazione", f"Si è verificato un errore imprevisto: {e}", parent=self)
-        finally:
-            if progress_win.winfo_exists(): # Check if window still exists before trying to destroy
-                 progress_win.destroy() # Ensure progress window is closed
+        if not filepath:
+            return
+        # file_formats riporta l'avanzamento in percentuale
+        self._run_with_progress("Importazione da Excel",
+                                lambda progress: db_worker.submit(file_formats.import_materials_from_excel, filepath,
+                                                                  progress_callback=lambda pct: progress(pct, 100)),
+                                self._on_excel_import_done,
+                                on_error=lambda error: utils.show_excel_import_error(error, parent=self))
+
+    def _on_excel_import_done(self, outcome):
+        self._load_materials_to_combobox()
+        utils.show_excel_import_outcome(outcome, parent=self)
 
+    @database.query_scope("Esportazione dati")
     def export_materials_and_edges(self):
-        """Esporta tutti i materiali e tipi di bordo in un file JSON."""
-        try:
-            from tkinter import filedialog
-        except ImportError:
-            pass
-        
+        """Esporta tutti i materiali e tipi di bordo: catalogo a righe (NDJSON) o, con estensione .json, il vecchio formato."""
+        from tkinter import filedialog
         filepath = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            defaultextension=".ndjson.gz",
+            filetypes=[("Catalogo compresso", "*.ndjson.gz"), ("Catalogo NDJSON", "*.ndjson"),
+                       ("JSON (formato precedente)", "*.json"), ("All files", "*.*")],
             title="Esporta Dati Materiali e Bordi",
             parent=self
         )
-        if filepath:
-            utils.export_materials_and_edges_to_json(filepath)
+        if not filepath:
+            return
+        if filepath.lower().endswith('.json'):
+            start = lambda progress: db_worker.submit(catalog_ndjson.export_catalog_json, filepath)
+        else:
+            start = lambda progress: db_worker.submit(catalog_ndjson.export_catalog, filepath, progress=progress)
+        self._run_with_progress("Esportazione del catalogo", start,
+                                lambda counts: utils.show_catalog_export_outcome(counts, filepath, parent=self),
+                                on_error=lambda error: utils.show_catalog_export_error(error, parent=self))
 
+    @database.query_scope("Importazione dati")
     def import_materials_and_edges(self):
-        """Importa materiali e tipi di bordo da un file JSON."""
-        try:
-            from tkinter import filedialog
-        except ImportError:
-            pass
-        
+        """Importa materiali e tipi di bordo da un catalogo NDJSON (anche compresso) o da un file JSON."""
+        from tkinter import filedialog
         filepath = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("Cataloghi", "*.ndjson.gz *.ndjson *.json"), ("All files", "*.*")],
             title="Importa Dati Materiali e Bordi",
             parent=self
         )
-        if filepath:
-            success = utils.import_materials_and_edges_from_json(filepath)
-            if success:
-                # Ricarica i materiali nel combobox dopo l'importazione
-                self._load_materials_to_combobox()
+        if not filepath:
+            return
+        self._run_with_progress("Importazione del catalogo",
+                                lambda progress: db_worker.submit(catalog_ndjson.import_catalog_file, filepath,
+                                                                  progress=progress),
+                                self._on_catalog_import_done,
+                                on_error=lambda error: utils.show_catalog_import_error(error, parent=self))
+
+    def _on_catalog_import_done(self, outcomes):
+        # Ricarica i materiali nel combobox dopo l'importazione
+        self._load_materials_to_combobox()
+        utils.show_catalog_import_outcome(outcomes, parent=self)
+
+    def _on_auto_backup_done(self, path):
+        if path:
+            print(f"Backup automatico salvato in {path}")
+
+    def backup_database(self):
+        """Salva subito un backup del database (il programma resta utilizzabile durante la copia)."""
+        self._run_with_progress("Backup del database", backup.create_backup_async, self._on_backup_done,
+                                error_title="Errore Backup")
+
+    def _on_backup_done(self, path):
+        messagebox.showinfo("Backup Completato", f"Backup salvato in:\n{path}", parent=self)
+
+    def restore_database(self):
+        """Sostituisce il database con un backup scelto dall'utente."""
+        from tkinter import filedialog
+        filepath = filedialog.askopenfilename(
+            initialdir=backup.backup_dir(),
+            filetypes=[("Backup database", "*.db"), ("All files", "*.*")],
+            title="Ripristina da Backup",
+            parent=self
+        )
+        if not filepath:
+            return
+        if not messagebox.askyesno("Ripristina da Backup",
+                                   "Il database attuale verrà sostituito dal backup scelto "
+                                   "(prima ne viene salvata una copia).\n"
+                                   "Le altre postazioni che usano il database devono essere chiuse.\n\nContinuare?",
+                                   parent=self):
+            return
+        self._run_with_progress("Ripristino del backup",
+                                lambda progress: backup.prepare_restore_async(filepath, progress),
+                                self._finish_restore, error_title="Errore Backup")
+
+    def _finish_restore(self, restore_path):
+        # Nessuna lettura in corso nel thread del database mentre il file viene sostituito
+        db_worker.shutdown()
+        try:
+            backup.finish_restore(restore_path)
+        except Exception as e:
+            messagebox.showerror("Errore Ripristino", f"Ripristino non riuscito:\n{e}", parent=self)
+            return
+        # Il preventivo aperto potrebbe non esistere nell'archivio ripristinato: verrà salvato come nuovo
+        self.current_quote_id = None
+        # Le posizioni nel registro delle modifiche (catalog_seq) si riferiscono al database
+        # sostituito: l'elenco materiali e le finestre di gestione aperte si ricaricano da capo
+        self.catalog_seq = None
+        self._load_materials_to_combobox()
+        for window in self.winfo_children():
+            if isinstance(window, tk.Toplevel) and hasattr(window, "reload_catalog"):
+                window.reload_catalog()
+        messagebox.showinfo("Ripristino Completato", "Database ripristinato dal backup.", parent=self)
+
+    def _run_with_progress(self, title, start, on_success, on_error=None, error_title="Errore"):
+        """Avvia start(progress) in background mostrando una finestra con la barra di avanzamento.
+
+        start restituisce un Future (thread del backup o del database) e chiama progress(fatti, totale)
+        dal proprio thread. Al termine la finestra si chiude e arriva on_success(risultato) oppure
+        on_error(eccezione); senza on_error l'errore viene mostrato con il titolo error_title.
+        """
+        window = tk.Toplevel(self)
+        window.title(title)
+        window.resizable(False, False)
+        window.transient(self)
+        window.protocol("WM_DELETE_WINDOW", lambda: None) # Si chiude da sola al termine
+        ttk.Label(window, text=f"{title} in corso...").pack(padx=20, pady=(15, 5))
+        progress_bar = ttk.Progressbar(window, length=300, mode="determinate", maximum=1.0)
+        progress_bar.pack(padx=20, pady=(0, 15))
+        state = {"done": 0, "total": 0}
+
+        def progress(done, total):
+            # Chiamata dal thread di lavoro: aggiorna solo i numeri, la barra la ridisegna update_bar
+            state["done"], state["total"] = done, total
+
+        def update_bar():
+            if window.winfo_exists():
+                progress_bar["value"] = state["done"] / state["total"] if state["total"] else 0
+                window.after(100, update_bar)
+
+        def on_done(result):
+            window.destroy()
+            on_success(result)
+
+        def on_failed(error):
+            window.destroy()
+            if on_error is not None:
+                on_error(error)
+            else:
+                messagebox.showerror(error_title, f"{title} non riuscito:\n{error}", parent=self)
+
+        update_bar()
+        db_worker.when_done(window, start(progress), on_done, on_failed)
 
 if __name__ == "__main__":
     print("Avvio dell'applicazione...")
+    # PREVENTIVI_QUERY_STATS=1: statistiche delle query per azione e dei lock, stampate alla chiusura
+    query_stats = bool(os.environ.get("PREVENTIVI_QUERY_STATS"))
+    if query_stats:
+        database.enable_query_stats()
     try:
         app = App()
         print("Applicazione inizializzata, avvio del mainloop...")
@@ -583,4 +832,9 @@ if __name__ == "__main__":
         import traceback
         traceback.print_exc()
     finally:
+        db_worker.shutdown()
+        if query_stats:
+            print(database.format_query_stats())
+            print(database.format_lock_stats())
+        database.close_all_connections()
         print("Applicazione terminata.")
\ No newline at end of file
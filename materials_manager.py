@@ -1,6 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import database
+import db_worker
+from catalog_grid import CatalogGrid
+
+# (colonna di database.get_catalog_rows, intestazione, larghezza, allineamento)
+MATERIAL_COLUMNS = [
+    ("id", "ID", 40, "center"),
+    ("name", "Nome Materiale", 150, "w"),
+    ("thickness", "Spessore (cm)", 100, "e"),
+    ("price_per_sqm", "Prezzo (€/m²)", 100, "e"),
+    ("description", "Descrizione", 150, "w"),
+    ("supplier", "Fornitore", 100, "w"),
+]
 
 class MaterialsManager(tk.Toplevel):
     def __init__(self, parent):
@@ -9,32 +21,20 @@ class MaterialsManager(tk.Toplevel):
         self.geometry("700x500")
         self.parent = parent
 
-        # Frame for Treeview
-        tree_frame = ttk.Frame(self)
-        tree_frame.pack(pady=10, padx=10, fill="both", expand=True)
-
-        # Treeview to display materials
-        self.tree = ttk.Treeview(tree_frame, columns=("ID", "Nome", "Spessore (cm)", "Prezzo (€/m²)", "Descrizione", "Fornitore"), show="headings")
-        self.tree.heading("ID", text="ID")
-        self.tree.heading("Nome", text="Nome Materiale")
-        self.tree.heading("Spessore (cm)", text="Spessore (cm)")
-        self.tree.heading("Prezzo (€/m²)", text="Prezzo (€/m²)")
-        self.tree.heading("Descrizione", text="Descrizione")
-        self.tree.heading("Fornitore", text="Fornitore")
-
-        self.tree.column("ID", width=40, anchor="center")
-        self.tree.column("Nome", width=150)
-        self.tree.column("Spessore (cm)", width=100, anchor="e")
-        self.tree.column("Prezzo (€/m²)", width=100, anchor="e")
-        self.tree.column("Descrizione", width=150)
-        self.tree.column("Fornitore", width=100)
-
-        self.tree.pack(side="left", fill="both", expand=True)
-
-        # Scrollbar for Treeview
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
+        # Ricerca per nome, descrizione o fornitore
+        search_frame = ttk.Frame(self)
+        search_frame.pack(pady=(10, 0), padx=10, fill="x")
+        ttk.Label(search_frame, text="Cerca:").pack(side="left")
+        self.search_var = tk.StringVar()
+        self._search_job = None
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side="left", fill="x", expand=True, padx=5)
+        search_entry.bind("<KeyRelease>", self.on_search_changed)
+
+        # Tabella letta a pagine, con un filtro per colonna: le modifiche aggiornano solo le righe cambiate
+        self.grid_view = CatalogGrid(self, "materials", MATERIAL_COLUMNS, self._material_values,
+                                     on_activate=lambda row: self.open_edit_material_dialog())
+        self.grid_view.pack(pady=10, padx=10, fill="both", expand=True)
 
         # Frame for buttons
         button_frame = ttk.Frame(self)
@@ -46,56 +46,71 @@ class MaterialsManager(tk.Toplevel):
         edit_button = ttk.Button(button_frame, text="Modifica Selezionato", command=self.open_edit_material_dialog)
         edit_button.pack(side="left", padx=5)
 
-        delete_button = ttk.Button(button_frame, text="Elimina Selezionato", command=self.delete_selected_material)
-        delete_button.pack(side="left", padx=5)
-
-        self.load_materials()
+        self.delete_button = ttk.Button(button_frame, text="Elimina Selezionato", command=self.delete_selected_material)
+        self.delete_button.pack(side="left", padx=5)
 
         self.transient(parent) # Keep this window on top of the main window
         self.grab_set() # Modal behavior
 
-    def load_materials(self):
-        """Carica i materiali dal database e li visualizza nella Treeview."""
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        materials = database.get_all_materials()
-        for mat in materials:
-            thickness = mat['thickness'] if mat['thickness'] is not None else "N/A"
-            supplier = mat['supplier'] if mat['supplier'] else "N/A"
-            self.tree.insert("", "end", values=(mat['id'], mat['name'], thickness, f"{mat['price_per_sqm']:.2f}", mat['description'], supplier))
+    def _material_values(self, mat):
+        thickness = mat['thickness'] if mat['thickness'] is not None else "N/A"
+        supplier = mat['supplier'] if mat['supplier'] else "N/A"
+        return (mat['id'], mat['name'], thickness, f"{mat['price_per_sqm']:.2f}", mat['description'], supplier)
+
+    def refresh_catalog_changes(self):
+        """Aggiorna l'elenco con le sole righe cambiate (dopo una modifica, anche da un'altra postazione)."""
+        self.grid_view.refresh_catalog_changes()
+
+    def reload_catalog(self):
+        """Ricarica l'elenco da capo (es. dopo il ripristino di un backup)."""
+        self.grid_view.reload()
+
+    def on_search_changed(self, event=None):
+        # Aggiorna l'elenco solo dopo una breve pausa nella digitazione
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(200, self._run_search)
+
+    def _run_search(self):
+        self._search_job = None
+        self.grid_view.set_search(self.search_var.get())
 
     def open_add_material_dialog(self):
         """Apre la finestra di dialogo per aggiungere un nuovo materiale."""
-        MaterialDialog(self, "Aggiungi Nuovo Materiale", self.load_materials)
+        MaterialDialog(self, "Aggiungi Nuovo Materiale", self.refresh_catalog_changes)
 
     def open_edit_material_dialog(self):
         """Apre la finestra di dialogo per modificare il materiale selezionato."""
-        selected_item = self.tree.selection()
-        if not selected_item:
+        material = self.grid_view.selected_row()
+        if material is None:
             messagebox.showwarning("Nessuna Selezione", "Seleziona un materiale da modificare.", parent=self)
             return
-        
-        item_values = self.tree.item(selected_item[0], 'values')
-        material_id = item_values[0]
-        MaterialDialog(self, "Modifica Materiale", self.load_materials, material_id=material_id)
+        MaterialDialog(self, "Modifica Materiale", self.refresh_catalog_changes, material_id=material['id'])
 
     def delete_selected_material(self):
         """Elimina il materiale selezionato dal database."""
-        selected_item = self.tree.selection()
-        if not selected_item:
+        material = self.grid_view.selected_row()
+        if material is None:
             messagebox.showwarning("Nessuna Selezione", "Seleziona un materiale da eliminare.", parent=self)
             return
 
-        item_values = self.tree.item(selected_item[0], 'values')
-        material_id = item_values[0]
-        material_name = item_values[1]
+        if messagebox.askyesno("Conferma Eliminazione", f"Sei sicuro di voler eliminare il materiale '{material['name']}'?", parent=self):
+            # Eliminato nel thread del database; fino alla risposta non si può eliminare di nuovo
+            self.delete_button.configure(state="disabled")
+            db_worker.when_done(self, database.delete_material_async(material['id']), self._on_material_deleted,
+                                self._on_delete_error)
+
+    def _on_material_deleted(self, deleted):
+        self.delete_button.configure(state="normal")
+        if deleted:
+            messagebox.showinfo("Successo", "Materiale eliminato con successo.", parent=self)
+            self.refresh_catalog_changes()
+        else:
+            messagebox.showerror("Errore", "Impossibile eliminare il materiale.", parent=self)
 
-        if messagebox.askyesno("Conferma Eliminazione", f"Sei sicuro di voler eliminare il materiale '{material_name}'?", parent=self):
-            if database.delete_material(material_id):
-                messagebox.showinfo("Successo", "Materiale eliminato con successo.", parent=self)
-                self.load_materials()
-            else:
-                messagebox.showerror("Errore", "Impossibile eliminare il materiale.", parent=self)
+    def _on_delete_error(self, error):
+        self.delete_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Impossibile eliminare il materiale: {error}", parent=self)
 
 class MaterialDialog(tk.Toplevel):
     def __init__(self, parent, title, callback_on_save, material_id=None):
@@ -130,26 +145,32 @@ class MaterialDialog(tk.Toplevel):
         self.supplier_entry = ttk.Entry(self, textvariable=self.supplier_var, width=40)
         self.supplier_entry.grid(row=4, column=1, padx=5, pady=5, sticky="ew")
 
-        # Load data if editing
-        if self.material_id:
-            self.load_material_data()
-
         # Buttons
         button_frame = ttk.Frame(self)
         button_frame.grid(row=5, column=0, columnspan=2, pady=10) # Adjusted row for buttons
 
-        save_button = ttk.Button(button_frame, text="Salva", command=self.save_material)
-        save_button.pack(side="left", padx=5)
+        self.save_button = ttk.Button(button_frame, text="Salva", command=self.save_material)
+        self.save_button.pack(side="left", padx=5)
         cancel_button = ttk.Button(button_frame, text="Annulla", command=self.destroy)
         cancel_button.pack(side="left", padx=5)
 
+        # Load data if editing
+        if self.material_id:
+            self.load_material_data()
+
         self.grid_columnconfigure(1, weight=1)
         self.transient(parent)
         self.grab_set()
         self.name_entry.focus_set()
 
     def load_material_data(self):
-        material = database.get_material_by_id(self.material_id)
+        # Letto nel thread del database; fino all'arrivo dei dati non si può salvare
+        self.save_button.configure(state="disabled")
+        db_worker.when_done(self, database.get_material_by_id_async(self.material_id), self._on_material_loaded,
+                            self._on_load_error)
+
+    def _on_material_loaded(self, material):
+        self.save_button.configure(state="normal")
         if material:
             self.name_var.set(material['name'])
             self.thickness_var.set(str(material['thickness']) if material['thickness'] is not None else "")
@@ -157,6 +178,9 @@ class MaterialDialog(tk.Toplevel):
             self.description_text.insert("1.0", material['description'] or "")
             self.supplier_var.set(material['supplier'] or "")
 
+    def _on_load_error(self, error):
+        messagebox.showerror("Errore Database", f"Impossibile caricare il materiale: {error}", parent=self)
+
     def save_material(self):
         name = self.name_var.get().strip()
         thickness_str = self.thickness_var.get().strip()
@@ -186,14 +210,19 @@ class MaterialDialog(tk.Toplevel):
                 messagebox.showerror("Errore Validazione", "Lo spessore deve essere un numero valido (es. 2.0) o lasciato vuoto.", parent=self)
                 return
 
+        # Salvato nel thread del database; fino alla risposta il pulsante Salva resta disattivato
+        self.save_button.configure(state="disabled")
         if self.material_id:
-            success = database.update_material(self.material_id, name, price, thickness, description, supplier)
-            action = "aggiornato"
+            future = database.update_material_async(self.material_id, name, price, thickness, description, supplier)
+            db_worker.when_done(self, future, lambda success: self._on_material_saved(success, "aggiornato"),
+                                self._on_save_error)
         else:
-            new_id = database.add_material(name, price, thickness, description, supplier)
-            success = new_id is not None
-            action = "aggiunto"
+            future = database.add_material_async(name, price, thickness, description, supplier)
+            db_worker.when_done(self, future, lambda new_id: self._on_material_saved(new_id is not None, "aggiunto"),
+                                self._on_save_error)
 
+    def _on_material_saved(self, success, action):
+        self.save_button.configure(state="normal")
         if success:
             messagebox.showinfo("Successo", f"Materiale {action} con successo.", parent=self.parent) # Show on parent of dialog
             self.callback_on_save() # Refresh the list in MaterialsManager
@@ -201,6 +230,10 @@ class MaterialDialog(tk.Toplevel):
         else:
             messagebox.showerror("Errore Database", f"Impossibile {action.replace('o','are')} il materiale. Controlla se il nome esiste già.", parent=self)
 
+    def _on_save_error(self, error):
+        self.save_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Impossibile salvare il materiale: {error}", parent=self)
+
 if __name__ == '__main__':
     # Example usage (requires a root window)
     root = tk.Tk()
@@ -0,0 +1,116 @@
+import math
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Importi, prezzi e misure in unità intere: tutti i calcoli del preventivo sono somme e
+# prodotti di interi, arrotondati una sola volta per valore (a metà per eccesso, come
+# l'arrotondamento commerciale). I float e le stringhe si convertono solo all'ingresso
+# (campi dell'interfaccia, database, file) e all'uscita (tabella, PDF, JSON).
+CENTS = 100                # importi in centesimi
+PRICE_UNITS = 10000        # prezzi al m² e al metro lineare in decimillesimi di euro
+MQ_UNITS = 10000           # m² in decimillesimi, come le quattro cifre del preventivo
+TENTHS_MM_PER_CM = 100     # lunghezze in decimi di millimetro
+TENTHS_MM_PER_M = 10000
+
+EUR_DECIMALS = 2
+PRICE_DECIMALS = 2         # decimali dei prezzi unitari mostrati
+MQ_DECIMALS = 4
+
+# Denominatori dei prodotti: decimi di mm² -> decimillesimi di m², e così via
+MQ_DIVISOR = TENTHS_MM_PER_M ** 2 // MQ_UNITS
+SLAB_DIVISOR = TENTHS_MM_PER_M ** 2 * PRICE_UNITS // CENTS
+LENGTH_DIVISOR = TENTHS_MM_PER_M * PRICE_UNITS // CENTS
+
+# Distanza da metà sotto la quale la conversione di un float passa dalla sua repr
+HALF_TOLERANCE = 1e-6
+
+
+def to_units(value, scale):
+    """Converte un numero o una stringa (anche con la virgola) in unità intere di 1/scale.
+
+    Arrotonda a metà per eccesso sul valore decimale scritto: '2,675' e 2.675 danno
+    entrambi 268 centesimi, anche se il float 2.675 è appena sotto 2.675. None resta None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value * scale
+    if isinstance(value, str):
+        try:
+            number = Decimal(value.strip().replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError(f"Numero non valido: {value!r}") from None
+        if not number.is_finite():
+            raise ValueError(f"Numero non valido: {value!r}")
+        return int((number * scale).to_integral_value(rounding=ROUND_HALF_UP))
+    value = float(value)
+    scaled = value * scale
+    whole = math.floor(scaled)
+    fraction = scaled - whole
+    if abs(fraction - 0.5) < HALF_TOLERANCE:
+        # Vicino a metà: decide il valore decimale del float (la sua repr), in modo esatto
+        return to_units(repr(value), scale)
+    return whole + 1 if fraction > 0.5 else whole
+
+def cents(value):
+    return to_units(value, CENTS)
+
+def price_units(value):
+    return to_units(value, PRICE_UNITS)
+
+def mq_units(value):
+    return to_units(value, MQ_UNITS)
+
+def tenths_mm(length_cm):
+    return to_units(length_cm, TENTHS_MM_PER_CM)
+
+def tenths_mm_from_m(length_m):
+    return to_units(length_m, TENTHS_MM_PER_M)
+
+def to_float(units, scale):
+    """Valore in unità intere come float, per il database e le API che usano i float."""
+    return None if units is None else units / scale
+
+def div_round(numerator, denominator):
+    """numerator / denominator arrotondato all'intero, a metà per eccesso (lontano da zero)."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+def slab_mq_units(quantity, length_tmm, width_tmm):
+    """m² (in decimillesimi) di quantity soglie length_tmm x width_tmm."""
+    return div_round(quantity * length_tmm * width_tmm, MQ_DIVISOR)
+
+def slab_cost_cents(quantity, length_tmm, width_tmm, price_per_sqm_units):
+    """Costo in centesimi delle soglie, calcolato sulla superficie esatta e arrotondato una volta."""
+    return div_round(quantity * length_tmm * width_tmm * price_per_sqm_units, SLAB_DIVISOR)
+
+def length_cost_cents(length_tmm, price_per_lm_units, quantity):
+    """Costo in centesimi di quantity pezzi lunghi length_tmm (bordi ed elementi lineari)."""
+    return div_round(length_tmm * price_per_lm_units * quantity, LENGTH_DIVISOR)
+
+def format_units(units, scale, decimals):
+    """Valore in unità intere come stringa con `decimals` decimali, senza passare dai float."""
+    if units is None:
+        return ""
+    factor = 10 ** decimals
+    if scale == factor:
+        value = units
+    elif scale % factor == 0:
+        value = div_round(units, scale // factor)
+    else:
+        value = div_round(units * factor, scale)
+    sign = "-" if value < 0 else ""
+    whole, fraction = divmod(abs(value), factor)
+    if not decimals:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{fraction:0{decimals}d}"
+
+def format_cents(value):
+    return format_units(value, CENTS, EUR_DECIMALS)
+
+def format_price(value):
+    return format_units(value, PRICE_UNITS, PRICE_DECIMALS)
+
+def format_mq(value):
+    return format_units(value, MQ_UNITS, MQ_DECIMALS)
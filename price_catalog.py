@@ -0,0 +1,260 @@
+import threading
+
+
+def material_sort_key(row):
+    # Stesso ordine di "ORDER BY name, supplier, thickness_mm" (in SQLite i NULL vengono per primi)
+    return (row['name'],
+            row['supplier'] is not None, row['supplier'] or '',
+            row['thickness_mm'] is not None, row['thickness_mm'] or 0,
+            row['id'])
+
+def edge_sort_key(row):
+    # Stesso ordine di "ORDER BY material_name, thickness_mm, edge_type"
+    return (row['material_name'] is not None, row['material_name'] or '',
+            row['thickness_mm'] is not None, row['thickness_mm'] or 0,
+            row['edge_type'], row['id'])
+
+def _edge_scopes(material_name, thickness_mm):
+    """Restituisce gli ambiti (material_name, thickness_mm) da consultare, dal più specifico al generico."""
+    scopes = []
+    if material_name is not None and thickness_mm is not None:
+        scopes.append((material_name, thickness_mm))
+    if material_name is not None:
+        scopes.append((material_name, None))
+    if thickness_mm is not None:
+        scopes.append((None, thickness_mm))
+    scopes.append((None, None))
+    return scopes
+
+
+class PriceCatalog:
+    """Copia in memoria delle tabelle materials ed edges.
+
+    Le righe vengono caricate una volta tramite `loader` (una funzione che restituisce
+    (materiali, bordi, seq), dove seq è l'ultima modifica del registro catalog_changes già
+    compresa nelle righe) e poi servite dagli indici in memoria. Chi scrive sul database
+    deve chiamare put_*/remove_* oppure invalidate(); le modifiche di altre istanze
+    arrivano con apply_changes().
+    Gli indici usano lo spessore in millimetri interi (thickness_mm), stabile come chiave.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._loaded = False
+        self._warming = False
+        self._seq = None
+        self._reset()
+
+    def _reset(self):
+        self._materials = {}            # id -> riga
+        self._materials_by_supplier = {}  # supplier -> {id: riga}
+        self._edges = {}                # id -> riga
+        self._edges_by_key = {}         # (material_name, thickness_mm, edge_type) -> riga
+        self._edges_by_scope = {}       # (material_name, thickness_mm) -> {id: riga}
+        self._sorted_materials = None
+        self._sorted_edges = None
+
+    # --- Caricamento ---
+
+    def is_loaded(self):
+        return self._loaded
+
+    def is_warming(self):
+        return self._warming
+
+    def load(self):
+        """Carica (o ricarica) l'intero catalogo in modo sincrono."""
+        with self._lock:
+            generation = self._generation
+        materials, edges, seq = self._loader()
+        with self._lock:
+            if generation != self._generation:
+                # Invalidato durante il caricamento: i dati letti potrebbero essere vecchi
+                return False
+            self._reset()
+            self._seq = seq
+            for row in materials:
+                self._index_material(row)
+            for row in edges:
+                self._index_edge(row)
+            self._loaded = True
+        return True
+
+    def seq(self):
+        """Ultima modifica del registro già applicata, None se il catalogo non è caricato."""
+        with self._lock:
+            return self._seq if self._loaded else None
+
+    def warm_in_background(self):
+        """Avvia il caricamento in un thread separato; le letture nel frattempo vanno su SQLite."""
+        with self._lock:
+            if self._loaded or self._warming:
+                return
+            self._warming = True
+
+        def _warm():
+            try:
+                self.load()
+            finally:
+                self._warming = False
+
+        threading.Thread(target=_warm, name="PriceCatalogWarmup", daemon=True).start()
+
+    def invalidate(self):
+        """Scarta il contenuto: la prossima lettura ricaricherà il catalogo."""
+        with self._lock:
+            self._generation += 1
+            self._loaded = False
+            self._reset()
+
+    # --- Aggiornamenti puntuali (write-through) ---
+
+    def _index_material(self, row):
+        self._materials[row['id']] = row
+        self._materials_by_supplier.setdefault(row['supplier'], {})[row['id']] = row
+        self._sorted_materials = None
+
+    def _index_edge(self, row):
+        self._edges[row['id']] = row
+        key = (row['material_name'], row['thickness_mm'], row['edge_type'])
+        current = self._edges_by_key.get(key)
+        # Se esistono duplicati (database non ancora compattato) vince il record più vecchio, come in SQLite
+        if current is None or row['id'] < current['id']:
+            self._edges_by_key[key] = row
+        self._edges_by_scope.setdefault((row['material_name'], row['thickness_mm']), {})[row['id']] = row
+        self._sorted_edges = None
+
+    def put_material(self, row):
+        with self._lock:
+            if not self._loaded:
+                self._generation += 1  # un caricamento in corso non vedrebbe questa modifica
+                return
+            self._remove_material(row['id'])
+            self._index_material(row)
+
+    def remove_material(self, material_id):
+        with self._lock:
+            if not self._loaded:
+                self._generation += 1
+                return
+            self._remove_material(material_id)
+
+    def _remove_material(self, material_id):
+        old = self._materials.pop(material_id, None)
+        if old is None:
+            return
+        by_supplier = self._materials_by_supplier.get(old['supplier'])
+        if by_supplier is not None:
+            by_supplier.pop(material_id, None)
+            if not by_supplier:
+                del self._materials_by_supplier[old['supplier']]
+        self._sorted_materials = None
+
+    def put_edge(self, row):
+        with self._lock:
+            if not self._loaded:
+                self._generation += 1
+                return
+            self._remove_edge(row['id'])
+            self._index_edge(row)
+
+    def remove_edge(self, edge_id):
+        with self._lock:
+            if not self._loaded:
+                self._generation += 1
+                return
+            self._remove_edge(edge_id)
+
+    def _remove_edge(self, edge_id):
+        old = self._edges.pop(edge_id, None)
+        if old is None:
+            return
+        scope = self._edges_by_scope.get((old['material_name'], old['thickness_mm']))
+        if scope is not None:
+            scope.pop(edge_id, None)
+            if not scope:
+                del self._edges_by_scope[(old['material_name'], old['thickness_mm'])]
+        key = (old['material_name'], old['thickness_mm'], old['edge_type'])
+        if self._edges_by_key.get(key) is old:
+            del self._edges_by_key[key]
+            duplicates = [row for row in (scope or {}).values() if row['edge_type'] == old['edge_type']]
+            if duplicates:
+                self._edges_by_key[key] = min(duplicates, key=lambda row: row['id'])
+        self._sorted_edges = None
+
+    def apply_changes(self, seq, materials, edges):
+        """Applica le righe cambiate fino alla modifica `seq` del registro.
+
+        `materials` ed `edges` sono {id: riga attuale, None se eliminata}, come restituiti
+        da database.get_catalog_changes. Ignorate se il catalogo non è caricato o le ha già.
+        """
+        with self._lock:
+            if not self._loaded or seq <= self._seq:
+                return
+            for material_id, row in materials.items():
+                self._remove_material(material_id)
+                if row is not None:
+                    self._index_material(row)
+            for edge_id, row in edges.items():
+                self._remove_edge(edge_id)
+                if row is not None:
+                    self._index_edge(row)
+            self._seq = seq
+
+    # --- Letture ---
+
+    def all_materials(self):
+        with self._lock:
+            if self._sorted_materials is None:
+                self._sorted_materials = sorted(self._materials.values(), key=material_sort_key)
+            return list(self._sorted_materials)
+
+    def material_by_id(self, material_id):
+        with self._lock:
+            return self._materials.get(int(material_id))
+
+    def materials_by_supplier(self, supplier):
+        with self._lock:
+            rows = list(self._materials_by_supplier.get(supplier, {}).values())
+        return sorted(rows, key=material_sort_key)
+
+    def all_edge_types(self):
+        with self._lock:
+            if self._sorted_edges is None:
+                self._sorted_edges = sorted(self._edges.values(), key=edge_sort_key)
+            return list(self._sorted_edges)
+
+    def edge_by_id(self, edge_id):
+        with self._lock:
+            return self._edges.get(int(edge_id))
+
+    def edge_types_for(self, material_name, thickness_mm):
+        """Bordi validi per materiale/spessore (mm), dal più specifico al generico e poi per nome."""
+        result = []
+        with self._lock:
+            for scope in _edge_scopes(material_name, thickness_mm):
+                rows = self._edges_by_scope.get(scope)
+                if rows:
+                    result.extend(sorted(rows.values(), key=lambda row: (row['edge_type'], row['id'])))
+        return result
+
+    def distinct_edge_types(self):
+        """Un record per tipo di bordo, preferendo quelli generici."""
+        best = {}
+        with self._lock:
+            for row in self._edges.values():
+                rank = (row['material_name'] is not None, row['thickness_mm'] is not None)
+                current = best.get(row['edge_type'])
+                if current is None or rank < current[0]:
+                    best[row['edge_type']] = (rank, row)
+        return [dict(best[edge_type][1]) for edge_type in sorted(best)]
+
+    def edge_price(self, material_name, thickness_mm, edge_type):
+        with self._lock:
+            for scope_material, scope_thickness_mm in _edge_scopes(material_name, thickness_mm):
+                row = self._edges_by_key.get((scope_material, scope_thickness_mm, edge_type))
+                if row is not None:
+                    return row['price_per_lm']
+        return None
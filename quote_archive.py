@@ -0,0 +1,197 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import datetime
+import database
+import db_worker
+
+PAGE_SIZE = 100
+
+def parse_date(text):
+    """Converte "AAAA-MM-GG" o "GG/MM/AAAA" in una data; None se il campo è vuoto."""
+    text = text.strip()
+    if not text:
+        return None
+    for date_format in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Data non valida: {text}")
+
+class QuoteArchive(tk.Toplevel):
+    """Archivio dei preventivi salvati: carica una pagina alla volta, il preventivo solo quando viene aperto."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Archivio Preventivi")
+        self.geometry("800x500")
+        self.parent = parent
+
+        self.filters = {}
+        self.last_key = None      # (created_at, id) dell'ultimo preventivo caricato
+        self.exhausted = False
+        self.loading = False
+
+        self.create_widgets()
+        self.search()
+
+        self.transient(parent)
+        self.grab_set()
+
+    def create_widgets(self):
+        # Filtri
+        filter_frame = ttk.LabelFrame(self, text="Cerca", padding="10")
+        filter_frame.pack(fill="x", padx=10, pady=10)
+
+        ttk.Label(filter_frame, text="Cliente:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.client_var = tk.StringVar()
+        client_entry = ttk.Entry(filter_frame, textvariable=self.client_var, width=20)
+        client_entry.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+
+        ttk.Label(filter_frame, text="Numero:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        self.number_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.number_var, width=12).grid(row=0, column=3, padx=5, pady=5, sticky="ew")
+
+        ttk.Label(filter_frame, text="Dal:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.date_from_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.date_from_var, width=12).grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(filter_frame, text="Al:").grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        self.date_to_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.date_to_var, width=12).grid(row=1, column=3, padx=5, pady=5, sticky="w")
+
+        ttk.Button(filter_frame, text="Cerca", command=self.search).grid(row=0, column=4, rowspan=2, padx=10, pady=5)
+        filter_frame.columnconfigure(1, weight=1)
+        filter_frame.columnconfigure(3, weight=1)
+        self.bind("<Return>", lambda event: self.search())
+        client_entry.focus_set()
+
+        # Elenco preventivi
+        list_frame = ttk.Frame(self)
+        list_frame.pack(fill="both", expand=True, padx=10)
+
+        columns = ("numero", "data", "cliente", "righe", "totale")
+        self.tree = ttk.Treeview(list_frame, columns=columns, show="headings")
+        self.tree.heading("numero", text="Numero")
+        self.tree.heading("data", text="Data")
+        self.tree.heading("cliente", text="Cliente")
+        self.tree.heading("righe", text="Righe")
+        self.tree.heading("totale", text="Totale (€)")
+        self.tree.column("numero", width=90)
+        self.tree.column("data", width=140)
+        self.tree.column("cliente", width=250)
+        self.tree.column("righe", width=60, anchor="e")
+        self.tree.column("totale", width=100, anchor="e")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.bind("<Double-1>", lambda event: self.open_selected())
+
+        # Pulsanti
+        button_frame = ttk.Frame(self)
+        button_frame.pack(fill="x", padx=10, pady=10)
+
+        self.status_var = tk.StringVar()
+        ttk.Label(button_frame, textvariable=self.status_var).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Chiudi", command=self.destroy).pack(side="right", padx=5)
+        self.delete_button = ttk.Button(button_frame, text="Elimina", command=self.delete_selected)
+        self.delete_button.pack(side="right", padx=5)
+        ttk.Button(button_frame, text="Apri", command=self.open_selected).pack(side="right", padx=5)
+        self.more_button = ttk.Button(button_frame, text="Carica altri", command=self.load_next_page)
+        self.more_button.pack(side="right", padx=5)
+
+    def search(self):
+        """Riparte dalla prima pagina con i filtri correnti."""
+        try:
+            self.filters = {
+                'client': self.client_var.get().strip() or None,
+                'number': self.number_var.get().strip() or None,
+                'date_from': parse_date(self.date_from_var.get()),
+                'date_to': parse_date(self.date_to_var.get()),
+            }
+        except ValueError as e:
+            messagebox.showerror("Errore Filtro", f"{e} (usa AAAA-MM-GG o GG/MM/AAAA).", parent=self)
+            return
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.last_key = None
+        self.exhausted = False
+        self.loading = False  # Una pagina della ricerca precedente ancora in arrivo viene scartata
+        self.load_next_page()
+
+    @database.query_scope("Archivio preventivi: pagina")
+    def load_next_page(self):
+        """Accoda la pagina successiva dell'archivio (letta nel thread del database)."""
+        if self.exhausted or self.loading:
+            return
+        self.loading = True
+        db_worker.when_done(self, database.list_quotes_async(limit=PAGE_SIZE, after=self.last_key, **self.filters),
+                            self._append_page, self._on_load_error, key="page")
+
+    def _append_page(self, quotes):
+        self.loading = False
+        for quote in quotes:
+            self.tree.insert("", "end", iid=str(quote['id']), values=(
+                quote['quote_number'],
+                quote['created_at'],
+                quote['client'] or "",
+                quote['line_count'],
+                f"{quote['total_eur']:.2f}"
+            ))
+        if quotes:
+            self.last_key = (quotes[-1]['created_at'], quotes[-1]['id'])
+        self.exhausted = len(quotes) < PAGE_SIZE
+        self.more_button.configure(state="disabled" if self.exhausted else "normal")
+        count = len(self.tree.get_children())
+        self.status_var.set(f"{count} preventivi" if self.exhausted else f"{count} preventivi caricati, altri disponibili")
+
+    def _on_load_error(self, error):
+        self.loading = False
+        messagebox.showerror("Errore Database", f"Impossibile caricare l'archivio: {error}", parent=self)
+
+    def on_tree_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # Arrivati in fondo all'elenco si carica la pagina successiva
+        if float(last) >= 1.0 and not self.exhausted and self.tree.get_children():
+            self.after_idle(self.load_next_page)
+
+    def selected_quote_id(self):
+        selected = self.tree.selection()
+        if not selected:
+            messagebox.showwarning("Nessuna Selezione", "Selezionare un preventivo.", parent=self)
+            return None
+        return int(selected[0])
+
+    def open_selected(self):
+        quote_id = self.selected_quote_id()
+        if quote_id is None:
+            return
+        if self.parent.load_quote_from_archive(quote_id):
+            self.destroy()
+
+    def delete_selected(self):
+        quote_id = self.selected_quote_id()
+        if quote_id is None:
+            return
+        quote_number = self.tree.item(str(quote_id), "values")[0]
+        if messagebox.askyesno("Conferma Eliminazione", f"Eliminare il preventivo {quote_number} dall'archivio?", parent=self):
+            # Eliminato nel thread del database; fino alla risposta non si può eliminare di nuovo
+            self.delete_button.configure(state="disabled")
+            db_worker.when_done(self, database.delete_quote_async(quote_id),
+                                lambda deleted: self._on_quote_deleted(quote_id, deleted), self._on_delete_error)
+
+    def _on_quote_deleted(self, quote_id, deleted):
+        self.delete_button.configure(state="normal")
+        if deleted:
+            if self.tree.exists(str(quote_id)):
+                self.tree.delete(str(quote_id))
+            if getattr(self.parent, 'current_quote_id', None) == quote_id:
+                self.parent.current_quote_id = None
+        else:
+            messagebox.showerror("Errore", "Impossibile eliminare il preventivo.", parent=self)
+
+    def _on_delete_error(self, error):
+        self.delete_button.configure(state="normal")
+        messagebox.showerror("Errore Database", f"Impossibile eliminare il preventivo: {error}", parent=self)
@@ -0,0 +1,707 @@
+from types import MappingProxyType
+
+from contextlib import contextmanager
+
+import money
+from database import QUOTE_EDGE_SIDES
+
+_NO_EDGES = MappingProxyType({})
+
+
+class _Record:
+    """Base dei record immutabili: i campi sono __slots__ e si assegnano solo nel costruttore."""
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} non è modificabile: usare replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} non è modificabile")
+
+    def replace(self, **changes):
+        """Copia del record con i campi indicati cambiati."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Per pickle (es. i risultati dei processi di batch_quote): la ricostruzione non passa da __setattr__
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields = {name: dict(value) if isinstance(value, MappingProxyType) else value for name, value in fields.items()}
+        return _rebuild_record, (type(self), fields)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+def _rebuild_record(cls, fields):
+    record = object.__new__(cls)
+    _Record.__init__(record, **{name: MappingProxyType(value) if isinstance(value, dict) else value
+                                for name, value in fields.items()})
+    return record
+
+
+class QuoteEdge(_Record):
+    """Bordo di un lato di una riga: tipo, lunghezza del lato, prezzo al metro e costo per tutte le soglie.
+
+    I valori sono interi (decimi di mm, decimillesimi di euro, centesimi); length_cm,
+    price_lm e cost sono gli stessi valori come float.
+    """
+
+    __slots__ = ('edge_type', 'length_tmm', 'price_units', 'cost_cents')
+
+    def __init__(self, edge_type, length_tmm, price_units, cost_cents):
+        super().__init__(edge_type=edge_type, length_tmm=length_tmm, price_units=price_units, cost_cents=cost_cents)
+
+    @property
+    def length_cm(self):
+        return money.to_float(self.length_tmm, money.TENTHS_MM_PER_CM)
+
+    @property
+    def price_lm(self):
+        return money.to_float(self.price_units, money.PRICE_UNITS)
+
+    @property
+    def cost(self):
+        return money.to_float(self.cost_cents, money.CENTS)
+
+
+class QuoteLine(_Record):
+    """Riga del preventivo, con i valori già calcolati in unità intere (vedi money).
+
+    Per le soglie `price_units` è il prezzo al m² e `edges` i bordi per lato (solo i lati
+    con un bordo); per gli elementi lineari (is_linear) `price_units` è il prezzo al metro
+    lineare, `length_tmm` la lunghezza del pezzo, `mq_units` i metri lineari totali e
+    `edges` è vuoto. Le proprietà (length_cm, price, mq, total...) danno gli stessi valori
+    come float, per il database e la visualizzazione.
+    """
+
+    __slots__ = ('line_id', 'is_linear', 'quantity', 'length_tmm', 'width_tmm', 'material_name',
+                 'thickness', 'price_units', 'mq_units', 'slab_cents', 'edges', 'edges_cents',
+                 'total_cents', 'notes')
+
+    @property
+    def length_cm(self):
+        # Per gli elementi lineari è la lunghezza in metri, come nell'archivio
+        scale = money.TENTHS_MM_PER_M if self.is_linear else money.TENTHS_MM_PER_CM
+        return money.to_float(self.length_tmm, scale)
+
+    @property
+    def width_cm(self):
+        return money.to_float(self.width_tmm, money.TENTHS_MM_PER_CM)
+
+    @property
+    def price(self):
+        return money.to_float(self.price_units, money.PRICE_UNITS)
+
+    @property
+    def mq(self):
+        return money.to_float(self.mq_units, money.MQ_UNITS)
+
+    @property
+    def slab_cost(self):
+        return money.to_float(self.slab_cents, money.CENTS)
+
+    @property
+    def edges_cost(self):
+        return money.to_float(self.edges_cents, money.CENTS)
+
+    @property
+    def total(self):
+        return money.to_float(self.total_cents, money.CENTS)
+
+
+class QuoteTotals(_Record):
+    """Totali del preventivo in unità intere; mq, slabs_eur, edges_eur e total_eur come float."""
+
+    __slots__ = ('line_count', 'mq_units', 'slabs_cents', 'edges_cents', 'total_cents')
+
+    @property
+    def mq(self):
+        return money.to_float(self.mq_units, money.MQ_UNITS)
+
+    @property
+    def slabs_eur(self):
+        return money.to_float(self.slabs_cents, money.CENTS)
+
+    @property
+    def edges_eur(self):
+        return money.to_float(self.edges_cents, money.CENTS)
+
+    @property
+    def total_eur(self):
+        return money.to_float(self.total_cents, money.CENTS)
+
+
+class EdgeProfile(_Record):
+    """Profilo dei bordi: tipo di bordo per lato, nell'ordine di QUOTE_EDGE_SIDES (None = nessun bordo).
+
+    Si ottiene con edge_profile(), che restituisce sempre lo stesso oggetto per gli
+    stessi tipi: i profili uguali sono condivisi e si confrontano con `is`.
+    """
+
+    __slots__ = ('edge_types',)
+
+    @property
+    def edges(self):
+        """{lato: tipo di bordo}, solo i lati con un bordo."""
+        return {side: edge_type for side, edge_type in zip(QUOTE_EDGE_SIDES, self.edge_types) if edge_type}
+
+    def __hash__(self):
+        return hash(self.edge_types)
+
+
+_edge_profiles = {}  # tipi per lato -> EdgeProfile
+
+
+def edge_profile(edges):
+    """Profilo (condiviso) per {lato: tipo di bordo}; i lati mancanti o vuoti non hanno bordo."""
+    edge_types = tuple(edges.get(side) or None for side in QUOTE_EDGE_SIDES)
+    profile = _edge_profiles.get(edge_types)
+    if profile is None:
+        profile = _edge_profiles.setdefault(edge_types, EdgeProfile(edge_types=edge_types))
+    return profile
+
+def side_length_tmm(length_tmm, width_tmm, side):
+    """Lunghezza del lato di una soglia: fronte e retro sono la lunghezza, i fianchi la larghezza."""
+    return length_tmm if side in ('front', 'back') else width_tmm
+
+def edge_records(quantity, length_tmm, width_tmm, edges):
+    """Bordi di una soglia da {lato: (tipo, prezzo al metro in unità intere)}: ({lato: QuoteEdge}, costo totale in centesimi)."""
+    records = {}
+    for side in QUOTE_EDGE_SIDES:
+        if side in edges:
+            edge_type, price_units = edges[side]
+            side_tmm = side_length_tmm(length_tmm, width_tmm, side)
+            records[side] = QuoteEdge(edge_type, side_tmm, price_units,
+                                      money.length_cost_cents(side_tmm, price_units, quantity))
+    return records, sum(edge.cost_cents for edge in records.values())
+
+
+# Differenza ammessa tra un importo salvato e quello ricalcolato, per ogni valore arrotondato:
+# i preventivi delle versioni precedenti, calcolati con i float, possono differire di un'unità
+# sui mezzi centesimi
+STORED_ROUNDING_TOLERANCE = 1
+
+def _check_stored_amounts(data, mq_units, slab_cents, edges_cents, total_cents, edges_tolerance):
+    """Solleva ValueError se m² o importi salvati in `data` non coincidono con quelli ricalcolati."""
+    tolerance = STORED_ROUNDING_TOLERANCE
+    checks = (
+        ('mq', 'm²', mq_units, money.mq_units, money.format_mq, tolerance),
+        ('slab_cost', 'costo lastra', slab_cents, money.cents, money.format_cents, tolerance),
+        ('edges_cost', 'costo bordi', edges_cents, money.cents, money.format_cents, edges_tolerance * tolerance),
+        ('total', 'totale', total_cents, money.cents, money.format_cents, (1 + edges_tolerance) * tolerance),
+    )
+    for key, label, computed, to_units, format_units, allowed in checks:
+        if data.get(key) is None:
+            continue
+        stored = to_units(data[key])
+        if abs(stored - computed) > allowed:
+            raise ValueError(f"{label} {format_units(stored)} diverso da quello calcolato da misure e prezzi "
+                             f"({format_units(computed)})")
+
+
+# Nodi della tabella delle righe: tuple di 32 elementi, indicizzate da 5 bit di line_id
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+
+
+def _trie_set(node, shift, key, line):
+    """Copia del nodo con la riga `key` sostituita (None = eliminata); None se il nodo resta vuoto."""
+    children = list(node) if node is not None else [None] * _WIDTH
+    index = (key >> shift) & _MASK
+    children[index] = _trie_set(children[index], shift - _BITS, key, line) if shift else line
+    if all(child is None for child in children):
+        return None
+    return tuple(children)
+
+def _trie_iter(node, shift, start):
+    """Righe del nodo con chiave >= start, in ordine di chiave."""
+    first = (start >> shift) & _MASK if start >= 0 else 0
+    for index in range(first, _WIDTH):
+        child = node[index]
+        if child is None:
+            continue
+        if not shift:
+            yield child
+        else:
+            # Solo il primo figlio parte da `start`, i successivi dall'inizio
+            yield from _trie_iter(child, shift - _BITS, start if index == first else -1)
+
+def _trie_diff(old, new, shift):
+    """(vecchia, nuova) per le righe diverse tra due nodi, dall'ultima alla prima.
+
+    I sottoalberi condivisi (stesso oggetto) sono saltati: il costo dipende dalle righe
+    cambiate, non dalla dimensione del preventivo.
+    """
+    for index in range(_WIDTH - 1, -1, -1):
+        old_child = old[index] if old is not None else None
+        new_child = new[index] if new is not None else None
+        if old_child is new_child:
+            continue
+        if shift:
+            yield from _trie_diff(old_child, new_child, shift - _BITS)
+        else:
+            yield old_child, new_child
+
+
+class _LineTable:
+    """Tabella persistente line_id -> QuoteLine: trie a 32 vie di tuple immutabili.
+
+    set() non modifica la tabella ma ne restituisce una nuova che condivide con questa
+    tutti i nodi tranne quelli sul percorso della riga cambiata (tre nodi per 30.000
+    righe): ogni versione del preventivo conservata per annulla/ripeti costa quindi
+    quanto le righe cambiate. Gli id sono crescenti, quindi l'ordine degli id è quello
+    del preventivo.
+    """
+
+    __slots__ = ('_root', '_shift', '_count')
+
+    def __init__(self, root=None, shift=0, count=0):
+        self._root = root
+        self._shift = shift
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return self.lines_from(1)
+
+    def get(self, line_id):
+        key = line_id - 1
+        if self._root is None or not 0 <= key < _WIDTH << self._shift:
+            return None
+        node, shift = self._root, self._shift
+        while shift and node is not None:
+            node = node[(key >> shift) & _MASK]
+            shift -= _BITS
+        return None if node is None else node[key & _MASK]
+
+    def lines_from(self, line_id):
+        """Righe con id >= line_id, in ordine."""
+        if self._root is None or line_id - 1 >= _WIDTH << self._shift:
+            return iter(())
+        return _trie_iter(self._root, self._shift, max(line_id - 1, 0))
+
+    def set(self, line_id, line):
+        """Nuova tabella con la riga line_id sostituita, aggiunta o (line=None) eliminata."""
+        key = line_id - 1
+        old = self.get(line_id)
+        if old is None and line is None:
+            return self
+        root, shift = self._root, self._shift
+        while key >= _WIDTH << shift:
+            root = None if root is None else (root,) + (None,) * (_WIDTH - 1)
+            shift += _BITS
+        root = _trie_set(root, shift, key, line)
+        return _LineTable(root, shift if root is not None else 0,
+                          self._count + (old is None) - (line is None))
+
+    def diff(self, other):
+        """(riga in questa tabella, riga in other) per ogni id diverso, dall'ultimo al primo."""
+        old, new = self._root, other._root
+        old_shift, new_shift = self._shift, other._shift
+        # Porta le due radici alla stessa altezza (un nodo con il solo primo figlio)
+        while old_shift < new_shift:
+            old = None if old is None else (old,) + (None,) * (_WIDTH - 1)
+            old_shift += _BITS
+        while new_shift < old_shift:
+            new = None if new is None else (new,) + (None,) * (_WIDTH - 1)
+            new_shift += _BITS
+        if old is new:
+            return iter(())
+        return _trie_diff(old, new, old_shift)
+
+
+_EMPTY_TABLE = _LineTable()
+
+
+class QuoteEngine:
+    """Righe del preventivo corrente e totali, indipendenti dall'interfaccia.
+
+    Le righe sono QuoteLine immutabili con importi e misure interi (vedi money): ogni
+    modifica sostituisce la riga e aggiorna i totali togliendo i valori vecchi e
+    aggiungendo i nuovi, quindi costa O(1) qualunque sia il numero di righe e non
+    accumula errori di arrotondamento. Chi mostra il preventivo si registra con
+    subscribe() e riceve ogni cambiamento.
+
+    Ogni modifica può essere annullata (undo) e ripetuta (redo) senza limiti: la
+    cronologia conserva le versioni precedenti della tabella persistente delle righe
+    (_LineTable), che condividono tutte le righe non cambiate, e i totali. Un passo
+    costa quanto le righe modificate, e annullarlo notifica solo quelle.
+    """
+
+    def __init__(self):
+        self._lines = _EMPTY_TABLE  # line_id -> QuoteLine, nell'ordine del preventivo
+        self._next_id = 1
+        self._mq_units = 0
+        self._slabs_cents = 0
+        self._edges_cents = 0
+        self._total_cents = 0
+        self._listeners = []
+        self._undo = []  # stati precedenti (vedi _state), il più recente in fondo
+        self._redo = []
+        self._group_depth = 0
+
+    # --- Notifiche ---
+
+    def subscribe(self, listener):
+        """Registra listener(vecchia, nuova), chiamata a ogni cambiamento.
+
+        Riga aggiunta: (None, riga); eliminata: (riga, None); modificata: (vecchia, nuova);
+        preventivo svuotato con clear(): (None, None).
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, old, new):
+        for listener in list(self._listeners):
+            listener(old, new)
+
+    def _count(self, line, sign):
+        self._mq_units += sign * line.mq_units
+        self._slabs_cents += sign * line.slab_cents
+        self._edges_cents += sign * line.edges_cents
+        self._total_cents += sign * line.total_cents
+
+    # --- Annulla / Ripeti ---
+
+    def _state(self):
+        # La tabella è immutabile: lo stato è un riferimento, non una copia delle righe
+        return (self._lines, self._mq_units, self._slabs_cents, self._edges_cents, self._total_cents)
+
+    def _record(self):
+        """Salva lo stato prima di una modifica; in un group() lo salva solo group() all'inizio."""
+        if not self._group_depth:
+            self._undo.append(self._state())
+            self._redo.clear()
+
+    @contextmanager
+    def group(self):
+        """Le modifiche nel blocco with diventano un solo passo di undo (es. più righe eliminate).
+
+        Se il blocco esterno termina con un'eccezione le sue modifiche vengono annullate
+        e non resta nessun passo: il preventivo torna com'era prima del blocco.
+        """
+        if not self._group_depth:
+            self._undo.append(self._state())
+        self._group_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._group_depth -= 1
+            if not self._group_depth:
+                self._restore(self._undo.pop())
+            raise
+        self._group_depth -= 1
+        if not self._group_depth:
+            if self._undo[-1] == self._state():
+                self._undo.pop()  # Nessuna modifica: nessun passo
+            else:
+                self._redo.clear()
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        """Annulla l'ultima modifica (o l'ultimo group()). Restituisce False se non c'è nulla da annullare."""
+        if self._group_depth:
+            raise RuntimeError("undo() non è possibile dentro group()")
+        if not self._undo:
+            return False
+        self._redo.append(self._state())
+        self._restore(self._undo.pop())
+        return True
+
+    def redo(self):
+        """Ripete l'ultima modifica annullata. Restituisce False se non c'è nulla da ripetere."""
+        if self._group_depth:
+            raise RuntimeError("redo() non è possibile dentro group()")
+        if not self._redo:
+            return False
+        self._undo.append(self._state())
+        self._restore(self._redo.pop())
+        return True
+
+    def reset_history(self):
+        """Svuota la cronologia (es. dopo l'apertura di un preventivo dall'archivio)."""
+        self._undo.clear()
+        self._redo.clear()
+
+    def _restore(self, state):
+        old_lines = self._lines
+        self._lines, self._mq_units, self._slabs_cents, self._edges_cents, self._total_cents = state
+        if not len(self._lines):
+            self._notify(None, None)
+            return
+        # Solo le righe diverse tra le due versioni, dall'ultima alla prima: quando una riga
+        # torna nel preventivo, quelle che la seguono (line_after) sono già state notificate
+        for old, new in old_lines.diff(self._lines):
+            self._notify(old, new)
+
+    # --- Letture ---
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines)
+
+    def __contains__(self, line_id):
+        return self._lines.get(line_id) is not None
+
+    def get(self, line_id):
+        """Riga con l'id indicato, o None."""
+        return self._lines.get(line_id)
+
+    def line_after(self, line_id):
+        """Riga che segue line_id nel preventivo (anche se line_id non c'è più), o None."""
+        return next(self._lines.lines_from(line_id + 1), None)
+
+    def lines(self):
+        return list(self._lines)
+
+    def totals(self):
+        return QuoteTotals(line_count=len(self._lines), mq_units=self._mq_units,
+                           slabs_cents=self._slabs_cents, edges_cents=self._edges_cents,
+                           total_cents=self._total_cents)
+
+    # --- Modifiche ---
+
+    def _insert(self, **fields):
+        self._record()
+        line = QuoteLine(line_id=self._next_id, **fields)
+        self._next_id += 1
+        self._lines = self._lines.set(line.line_id, line)
+        self._count(line, 1)
+        self._notify(None, line)
+        return line
+
+    def _replace(self, old, new):
+        self._record()
+        self._count(old, -1)
+        self._lines = self._lines.set(new.line_id, new)
+        self._count(new, 1)
+        self._notify(old, new)
+        return new
+
+    def add_slab(self, quantity, length_cm, width_cm, material_name, thickness, price_per_sqm):
+        """Aggiunge una riga di soglie senza bordi e la restituisce."""
+        length_tmm, width_tmm = money.tenths_mm(length_cm), money.tenths_mm(width_cm)
+        price_units = money.price_units(price_per_sqm)
+        slab_cents = money.slab_cost_cents(quantity, length_tmm, width_tmm, price_units)
+        return self._insert(is_linear=False, quantity=quantity, length_tmm=length_tmm, width_tmm=width_tmm,
+                            material_name=material_name, thickness=thickness, price_units=price_units,
+                            mq_units=money.slab_mq_units(quantity, length_tmm, width_tmm),
+                            slab_cents=slab_cents, edges=_NO_EDGES, edges_cents=0,
+                            total_cents=slab_cents, notes='')
+
+    def add_linear(self, quantity, length_m, element_type, price_per_lm, notes=''):
+        """Aggiunge un elemento lineare (quantity pezzi da length_m metri) e lo restituisce."""
+        length_tmm = money.tenths_mm_from_m(length_m)
+        price_units = money.price_units(price_per_lm)
+        # I decimi di mm sono anche decimillesimi di metro lineare, l'unità di mq_units
+        return self._insert(is_linear=True, quantity=quantity, length_tmm=length_tmm, width_tmm=None,
+                            material_name=element_type, thickness=None, price_units=price_units,
+                            mq_units=quantity * length_tmm, slab_cents=0, edges=_NO_EDGES, edges_cents=0,
+                            total_cents=money.length_cost_cents(length_tmm, price_units, quantity),
+                            notes=notes or '')
+
+    def add_priced_slab(self, quantity, length_tmm, width_tmm, material_name, thickness, price_units,
+                        mq_units, slab_cents, edges=None):
+        """Aggiunge una riga di soglie con m² e costo lastra già calcolati (es. da quote_kernel).
+
+        `edges` è {lato: (tipo di bordo, prezzo al metro in unità intere)}. Restituisce la riga.
+        """
+        records, edges_cents = edge_records(quantity, length_tmm, width_tmm, edges or {})
+        return self._insert(is_linear=False, quantity=quantity, length_tmm=length_tmm, width_tmm=width_tmm,
+                            material_name=material_name, thickness=thickness, price_units=price_units,
+                            mq_units=mq_units, slab_cents=slab_cents,
+                            edges=MappingProxyType(records) if records else _NO_EDGES,
+                            edges_cents=edges_cents, total_cents=slab_cents + edges_cents, notes='')
+
+    def add_line_data(self, data):
+        """Aggiunge una riga dal formato di database.save_quote/get_quote.
+
+        I valori possono essere numeri o stringhe (es. la tabella salvata in un file JSON).
+        m², costo lastra, costo dei bordi e totale vengono ricalcolati da quantità, misure e
+        prezzi; quelli salvati servono solo da controllo (vedi _check_stored_amounts): se
+        non coincidono, oltre gli arrotondamenti dei calcoli con i float delle versioni
+        precedenti, la riga non viene aggiunta (ValueError). Senza i singoli bordi (tabella
+        del file JSON) resta il costo dei bordi salvato.
+        """
+        is_linear = bool(data.get('is_linear'))
+        quantity = int(data['quantity'])
+        price_units = money.price_units(data['price'])
+        if is_linear:
+            length_tmm = money.tenths_mm_from_m(data['length_cm'])
+            width_tmm = None
+            mq_units = quantity * length_tmm
+            slab_cents = 0
+            edges, edges_cents = {}, money.cents(data.get('edges_cost') or 0)
+            edges_tolerance = 0
+            total_cents = money.length_cost_cents(length_tmm, price_units, quantity) + edges_cents
+        else:
+            length_tmm, width_tmm = money.tenths_mm(data['length_cm']), money.tenths_mm(data['width_cm'])
+            mq_units = money.slab_mq_units(quantity, length_tmm, width_tmm)
+            slab_cents = money.slab_cost_cents(quantity, length_tmm, width_tmm, price_units)
+            if data.get('edges'):
+                edges, edges_cents = edge_records(quantity, length_tmm, width_tmm, {
+                    side: (edge['edge_type'], money.price_units(edge['price_lm']))
+                    for side, edge in data['edges'].items()})
+                edges_tolerance = len(edges)
+            else:
+                edges, edges_cents = {}, money.cents(data.get('edges_cost') or 0)
+                edges_tolerance = 0
+            total_cents = slab_cents + edges_cents
+        _check_stored_amounts(data, mq_units, slab_cents, edges_cents, total_cents, edges_tolerance)
+        return self._insert(is_linear=is_linear, quantity=quantity, length_tmm=length_tmm, width_tmm=width_tmm,
+                            material_name=data['material_name'], thickness=data.get('thickness'),
+                            price_units=price_units, mq_units=mq_units, slab_cents=slab_cents,
+                            edges=MappingProxyType(edges) if edges else _NO_EDGES,
+                            edges_cents=edges_cents, total_cents=total_cents, notes=data.get('notes') or '')
+
+    def set_edges(self, line_id, edges):
+        """Sostituisce i bordi di una riga di soglie e ne ricalcola costi e totale.
+
+        `edges` è {lato: (tipo di bordo, prezzo al metro)}, solo per i lati con un bordo.
+        Restituisce la riga aggiornata.
+        """
+        old = self._lines.get(line_id)
+        if old is None:
+            raise KeyError(line_id)
+        if old.is_linear:
+            raise ValueError("Gli elementi lineari non hanno bordi")
+        records, edges_cents = edge_records(
+            old.quantity, old.length_tmm, old.width_tmm,
+            {side: (edge_type, money.price_units(price_lm)) for side, (edge_type, price_lm) in edges.items()})
+        return self._replace(old, old.replace(edges=MappingProxyType(records) if records else _NO_EDGES,
+                                              edges_cents=edges_cents,
+                                              total_cents=old.slab_cents + edges_cents))
+
+    def edge_price_keys(self, line_ids, profile):
+        """Chiavi (materiale, spessore, tipo di bordo) dei prezzi che servono ad apply_edge_profile.
+
+        Una per ogni combinazione distinta di materiale e spessore delle righe di soglie
+        indicate e tipo di bordo del profilo, da risolvere tutte insieme (es. con
+        database.get_edge_prices).
+        """
+        edge_types = [edge_type for edge_type in profile.edge_types if edge_type]
+        materials = dict.fromkeys((line.material_name, line.thickness) for line in map(self._lines.get, line_ids)
+                                  if line is not None and not line.is_linear)
+        return [(material_name, thickness, edge_type)
+                for material_name, thickness in materials for edge_type in dict.fromkeys(edge_types)]
+
+    def apply_edge_profile(self, line_ids, profile, edge_prices):
+        """Applica un profilo dei bordi a più righe di soglie, in un solo passo di annulla.
+
+        `edge_prices` è {(materiale, spessore, tipo di bordo): prezzo al metro} per tutte
+        le chiavi di edge_price_keys(); se un prezzo manca non viene modificata nessuna
+        riga (ValueError). Gli elementi lineari sono saltati. Le righe con la stessa
+        quantità, misure e prezzi condividono gli stessi bordi (un solo dict di QuoteEdge).
+        Restituisce le righe aggiornate.
+        """
+        lines = [line for line in map(self._lines.get, line_ids) if line is not None and not line.is_linear]
+        side_prices = {}  # (materiale, spessore) -> {lato: (tipo, prezzo in unità intere)}
+        for line in lines:
+            key = (line.material_name, line.thickness)
+            if key in side_prices:
+                continue
+            prices = {}
+            for side, edge_type in profile.edges.items():
+                price_lm = edge_prices.get(key + (edge_type,))
+                if price_lm is None:
+                    raise ValueError(f"Bordo '{edge_type}' senza prezzo per {line.material_name} ({line.thickness} cm)")
+                prices[side] = (edge_type, money.price_units(price_lm))
+            side_prices[key] = prices
+
+        shared = {}  # (quantità, lunghezza, larghezza, bordi) -> (bordi della riga, costo)
+        updated = []
+        with self.group():
+            for line in lines:
+                edges = side_prices[(line.material_name, line.thickness)]
+                shape = (line.quantity, line.length_tmm, line.width_tmm, tuple(edges.items()))
+                if shape not in shared:
+                    records, edges_cents = edge_records(line.quantity, line.length_tmm, line.width_tmm, edges)
+                    shared[shape] = (MappingProxyType(records) if records else _NO_EDGES, edges_cents)
+                records, edges_cents = shared[shape]
+                updated.append(self._replace(line, line.replace(edges=records, edges_cents=edges_cents,
+                                                                total_cents=line.slab_cents + edges_cents)))
+        return updated
+
+    def remove(self, line_id):
+        """Elimina una riga e la restituisce."""
+        line = self._lines.get(line_id)
+        if line is None:
+            raise KeyError(line_id)
+        self._record()
+        self._lines = self._lines.set(line_id, None)
+        self._count(line, -1)
+        self._notify(line, None)
+        return line
+
+    def clear(self):
+        """Elimina tutte le righe (si può annullare)."""
+        if len(self._lines):
+            self._record()
+        self._lines = _EMPTY_TABLE
+        self._mq_units = self._slabs_cents = self._edges_cents = self._total_cents = 0
+        self._notify(None, None)
+
+    # --- Archivio ---
+
+    def load_lines_data(self, lines):
+        """Sostituisce il preventivo con le righe nel formato di database.get_quote.
+
+        È un nuovo preventivo: la cronologia di annulla/ripeti viene azzerata.
+        """
+        with self.group():
+            self.clear()
+            for data in lines:
+                self.add_line_data(data)
+        self.reset_history()
+
+    def lines_data(self):
+        """Righe nel formato di database.save_quote."""
+        return [
+            {
+                'is_linear': line.is_linear,
+                'quantity': line.quantity,
+                'length_cm': line.length_cm,
+                'width_cm': line.width_cm,
+                'material_name': line.material_name,
+                'thickness': line.thickness,
+                'mq': line.mq,
+                'price': line.price,
+                'slab_cost': line.slab_cost,
+                'edges_cost': line.edges_cost,
+                'total': line.total,
+                'notes': line.notes,
+                'edges': {
+                    side: {'edge_type': edge.edge_type, 'length_cm': edge.length_cm,
+                           'price_lm': edge.price_lm, 'cost': edge.cost}
+                    for side, edge in line.edges.items()
+                },
+            }
+            for line in self._lines
+        ]
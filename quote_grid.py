@@ -0,0 +1,341 @@
+import bisect
+import tkinter as tk
+from tkinter import ttk, font as tkfont
+import file_formats
+
+# Colonne della tabella del preventivo, nell'ordine di file_formats.line_row_values
+COLUMNS = ("num", "lun", "lar", "materiale", "spessore", "mq", "prezzo_mq", "costo_lastra", "costo_bordi", "importo_riga", "id_riga")
+HEADINGS = {
+    "num": "N.", "lun": "L (cm)", "lar": "W (cm)", "materiale": "Materiale", "spessore": "Spess. (cm)",
+    "mq": "m²", "prezzo_mq": "€/m²", "costo_lastra": "Lastra (€)", "costo_bordi": "Bordi (€)", "importo_riga": "Tot. Riga (€)",
+}
+WIDTHS = {
+    "num": (40, "center"), "lun": (70, "e"), "lar": (70, "e"), "materiale": (150, "w"), "spessore": (80, "e"),
+    "mq": (70, "e"), "prezzo_mq": (70, "e"), "costo_lastra": (80, "e"), "costo_bordi": (80, "e"), "importo_riga": (90, "e"),
+}
+
+# Chiave di ordinamento di ogni colonna, sui valori interi di QuoteLine (non sulle stringhe mostrate)
+SORT_KEYS = {
+    "num": lambda line: line.quantity,
+    "lun": lambda line: line.length_tmm,
+    "lar": lambda line: -1 if line.width_tmm is None else line.width_tmm,
+    "materiale": lambda line: line.material_name.casefold(),
+    "spessore": lambda line: -1 if line.thickness is None else line.thickness,
+    "mq": lambda line: line.mq_units,
+    "prezzo_mq": lambda line: line.price_units,
+    "costo_lastra": lambda line: line.slab_cents,
+    "costo_bordi": lambda line: line.edges_cents,
+    "importo_riga": lambda line: line.total_cents,
+}
+
+WHEEL_ROWS = 3
+
+
+class QuoteGridModel:
+    """Ordine, ordinamento e selezione delle righe di QuoteEngine mostrate nella tabella, senza widget.
+
+    `order` sono gli id delle righe nell'ordine mostrato. Senza ordinamento è l'ordine
+    del preventivo (id crescenti) ed è aggiornato a ogni cambiamento con una ricerca
+    binaria; con un ordinamento per colonna viene ricalcolato una volta sola, alla
+    prima lettura dopo le modifiche, anche se ne sono arrivate migliaia.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.order = [line.line_id for line in engine]
+        self.selected = set()
+        self.focus = None    # id della riga attiva (ultimo click o tasto freccia)
+        self.anchor = None   # inizio della selezione con Maiusc
+        self.sort_column = None
+        self.sort_descending = False
+        self._order_stale = False
+
+    def __len__(self):
+        return len(self.engine)
+
+    def line_changed(self, old, new):
+        """Da collegare a QuoteEngine.subscribe."""
+        if old is None and new is None:
+            self.order = []
+            self.selected.clear()
+            self.focus = self.anchor = None
+            self._order_stale = False
+            return
+        if new is None:
+            self.selected.discard(old.line_id)
+            if self.focus == old.line_id:
+                self.focus = None
+        if self.sort_column is not None:
+            self._order_stale = True
+        elif old is None:
+            bisect.insort(self.order, new.line_id)
+        elif new is None:
+            index = bisect.bisect_left(self.order, old.line_id)
+            if index < len(self.order) and self.order[index] == old.line_id:
+                del self.order[index]
+
+    def _ensure_order(self):
+        if not self._order_stale:
+            return
+        key = SORT_KEYS[self.sort_column]
+        lines = sorted(self.engine, key=lambda line: (key(line), line.line_id), reverse=self.sort_descending)
+        self.order = [line.line_id for line in lines]
+        self._order_stale = False
+
+    def sort_by(self, column):
+        """Click sull'intestazione: crescente, decrescente, poi di nuovo l'ordine del preventivo."""
+        if column not in SORT_KEYS:
+            return
+        if self.sort_column != column:
+            self.sort_column, self.sort_descending = column, False
+        elif not self.sort_descending:
+            self.sort_descending = True
+        else:
+            self.sort_column, self.sort_descending = None, False
+        if self.sort_column is None:
+            self.order = [line.line_id for line in self.engine]
+            self._order_stale = False
+        else:
+            self._order_stale = True
+
+    def window(self, first, count):
+        """Id delle righe dalla posizione first, al massimo count."""
+        self._ensure_order()
+        return self.order[first:first + count]
+
+    def index(self, line_id):
+        """Posizione della riga nell'ordine mostrato, o None."""
+        self._ensure_order()
+        if self.sort_column is None:
+            index = bisect.bisect_left(self.order, line_id)
+            return index if index < len(self.order) and self.order[index] == line_id else None
+        try:
+            return self.order.index(line_id)
+        except ValueError:
+            return None
+
+    def select(self, index, toggle=False, extend=False):
+        """Selezione con il mouse o la tastiera: riga singola, Ctrl (aggiunge/toglie), Maiusc (intervallo)."""
+        self._ensure_order()
+        line_id = self.order[index]
+        if extend and self.anchor is not None and self.index(self.anchor) is not None:
+            start, end = sorted((self.index(self.anchor), index))
+            if not toggle:
+                self.selected.clear()
+            self.selected.update(self.order[start:end + 1])
+        elif toggle:
+            self.selected.symmetric_difference_update((line_id,))
+            self.anchor = line_id
+        else:
+            self.selected = {line_id}
+            self.anchor = line_id
+        self.focus = line_id
+
+    def select_all(self):
+        self._ensure_order()
+        self.selected = set(self.order)
+
+    def selection(self):
+        """Id delle righe selezionate, nell'ordine mostrato."""
+        self._ensure_order()
+        return [line_id for line_id in self.order if line_id in self.selected]
+
+
+class QuoteGrid(ttk.Frame):
+    """Tabella del preventivo virtualizzata: il Treeview contiene solo le righe visibili.
+
+    Le righe restano in quote_engine; lo scorrimento, l'ordinamento e i cambiamenti del
+    preventivo aggiornano i valori delle poche righe a schermo, in un solo passaggio
+    dopo l'ultima modifica (after_idle), quindi aprire o svuotare un preventivo di
+    migliaia di righe costa quanto una schermata. Selezione e riga attiva sono tenute
+    per id di riga (selection(), focus_line()); `on_activate(line_id)` è chiamata al doppio
+    click o con Invio.
+    """
+
+    def __init__(self, parent, engine, on_activate=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.engine = engine
+        self.model = QuoteGridModel(engine)
+        self.on_activate = on_activate
+        self.first = 0          # posizione della prima riga visibile
+        self._window = []       # id delle righe a schermo, una per elemento "slotN" del Treeview
+        self._row_height = None
+        self._header_height = None
+        self._render_job = None
+
+        self.tree = ttk.Treeview(self, columns=COLUMNS, show="headings", selectmode="extended")
+        for column in COLUMNS[:-1]:
+            self.tree.heading(column, text=HEADINGS[column], command=lambda c=column: self.sort_by(c))
+            width, anchor = WIDTHS[column]
+            self.tree.column(column, width=width, anchor=anchor)
+        self.tree.column("id_riga", width=0, stretch=tk.NO) # Hidden column for row ID
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        # Selezione e tastiera gestite qui: gli elementi del Treeview sono riutilizzati scorrendo
+        self.tree.bind("<Button-1>", lambda event: self._on_click(event))
+        self.tree.bind("<Control-Button-1>", lambda event: self._on_click(event, toggle=True))
+        self.tree.bind("<Shift-Button-1>", lambda event: self._on_click(event, extend=True))
+        self.tree.bind("<Double-1>", self._on_double_click)
+        self.tree.bind("<Up>", lambda event: self._move_focus(-1))
+        self.tree.bind("<Down>", lambda event: self._move_focus(1))
+        self.tree.bind("<Shift-Up>", lambda event: self._move_focus(-1, extend=True))
+        self.tree.bind("<Shift-Down>", lambda event: self._move_focus(1, extend=True))
+        self.tree.bind("<Prior>", lambda event: self._move_focus(-self._visible_rows()))
+        self.tree.bind("<Next>", lambda event: self._move_focus(self._visible_rows()))
+        self.tree.bind("<Home>", lambda event: self._move_focus(-len(self.model)))
+        self.tree.bind("<End>", lambda event: self._move_focus(len(self.model)))
+        self.tree.bind("<Control-a>", self._on_select_all)
+        self.tree.bind("<Return>", self._on_double_click)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(WHEEL_ROWS))
+        self.tree.bind("<Configure>", lambda event: self.refresh())
+
+        engine.subscribe(self._on_quote_changed)
+        self.refresh()
+
+    # --- Stato per chi usa la tabella ---
+
+    def selection(self):
+        """Id delle righe selezionate, nell'ordine mostrato."""
+        return self.model.selection()
+
+    def focus_line(self):
+        """Id della riga attiva, o None."""
+        return self.model.focus
+
+    def see(self, line_id):
+        """Scorre la tabella fino a mostrare la riga indicata."""
+        index = self.model.index(line_id)
+        if index is None:
+            return
+        rows = self._visible_rows()
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + rows:
+            self.first = index - rows + 1
+        self.refresh()
+
+    def sort_by(self, column):
+        self.model.sort_by(column)
+        for name in COLUMNS[:-1]:
+            arrow = ""
+            if name == self.model.sort_column:
+                arrow = " ▼" if self.model.sort_descending else " ▲"
+            self.tree.heading(name, text=HEADINGS[name] + arrow)
+        self.refresh()
+
+    def scroll(self, rows):
+        self.first += rows
+        self.refresh()
+        return "break"
+
+    # --- Disegno ---
+
+    def refresh(self):
+        """Ridisegna le righe visibili appena Tk è libero (più richieste = un solo ridisegno)."""
+        if self._render_job is None:
+            self._render_job = self.after_idle(self._render)
+
+    def _on_quote_changed(self, old, new):
+        self.model.line_changed(old, new)
+        self.refresh()
+
+    def _visible_rows(self):
+        if self._row_height is None:
+            items = self.tree.get_children()
+            bbox = self.tree.bbox(items[0]) if items else None
+            if bbox:
+                self._header_height, self._row_height = bbox[1], bbox[3]
+        row_height = self._row_height or tkfont.nametofont("TkDefaultFont").metrics("linespace") + 4
+        header_height = self._header_height or row_height + 4
+        return max(1, (self.tree.winfo_height() - header_height) // row_height)
+
+    def _render(self):
+        self._render_job = None
+        rows = self._visible_rows()
+        total = len(self.model)
+        self.first = max(0, min(self.first, total - rows))
+        self._window = self.model.window(self.first, rows)
+
+        slots = self.tree.get_children()
+        selected_slots = []
+        for position, line_id in enumerate(self._window):
+            iid = f"slot{position}"
+            values = file_formats.line_row_values(self.engine.get(line_id))
+            if position < len(slots):
+                self.tree.item(iid, values=values)
+            else:
+                self.tree.insert("", "end", iid=iid, values=values)
+            if line_id in self.model.selected:
+                selected_slots.append(iid)
+        if len(slots) > len(self._window):
+            self.tree.delete(*slots[len(self._window):])
+        self.tree.selection_set(selected_slots)
+        if self.model.focus in self._window:
+            self.tree.focus(f"slot{self._window.index(self.model.focus)}")
+
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + len(self._window)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        if self._row_height is None and self._window and self.tree.winfo_ismapped():
+            # L'altezza reale delle righe si legge solo dopo che Tk le ha disegnate
+            self.after(20, self.refresh)
+
+    # --- Mouse e tastiera ---
+
+    def _slot_index(self, event):
+        iid = self.tree.identify_row(event.y)
+        if not iid.startswith("slot"):
+            return None
+        position = int(iid[4:])
+        return self.first + position if position < len(self._window) else None
+
+    def _on_click(self, event, toggle=False, extend=False):
+        if self.tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return None  # Intestazioni (ordinamento) e bordi delle colonne: comportamento normale
+        self.tree.focus_set()
+        index = self._slot_index(event)
+        if index is not None:
+            self.model.select(index, toggle=toggle, extend=extend)
+            self.refresh()
+        return "break"
+
+    def _on_double_click(self, event):
+        if event.type == tk.EventType.ButtonPress and self._slot_index(event) is None:
+            return "break"
+        if self.on_activate is not None and self.model.focus is not None:
+            self.on_activate(self.model.focus)
+        return "break"
+
+    def _move_focus(self, delta, extend=False):
+        if not len(self.model):
+            return "break"
+        current = self.model.index(self.model.focus) if self.model.focus is not None else None
+        index = 0 if current is None else max(0, min(len(self.model) - 1, current + delta))
+        self.model.select(index, extend=extend)
+        self.see(self.model.focus)
+        return "break"
+
+    def _on_select_all(self, event):
+        self.model.select_all()
+        self.refresh()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        # Windows: multipli di 120; macOS: pochi passi per scatto
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-steps * WHEEL_ROWS if steps else 0)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first = int(float(amount) * len(self.model))
+        elif unit == "pages":
+            self.first += int(amount) * self._visible_rows()
+        else:
+            self.first += int(amount)
+        self.refresh()
@@ -0,0 +1,112 @@
+from collections import namedtuple
+
+import money
+from database import QUOTE_EDGE_SIDES
+from quote_engine import QuoteTotals
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è facoltativo: senza si usa il calcolo riga per riga
+    np = None
+
+# Prezzi di un'intera distinta di taglio: un valore intero per riga (array NumPy o liste)
+# in decimillesimi di m² e centesimi, come i campi di quote_engine.QuoteLine, e i totali
+CutListPrices = namedtuple('CutListPrices', 'mq_units slab_cents edges_cents total_cents totals')
+
+# Oltre questo valore i prodotti interi non stanno in int64: si usa il calcolo in puro Python
+_INT64_SAFE = 2 ** 62
+
+
+def has_numpy():
+    return np is not None
+
+def price_cut_list(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm,
+                   edge_masks=None, edge_prices_lm=None, use_numpy=None):
+    """Calcola m², costo lastra, costo bordi e totale di tutte le righe di una distinta.
+
+    `counts`, `lengths_cm`, `widths_cm` e `price_indices` hanno un valore per riga;
+    `price_indices` sono posizioni in `prices_per_sqm` (prezzo al m² di ogni materiale).
+    `edge_masks` e `edge_prices_lm` hanno una riga di quattro valori per riga, nell'ordine
+    di QUOTE_EDGE_SIDES: se il lato ha un bordo e il suo prezzo al metro. Misure e prezzi
+    sono convertiti in unità intere e i valori calcolati come in QuoteEngine (vedi money).
+    Con NumPy (se installato, o use_numpy=True) tutte le righe sono calcolate insieme;
+    altrimenti riga per riga con le stesse funzioni di money.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return _price_numpy(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm)
+    return _price_python(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm)
+
+def _price_python(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm):
+    n = len(counts)
+    mq_values, slab_values, edges_values, total_values = [0] * n, [0] * n, [0] * n, [0] * n
+    price_units = [money.price_units(price) for price in prices_per_sqm]
+    for i in range(n):
+        quantity = int(counts[i])
+        length_tmm, width_tmm = money.tenths_mm(lengths_cm[i]), money.tenths_mm(widths_cm[i])
+        slab_cents = money.slab_cost_cents(quantity, length_tmm, width_tmm, price_units[price_indices[i]])
+        edges_cents = 0
+        if edge_masks is not None:
+            mask, prices = edge_masks[i], edge_prices_lm[i]
+            for side in range(len(QUOTE_EDGE_SIDES)):
+                if mask[side]:
+                    # Fronte e retro sono la lunghezza, i fianchi la larghezza (come side_length_tmm)
+                    edges_cents += money.length_cost_cents(length_tmm if side < 2 else width_tmm,
+                                                           money.price_units(prices[side]), quantity)
+        mq_values[i] = money.slab_mq_units(quantity, length_tmm, width_tmm)
+        slab_values[i], edges_values[i] = slab_cents, edges_cents
+        total_values[i] = slab_cents + edges_cents
+    totals = QuoteTotals(line_count=n, mq_units=sum(mq_values), slabs_cents=sum(slab_values),
+                         edges_cents=sum(edges_values), total_cents=sum(total_values))
+    return CutListPrices(mq_values, slab_values, edges_values, total_values, totals)
+
+def _units(values, scale):
+    """money.to_units su un array di float: i pochi valori vicini a metà sono convertiti uno per uno."""
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * scale
+    units = np.floor(scaled + 0.5).astype(np.int64)
+    near_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < money.HALF_TOLERANCE)
+    for i in near_half:
+        units.flat[i] = money.to_units(float(values.flat[i]), scale)
+    return units
+
+def _div_round(numerator, denominator):
+    """money.div_round su un array di interi."""
+    quotient, remainder = np.divmod(np.abs(numerator), denominator)
+    quotient += 2 * remainder >= denominator
+    return np.where(numerator >= 0, quotient, -quotient)
+
+def _price_numpy(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm):
+    if np is None:
+        raise RuntimeError("NumPy non è installato")
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(counts) == 0:
+        return _price_python(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm)
+    length_tmm = _units(lengths_cm, money.TENTHS_MM_PER_CM)
+    width_tmm = _units(widths_cm, money.TENTHS_MM_PER_CM)
+    prices = _units(prices_per_sqm, money.PRICE_UNITS)[np.asarray(price_indices, dtype=np.intp)]
+    if edge_masks is not None:
+        masks = np.asarray(edge_masks, dtype=bool)
+        edge_prices = _units(edge_prices_lm, money.PRICE_UNITS)
+
+    # Quantità, misure o prezzi fuori scala: i prodotti supererebbero int64
+    largest = float(np.abs(counts).max()) * float(np.abs(length_tmm).max()) * float(np.abs(width_tmm).max())
+    largest *= max(float(np.abs(prices).max()), float(np.abs(edge_prices).max()) if edge_masks is not None else 0.0, 1.0)
+    if largest >= _INT64_SAFE:
+        return _price_python(counts, lengths_cm, widths_cm, price_indices, prices_per_sqm, edge_masks, edge_prices_lm)
+
+    area = counts * length_tmm * width_tmm
+    mq = _div_round(area, money.MQ_DIVISOR)
+    slab_cents = _div_round(area * prices, money.SLAB_DIVISOR)
+    edges_cents = np.zeros_like(slab_cents)
+    if edge_masks is not None:
+        for side in range(len(QUOTE_EDGE_SIDES)):
+            side_tmm = length_tmm if side < 2 else width_tmm
+            side_cents = _div_round(side_tmm * edge_prices[:, side] * counts, money.LENGTH_DIVISOR)
+            edges_cents += np.where(masks[:, side], side_cents, 0)
+    total_cents = slab_cents + edges_cents
+
+    totals = QuoteTotals(line_count=len(counts), mq_units=int(mq.sum()), slabs_cents=int(slab_cents.sum()),
+                         edges_cents=int(edges_cents.sum()), total_cents=int(total_cents.sum()))
+    return CutListPrices(mq, slab_cents, edges_cents, total_cents, totals)
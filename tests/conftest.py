@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: prove lunghe con più processi (escluse con -m "not slow")')
+
+@pytest.fixture
+def temp_database(tmp_path, monkeypatch):
+    """Database creato da zero con tutte le migrazioni, in una cartella temporanea."""
+    monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / 'preventivi.db'))
+    database.create_tables()
+    yield
+    database.close_all_connections()
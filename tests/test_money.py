@@ -0,0 +1,174 @@
+import os
+import random
+import sys
+from fractions import Fraction
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import money
+import quote_kernel
+from database import QUOTE_EDGE_SIDES
+from quote_engine import QuoteEngine
+
+# I calcoli in unità intere di money coincidono con il calcolo esatto (frazioni) arrotondato
+# a metà per eccesso, e i totali di QuoteEngine e di quote_kernel con la somma delle righe.
+
+SEED = 1
+LINES = 2000
+
+@pytest.mark.parametrize('value, scale, expected', [
+    ('2,675', 100, 268),
+    ('2.675', 100, 268),
+    # 2.675 come float è appena sotto la metà: conta il valore decimale scritto
+    (2.675, 100, 268),
+    (1.005, 100, 101),
+    (-0.125, 100, -13),
+    (0.5, 1, 1),
+    (3, 100, 300),
+    (None, 100, None),
+])
+def test_to_units_rounds_half_up(value, scale, expected):
+    assert money.to_units(value, scale) == expected
+
+@pytest.mark.parametrize('numerator, denominator, expected', [
+    (5, 10, 1),
+    (4, 10, 0),
+    (15, 10, 2),
+    (-5, 10, -1),
+    (-4, 10, 0),
+    (0, 7, 0),
+])
+def test_div_round(numerator, denominator, expected):
+    assert money.div_round(numerator, denominator) == expected
+
+def test_slab_and_length_costs():
+    assert money.slab_mq_units(2, 10000, 3000) == 6000
+    assert money.slab_cost_cents(2, 10000, 3000, 500000) == 3000
+    # 10 x 5 cm a 1 €/m² = 0,005 €: mezzo centesimo, arrotondato per eccesso
+    assert money.slab_cost_cents(1, 1000, 500, 10000) == 1
+    assert money.length_cost_cents(10000, 30000, 2) == 600
+    # 1 cm a 0,50 €/m = 0,005 €
+    assert money.length_cost_cents(100, 5000, 1) == 1
+
+@pytest.mark.parametrize('got, expected', [
+    (money.format_cents(123456), '1234.56'),
+    (money.format_cents(-7), '-0.07'),
+    (money.format_mq(5), '0.0005'),
+    (money.format_units(12345, money.TENTHS_MM_PER_CM, 1), '123.5'),
+    (money.format_units(25000, money.TENTHS_MM_PER_M, 2), '2.50'),
+])
+def test_formatting(got, expected):
+    assert got == expected
+
+def exact(value, step):
+    """value (Fraction) arrotondato al multiplo di step, a metà per eccesso, in unità di step."""
+    units = value / step
+    whole = units.numerator // units.denominator
+    return whole + 1 if units - whole >= Fraction(1, 2) else whole
+
+def make_lines(count, seed):
+    """Righe casuali come le inserisce l'utente: misure con un decimale, prezzi con due."""
+    rng = random.Random(seed)
+    return [{
+        'quantity': rng.randint(1, 50),
+        'length_cm': rng.randint(100, 4000) / 10,
+        'width_cm': rng.randint(50, 900) / 10,
+        'price_per_sqm': rng.randint(1000, 60000) / 100,
+        'edges': {side: rng.randint(100, 5000) / 100 for side in QUOTE_EDGE_SIDES if rng.random() < 0.4},
+    } for _ in range(count)]
+
+def add_lines(engine, lines):
+    for data in lines:
+        line = engine.add_slab(data['quantity'], data['length_cm'], data['width_cm'], 'Materiale', 2.0,
+                               data['price_per_sqm'])
+        engine.set_edges(line.line_id, {side: ('Bordo', price_lm) for side, price_lm in data['edges'].items()})
+    return engine
+
+@pytest.fixture(scope='module')
+def cut_list():
+    return make_lines(LINES, SEED)
+
+def test_lines_match_exact_rounding(cut_list):
+    engine = add_lines(QuoteEngine(), cut_list)
+    for data, line in zip(cut_list, engine):
+        quantity = data['quantity']
+        length, width = Fraction(str(data['length_cm'])), Fraction(str(data['width_cm']))
+        area = quantity * length / 100 * width / 100
+        expected_mq = exact(area, Fraction(1, money.MQ_UNITS))
+        expected_slab = exact(area * Fraction(str(data['price_per_sqm'])), Fraction(1, money.CENTS))
+        expected_edges = sum(
+            exact((length if side in ('front', 'back') else width) / 100 * Fraction(str(price_lm)) * quantity,
+                  Fraction(1, money.CENTS))
+            for side, price_lm in data['edges'].items())
+        assert (line.mq_units, line.slab_cents, line.edges_cents, line.total_cents) == (
+            expected_mq, expected_slab, expected_edges, expected_slab + expected_edges), data
+
+def test_engine_totals_match_row_sums_after_edits(cut_list):
+    engine = add_lines(QuoteEngine(), cut_list)
+    rng = random.Random(SEED)
+    for line in engine.lines()[::7]:
+        engine.remove(line.line_id)
+    for line in engine.lines()[::5]:
+        engine.set_edges(line.line_id, {'front': ('Bordo', rng.randint(100, 5000) / 100)})
+    totals = engine.totals()
+    rows = engine.lines()
+    assert totals.line_count == len(rows)
+    assert (totals.mq_units, totals.slabs_cents, totals.edges_cents, totals.total_cents) == (
+        sum(line.mq_units for line in rows), sum(line.slab_cents for line in rows),
+        sum(line.edges_cents for line in rows), sum(line.total_cents for line in rows))
+
+@pytest.mark.parametrize('use_numpy', [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(not quote_kernel.has_numpy(), reason='NumPy non installato')),
+])
+def test_kernel_matches_engine(cut_list, use_numpy):
+    reference = add_lines(QuoteEngine(), cut_list)
+    prices = quote_kernel.price_cut_list(
+        [data['quantity'] for data in cut_list],
+        [data['length_cm'] for data in cut_list],
+        [data['width_cm'] for data in cut_list],
+        list(range(len(cut_list))),
+        [data['price_per_sqm'] for data in cut_list],
+        [[side in data['edges'] for side in QUOTE_EDGE_SIDES] for data in cut_list],
+        [[data['edges'].get(side, 0.0) for side in QUOTE_EDGE_SIDES] for data in cut_list],
+        use_numpy=use_numpy)
+    assert prices.totals == reference.totals()
+    rows = [(line.mq_units, line.slab_cents, line.edges_cents, line.total_cents) for line in reference]
+    assert list(zip(*(list(map(int, values)) for values in prices[:4]))) == rows
+
+def test_json_table_round_trip(cut_list):
+    file_formats = pytest.importorskip('file_formats')
+    engine = add_lines(QuoteEngine(), cut_list[:200])
+    reloaded = QuoteEngine()
+    for line in engine:
+        reloaded.add_line_data(file_formats.line_data_from_row_values(file_formats.line_row_values(line)))
+    for original, copy in zip(engine, reloaded):
+        # La tabella del file non contiene i singoli bordi
+        assert original.replace(line_id=copy.line_id, edges=copy.edges) == copy
+    assert reloaded.totals() == engine.totals()
+
+def test_line_data_amounts_are_recomputed():
+    engine = QuoteEngine()
+    line = engine.add_slab(2, 120.0, 60.0, 'Materiale', 2.0, 120.0)
+    line = engine.set_edges(line.line_id, {'front': ('Bordo', 7.0)})
+    linear = engine.add_linear(3, 2.5, 'Alzatina', 18.0)
+    # Un centesimo in meno: arrotondamento dei preventivi calcolati con i float
+    data = [dict(engine.lines_data()[0], slab_cost=172.79, total=189.59), engine.lines_data()[1]]
+    reloaded = QuoteEngine()
+    copies = [reloaded.add_line_data(row) for row in data]
+    assert copies[0] == line.replace(line_id=copies[0].line_id)
+    assert copies[1] == linear.replace(line_id=copies[1].line_id)
+    assert reloaded.totals() == engine.totals()
+
+@pytest.mark.parametrize('key, value', [('mq', 2.0), ('slab_cost', 100.0), ('edges_cost', 0.0), ('total', 999.0)])
+def test_line_data_with_wrong_amounts_is_rejected(key, value):
+    engine = QuoteEngine()
+    line = engine.add_slab(2, 120.0, 60.0, 'Materiale', 2.0, 120.0)
+    engine.set_edges(line.line_id, {'front': ('Bordo', 7.0)})
+    data = dict(engine.lines_data()[0], **{key: value})
+    reloaded = QuoteEngine()
+    with pytest.raises(ValueError):
+        reloaded.add_line_data(data)
+    assert len(reloaded) == 0 and not reloaded.can_undo()
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from catalog_grid import CatalogGridModel
+from edge_editor_dialog import EdgeEditorDialog
+
+# Le letture più frequenti dell'interfaccia eseguono ogni istruzione una sola volta,
+# qualunque sia il numero di righe (nessuna query per riga dentro un ciclo).
+
+MATERIALS = [f'Materiale {n:03}' for n in range(60)]
+THICKNESSES = (2.0, 3.0)
+
+@pytest.fixture
+def catalog(temp_database):
+    database.add_materials_bulk([{'name': name, 'price_per_sqm': 100.0 + n, 'thickness': thickness, 'supplier': None}
+                                 for n, name in enumerate(MATERIALS) for thickness in THICKNESSES])
+    edges = [{'edge_type': 'normal edge', 'price_per_lm': 3.0}, {'edge_type': 'polished normal edge', 'price_per_lm': 7.0}]
+    edges += [{'edge_type': 'half bull nose 3cm', 'material_name': name, 'thickness': 2.0, 'price_per_lm': 20.0 + n}
+              for n, name in enumerate(MATERIALS)]
+    database.upsert_edges_bulk(edges)
+
+def test_edge_editor_reads_edge_types_with_one_query(catalog):
+    dialog = EdgeEditorDialog.__new__(EdgeEditorDialog)  # Solo i dati, senza finestra
+    dialog.material_name, dialog.thickness = MATERIALS[0], 2.0
+    with database.assert_query_budget(1, max_repeats=1):
+        edge_types = dialog._fetch_edge_types()
+    assert {row['edge_type'] for row in edge_types} == {'normal edge', 'polished normal edge', 'half bull nose 3cm'}
+
+def test_edge_prices_for_many_keys_use_one_query(catalog):
+    # 240 chiavi: una sola istruzione anche con il limite di 999 parametri delle versioni più vecchie
+    keys = [(name, thickness, edge_type) for name in MATERIALS[:40] for thickness in THICKNESSES
+            for edge_type in ('normal edge', 'half bull nose 3cm', 'missing edge')]
+    with database.assert_query_budget(1, max_repeats=1):
+        prices = database.get_edge_prices(keys + keys[:10])
+    assert len(prices) == len(keys)
+    assert prices[(MATERIALS[5], 2.0, 'half bull nose 3cm')] == 25.0
+    assert prices[(MATERIALS[5], 3.0, 'normal edge')] == 3.0
+    assert prices[(MATERIALS[5], 3.0, 'missing edge')] is None
+
+@pytest.mark.parametrize('sort, descending', [(None, False), ('name', False), ('price_per_sqm', True)])
+def test_catalog_grid_page_uses_one_query(catalog, sort, descending):
+    model = CatalogGridModel('materials')
+    model.sort_column, model.sort_descending = sort, descending
+    limit = 50
+    pages = 0
+    while not model.complete:
+        with database.assert_query_budget(1, max_repeats=1):
+            page = database.get_catalog_rows('materials', *model.query(), after=model.after, limit=limit)
+        model.add_page(page, limit)
+        pages += 1
+    assert len(model) == len(MATERIALS) * len(THICKNESSES)
+    assert pages == len(model) // limit + 1
+
+def test_budget_fails_on_a_query_per_row(catalog):
+    materials = database.get_all_materials()
+    with pytest.raises(AssertionError, match='esecuzioni'):
+        with database.assert_query_budget(len(materials), max_repeats=1):
+            for material in materials:
+                database.get_material_by_id(material['id'])
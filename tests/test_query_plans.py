@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# Le query del modulo database devono usare gli indici (vedi check_query_plans), su un
+# database creato da zero con tutte le migrazioni e qualche riga di catalogo e archivio.
+
+def seed_database():
+    database.add_materials_bulk([
+        {'name': 'Carrara bianco', 'price_per_sqm': 120.0, 'thickness': 2, 'description': 'lucido', 'supplier': 'Cave Apuane'},
+        {'name': 'Carrara bianco', 'price_per_sqm': 150.0, 'thickness': 3, 'description': 'lucido', 'supplier': 'Cave Apuane'},
+        {'name': 'Nero assoluto', 'price_per_sqm': 210.0, 'thickness': 2, 'description': 'fiammato', 'supplier': None},
+    ])
+    database.upsert_edges_bulk([
+        {'edge_type': 'normal edge', 'price_per_lm': 3.00},
+        {'edge_type': 'polished normal edge', 'price_per_lm': 7.00},
+        {'edge_type': 'half bull nose 3cm', 'material_name': 'Carrara bianco', 'thickness': 2, 'price_per_lm': 25.00},
+    ])
+    database.upsert_linear_elements_bulk([
+        {'element_type': 'Alzatina', 'material_name': 'Carrara bianco', 'thickness': 2, 'price_per_lm': 18.0, 'description': ''},
+        {'element_type': 'Soglia', 'material_name': None, 'thickness': None, 'price_per_lm': 30.0, 'description': ''},
+    ])
+    database.save_edge_profile('Tutti lucidi', {'front': 'polished normal edge', 'back': 'polished normal edge'})
+    database.save_quote([{
+        'quantity': 2, 'length_cm': 120.0, 'width_cm': 60.0, 'material_name': 'Carrara bianco', 'thickness': 2.0,
+        'mq': 1.44, 'price': 120.0, 'slab_cost': 172.8, 'edges_cost': 7.2, 'total': 180.0,
+        'edges': {'front': {'edge_type': 'polished normal edge', 'length_cm': 120.0, 'price_lm': 7.0, 'cost': 8.4}},
+    }], client='Rossi')
+
+def test_query_plans_use_indexes(temp_database):
+    seed_database()
+    assert database.check_query_plans() == []
+
+def test_query_plan_check_leaves_database_unchanged(temp_database):
+    seed_database()
+    conn = database.get_db_connection()
+    counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('materials', 'edges', 'linear_elements', 'quotes', 'catalog_changes')}
+    database.check_query_plans()
+    assert {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in counts} == counts
@@ -0,0 +1,103 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import quote_engine
+from quote_engine import QuoteEngine, edge_profile
+
+# Righe e totali di QuoteEngine: i totali sono tenuti aggiornati a ogni modifica, senza
+# ripercorrere le righe, e coincidono sempre con la somma delle righe.
+
+def row_sums(engine):
+    rows = engine.lines()
+    return (len(rows), sum(line.mq_units for line in rows), sum(line.slab_cents for line in rows),
+            sum(line.edges_cents for line in rows), sum(line.total_cents for line in rows))
+
+def running_totals(engine, monkeypatch):
+    """engine.totals() con la lettura delle righe vietata: i totali non devono ripercorrerle."""
+    def no_iteration(self):
+        raise AssertionError("totals() non deve ripercorrere le righe")
+    with monkeypatch.context() as patch:
+        patch.setattr(quote_engine._LineTable, '__iter__', no_iteration)
+        totals = engine.totals()
+    return (totals.line_count, totals.mq_units, totals.slabs_cents, totals.edges_cents, totals.total_cents)
+
+@pytest.fixture
+def engine():
+    engine = QuoteEngine()
+    first = engine.add_slab(2, 120.0, 60.0, 'Carrara bianco', 2.0, 120.0)
+    engine.set_edges(first.line_id, {'front': ('polished normal edge', 7.0), 'left': ('normal edge', 3.0)})
+    engine.add_slab(1, 95.5, 33.0, 'Nero assoluto', 3.0, 210.0)
+    engine.add_linear(4, 2.5, 'Alzatina', 18.0, notes='cucina')
+    return engine
+
+def test_running_totals_follow_every_change(engine, monkeypatch):
+    # 1,44 + 0,3152 m² e 4 x 2,5 m; 172,80 + 66,18 € di lastre; 16,80 + 3,60 € di bordi; 180 € di alzatine
+    assert running_totals(engine, monkeypatch) == row_sums(engine) == (3, 117552, 23898, 2040, 43938)
+    first, second, _ = engine.lines()
+
+    engine.set_edges(second.line_id, {'back': ('normal edge', 3.0)})
+    assert running_totals(engine, monkeypatch) == row_sums(engine)
+    engine.set_edges(first.line_id, {})
+    assert engine.get(first.line_id).total_cents == engine.get(first.line_id).slab_cents
+    assert running_totals(engine, monkeypatch) == row_sums(engine)
+
+    engine.remove(second.line_id)
+    assert running_totals(engine, monkeypatch) == row_sums(engine)
+    assert second.line_id not in engine
+
+    engine.clear()
+    assert running_totals(engine, monkeypatch) == (0, 0, 0, 0, 0)
+    assert len(engine) == 0
+
+def test_set_edges_and_remove_reject_invalid_lines(engine):
+    linear = engine.lines()[-1]
+    with pytest.raises(ValueError):
+        engine.set_edges(linear.line_id, {'front': ('normal edge', 3.0)})
+    with pytest.raises(KeyError):
+        engine.set_edges(999, {})
+    with pytest.raises(KeyError):
+        engine.remove(999)
+
+def test_lines_data_round_trip(engine):
+    data = engine.lines_data()
+    reloaded = QuoteEngine()
+    reloaded.load_lines_data(data)
+    assert reloaded.lines_data() == data
+    assert reloaded.totals() == engine.totals()
+    for original, copy in zip(engine, reloaded):
+        assert original.replace(line_id=copy.line_id) == copy
+    # Un preventivo caricato è nuovo: niente da annullare
+    assert not reloaded.can_undo()
+
+def test_apply_edge_profile_prices_every_line(engine):
+    first, second, linear = engine.lines()
+    profile = edge_profile({'front': 'polished normal edge', 'back': 'polished normal edge'})
+    keys = engine.edge_price_keys([line.line_id for line in engine], profile)
+    assert sorted(keys) == [('Carrara bianco', 2.0, 'polished normal edge'), ('Nero assoluto', 3.0, 'polished normal edge')]
+    prices = {('Carrara bianco', 2.0, 'polished normal edge'): 7.0, ('Nero assoluto', 3.0, 'polished normal edge'): 9.5}
+
+    updated = engine.apply_edge_profile([first.line_id, second.line_id, linear.line_id], profile, prices)
+    assert [line.line_id for line in updated] == [first.line_id, second.line_id]
+    assert set(updated[0].edges) == {'front', 'back'}
+    # 2 soglie x 2 lati da 120 cm a 7 €/m
+    assert updated[0].edges_cents == 2 * 1680
+    assert engine.get(linear.line_id) == linear
+    assert row_sums(engine)[1:] == (engine.totals().mq_units, engine.totals().slabs_cents,
+                                    engine.totals().edges_cents, engine.totals().total_cents)
+
+def test_apply_edge_profile_rejects_missing_prices(engine):
+    before = engine.lines()
+    totals = engine.totals()
+    profile = edge_profile({'front': 'polished normal edge'})
+    # Manca il prezzo per il secondo materiale: nessuna riga viene modificata
+    prices = {('Carrara bianco', 2.0, 'polished normal edge'): 7.0}
+    with pytest.raises(ValueError, match='Nero assoluto'):
+        engine.apply_edge_profile([line.line_id for line in before], profile, prices)
+    assert engine.lines() == before
+    assert engine.totals() == totals
+    engine.undo()
+    assert len(engine) == 2  # L'ultimo passo annullato è ancora l'aggiunta dell'elemento lineare
@@ -0,0 +1,112 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quote_engine import QuoteEngine
+
+# Annulla/ripeti di QuoteEngine: ogni passo riporta righe e totali com'erano, notifica solo
+# le righe cambiate e non copia quelle rimaste uguali.
+
+def make_engine(count):
+    engine = QuoteEngine()
+    for n in range(count):
+        line = engine.add_slab(1 + n % 5, 100.0 + n % 300, 30.0 + n % 40, f'Materiale {n % 7}', 2.0, 100.0 + n % 50)
+        if n % 3 == 0:
+            engine.set_edges(line.line_id, {'front': ('normal edge', 3.0)})
+    engine.reset_history()
+    return engine
+
+def snapshot(engine):
+    return engine.lines(), engine.totals()
+
+class Recorder:
+    def __init__(self, engine):
+        self.calls = []
+        engine.subscribe(lambda old, new: self.calls.append((old, new)))
+
+@pytest.mark.parametrize('change', [
+    lambda engine: engine.remove(engine.lines()[3].line_id),
+    lambda engine: engine.clear(),
+    lambda engine: engine.set_edges(engine.lines()[4].line_id, {'back': ('polished normal edge', 7.0),
+                                                                'right': ('normal edge', 3.0)}),
+    lambda engine: engine.set_edges(engine.lines()[0].line_id, {}),
+], ids=['remove', 'clear', 'set_edges', 'remove_edges'])
+def test_undo_and_redo_restore_lines_and_totals(change):
+    engine = make_engine(20)
+    before = snapshot(engine)
+    change(engine)
+    after = snapshot(engine)
+    assert after != before
+    assert engine.undo()
+    assert snapshot(engine) == before
+    assert not engine.can_undo()
+    assert engine.redo()
+    assert snapshot(engine) == after
+    assert not engine.can_redo()
+
+def test_listeners_receive_only_changed_lines():
+    engine = make_engine(100)
+    lines = engine.lines()
+    edited = engine.set_edges(lines[50].line_id, {'back': ('normal edge', 3.0)})
+    engine.remove(lines[80].line_id)
+    recorder = Recorder(engine)
+
+    engine.undo()
+    assert recorder.calls == [(None, lines[80])]
+    recorder.calls.clear()
+    engine.undo()
+    assert recorder.calls == [(edited, lines[50])]
+    recorder.calls.clear()
+    engine.redo()
+    assert recorder.calls == [(lines[50], edited)]
+
+def test_undo_after_clear_notifies_lines_from_last_to_first():
+    engine = make_engine(40)
+    lines = engine.lines()
+    engine.clear()
+    recorder = Recorder(engine)
+    engine.undo()
+    assert recorder.calls == [(None, line) for line in reversed(lines)]
+
+def test_failing_group_restores_state_and_leaves_no_step():
+    engine = make_engine(30)
+    lines = engine.lines()
+    engine.remove(lines[0].line_id)  # Il passo precedente, da non toccare
+    before = snapshot(engine)
+    recorder = Recorder(engine)
+
+    with pytest.raises(RuntimeError):
+        with engine.group():
+            engine.remove(lines[5].line_id)
+            with engine.group():
+                engine.set_edges(lines[6].line_id, {'left': ('normal edge', 3.0)})
+            added = engine.add_slab(1, 50.0, 20.0, 'Materiale', 2.0, 10.0)
+            edited = engine.get(lines[6].line_id)
+            recorder.calls.clear()
+            raise RuntimeError("riga non valida")
+    assert snapshot(engine) == before
+    assert not engine.can_redo()
+    # Solo le righe toccate dal blocco tornano com'erano, notificate come ogni altro cambiamento
+    assert recorder.calls == [(added, None), (edited, lines[6]), (None, lines[5])]
+
+    # L'unico passo da annullare è ancora quello prima del blocco
+    assert engine.undo()
+    assert engine.lines() == lines
+    assert not engine.can_undo()
+
+def test_restore_does_not_copy_unchanged_lines():
+    engine = make_engine(2000)
+    lines = engine.lines()
+    table = engine._lines
+    edited = engine.set_edges(lines[1234].line_id, {'front': ('polished normal edge', 7.0)})
+    assert list(table.diff(engine._lines)) == [(lines[1234], edited)]
+
+    recorder = Recorder(engine)
+    engine.undo()
+    assert recorder.calls == [(edited, lines[1234])]
+    # Dopo l'annullamento il preventivo è la versione conservata: le stesse righe, non copie
+    assert engine._lines is table
+    assert all(restored is original for restored, original in zip(engine.lines(), lines))
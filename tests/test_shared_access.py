@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# Prova di carico della modalità condivisa: più processi (come più postazioni) scrivono e
+# leggono lo stesso preventivi.db. Nessuna operazione deve fallire per "database is locked",
+# nessun aggiornamento deve andare perso e il database deve restare integro.
+
+COUNTER_NAME = 'Contatore prova di carico'
+WRITERS = 4
+READERS = 2
+ITERATIONS = 15
+BULK_ROWS = 600
+
+def _open(path, busy_timeout_ms):
+    database.DATABASE_NAME = path
+    if busy_timeout_ms is not None:
+        # Attesa di SQLite ridotta: i conflitti arrivano ai tentativi di _retry_when_busy
+        database.CONNECTION_PRAGMAS = tuple(
+            (pragma, busy_timeout_ms if pragma == 'busy_timeout' else value)
+            for pragma, value in database.CONNECTION_PRAGMAS)
+
+def _writer(worker, path, iterations, bulk_rows, busy_timeout_ms):
+    _open(path, busy_timeout_ms)
+    errors = []
+    counter_id = database.get_db_connection().execute(
+        'SELECT id FROM materials WHERE name = ?', (COUNTER_NAME,)).fetchone()[0]
+    bulk = [{'name': f'Lastra {i}', 'price_per_sqm': 10 + i % 50, 'thickness': 2, 'supplier': f'Postazione {worker}'}
+            for i in range(bulk_rows)]
+    for iteration in range(iterations):
+        try:
+            # Scrittura breve
+            database.add_material(f'Materiale {worker}-{iteration}', 50.0, 3, 'prova', f'Postazione {worker}')
+            # Lettura-modifica-scrittura nella stessa transazione: nessun incremento deve andare perso
+            with database.transaction() as conn:
+                price = conn.execute('SELECT price_per_sqm FROM materials WHERE id = ?', (counter_id,)).fetchone()[0]
+                conn.execute('UPDATE materials SET price_per_sqm = ? WHERE id = ?', (price + 1, counter_id))
+            # Importazione di listino: divisa in transazioni da SHARED_WRITE_BATCH righe
+            if iteration % 5 == 0:
+                for row in bulk:
+                    row['price_per_sqm'] += 1
+                database.add_materials_bulk(bulk, overwrite_existing=True)
+        except Exception as e:
+            errors.append(f'postazione {worker}, giro {iteration}: {e!r}')
+    stats = database.get_lock_stats()
+    database.close_all_connections()
+    return stats, errors
+
+def _reader(worker, path, stop, busy_timeout_ms):
+    _open(path, busy_timeout_ms)
+    errors = []
+    reads = 0
+    while not stop.is_set():
+        try:
+            database.search_materials('lastra', limit=50)
+            database.get_materials_by_supplier(f'Postazione {worker % 2}')
+            reads += 2
+        except Exception as e:
+            errors.append(f'lettore {worker}: {e!r}')
+    database.close_all_connections()
+    return reads, errors
+
+@pytest.fixture
+def shared_database(tmp_path, monkeypatch):
+    path = str(tmp_path / 'preventivi.db')
+    monkeypatch.setattr(database, 'DATABASE_NAME', path)
+    database.create_tables()
+    database.set_shared_access(True)
+    # Riaperta in modalità condivisa: il file passa dal WAL al journal classico prima
+    # che le altre postazioni lo aprano (con il WAL aperto altrove il cambio non riesce)
+    database.close_all_connections()
+    database.add_material(COUNTER_NAME, 0.0)
+    database.close_all_connections()
+    yield path
+    database.close_all_connections()
+
+def run_workers(path, busy_timeout_ms):
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        stop = manager.Event()
+        with context.Pool(WRITERS + READERS) as pool:
+            reader_results = [pool.apply_async(_reader, (n, path, stop, busy_timeout_ms)) for n in range(READERS)]
+            writer_results = [pool.apply_async(_writer, (n, path, ITERATIONS, BULK_ROWS, busy_timeout_ms))
+                              for n in range(WRITERS)]
+            writer_results = [result.get() for result in writer_results]
+            stop.set()
+            reader_results = [result.get() for result in reader_results]
+    return writer_results, reader_results
+
+# None: busy_timeout normale; 0: SQLite non aspetta mai, ogni conflitto passa dai tentativi ripetuti
+@pytest.mark.slow
+@pytest.mark.parametrize('busy_timeout_ms', [None, 0])
+def test_concurrent_writers_lose_nothing(shared_database, busy_timeout_ms):
+    writer_results, reader_results = run_workers(shared_database, busy_timeout_ms)
+
+    errors = [error for _, worker_errors in writer_results + reader_results for error in worker_errors]
+    assert errors == []
+    assert [stats['busy_failures'] for stats, _ in writer_results] == [0] * WRITERS
+    assert all(reads > 0 for reads, _ in reader_results)
+    if busy_timeout_ms == 0:
+        assert sum(stats['busy_retries'] for stats, _ in writer_results) > 0
+
+    conn = database.get_db_connection()
+    assert database.is_shared_access()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'delete'
+    assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert conn.execute('SELECT price_per_sqm FROM materials WHERE name = ?',
+                        (COUNTER_NAME,)).fetchone()[0] == WRITERS * ITERATIONS
+    assert conn.execute("SELECT COUNT(*) FROM materials WHERE name LIKE 'Materiale %'").fetchone()[0] == WRITERS * ITERATIONS
+    assert conn.execute("SELECT COUNT(*) FROM materials WHERE name LIKE 'Lastra %'").fetchone()[0] == WRITERS * BULK_ROWS
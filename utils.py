@@ -10,8 +10,8 @@ from reportlab.lib.units import cm
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import json
-import database
-from datetime import datetime
+import catalog_ndjson
+import file_formats
 
 def export_to_excel(quote_data, summary_data):
     """Esporta i dati del preventivo e il riepilogo in un file Excel."""
@@ -19,57 +19,13 @@ def export_to_excel(quote_data, summary_data):
 
 def export_to_pdf(quote_items, totals, filename):
     """Esporta il preventivo in un file PDF."""
-    doc = SimpleDocTemplate(filename, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-
-    story.append(Paragraph("Preventivo Soglie", styles['h1']))
-    story.append(Spacer(1, 12))
-
-    # Dati tabella con intestazioni corrette (escludendo l'ID)
-    data = [["N.", "L (cm)", "W (cm)", "Materiale", "Spess. (cm)", "m²", "€/m²", "Lastra (€)", "Bordi (€)", "Tot. Riga (€)"]]
-    
-    for item in quote_items:
-        # Prendi solo i primi 10 valori (escludendo l'ID che è l'ultimo)
-        row_data = list(item[:10])
-        data.append(row_data)
-    
-    # Creazione tabella con larghezze colonne ottimizzate
-    table = Table(data, colWidths=[0.8*cm, 1.8*cm, 1.8*cm, 3.5*cm, 1.5*cm, 1.5*cm, 1.5*cm, 1.8*cm, 1.8*cm, 2*cm])
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0,0), (-1,-1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Numeri centrati
-        ('ALIGN', (1, 1), (2, -1), 'RIGHT'),   # Dimensioni allineate a destra
-        ('ALIGN', (5, 1), (-1, -1), 'RIGHT'),  # Valori numerici allineati a destra
-    ])
-    table.setStyle(style)
-    story.append(table)
-    story.append(Spacer(1, 24))
-
-    # Riepilogo
-    story.append(Paragraph(f"<b>Totale m²:</b> {totals['mq']}", styles['Normal']))
-    story.append(Paragraph(f"<b>Totale Importo (€):</b> {totals['eur']}", styles['Normal']))
-
-    doc.build(story)
+    file_formats.write_quote_pdf(quote_items, totals, filename)
     messagebox.showinfo("Esportazione PDF", f"Preventivo esportato con successo in {filename}", parent=None)
 
 def save_quote_to_json(quote_items, totals, filename):
     """Salva il preventivo corrente in un file JSON."""
-    data_to_save = {
-        "items": quote_items,
-        "totals": totals
-    }
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, indent=4, ensure_ascii=False)
+        file_formats.write_quote_json(quote_items, totals, filename)
         messagebox.showinfo("Salvataggio JSON", f"Preventivo salvato con successo in {filename}", parent=None)
     except IOError as e:
         messagebox.showerror("Errore Salvataggio", f"Impossibile salvare il file: {e}", parent=None)
@@ -77,9 +33,7 @@ def save_quote_to_json(quote_items, totals, filename):
 def load_quote_from_json(filename):
     """Carica un preventivo da un file JSON."""
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data.get("items", []), data.get("totals", {})
+        return file_formats.read_quote_json(filename)
     except FileNotFoundError:
         messagebox.showerror("Errore Apertura", "File non trovato.", parent=None)
         return None, None
@@ -90,168 +44,25 @@ def load_quote_from_json(filename):
         messagebox.showerror("Errore Apertura", f"Impossibile leggere il file: {e}", parent=None)
         return None, None
 
-def import_materials_from_excel(filepath, progress_callback=None):
-    """Importa materiali da un file Excel multi-sheet nel database SQLite."""
-    imported_count = 0
-    skipped_count = 0
-    processed_sheets = 0
-
-    try:
-        if filepath.endswith('.xls'):
-            workbook = xlrd.open_workbook(filepath)
-            sheet_names = workbook.sheet_names()
-        elif filepath.endswith('.xlsx'):
-            workbook = openpyxl.load_workbook(filepath, data_only=True) # data_only=True to get values not formulas
-            sheet_names = workbook.sheetnames
-        else:
-            messagebox.showerror("Errore Importazione", "Formato file non supportato. Utilizzare .xls o .xlsx", parent=None)
-            return False
-
-        total_sheets = len(sheet_names)
-        if total_sheets == 0:
-            messagebox.showerror("Errore Importazione", "Il file Excel non contiene fogli.", parent=None)
-            return False
-
-        for sheet_index, supplier_name in enumerate(sheet_names):
-            if progress_callback:
-                # Update progress based on sheets processed, and then rows within a sheet
-                progress_callback((sheet_index / total_sheets) * 100) # Initial progress for starting a new sheet
-            
-            if filepath.endswith('.xls'):
-                sheet = workbook.sheet_by_name(supplier_name)
-                # Find the header row (e.g., containing 'nome' or 'Nome Materiale')
-                header_row_idx = -1
-                for r_idx in range(sheet.nrows):
-                    row_values = [str(sheet.cell_value(r_idx, c_idx)).strip().lower() for c_idx in range(sheet.ncols)]
-                    if "nome" in row_values or "nome materiale" in row_values:
-                        header_row_idx = r_idx
-                        break
-                if header_row_idx == -1:
-                    print(f"Foglio '{supplier_name}': Intestazione non trovata. Salto.")
-                    skipped_count += sheet.nrows # Approximate skipped rows
-                    continue
-                
-                header = [str(sheet.cell_value(header_row_idx, col)).strip() for col in range(sheet.ncols)]
-                data_rows = (sheet.row_values(row_idx) for row_idx in range(header_row_idx + 1, sheet.nrows))
-                current_sheet_total_rows = sheet.nrows - (header_row_idx + 1)
-            
-            elif filepath.endswith('.xlsx'):
-                sheet = workbook[supplier_name]
-                header_row_idx = -1
-                for r_idx, row in enumerate(sheet.iter_rows(values_only=True)):
-                    row_values = [str(cell).strip().lower() if cell is not None else "" for cell in row]
-                    if "nome" in row_values or "nome materiale" in row_values:
-                        header_row_idx = r_idx
-                        break
-                if header_row_idx == -1:
-                    print(f"Foglio '{supplier_name}': Intestazione non trovata. Salto.")
-                    skipped_count += sheet.max_row # Approximate skipped rows
-                    continue
-
-                # Get header row values more robustly
-                header_values_generator = sheet.iter_rows(min_row=header_row_idx + 1, max_row=header_row_idx + 1, values_only=True)
-                header = []
-                for row_tuple in header_values_generator: # Should be only one row_tuple
-                    header = [str(cell).strip() if cell is not None else "" for cell in row_tuple]
-                    break # exit after processing the header row
-                print(f"Debug: Foglio '{supplier_name}', Header identificato: {header}") # Debug print
-
-                data_rows = sheet.iter_rows(min_row=header_row_idx + 2, values_only=True)
-                current_sheet_total_rows = sheet.max_row - (header_row_idx + 1)
-
-            if not header or not any(h.lower() == "nome materiale" or h.lower() == "nome" for h in header):
-                print(f"Foglio '{supplier_name}': Colonna 'Nome Materiale' non trovata nell'intestazione. Salto.")
-                skipped_count += current_sheet_total_rows
-                continue
-            
-            try:
-                name_col_idx = next(i for i, h in enumerate(header) if h.lower() == "nome materiale" or h.lower() == "nome")
-            except StopIteration:
-                print(f"Foglio '{supplier_name}': Indice colonna 'Nome Materiale' non trovato. Salto.")
-                skipped_count += current_sheet_total_rows
-                continue
-
-            # Identify thickness columns (e.g., CM2, CM3, CM40)
-            thickness_price_cols = {}
-            for col_idx, col_name in enumerate(header):
-                if col_name.upper().startswith("CM") and col_idx != name_col_idx:
-                    try:
-                        # Extract numeric part of thickness from CM<number>
-                        thickness_val = float(col_name[2:].replace(',', '.'))
-                        thickness_price_cols[thickness_val] = col_idx
-                    except ValueError:
-                        print(f"Foglio '{supplier_name}': Formato spessore non valido in colonna '{col_name}'. Salto colonna.")
-            
-            if not thickness_price_cols:
-                print(f"Foglio '{supplier_name}': Nessuna colonna spessore (CMx) trovata o valida. Salto foglio.")
-                skipped_count += current_sheet_total_rows
-                continue
-
-            sheet_imported_count = 0
-            sheet_skipped_count = 0
-            for i, row_data in enumerate(data_rows):
-                if progress_callback:
-                    # Update progress for rows within the current sheet
-                    sheet_progress = ((i + 1) / current_sheet_total_rows) * (100 / total_sheets) # Progress within this sheet's share
-                    base_progress = (sheet_index / total_sheets) * 100
-                    progress_callback(base_progress + sheet_progress)
-
-                material_name = str(row_data[name_col_idx]).strip() if row_data[name_col_idx] else None
-
-                if not material_name:
-                    sheet_skipped_count += len(thickness_price_cols) # Skipping all potential entries for this row
-                    continue
-
-                for thickness, price_col_idx in thickness_price_cols.items():
-                    if price_col_idx >= len(row_data) or row_data[price_col_idx] is None or str(row_data[price_col_idx]).strip() == "":
-                        # No price for this thickness, skip this specific material-thickness combination
-                        sheet_skipped_count += 1
-                        continue
-                    
-                    price_str = str(row_data[price_col_idx]).replace(',', '.').replace('€', '').strip()
-                    
-                    try:
-                        price = float(price_str)
-                    except ValueError:
-                        print(f"Foglio '{supplier_name}', Materiale '{material_name}', Spessore '{thickness}': Prezzo non valido '{price_str}'. Salto.")
-                        sheet_skipped_count += 1
-                        continue
-                    
-                    # Description is not part of this specific Excel structure, so pass empty or None
-                    description = ""
-
-                    if database.add_material(material_name, price, thickness, description, supplier_name):
-                        sheet_imported_count += 1
-                    else:
-                        sheet_skipped_count += 1
-            
-            imported_count += sheet_imported_count
-            skipped_count += sheet_skipped_count
-            processed_sheets += 1
-            print(f"Foglio '{supplier_name}': Importati {sheet_imported_count}, Saltati {sheet_skipped_count}")
-
-        if progress_callback:
-            progress_callback(100) # Ensure progress reaches 100%
-
-        messagebox.showinfo("Importazione Completata", 
-                              f"{imported_count} materiali importati da {processed_sheets} fogli.\n"
-                              f"{skipped_count} voci saltate (dati mancanti/errati o duplicati).", parent=None)
-        return True
-
-    except FileNotFoundError:
-        messagebox.showerror("Errore Importazione", "File Excel non trovato.", parent=None)
-        return False
-    except xlrd.XLRDError as e:
-        messagebox.showerror("Errore Importazione XLS", f"Errore durante la lettura del file .xls: {e}", parent=None)
-        return False
-    except openpyxl.utils.exceptions.InvalidFileException as e:
-        messagebox.showerror("Errore Importazione XLSX", f"Errore durante la lettura del file .xlsx: {e}", parent=None)
-        return False
-    except Exception as e:
-        import traceback
-        traceback.print_exc() # For debugging
-        messagebox.showerror("Errore Importazione", f"Si è verificato un errore imprevisto: {e}", parent=None)
-        return False
+def show_excel_import_outcome(outcome, parent=None):
+    """Mostra l'esito di file_formats.import_materials_from_excel: (importati, saltati, fogli)."""
+    imported_count, skipped_count, processed_sheets = outcome
+    messagebox.showinfo("Importazione Completata", 
+                          f"{imported_count} materiali importati da {processed_sheets} fogli.\n"
+                          f"{skipped_count} voci saltate (dati mancanti/errati o duplicati).", parent=parent)
+
+def show_excel_import_error(error, parent=None):
+    """Mostra l'errore di un'importazione da Excel non riuscita."""
+    if isinstance(error, FileNotFoundError):
+        messagebox.showerror("Errore Importazione", "File Excel non trovato.", parent=parent)
+    elif isinstance(error, xlrd.XLRDError):
+        messagebox.showerror("Errore Importazione XLS", f"Errore durante la lettura del file .xls: {error}", parent=parent)
+    elif isinstance(error, openpyxl.utils.exceptions.InvalidFileException):
+        messagebox.showerror("Errore Importazione XLSX", f"Errore durante la lettura del file .xlsx: {error}", parent=parent)
+    elif isinstance(error, ValueError):
+        messagebox.showerror("Errore Importazione", str(error), parent=parent)
+    else:
+        messagebox.showerror("Errore Importazione", f"Si è verificato un errore imprevisto: {error}", parent=parent)
 
 # --- Helper for progress bar during import ---
 class ProgressWindow(tk.Toplevel):
@@ -383,115 +194,35 @@ def export_quote_to_pdf(filename, quote_data, totals, edge_details_for_pdf, clie
     messagebox.showinfo("Esportazione PDF", f"Preventivo esportato con successo in {filename}")
 
 
-def export_materials_and_edges_to_json(filename):
-    """Esporta tutti i materiali e tipi di bordo in un file JSON per backup/trasferimento."""
-    try:
-        # Recupera tutti i materiali
-        materials = database.get_all_materials()
-        materials_data = []
-        for material in materials:
-            materials_data.append({
-                'name': material['name'],
-                'thickness': material['thickness'],
-                'price_per_sqm': material['price_per_sqm'],
-                'description': material['description'],
-                'supplier': material['supplier']
-            })
-        
-        # Recupera tutti i tipi di bordo
-        edges = database.get_all_edge_types()
-        edges_data = []
-        for edge in edges:
-            edges_data.append({
-                'material_name': edge['material_name'],
-                'thickness': edge['thickness'],
-                'edge_type': edge['edge_type'],
-                'price_per_lm': edge['price_per_lm']
-            })
-        
-        # Crea il dizionario da esportare
-        export_data = {
-            'export_date': json.dumps(datetime.now().isoformat()),
-            'materials': materials_data,
-            'edges': edges_data
-        }
-        
-        # Salva nel file JSON
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, indent=4, ensure_ascii=False)
-        
-        messagebox.showinfo("Esportazione Completata", 
-                          f"Esportati {len(materials_data)} materiali e {len(edges_data)} tipi di bordo in {filename}")
-        return True
-        
-    except Exception as e:
-        messagebox.showerror("Errore Esportazione", f"Errore durante l'esportazione: {e}")
-        return False
+def show_catalog_export_outcome(counts, filename, parent=None):
+    """Mostra i conteggi di un'esportazione del catalogo (catalog_ndjson.export_catalog o export_catalog_json)."""
+    messagebox.showinfo("Esportazione Completata",
+                      f"Esportati {counts['materials']} materiali, {counts['edges']} tipi di bordo "
+                      f"e {counts['linear_elements']} elementi lineari in {filename}", parent=parent)
 
 
-def import_materials_and_edges_from_json(filename, overwrite_existing=False):
-    """Importa materiali e tipi di bordo da un file JSON di backup."""
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            import_data = json.load(f)
-        
-        if 'materials' not in import_data and 'edges' not in import_data:
-            messagebox.showerror("Errore Importazione", "File JSON non valido: mancano le sezioni 'materials' o 'edges'")
-            return False
-        
-        imported_materials = 0
-        skipped_materials = 0
-        imported_edges = 0
-        skipped_edges = 0
-        
-        # Importa materiali
-        if 'materials' in import_data:
-            for material_data in import_data['materials']:
-                try:
-                    result = database.add_material(
-                        name=material_data['name'],
-                        price_per_sqm=material_data['price_per_sqm'],
-                        thickness=material_data.get('thickness'),
-                        description=material_data.get('description', ''),
-                        supplier=material_data.get('supplier')
-                    )
-                    if result:
-                        imported_materials += 1
-                    else:
-                        skipped_materials += 1
-                except Exception as e:
-                    print(f"Errore importazione materiale {material_data.get('name', 'sconosciuto')}: {e}")
-                    skipped_materials += 1
-        
-        # Importa tipi di bordo
-        if 'edges' in import_data:
-            for edge_data in import_data['edges']:
-                try:
-                    result = database.add_edge_type(
-                        edge_type=edge_data['edge_type'],
-                        price_per_lm=edge_data['price_per_lm'],
-                        material_name=edge_data.get('material_name'),
-                        thickness=edge_data.get('thickness')
-                    )
-                    if result:
-                        imported_edges += 1
-                    else:
-                        skipped_edges += 1
-                except Exception as e:
-                    print(f"Errore importazione bordo {edge_data.get('edge_type', 'sconosciuto')}: {e}")
-                    skipped_edges += 1
-        
-        messagebox.showinfo("Importazione Completata", 
-                          f"Importati: {imported_materials} materiali, {imported_edges} tipi di bordo\n"
-                          f"Saltati (duplicati/errori): {skipped_materials} materiali, {skipped_edges} tipi di bordo")
-        return True
-        
-    except FileNotFoundError:
-        messagebox.showerror("Errore Importazione", "File non trovato")
-        return False
-    except json.JSONDecodeError:
-        messagebox.showerror("Errore Importazione", "File JSON non valido")
-        return False
-    except Exception as e:
-        messagebox.showerror("Errore Importazione", f"Errore durante l'importazione: {e}")
-        return False
\ No newline at end of file
+def show_catalog_export_error(error, parent=None):
+    messagebox.showerror("Errore Esportazione", f"Errore durante l'esportazione: {error}", parent=parent)
+
+
+def show_catalog_import_outcome(outcomes, parent=None):
+    """Mostra i conteggi di catalog_ndjson.import_catalog_file."""
+    materials_outcome, edges_outcome, linear_outcome = (
+        outcomes['materials'], outcomes['edges'], outcomes['linear_elements'])
+    messagebox.showinfo("Importazione Completata", 
+                      f"Importati: {materials_outcome['inserted']} materiali, {edges_outcome['inserted']} tipi di bordo, {linear_outcome['inserted']} elementi lineari\n"
+                      f"Aggiornati: {materials_outcome['updated']} materiali, {edges_outcome['updated']} tipi di bordo, {linear_outcome['updated']} elementi lineari\n"
+                      f"Saltati (duplicati/errori): {materials_outcome['skipped']} materiali, {edges_outcome['skipped']} tipi di bordo, {linear_outcome['skipped']} elementi lineari",
+                      parent=parent)
+
+
+def show_catalog_import_error(error, parent=None):
+    """Mostra l'errore di un'importazione del catalogo non riuscita."""
+    if isinstance(error, FileNotFoundError):
+        messagebox.showerror("Errore Importazione", "File non trovato", parent=parent)
+    elif isinstance(error, json.JSONDecodeError):
+        messagebox.showerror("Errore Importazione", "File JSON non valido", parent=parent)
+    elif isinstance(error, catalog_ndjson.CatalogFormatError):
+        messagebox.showerror("Errore Importazione", f"File non valido: {error}", parent=parent)
+    else:
+        messagebox.showerror("Errore Importazione", f"Errore durante l'importazione: {error}", parent=parent)